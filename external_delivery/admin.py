@@ -1,18 +1,20 @@
 from django.contrib import admin
 from django.db import models
-from django.db.models import Avg, Count
+from django.db.models import Count
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.html import format_html
 
 from .models import (
     APIUsageLog,
+    APIUsageMinute,
     ExternalBusiness,
     ExternalDelivery,
     ExternalDeliveryStatusHistory,
     RateLimitLog,
     WebhookLog,
 )
+from .usage import get_api_usage_stats
 
 
 @admin.register(ExternalBusiness)
@@ -114,17 +116,14 @@ class ExternalBusinessAdmin(admin.ModelAdmin):
 
     def api_usage_summary(self, obj):
         last_30_days = timezone.now() - timezone.timedelta(days=30)
-        logs = obj.api_usage_logs.filter(created_at__gte=last_30_days)
-
-        total_requests = logs.count()
-        error_requests = logs.filter(response_status__gte=400).count()
-        avg_response_time = logs.aggregate(avg_time=Avg("response_time"))["avg_time"] or 0
+        # Read from the per-minute aggregates; the raw log may be sampled
+        usage = get_api_usage_stats(obj, since=last_30_days)
 
         return format_html(
             "<strong>Last 30 Days:</strong><br>" "Requests: {} (Errors: {})<br>" "Avg Response Time: {:.3f}s",
-            total_requests,
-            error_requests,
-            avg_response_time,
+            usage["api_requests"],
+            usage["api_errors"],
+            usage["avg_response_time"],
         )
 
     api_usage_summary.short_description = "API Usage (30d)"
@@ -344,6 +343,25 @@ class APIUsageLogAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(APIUsageMinute)
+class APIUsageMinuteAdmin(admin.ModelAdmin):
+    list_display = ["business_name", "endpoint", "minute", "request_count", "error_count", "total_response_time"]
+    list_filter = ["external_business", "minute"]
+    search_fields = ["external_business__business_name", "endpoint"]
+    date_hierarchy = "minute"
+
+    def business_name(self, obj):
+        return obj.external_business.business_name
+
+    business_name.short_description = "Business"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(WebhookLog)
 class WebhookLogAdmin(admin.ModelAdmin):
     list_display = ["business_name", "event_type", "success_badge", "response_status", "retry_count", "created_at"]
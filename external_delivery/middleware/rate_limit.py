@@ -1,12 +1,10 @@
-import time
-from datetime import datetime, timedelta
-
 from django.conf import settings
-from django.core.cache import cache
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 
-from ..models import ExternalBusiness, RateLimitLog
+from ..rate_limiter import rate_limit_log_buffer, rate_limiter
+from ..usage import usage_meter
+from ..utils import log_rate_limit_exceeded
 
 
 class ExternalAPIRateLimit(MiddlewareMixin):
@@ -15,6 +13,9 @@ class ExternalAPIRateLimit(MiddlewareMixin):
     """
 
     def process_request(self, request):
+        # Write usage counters that have waited flush_interval, whatever this worker serves now
+        usage_meter.flush_if_due()
+
         # Only apply rate limiting to external API requests
         if not hasattr(request, "external_business"):
             return None
@@ -22,29 +23,25 @@ class ExternalAPIRateLimit(MiddlewareMixin):
         external_business = request.external_business
         client_ip = self.get_client_ip(request)
 
-        # Check rate limits
-        if self.is_rate_limited(external_business, client_ip, request):
-            # Log the rate limit violation
-            RateLimitLog.objects.create(
-                external_business=external_business,
-                request_ip=client_ip,
-                endpoint=request.path,
-                request_count=1,
-                time_window="minute",
-                blocked=True,
-            )
+        # Write blocked-request logs that have waited flush_interval, even when nothing is blocked now
+        rate_limit_log_buffer.flush_if_due()
 
-            return JsonResponse(
+        # Check and record the request against both windows in one atomic call
+        decision = self.check_rate_limit(external_business, client_ip)
+        if not decision.allowed:
+            # Log the rate limit violation (buffered)
+            log_rate_limit_exceeded(external_business, request, rate_type=decision.window_name)
+
+            response = JsonResponse(
                 {
                     "error": "Rate limit exceeded",
-                    "message": f"Too many requests. Limit: {external_business.rate_limit_per_minute}/minute",
-                    "retry_after": 60,
+                    "message": f"Too many requests. Limit: {decision.limit}/{decision.window_name}",
+                    "retry_after": decision.retry_after,
                 },
                 status=429,
             )
-
-        # Record successful request
-        self.record_request(external_business, client_ip, request)
+            response["Retry-After"] = str(decision.retry_after)
+            return response
 
         return None
 
@@ -57,52 +54,25 @@ class ExternalAPIRateLimit(MiddlewareMixin):
             ip = request.META.get("REMOTE_ADDR")
         return ip
 
+    def check_rate_limit(self, external_business, client_ip):
+        """
+        Check the minute and hour limits and count the request if it is allowed.
+        Uses a single atomic Redis script call per request.
+        """
+        return rate_limiter.hit(
+            f"{external_business.id}:{client_ip}",
+            [
+                (60, external_business.rate_limit_per_minute),
+                (3600, external_business.rate_limit_per_hour),
+            ],
+        )
+
     def is_rate_limited(self, external_business, client_ip, request):
         """
-        Check if request should be rate limited
-        Uses Redis cache for performance
+        Check if request should be rate limited.
+        Allowed requests are recorded as part of the same check.
         """
-        now = datetime.now()
-
-        # Create cache keys
-        minute_key = f"rate_limit:{external_business.id}:{client_ip}:{now.strftime('%Y%m%d%H%M')}"
-        hour_key = f"rate_limit:{external_business.id}:{client_ip}:{now.strftime('%Y%m%d%H')}"
-
-        # Get current counts
-        minute_count = cache.get(minute_key, 0)
-        hour_count = cache.get(hour_key, 0)
-
-        # Check limits
-        if minute_count >= external_business.rate_limit_per_minute:
-            return True
-
-        if hour_count >= external_business.rate_limit_per_hour:
-            return True
-
-        return False
-
-    def record_request(self, external_business, client_ip, request):
-        """Record successful request in cache"""
-        now = datetime.now()
-
-        # Create cache keys
-        minute_key = f"rate_limit:{external_business.id}:{client_ip}:{now.strftime('%Y%m%d%H%M')}"
-        hour_key = f"rate_limit:{external_business.id}:{client_ip}:{now.strftime('%Y%m%d%H')}"
-
-        # Increment counters
-        try:
-            cache.set(minute_key, cache.get(minute_key, 0) + 1, 60)  # 1 minute TTL
-            cache.set(hour_key, cache.get(hour_key, 0) + 1, 3600)  # 1 hour TTL
-        except Exception:
-            # Fallback to database logging if cache fails
-            RateLimitLog.objects.create(
-                external_business=external_business,
-                request_ip=client_ip,
-                endpoint=request.path,
-                request_count=1,
-                time_window="minute",
-                blocked=False,
-            )
+        return not self.check_rate_limit(external_business, client_ip).allowed
 
 
 class APIQuotaMiddleware(MiddlewareMixin):
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.26 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("external_delivery", "0003_externalbusiness_last_login_externalbusiness_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="APIUsageMinute",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("endpoint", models.CharField(help_text="URL route pattern of the endpoint", max_length=255)),
+                ("minute", models.DateTimeField()),
+                ("request_count", models.PositiveIntegerField(default=0)),
+                ("error_count", models.PositiveIntegerField(default=0)),
+                (
+                    "total_response_time",
+                    models.DecimalField(
+                        decimal_places=3, default=0, help_text="Sum of response times in seconds", max_digits=14
+                    ),
+                ),
+                ("request_bytes", models.BigIntegerField(default=0)),
+                ("response_bytes", models.BigIntegerField(default=0)),
+                (
+                    "external_business",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="api_usage_minutes",
+                        to="external_delivery.externalbusiness",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "API Usage (per minute)",
+                "verbose_name_plural": "API Usage (per minute)",
+                "ordering": ["-minute"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="apiusageminute",
+            index=models.Index(fields=["external_business", "minute"], name="external_de_externa_b580a0_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="apiusageminute",
+            constraint=models.UniqueConstraint(
+                fields=("external_business", "endpoint", "minute"), name="unique_api_usage_minute"
+            ),
+        ),
+    ]
@@ -442,6 +442,35 @@ class APIUsageLog(models.Model):
         return f"{self.external_business.business_name} - {self.method} {self.endpoint}"
 
 
+class APIUsageMinute(models.Model):
+    """Per-minute API usage counters per business and endpoint, used for billing and statistics"""
+
+    external_business = models.ForeignKey(ExternalBusiness, on_delete=models.CASCADE, related_name="api_usage_minutes")
+    endpoint = models.CharField(max_length=255, help_text="URL route pattern of the endpoint")
+    minute = models.DateTimeField()
+    request_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    total_response_time = models.DecimalField(
+        max_digits=14, decimal_places=3, default=0, help_text="Sum of response times in seconds"
+    )
+    request_bytes = models.BigIntegerField(default=0)
+    response_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "API Usage (per minute)"
+        verbose_name_plural = "API Usage (per minute)"
+        ordering = ["-minute"]
+        constraints = [
+            models.UniqueConstraint(fields=["external_business", "endpoint", "minute"], name="unique_api_usage_minute"),
+        ]
+        indexes = [
+            models.Index(fields=["external_business", "minute"]),
+        ]
+
+    def __str__(self):
+        return f"{self.external_business.business_name} - {self.endpoint} @ {self.minute:%Y-%m-%d %H:%M}"
+
+
 class WebhookLog(models.Model):
     """Log webhook delivery attempts"""
 
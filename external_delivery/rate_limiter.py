@@ -0,0 +1,228 @@
+"""
+Atomic rate limiting for external API requests.
+
+Counters use the sliding-window-counter algorithm: each window keeps the
+count of the current and previous fixed bucket, and the previous bucket is
+weighted by how much of it still overlaps the sliding window. The check and
+the increment for every window (minute and hour) run in a single Lua script,
+so one Redis round-trip both decides and records the request and concurrent
+workers cannot undercount.
+
+When the default cache is not backed by Redis (local development, tests) an
+in-process implementation of the same algorithm is used instead.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .models import RateLimitLog
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ext_rl"
+
+WINDOW_NAMES = {60: "minute", 3600: "hour"}
+
+SLIDING_WINDOW_SCRIPT = """
+-- KEYS: (current bucket, previous bucket) pairs, one pair per window
+-- ARGV[1]: now in milliseconds, then (window_ms, limit) pairs
+local now = tonumber(ARGV[1])
+local windows = (#ARGV - 1) / 2
+for i = 1, windows do
+    local window = tonumber(ARGV[2 * i])
+    local limit = tonumber(ARGV[2 * i + 1])
+    local current = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+    local elapsed = now % window
+    local count = math.floor(previous * (window - elapsed) / window) + current
+    if count >= limit then
+        return {0, i, count, window - elapsed}
+    end
+end
+for i = 1, windows do
+    local window = tonumber(ARGV[2 * i])
+    redis.call('INCR', KEYS[2 * i - 1])
+    redis.call('PEXPIRE', KEYS[2 * i - 1], window * 2)
+end
+return {1, 0, 0, 0}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    window: int = 0
+    limit: int = 0
+    count: int = 0
+    retry_after: int = 0
+
+    @property
+    def window_name(self):
+        return WINDOW_NAMES.get(self.window, f"{self.window}s")
+
+
+def _bucket_keys(identity, window, now_ms):
+    bucket = now_ms // (window * 1000)
+    # The hash tag keeps every key of one identity on the same cluster slot.
+    base = f"{KEY_PREFIX}:{{{identity}}}:{window}"
+    return f"{base}:{bucket}", f"{base}:{bucket - 1}"
+
+
+class LocalSlidingWindowBackend:
+    """In-process counters with the same semantics as the Redis script."""
+
+    def __init__(self):
+        self._counts = {}
+        self._expiry = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def hit(self, keys, now_ms, limits):
+        with self._lock:
+            self._purge(now_ms)
+            for i, (window, limit) in enumerate(limits):
+                window_ms = window * 1000
+                current = self._counts.get(keys[2 * i], 0)
+                previous = self._counts.get(keys[2 * i + 1], 0)
+                elapsed = now_ms % window_ms
+                count = (previous * (window_ms - elapsed)) // window_ms + current
+                if count >= limit:
+                    return [0, i + 1, count, window_ms - elapsed]
+            for i, (window, _limit) in enumerate(limits):
+                key = keys[2 * i]
+                self._counts[key] = self._counts.get(key, 0) + 1
+                self._expiry[key] = now_ms + window * 2000
+            return [1, 0, 0, 0]
+
+    def _purge(self, now_ms):
+        if now_ms - self._last_purge < 60_000:
+            return
+        self._last_purge = now_ms
+        for key in [key for key, expires in self._expiry.items() if expires <= now_ms]:
+            self._counts.pop(key, None)
+            self._expiry.pop(key, None)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._expiry.clear()
+
+
+class RedisSlidingWindowBackend:
+    def __init__(self, connection):
+        self._script = connection.register_script(SLIDING_WINDOW_SCRIPT)
+
+    def hit(self, keys, now_ms, limits):
+        args = [now_ms]
+        for window, limit in limits:
+            args.extend([window * 1000, limit])
+        return [int(value) for value in self._script(keys=keys, args=args)]
+
+
+class SlidingWindowRateLimiter:
+    """
+    Check-and-record rate limiter for several windows at once.
+
+    ``hit`` returns a ``RateLimitDecision``; a request is only counted when it
+    is allowed in every window.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._fallback = LocalSlidingWindowBackend()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = self._default_backend()
+        return self._backend
+
+    def _default_backend(self):
+        try:
+            from django_redis import get_redis_connection
+
+            return RedisSlidingWindowBackend(get_redis_connection("default"))
+        except Exception:
+            # Non-Redis cache backend (e.g. LocMemCache) or django_redis missing
+            return self._fallback
+
+    def hit(self, identity, limits, now=None):
+        now_ms = int((now if now is not None else time.time()) * 1000)
+        keys = []
+        for window, _limit in limits:
+            keys.extend(_bucket_keys(identity, window, now_ms))
+
+        try:
+            allowed, index, count, retry_after_ms = self.backend.hit(keys, now_ms, limits)
+        except Exception as e:
+            # Keep enforcing per process rather than failing open when Redis is unavailable
+            logger.warning(f"Rate limiter backend error, using local counters: {e}")
+            allowed, index, count, retry_after_ms = self._fallback.hit(keys, now_ms, limits)
+
+        if allowed:
+            return RateLimitDecision(allowed=True)
+        window, limit = limits[index - 1]
+        return RateLimitDecision(
+            allowed=False,
+            window=window,
+            limit=limit,
+            count=count,
+            retry_after=max(1, -(-retry_after_ms // 1000)),
+        )
+
+
+class RateLimitLogBuffer:
+    """
+    Collects blocked-request ``RateLimitLog`` rows and writes them with ``bulk_create``.
+
+    The buffer is flushed when it reaches ``batch_size`` entries or when
+    ``flush_interval`` seconds have passed since the last flush. Besides
+    ``add``, the rate limit middleware checks the age on every external API
+    request (``flush_if_due``), so rows are not held back once blocking stops,
+    and whatever is left is written at interpreter exit.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or getattr(settings, "EXTERNAL_API_RATE_LIMIT_LOG_BATCH_SIZE", 100)
+        self.flush_interval = flush_interval or getattr(settings, "EXTERNAL_API_RATE_LIMIT_LOG_FLUSH_INTERVAL", 5)
+        self._entries = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, **fields):
+        with self._lock:
+            self._entries.append(RateLimitLog(**fields))
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = bool(self._entries) and (
+                len(self._entries) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        return self.flush() if due else 0
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, []
+            self._last_flush = time.monotonic()
+        if not entries:
+            return 0
+        try:
+            RateLimitLog.objects.bulk_create(entries, batch_size=self.batch_size)
+        except Exception as e:
+            logger.error(f"Failed to write {len(entries)} rate limit logs: {e}")
+            return 0
+        return len(entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+rate_limiter = SlidingWindowRateLimiter()
+rate_limit_log_buffer = RateLimitLogBuffer()
+atexit.register(rate_limit_log_buffer.flush)
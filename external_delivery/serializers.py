@@ -352,6 +352,9 @@ class ExternalBusinessStatsSerializer(serializers.Serializer):
     current_month_revenue = serializers.DecimalField(max_digits=15, decimal_places=2)
     success_rate = serializers.FloatField()
     average_delivery_value = serializers.DecimalField(max_digits=15, decimal_places=2)
+    current_month_api_requests = serializers.IntegerField()
+    current_month_api_errors = serializers.IntegerField()
+    average_response_time = serializers.FloatField()
 
 
 class WebhookTestSerializer(serializers.Serializer):
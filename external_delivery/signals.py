@@ -8,7 +8,7 @@ from .models import (
     ExternalDelivery,
     ExternalDeliveryStatus,
 )
-from .tasks import create_transport_delivery, send_delivery_notifications
+from .tasks import create_transport_delivery, schedule_delivery_notification
 
 
 @receiver(post_save, sender=ExternalDelivery)
@@ -35,7 +35,7 @@ def handle_external_delivery_status_change(sender, instance, **kwargs):
             # Check if status changed
             if old_instance.status != instance.status:
                 # Send notification for status change
-                send_delivery_notifications.delay(instance.id, instance.status)
+                schedule_delivery_notification(instance.id, instance.status)
 
         except ExternalDelivery.DoesNotExist:
             pass
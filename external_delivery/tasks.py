@@ -2,6 +2,8 @@ import logging
 
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 
 from transport.models import Delivery as TransportDelivery
@@ -20,6 +22,7 @@ from .utils import (
     send_webhook_notification,
     validate_delivery_data,
 )
+from .webhooks import webhook_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -53,14 +56,14 @@ def process_external_delivery(self, delivery_id):
             delivery.save()
 
             # Send failure notification
-            send_delivery_notifications.delay(delivery.id, ExternalDeliveryStatus.FAILED)
+            schedule_delivery_notification(delivery.id, ExternalDeliveryStatus.FAILED)
             return
 
         # Create corresponding transport delivery
         create_transport_delivery.delay(delivery_id)
 
         # Send creation notification
-        send_delivery_notifications.delay(delivery.id, ExternalDeliveryStatus.PENDING)
+        schedule_delivery_notification(delivery.id, ExternalDeliveryStatus.PENDING)
 
         logger.info(f"Successfully processed external delivery {delivery.tracking_number}")
 
@@ -122,27 +125,53 @@ def create_transport_delivery(self, external_delivery_id):
         raise self.retry(exc=exc, countdown=2**self.request.retries)
 
 
+# Map status to event type
+STATUS_EVENT_TYPES = {
+    ExternalDeliveryStatus.PENDING: WebhookEventType.DELIVERY_CREATED,
+    ExternalDeliveryStatus.ACCEPTED: WebhookEventType.DELIVERY_UPDATED,
+    ExternalDeliveryStatus.PICKED_UP: WebhookEventType.DELIVERY_UPDATED,
+    ExternalDeliveryStatus.IN_TRANSIT: WebhookEventType.DELIVERY_UPDATED,
+    ExternalDeliveryStatus.DELIVERED: WebhookEventType.DELIVERY_DELIVERED,
+    ExternalDeliveryStatus.CANCELLED: WebhookEventType.DELIVERY_CANCELLED,
+    ExternalDeliveryStatus.FAILED: WebhookEventType.DELIVERY_FAILED,
+}
+
+
+def _notification_coalesce_key(delivery_id, event_type):
+    return f"webhook_coalesce:{delivery_id}:{event_type}"
+
+
+def schedule_delivery_notification(delivery_id, event_status):
+    """
+    Queue a webhook for a delivery status change, coalescing rapid changes.
+
+    Status changes that map to the same event type within
+    ``WEBHOOK_COALESCE_WINDOW`` seconds produce a single webhook carrying the
+    latest status and delivery state.
+    """
+    window = getattr(settings, "WEBHOOK_COALESCE_WINDOW", 5)
+    event_type = STATUS_EVENT_TYPES.get(event_status, WebhookEventType.DELIVERY_UPDATED)
+    key = _notification_coalesce_key(delivery_id, event_type)
+
+    # When the key already exists a queued notification has not read the delivery yet and will carry this change
+    if cache.add(key, event_status, timeout=window * 10):
+        send_delivery_notifications.apply_async((delivery_id, event_status), countdown=window)
+
+
 @shared_task(bind=True, max_retries=5)
 def send_delivery_notifications(self, delivery_id, event_status):
     """
     Send webhook notifications for delivery status changes
     """
     try:
-        delivery = ExternalDelivery.objects.get(id=delivery_id)
-        business = delivery.external_business
+        event_type = STATUS_EVENT_TYPES.get(event_status, WebhookEventType.DELIVERY_UPDATED)
 
-        # Map status to event type
-        event_type_mapping = {
-            ExternalDeliveryStatus.PENDING: WebhookEventType.DELIVERY_CREATED,
-            ExternalDeliveryStatus.ACCEPTED: WebhookEventType.DELIVERY_UPDATED,
-            ExternalDeliveryStatus.PICKED_UP: WebhookEventType.DELIVERY_UPDATED,
-            ExternalDeliveryStatus.IN_TRANSIT: WebhookEventType.DELIVERY_UPDATED,
-            ExternalDeliveryStatus.DELIVERED: WebhookEventType.DELIVERY_DELIVERED,
-            ExternalDeliveryStatus.CANCELLED: WebhookEventType.DELIVERY_CANCELLED,
-            ExternalDeliveryStatus.FAILED: WebhookEventType.DELIVERY_FAILED,
-        }
+        # Release the coalescing slot before reading the delivery: a change made after this point
+        # queues its own notification instead of being folded into one that has already read the row
+        cache.delete(_notification_coalesce_key(delivery_id, event_type))
 
-        event_type = event_type_mapping.get(event_status, WebhookEventType.DELIVERY_UPDATED)
+        delivery = ExternalDelivery.objects.select_related("external_business").get(id=delivery_id)
+        business = delivery.external_business
 
         # Format delivery data for webhook
         webhook_data = format_webhook_delivery_data(delivery)
@@ -165,33 +194,33 @@ def send_delivery_notifications(self, delivery_id, event_status):
 
 
 @shared_task
-def retry_failed_webhooks():
+def retry_failed_webhooks(batch_size=500):
     """
-    Retry failed webhook deliveries
+    Retry failed webhook deliveries.
+    Due webhooks are re-sent concurrently with per-partner limits and their logs updated in bulk.
     """
     now = timezone.now()
+    max_retries = getattr(settings, "WEBHOOK_MAX_RETRIES", 3)
+
+    # Claim a batch of due webhooks; rows locked by an overlapping run are skipped rather than sent twice
+    with transaction.atomic():
+        claimed_ids = list(
+            WebhookLog.objects.select_for_update(skip_locked=True)
+            .filter(success=False, retry_count__lt=max_retries, next_retry_at__lte=now)
+            .order_by("next_retry_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not claimed_ids:
+            return 0
+        WebhookLog.objects.filter(id__in=claimed_ids).update(next_retry_at=None)
 
-    # Get webhooks that need retry
-    failed_webhooks = WebhookLog.objects.filter(success=False, retry_count__lt=3, next_retry_at__lte=now)
-
-    for webhook_log in failed_webhooks:
-        try:
-            # Retry webhook
-            result = send_webhook_notification(
-                business=webhook_log.external_business,
-                event_type=webhook_log.event_type,
-                data=webhook_log.payload,
-                webhook_url=webhook_log.webhook_url,
-                delivery=webhook_log.delivery,
-            )
+    failed_webhooks = WebhookLog.objects.filter(id__in=claimed_ids).select_related("external_business")
 
-            if result.get("success"):
-                logger.info(f"Successfully retried webhook {webhook_log.id}")
-            else:
-                logger.warning(f"Retry failed for webhook {webhook_log.id}: {result.get('error')}")
+    results = webhook_dispatcher.dispatch(failed_webhooks, is_retry=True)
 
-        except Exception as e:
-            logger.error(f"Error retrying webhook {webhook_log.id}: {e}")
+    succeeded = sum(1 for result in results.values() if result.get("success"))
+    logger.info(f"Retried {len(results)} webhooks: {succeeded} succeeded, {len(results) - succeeded} failed")
+    return len(results)
 
 
 @shared_task
@@ -229,7 +258,7 @@ def sync_transport_delivery_status():
             )
 
             # Send notification
-            send_delivery_notifications.delay(external_delivery.id, new_status)
+            schedule_delivery_notification(external_delivery.id, new_status)
 
             logger.info(f"Synced status for {external_delivery.tracking_number}: " f"{old_status} -> {new_status}")
 
@@ -241,7 +270,7 @@ def cleanup_old_logs():
     """
     cutoff_date = timezone.now() - timezone.timedelta(days=90)
 
-    # Clean up API usage logs older than 90 days
+    # Clean up API usage logs older than 90 days (per-minute aggregates are kept for billing)
     deleted_api_logs = APIUsageLog.objects.filter(created_at__lt=cutoff_date).delete()
 
     # Clean up webhook logs older than 90 days (except failed ones)
@@ -3,18 +3,27 @@ Tests for middleware and permissions in external delivery system
 """
 
 import time
+from decimal import Decimal
 from unittest.mock import Mock, patch
 
 from django.contrib.auth.models import AnonymousUser, User
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.test import RequestFactory, TestCase
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase, force_authenticate
 
 from .middleware.auth import ExternalAPIAuthentication, ExternalAPIMiddleware
 from .middleware.rate_limit import ExternalAPIRateLimit
+from .rate_limiter import (
+    LocalSlidingWindowBackend,
+    RateLimitLogBuffer,
+    SlidingWindowRateLimiter,
+)
+from .usage import UsageMeter, get_api_usage_stats, get_response_size
 from .models import (
     APIUsageLog,
+    APIUsageMinute,
     ExternalBusiness,
     ExternalBusinessPlan,
     ExternalBusinessStatus,
@@ -241,6 +250,227 @@ class RateLimitMiddlewareTest(TestCase):
         self.assertEqual(response2.status_code, 200)
 
 
+class SlidingWindowRateLimiterTest(TestCase):
+    """Test the atomic sliding window limiter"""
+
+    def setUp(self):
+        self.limiter = SlidingWindowRateLimiter(backend=LocalSlidingWindowBackend())
+
+    def test_limit_enforced_exactly_under_concurrency(self):
+        """Test concurrent requests never exceed the limit"""
+        import threading
+
+        now = 1_700_000_000.0
+        results = []
+
+        def worker():
+            for _ in range(10):
+                results.append(self.limiter.hit("biz:1.2.3.4", [(60, 25), (3600, 1000)], now=now).allowed)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 25)
+
+    def test_blocked_decision_reports_window(self):
+        """Test the decision names the window that was exceeded"""
+        now = 1_700_000_000.0
+        for _ in range(3):
+            self.assertTrue(self.limiter.hit("biz", [(60, 100), (3600, 3)], now=now).allowed)
+
+        decision = self.limiter.hit("biz", [(60, 100), (3600, 3)], now=now)
+
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.window_name, "hour")
+        self.assertGreater(decision.retry_after, 0)
+
+    def test_previous_window_slides_out(self):
+        """Test requests from the previous bucket stop counting as the window slides"""
+        start = 1_700_000_040.0  # start of a minute bucket
+        for _ in range(10):
+            self.assertTrue(self.limiter.hit("biz", [(60, 10)], now=start).allowed)
+        self.assertFalse(self.limiter.hit("biz", [(60, 10)], now=start + 30).allowed)
+        self.assertTrue(self.limiter.hit("biz", [(60, 10)], now=start + 80).allowed)
+
+
+class RateLimitLogBufferTest(TestCase):
+    """Test batched logging of blocked requests"""
+
+    def setUp(self):
+        self.business = ExternalBusiness.objects.create(
+            business_name="Buffer Test",
+            business_email="buffer@test.com",
+            contact_person="Buffer User",
+            contact_phone="+1234567890",
+            business_address="123 Buffer St",
+            plan=ExternalBusinessPlan.FREE,
+            status=ExternalBusinessStatus.APPROVED,
+        )
+
+    def test_entries_written_in_bulk(self):
+        """Test entries are held until the batch size is reached"""
+        buffer = RateLimitLogBuffer(batch_size=5, flush_interval=3600)
+        for _ in range(4):
+            buffer.add(
+                external_business=self.business,
+                request_ip="127.0.0.1",
+                endpoint="/api/external/deliveries/",
+                time_window="minute",
+                blocked=True,
+            )
+        self.assertEqual(RateLimitLog.objects.filter(external_business=self.business).count(), 0)
+
+        buffer.add(
+            external_business=self.business,
+            request_ip="127.0.0.1",
+            endpoint="/api/external/deliveries/",
+            time_window="minute",
+            blocked=True,
+        )
+
+        self.assertEqual(RateLimitLog.objects.filter(external_business=self.business).count(), 5)
+        self.assertEqual(len(buffer), 0)
+
+    def test_entries_flushed_once_the_interval_has_passed(self):
+        """Test a partial batch is written once flush_interval has elapsed, without further blocked requests"""
+        buffer = RateLimitLogBuffer(batch_size=100, flush_interval=5)
+        buffer.add(
+            external_business=self.business,
+            request_ip="127.0.0.1",
+            endpoint="/api/external/deliveries/",
+            time_window="minute",
+            blocked=True,
+        )
+        self.assertEqual(buffer.flush_if_due(), 0)
+        self.assertEqual(len(buffer), 1)
+
+        with patch("external_delivery.rate_limiter.time.monotonic", return_value=time.monotonic() + 6):
+            self.assertEqual(buffer.flush_if_due(), 1)
+
+        self.assertEqual(RateLimitLog.objects.filter(external_business=self.business).count(), 1)
+        self.assertEqual(len(buffer), 0)
+
+    @patch("external_delivery.middleware.rate_limit.rate_limit_log_buffer")
+    def test_rate_limit_middleware_flushes_due_entries(self, mock_buffer):
+        """Test every external API request gives the buffer a chance to flush"""
+        middleware = ExternalAPIRateLimit(lambda request: HttpResponse("OK"))
+        request = RequestFactory().get("/api/external/deliveries/")
+        request.external_business = self.business
+
+        middleware.process_request(request)
+
+        mock_buffer.flush_if_due.assert_called_once_with()
+
+
+class UsageMeterTest(TestCase):
+    """Test buffered API usage metering"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.business = ExternalBusiness.objects.create(
+            business_name="Usage Test",
+            business_email="usage@test.com",
+            contact_person="Usage User",
+            contact_phone="+1234567890",
+            business_address="123 Usage St",
+            plan=ExternalBusinessPlan.STARTER,
+            status=ExternalBusinessStatus.APPROVED,
+        )
+
+    def _record(self, meter, status_code):
+        request = self.factory.get("/api/external/deliveries/")
+        request.META["REMOTE_ADDR"] = "127.0.0.1"
+        meter.record(self.business, request, HttpResponse("x" * 10, status=status_code), 0.05)
+
+    def test_sampled_log_keeps_errors_and_full_counts(self):
+        """Test sampling drops successful raw rows but aggregates count everything"""
+        meter = UsageMeter(batch_size=1000, flush_interval=3600, sample_rate=0)
+        # All requests fall in the same minute bucket, whenever the test runs
+        frozen = timezone.now().replace(second=30, microsecond=0)
+        with patch("external_delivery.usage.timezone.now", return_value=frozen):
+            for _ in range(5):
+                self._record(meter, 200)
+            self._record(meter, 500)
+
+            self.assertEqual(APIUsageLog.objects.count(), 0)
+            meter.flush()
+            self._record(meter, 200)
+            meter.flush()
+
+        self.assertEqual(APIUsageLog.objects.filter(external_business=self.business).count(), 1)
+        self.assertEqual(APIUsageMinute.objects.filter(external_business=self.business).count(), 1)
+
+        usage = get_api_usage_stats(self.business)
+        self.assertEqual(usage["api_requests"], 7)
+        self.assertEqual(usage["api_errors"], 1)
+        self.assertEqual(usage["response_bytes"], 70)
+
+    def test_failed_flush_keeps_logs_and_counters_for_the_next_one(self):
+        """Test a database error puts the usage back, merged with what was recorded meanwhile"""
+        meter = UsageMeter(batch_size=1000, flush_interval=3600)
+        frozen = timezone.now().replace(second=30, microsecond=0)
+        with patch("external_delivery.usage.timezone.now", return_value=frozen):
+            self._record(meter, 200)
+            with patch.object(meter, "_upsert_counters", side_effect=RuntimeError("database unavailable")):
+                self.assertEqual(meter.flush(), 0)
+            self._record(meter, 500)
+
+            self.assertEqual(len(meter), 2)
+            self.assertEqual(meter.flush(), 2)
+
+        self.assertEqual(APIUsageLog.objects.filter(external_business=self.business).count(), 2)
+        usage = get_api_usage_stats(self.business)
+        self.assertEqual((usage["api_requests"], usage["api_errors"]), (2, 1))
+
+    def test_counters_flushed_once_the_interval_has_passed(self):
+        """Test pending usage is written once flush_interval has elapsed, without further external requests"""
+        meter = UsageMeter(batch_size=1000, flush_interval=5, sample_rate=0)
+        self._record(meter, 200)
+        meter.flush_if_due()
+        self.assertEqual(get_api_usage_stats(self.business)["api_requests"], 0)
+
+        with patch("external_delivery.usage.time.monotonic", return_value=time.monotonic() + 6):
+            meter.flush_if_due()
+
+        self.assertEqual(get_api_usage_stats(self.business)["api_requests"], 1)
+
+    @patch("external_delivery.middleware.rate_limit.usage_meter")
+    def test_every_request_gives_the_usage_meter_a_chance_to_flush(self, mock_meter):
+        """Test the rate limit middleware checks the usage buffer's age even for non-external requests"""
+        middleware = ExternalAPIRateLimit(lambda request: HttpResponse("OK"))
+
+        middleware.process_request(RequestFactory().get("/api/v1/products/"))
+
+        mock_meter.flush_if_due.assert_called_once_with()
+
+    def test_counters_upserted_in_conflict_key_order(self):
+        """Test aggregate rows are sent sorted by their conflict key so concurrent flushes lock in one order"""
+        minute = timezone.now().replace(second=0, microsecond=0)
+        counters = {
+            (self.business.id, "/b/", minute): [1, 0, Decimal("0.1"), 10, 10],
+            (self.business.id, "/a/", minute + timezone.timedelta(minutes=1)): [1, 0, Decimal("0.1"), 10, 10],
+            (self.business.id, "/a/", minute): [1, 0, Decimal("0.1"), 10, 10],
+        }
+        UsageMeter()._upsert_counters(counters)
+
+        rows = APIUsageMinute.objects.filter(external_business=self.business).order_by("id")
+        self.assertEqual(
+            [(row.endpoint, row.minute) for row in rows],
+            [("/a/", minute), ("/a/", minute + timezone.timedelta(minutes=1)), ("/b/", minute)],
+        )
+
+    def test_response_size_prefers_content_length(self):
+        """Test Content-Length is used without touching the body"""
+        response = HttpResponse("abc")
+        response["Content-Length"] = "1234"
+
+        self.assertEqual(get_response_size(response), 1234)
+        self.assertEqual(get_response_size(HttpResponse("abc")), 3)
+
+
 class ExternalBusinessOwnerPermissionTest(TestCase):
     """Test IsExternalBusinessOwner permission"""
 
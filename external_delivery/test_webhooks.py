@@ -5,8 +5,12 @@ Webhook testing for external delivery system
 import hashlib
 import hmac
 import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, patch
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.utils import timezone
 from rest_framework import status
@@ -21,7 +25,9 @@ from .models import (
     WebhookEventType,
     WebhookLog,
 )
+from .tasks import _notification_coalesce_key, retry_failed_webhooks, schedule_delivery_notification
 from .utils import format_webhook_delivery_data, send_webhook_notification
+from .webhooks import WebhookDispatcher, build_payload, sign_body
 
 
 class WebhookUtilsTest(TestCase):
@@ -69,7 +75,7 @@ class WebhookUtilsTest(TestCase):
         self.assertIn("delivery_name", data)
         self.assertEqual(data["external_delivery_id"], "WEBHOOK_001")
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_send_webhook_notification_success(self, mock_post):
         """Test successful webhook notification"""
         # Mock successful response
@@ -91,7 +97,7 @@ class WebhookUtilsTest(TestCase):
         call_args = mock_post.call_args
 
         # Verify URL
-        self.assertEqual(call_args[1]["url"], self.business.webhook_url)
+        self.assertEqual(call_args[0][0], self.business.webhook_url)
 
         # Verify headers
         headers = call_args[1]["headers"]
@@ -99,13 +105,13 @@ class WebhookUtilsTest(TestCase):
         self.assertIn("X-Webhook-Signature", headers)
 
         # Verify signature
-        payload = call_args[1]["data"]
+        payload = call_args[1]["data"].decode("utf-8")
         expected_signature = hmac.new(
             self.business.webhook_secret.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256
         ).hexdigest()
         self.assertEqual(headers["X-Webhook-Signature"], f"sha256={expected_signature}")
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_send_webhook_notification_failure(self, mock_post):
         """Test webhook notification failure"""
         # Mock failed response
@@ -122,7 +128,7 @@ class WebhookUtilsTest(TestCase):
         self.assertFalse(result["success"])
         self.assertEqual(result["status_code"], 500)
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_send_webhook_notification_timeout(self, mock_post):
         """Test webhook notification timeout"""
         # Mock timeout exception
@@ -185,7 +191,7 @@ class WebhookLoggingTest(TestCase):
             package_value=1500.00,
         )
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_webhook_logging_success(self, mock_post):
         """Test webhook logging for successful delivery"""
         # Mock successful response
@@ -207,7 +213,7 @@ class WebhookLoggingTest(TestCase):
         self.assertTrue(webhook_log.success)
         self.assertEqual(webhook_log.response_status_code, 200)
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_webhook_logging_failure(self, mock_post):
         """Test webhook logging for failed delivery"""
         # Mock failed response
@@ -247,7 +253,7 @@ class WebhookAPITest(APITestCase):
             webhook_url="https://test.com/webhook",
         )
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_webhook_test_endpoint(self, mock_post):
         """Test webhook test endpoint"""
         # Mock successful response
@@ -274,7 +280,7 @@ class WebhookAPITest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_webhook_test_endpoint_custom_url(self, mock_post):
         """Test webhook test endpoint with custom URL"""
         # Mock successful response
@@ -294,7 +300,7 @@ class WebhookAPITest(APITestCase):
         # Verify custom URL was used
         mock_post.assert_called_once()
         call_args = mock_post.call_args
-        self.assertEqual(call_args[1]["url"], "https://custom.com/webhook")
+        self.assertEqual(call_args[0][0], "https://custom.com/webhook")
 
 
 class WebhookSecurityTest(TestCase):
@@ -387,7 +393,7 @@ class WebhookSecurityTest(TestCase):
         # Verify incorrect signature fails
         self.assertFalse(hmac.compare_digest(correct_signature, incorrect_signature))
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_webhook_retry_mechanism(self, mock_post):
         """Test webhook retry mechanism for failed deliveries"""
         # Mock failed response (will trigger retry)
@@ -431,8 +437,8 @@ class WebhookIntegrationTest(APITestCase):
             webhook_url="https://integration.test.com/webhook",
         )
 
-    @patch("requests.post")
-    @patch("external_delivery.tasks.send_delivery_notifications.delay")
+    @patch("requests.Session.post")
+    @patch("external_delivery.tasks.send_delivery_notifications.apply_async")
     def test_delivery_creation_triggers_webhook(self, mock_task, mock_post):
         """Test that creating delivery triggers webhook notification"""
         # Mock successful webhook response
@@ -469,3 +475,156 @@ class WebhookIntegrationTest(APITestCase):
         delivery = ExternalDelivery.objects.get(external_delivery_id="INTEGRATION_001")
         self.assertEqual(delivery.external_business, self.business)
         self.assertEqual(delivery.status, ExternalDeliveryStatus.PENDING)
+
+
+class StubWebhookServer:
+    """Local HTTP server that records webhook calls and tracks concurrency per path"""
+
+    def __init__(self, status_by_path=None, delay=0.05):
+        self.status_by_path = status_by_path or {}
+        self.delay = delay
+        self.calls = []
+        self.active = {}
+        self.max_active = {}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                with stub.lock:
+                    stub.calls.append((self.path, dict(self.headers), body))
+                    stub.active[self.path] = stub.active.get(self.path, 0) + 1
+                    stub.max_active[self.path] = max(stub.max_active.get(self.path, 0), stub.active[self.path])
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.active[self.path] -= 1
+                self.send_response(stub.status_by_path.get(self.path, 200))
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class WebhookDispatcherTest(TestCase):
+    """Test concurrent webhook dispatch against a local stub server"""
+
+    def setUp(self):
+        self.businesses = [
+            ExternalBusiness.objects.create(
+                business_name=f"Dispatch Business {i}",
+                business_email=f"dispatch{i}@test.com",
+                contact_person="Dispatch User",
+                contact_phone="+1234567890",
+                business_address="123 Dispatch St",
+                plan=ExternalBusinessPlan.STARTER,
+                status=ExternalBusinessStatus.APPROVED,
+            )
+            for i in range(2)
+        ]
+
+    def _create_logs(self, business, url, count):
+        return [
+            WebhookLog.objects.create(
+                external_business=business,
+                event_type=WebhookEventType.DELIVERY_UPDATED,
+                webhook_url=url,
+                payload=build_payload(business, WebhookEventType.DELIVERY_UPDATED, {"seq": i}),
+            )
+            for i in range(count)
+        ]
+
+    def test_dispatch_respects_per_partner_limit_and_bulk_updates_logs(self):
+        """Test partners are capped independently and every log is updated"""
+        with StubWebhookServer(status_by_path={"/b": 503}) as stub:
+            logs = self._create_logs(self.businesses[0], f"{stub.url}/a", 6)
+            logs += self._create_logs(self.businesses[1], f"{stub.url}/b", 3)
+
+            dispatcher = WebhookDispatcher(max_workers=8, per_partner_limit=2, timeout=5)
+            results = dispatcher.dispatch(WebhookLog.objects.filter(id__in=[log.id for log in logs]))
+
+        self.assertEqual(len(results), 9)
+        self.assertLessEqual(stub.max_active["/a"], 2)
+        self.assertLessEqual(stub.max_active["/b"], 2)
+
+        ok_logs = WebhookLog.objects.filter(external_business=self.businesses[0])
+        self.assertTrue(all(log.success and log.response_status == 200 for log in ok_logs))
+
+        failed_logs = WebhookLog.objects.filter(external_business=self.businesses[1])
+        for log in failed_logs:
+            self.assertFalse(log.success)
+            self.assertEqual(log.response_status, 503)
+            self.assertIsNotNone(log.next_retry_at)
+
+    def test_signature_matches_sent_body(self):
+        """Test the signature header is computed over the exact request body"""
+        business = self.businesses[0]
+        with StubWebhookServer() as stub:
+            logs = self._create_logs(business, f"{stub.url}/a", 1)
+            WebhookDispatcher(timeout=5).dispatch(logs)
+
+        _path, headers, body = stub.calls[0]
+        self.assertEqual(headers["X-Webhook-Signature"], sign_body(business.webhook_secret, body.decode("utf-8")))
+        self.assertEqual(json.loads(body)["data"], {"seq": 0})
+
+    def test_retry_exhaustion_stops_scheduling(self):
+        """Test a webhook past the retry limit is not rescheduled"""
+        with StubWebhookServer(status_by_path={"/b": 500}) as stub:
+            logs = self._create_logs(self.businesses[1], f"{stub.url}/b", 1)
+            logs[0].retry_count = 2
+            WebhookDispatcher(timeout=5, max_retries=3).dispatch(logs, is_retry=True)
+
+        log = WebhookLog.objects.get(id=logs[0].id)
+        self.assertEqual(log.retry_count, 3)
+        self.assertIsNone(log.next_retry_at)
+
+    def test_retry_task_dispatches_only_claimed_due_webhooks(self):
+        """Test the retry task sends due webhooks once and leaves the rest alone"""
+        with StubWebhookServer() as stub:
+            due = self._create_logs(self.businesses[0], f"{stub.url}/a", 2)
+            later = self._create_logs(self.businesses[0], f"{stub.url}/later", 1)
+            WebhookLog.objects.filter(id__in=[log.id for log in due]).update(
+                success=False, next_retry_at=timezone.now() - timezone.timedelta(minutes=1)
+            )
+            WebhookLog.objects.filter(id=later[0].id).update(
+                success=False, next_retry_at=timezone.now() + timezone.timedelta(hours=1)
+            )
+
+            self.assertEqual(retry_failed_webhooks(), 2)
+            # Nothing is due any more, so a second run sends nothing
+            self.assertEqual(retry_failed_webhooks(), 0)
+
+        self.assertEqual(sorted(path for path, _headers, _body in stub.calls), ["/a", "/a"])
+        self.assertTrue(all(log.success for log in WebhookLog.objects.filter(id__in=[log.id for log in due])))
+        self.assertIsNotNone(WebhookLog.objects.get(id=later[0].id).next_retry_at)
+
+
+class DeliveryNotificationCoalescingTest(TestCase):
+    """Test rapid status changes are folded into one queued notification"""
+
+    def setUp(self):
+        cache.clear()
+
+    @patch("external_delivery.tasks.send_delivery_notifications.apply_async")
+    def test_changes_coalesce_until_the_notification_runs(self, mock_apply_async):
+        schedule_delivery_notification(42, ExternalDeliveryStatus.PICKED_UP)
+        schedule_delivery_notification(42, ExternalDeliveryStatus.IN_TRANSIT)
+        self.assertEqual(mock_apply_async.call_count, 1)
+
+        # The queued task releases the slot when it runs; the next change queues a new notification
+        cache.delete(_notification_coalesce_key(42, WebhookEventType.DELIVERY_UPDATED))
+        schedule_delivery_notification(42, ExternalDeliveryStatus.IN_TRANSIT)
+        self.assertEqual(mock_apply_async.call_count, 2)
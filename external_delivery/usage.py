@@ -0,0 +1,219 @@
+"""
+Buffered API usage metering for external businesses.
+
+Each external API request is counted into per-minute aggregates keyed by
+business, endpoint route and minute, and optionally (sampled) into the raw
+``APIUsageLog``. Both are held in process and flushed in batches: raw rows
+with ``bulk_create`` and aggregates with a single additive upsert.
+"""
+
+import atexit
+import logging
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import APIUsageLog, APIUsageMinute
+
+logger = logging.getLogger(__name__)
+
+
+def get_request_size(request):
+    try:
+        return int(request.META.get("CONTENT_LENGTH", 0) or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def get_response_size(response):
+    """Prefer the Content-Length header; fall back to rendered content, never re-serialize data."""
+    content_length = response.get("Content-Length") if hasattr(response, "get") else None
+    if content_length:
+        try:
+            return int(content_length)
+        except (ValueError, TypeError):
+            pass
+    if getattr(response, "streaming", False):
+        return 0
+    if getattr(response, "is_rendered", True) and hasattr(response, "content"):
+        return len(response.content)
+    return 0
+
+
+def get_endpoint_route(request):
+    """Use the resolved URL pattern so IDs in paths don't create separate counters."""
+    match = getattr(request, "resolver_match", None)
+    route = getattr(match, "route", None)
+    return f"/{route}"[:255] if route else request.path[:255]
+
+
+class UsageMeter:
+    """
+    Process-local buffer of API usage.
+
+    Flushes when ``batch_size`` raw rows are pending or ``flush_interval``
+    seconds have passed. Besides ``record``, the rate limit middleware checks
+    the age on every request (``flush_if_due``), so counters are not held back
+    by a worker that no longer serves external API traffic, and whatever is
+    left is written at interpreter exit. A failed flush puts everything back
+    for the next one, since the aggregates feed billing. ``sample_rate``
+    controls the share of successful requests written to the raw log; errors
+    are always logged and every request is counted in the aggregates.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, sample_rate=None):
+        self.batch_size = batch_size or getattr(settings, "EXTERNAL_API_USAGE_BATCH_SIZE", 200)
+        self.flush_interval = flush_interval or getattr(settings, "EXTERNAL_API_USAGE_FLUSH_INTERVAL", 5)
+        self.sample_rate = (
+            sample_rate if sample_rate is not None else getattr(settings, "EXTERNAL_API_USAGE_LOG_SAMPLE_RATE", 1.0)
+        )
+        self._logs = []
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, external_business, request, response, response_time):
+        request_size = get_request_size(request)
+        response_size = get_response_size(response)
+        status_code = response.status_code
+        is_error = status_code >= 400
+        now = timezone.now()
+        key = (external_business.id, get_endpoint_route(request), now.replace(second=0, microsecond=0))
+
+        log = None
+        if is_error or self.sample_rate >= 1 or random.random() < self.sample_rate:
+            client_ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0] or request.META.get("REMOTE_ADDR", "")
+            log = APIUsageLog(
+                external_business=external_business,
+                endpoint=request.path[:255],
+                method=request.method,
+                request_ip=client_ip,
+                user_agent=request.META.get("HTTP_USER_AGENT", "")[:500],
+                request_size=request_size,
+                response_status=status_code,
+                response_size=response_size,
+                response_time=round(Decimal(response_time), 3),
+            )
+
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = [0, 0, Decimal("0"), 0, 0]
+            counter[0] += 1
+            counter[1] += int(is_error)
+            counter[2] += round(Decimal(response_time), 3)
+            counter[3] += request_size
+            counter[4] += response_size
+            if log is not None:
+                self._logs.append(log)
+            due = len(self._logs) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = bool(self._logs or self._counters) and (
+                len(self._logs) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        return self.flush() if due else 0
+
+    def flush(self):
+        with self._lock:
+            logs, self._logs = self._logs, []
+            counters, self._counters = self._counters, {}
+            self._last_flush = time.monotonic()
+
+        if not logs and not counters:
+            return 0
+        try:
+            with transaction.atomic():
+                if logs:
+                    APIUsageLog.objects.bulk_create(logs, batch_size=self.batch_size)
+                if counters:
+                    self._upsert_counters(counters)
+        except Exception as e:
+            logger.error(f"Error flushing API usage ({len(logs)} logs, {len(counters)} counters), keeping them: {e}")
+            self._requeue(logs, counters)
+            return 0
+        return len(logs)
+
+    def _requeue(self, logs, counters):
+        """Put back a failed flush: its logs ahead of newer ones, its counters added to those recorded since."""
+        for log in logs:
+            # bulk_create may have assigned ids before the transaction rolled back
+            log.pk = None
+        with self._lock:
+            self._logs[:0] = logs
+            for key, values in counters.items():
+                counter = self._counters.get(key)
+                if counter is None:
+                    self._counters[key] = values
+                else:
+                    for index, value in enumerate(values):
+                        counter[index] += value
+
+    def _upsert_counters(self, counters):
+        table = APIUsageMinute._meta.db_table
+        rows = []
+        params = []
+        # Rows in conflict-key order, so concurrent flushes lock existing rows in the same order and cannot deadlock
+        for (business_id, endpoint, minute), values in sorted(counters.items(), key=lambda item: item[0]):
+            rows.append("(%s, %s, %s, %s, %s, %s, %s, %s)")
+            params.extend([business_id, endpoint, minute, *values])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} AS t
+                    (external_business_id, endpoint, minute, request_count, error_count,
+                     total_response_time, request_bytes, response_bytes)
+                VALUES {", ".join(rows)}
+                ON CONFLICT (external_business_id, endpoint, minute)
+                DO UPDATE SET
+                    request_count = t.request_count + EXCLUDED.request_count,
+                    error_count = t.error_count + EXCLUDED.error_count,
+                    total_response_time = t.total_response_time + EXCLUDED.total_response_time,
+                    request_bytes = t.request_bytes + EXCLUDED.request_bytes,
+                    response_bytes = t.response_bytes + EXCLUDED.response_bytes
+                """,
+                params,
+            )
+
+    def __len__(self):
+        return len(self._logs)
+
+
+def get_api_usage_stats(external_business, since=None):
+    """
+    API usage totals for a business from the per-minute aggregates.
+    """
+    minutes = APIUsageMinute.objects.filter(external_business=external_business)
+    if since is not None:
+        minutes = minutes.filter(minute__gte=since)
+
+    totals = minutes.aggregate(
+        requests=Sum("request_count"),
+        errors=Sum("error_count"),
+        response_time=Sum("total_response_time"),
+        request_bytes=Sum("request_bytes"),
+        response_bytes=Sum("response_bytes"),
+    )
+    requests = totals["requests"] or 0
+    return {
+        "api_requests": requests,
+        "api_errors": totals["errors"] or 0,
+        "avg_response_time": float(totals["response_time"] or 0) / requests if requests else 0.0,
+        "request_bytes": totals["request_bytes"] or 0,
+        "response_bytes": totals["response_bytes"] or 0,
+    }
+
+
+usage_meter = UsageMeter()
+atexit.register(usage_meter.flush)
@@ -1,27 +1,27 @@
-import hashlib
-import hmac
-import json
 import logging
 from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
 
-import requests
 from django.conf import settings
 from django.utils import timezone
 
-from .models import APIUsageLog, RateLimitLog, WebhookLog
+from .models import WebhookLog
+from .rate_limiter import rate_limit_log_buffer
+from .usage import get_api_usage_stats, usage_meter
+from .webhooks import RESULT_FIELDS, build_payload, webhook_dispatcher
 
 logger = logging.getLogger(__name__)
 
 
 def log_rate_limit_exceeded(external_business, request, rate_type="minute"):
     """
-    Log rate limit exceeded events for monitoring and analysis
+    Log rate limit exceeded events for monitoring and analysis.
+    Rows are buffered and written in batches so blocked bursts don't hit the database per request.
     """
     try:
         client_ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0] or request.META.get("REMOTE_ADDR", "")
 
-        RateLimitLog.objects.create(
+        rate_limit_log_buffer.add(
             external_business=external_business,
             request_ip=client_ip,
             endpoint=request.path,
@@ -48,110 +48,28 @@ def send_webhook_notification(business, event_type, data, webhook_url=None, deli
 
     url = webhook_url or business.webhook_url
 
-    # Prepare payload
-    payload = {
-        "event_type": event_type,
-        "timestamp": timezone.now().isoformat(),
-        "business_id": str(business.id),
-        "data": data,
-    }
-
-    # Create HMAC signature
-    payload_json = json.dumps(payload, sort_keys=True, default=str)
-    signature = hmac.new(business.webhook_secret.encode("utf-8"), payload_json.encode("utf-8"), hashlib.sha256).hexdigest()
-
-    headers = {
-        "Content-Type": "application/json",
-        "X-Webhook-Signature": f"sha256={signature}",
-        "X-Event-Type": event_type,
-        "User-Agent": "SupplyChain-Webhooks/1.0",
-    }
-
     webhook_log = WebhookLog.objects.create(
-        external_business=business, delivery=delivery, event_type=event_type, webhook_url=url, payload=payload
+        external_business=business,
+        delivery=delivery,
+        event_type=event_type,
+        webhook_url=url,
+        payload=build_payload(business, event_type, data),
     )
 
-    try:
-        start_time = timezone.now()
-        response = requests.post(url, json=payload, headers=headers, timeout=30, verify=True)
-        end_time = timezone.now()
-
-        response_time = (end_time - start_time).total_seconds()
-
-        webhook_log.response_status = response.status_code
-        webhook_log.response_body = response.text[:1000]  # Limit response size
-        webhook_log.response_time = response_time
-        webhook_log.success = response.status_code < 400
-
-        if not webhook_log.success:
-            webhook_log.error_message = f"HTTP {response.status_code}: {response.text[:500]}"
-
-        webhook_log.save()
-
-        return {"success": webhook_log.success, "response_status": response.status_code, "response_time": response_time}
-
-    except requests.exceptions.RequestException as e:
-        webhook_log.success = False
-        webhook_log.error_message = str(e)[:500]
-        webhook_log.retry_count += 1
-
-        # Schedule retry if needed (implement retry logic as needed)
-        if webhook_log.retry_count < 3:
-            retry_delay = 2**webhook_log.retry_count  # Exponential backoff
-            webhook_log.next_retry_at = timezone.now() + timedelta(minutes=retry_delay)
+    # Sent through the shared pooled dispatcher; failures are rescheduled with backoff
+    result = webhook_dispatcher.deliver(webhook_log)
+    webhook_log.save(update_fields=RESULT_FIELDS)
 
-        webhook_log.save()
-
-        return {"success": False, "error": str(e)}
+    return result
 
 
 def log_api_usage(external_business, request, response, response_time):
     """
-    Log API usage for monitoring and billing
+    Log API usage for monitoring and billing.
+    Usage is buffered and written in batches; see ``usage.UsageMeter``.
     """
     try:
-        # Safe way to get request size without reading body again
-        request_size = 0
-        try:
-            # Try to get the content length from headers first
-            request_size = int(request.META.get("CONTENT_LENGTH", 0) or 0)
-        except (ValueError, TypeError):
-            # If that fails, try to get from body if available and not consumed
-            try:
-                if hasattr(request, "body") and hasattr(request, "_body"):
-                    request_size = len(request._body) if request._body else 0
-                elif hasattr(request, "stream") and hasattr(request.stream, "read"):
-                    # For DRF requests, try to get from the stream
-                    request_size = getattr(request, "_content_length", 0)
-            except Exception:
-                # If we can't get the request size, default to 0
-                request_size = 0
-
-        # Get response size safely
-        response_size = 0
-        try:
-            if hasattr(response, "content"):
-                response_size = len(response.content)
-            elif hasattr(response, "data"):
-                # For DRF responses
-                response_size = len(str(response.data).encode("utf-8"))
-        except Exception:
-            response_size = 0
-
-        # Extract client IP
-        client_ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0] or request.META.get("REMOTE_ADDR", "")
-
-        APIUsageLog.objects.create(
-            external_business=external_business,
-            endpoint=request.path,
-            method=request.method,
-            request_ip=client_ip,
-            user_agent=request.META.get("HTTP_USER_AGENT", "")[:500],
-            request_size=request_size,
-            response_status=response.status_code,
-            response_size=response_size,
-            response_time=response_time,
-        )
+        usage_meter.record(external_business, request, response, response_time)
     except Exception as e:
         logger.error(f"Error logging API usage: {e}")
 
@@ -174,6 +92,7 @@ def calculate_delivery_stats(business):
             "current_month_revenue": Decimal("0.00"),
             "success_rate": 0.0,
             "average_delivery_value": Decimal("0.00"),
+            **_current_month_api_usage(business),
         }
 
     # Count deliveries by status
@@ -213,6 +132,17 @@ def calculate_delivery_stats(business):
         "current_month_revenue": current_month_revenue,
         "success_rate": round(success_rate, 2),
         "average_delivery_value": average_delivery_value,
+        **_current_month_api_usage(business),
+    }
+
+
+def _current_month_api_usage(business):
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    usage = get_api_usage_stats(business, since=month_start)
+    return {
+        "current_month_api_requests": usage["api_requests"],
+        "current_month_api_errors": usage["api_errors"],
+        "average_response_time": round(usage["avg_response_time"], 3),
     }
 
 
@@ -264,9 +264,9 @@ class InternalExternalDeliveryViewSet(viewsets.ModelViewSet):
             )
 
             # Send notifications
-            from .tasks import send_delivery_notifications
+            from .tasks import schedule_delivery_notification
 
-            send_delivery_notifications.delay(delivery.id, delivery.status)
+            schedule_delivery_notification(delivery.id, delivery.status)
 
             return Response({"message": "Status updated successfully", "data": ExternalDeliverySerializer(delivery).data})
         except Exception as e:
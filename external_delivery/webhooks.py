@@ -0,0 +1,198 @@
+"""
+Webhook delivery engine for external businesses.
+
+Webhooks are posted through pooled ``requests`` sessions (one per host) from a
+bounded thread pool. Each partner gets at most ``per_partner_limit`` requests
+in flight, so a slow endpoint only delays its own queue. Outcomes are written
+back to ``WebhookLog`` with ``bulk_update`` and failed deliveries are
+rescheduled with jittered exponential backoff.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import WebhookLog
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "SupplyChain-Webhooks/1.0"
+
+RESULT_FIELDS = [
+    "response_status",
+    "response_body",
+    "response_time",
+    "success",
+    "error_message",
+    "retry_count",
+    "next_retry_at",
+]
+
+
+def build_payload(business, event_type, data):
+    return {
+        "event_type": event_type,
+        "timestamp": timezone.now().isoformat(),
+        "business_id": str(business.id),
+        "data": data,
+    }
+
+
+def sign_body(secret, body):
+    signature = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"sha256={signature}"
+
+
+def compute_next_retry_at(attempt, now=None):
+    """
+    Exponential backoff with jitter for the given retry attempt (1-based).
+    The delay is drawn uniformly from the upper half of the exponential step.
+    """
+    base = getattr(settings, "WEBHOOK_RETRY_BASE_DELAY", 60)
+    cap = getattr(settings, "WEBHOOK_RETRY_MAX_DELAY", 3600)
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return (now or timezone.now()) + timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def is_retryable_status(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+class WebhookDispatcher:
+    """
+    Concurrent webhook sender with per-host connection pools and per-partner concurrency limits.
+    """
+
+    def __init__(self, max_workers=None, per_partner_limit=None, timeout=None, max_retries=None):
+        self.max_workers = max_workers or getattr(settings, "WEBHOOK_MAX_WORKERS", 16)
+        self.per_partner_limit = per_partner_limit or getattr(settings, "WEBHOOK_PER_PARTNER_CONCURRENCY", 4)
+        self.timeout = timeout or getattr(settings, "WEBHOOK_TIMEOUT", 30)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, "WEBHOOK_MAX_RETRIES", 3)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session_for(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = USER_AGENT
+                self._sessions[host] = session
+        return session
+
+    def deliver(self, webhook_log):
+        """
+        Post one ``WebhookLog`` payload and record the outcome on the instance (not saved).
+        """
+        business = webhook_log.external_business
+        body = json.dumps(webhook_log.payload, sort_keys=True, default=str)
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Signature": sign_body(business.webhook_secret, body),
+            "X-Event-Type": webhook_log.event_type,
+        }
+
+        start_time = time.monotonic()
+        try:
+            response = self._session_for(webhook_log.webhook_url).post(
+                webhook_log.webhook_url, data=body.encode("utf-8"), headers=headers, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            webhook_log.success = False
+            webhook_log.error_message = str(e)[:500]
+            self._schedule_retry(webhook_log)
+            return {"success": False, "error": str(e)}
+
+        response_time = round(time.monotonic() - start_time, 3)
+        webhook_log.response_status = response.status_code
+        webhook_log.response_body = response.text[:1000]  # Limit response size
+        webhook_log.response_time = response_time
+        webhook_log.success = response.status_code < 400
+        webhook_log.error_message = ""
+        webhook_log.next_retry_at = None
+
+        if not webhook_log.success:
+            webhook_log.error_message = f"HTTP {response.status_code}: {response.text[:500]}"
+            if is_retryable_status(response.status_code):
+                self._schedule_retry(webhook_log)
+
+        return {"success": webhook_log.success, "response_status": response.status_code, "response_time": response_time}
+
+    def _schedule_retry(self, webhook_log):
+        if webhook_log.retry_count < self.max_retries:
+            webhook_log.next_retry_at = compute_next_retry_at(webhook_log.retry_count + 1)
+        else:
+            webhook_log.next_retry_at = None
+
+    def dispatch(self, webhook_logs, is_retry=False):
+        """
+        Deliver many webhooks concurrently and bulk-update their logs.
+
+        Logs are queued per partner; at most ``per_partner_limit`` requests per
+        partner are in flight at any time. Returns ``{log_id: result}``.
+        """
+        if isinstance(webhook_logs, QuerySet):
+            webhook_logs = webhook_logs.select_related("external_business")
+        webhook_logs = list(webhook_logs)
+        queues = defaultdict(deque)
+        for webhook_log in webhook_logs:
+            # Resolve the business here so worker threads never touch the database
+            webhook_log.external_business
+            if is_retry:
+                webhook_log.retry_count += 1
+            queues[webhook_log.external_business_id].append(webhook_log)
+
+        results = {}
+        in_flight = defaultdict(int)
+        pending = {}
+
+        def submit_ready(executor):
+            for partner_id, queue in queues.items():
+                while queue and in_flight[partner_id] < self.per_partner_limit:
+                    webhook_log = queue.popleft()
+                    in_flight[partner_id] += 1
+                    pending[executor.submit(self._safe_deliver, webhook_log)] = webhook_log
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="webhook") as executor:
+            submit_ready(executor)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    webhook_log = pending.pop(future)
+                    in_flight[webhook_log.external_business_id] -= 1
+                    results[webhook_log.id] = future.result()
+                submit_ready(executor)
+
+        WebhookLog.objects.bulk_update(webhook_logs, RESULT_FIELDS, batch_size=500)
+        return results
+
+    def _safe_deliver(self, webhook_log):
+        try:
+            return self.deliver(webhook_log)
+        except Exception as e:
+            logger.error(f"Error delivering webhook {webhook_log.id}: {e}")
+            webhook_log.success = False
+            webhook_log.error_message = str(e)[:500]
+            self._schedule_retry(webhook_log)
+            return {"success": False, "error": str(e)}
+
+
+webhook_dispatcher = WebhookDispatcher()
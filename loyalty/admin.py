@@ -9,8 +9,11 @@ from .models import (
     LoyaltyTier,
     LoyaltyTransaction,
     LoyaltyTransactionArchive,
+    PointsLot,
     UserLoyalty,
 )
+from .services import TierEngine
+from .tasks import enqueue_tier_upgrade_notifications
 
 
 @admin.register(LoyaltyConfiguration)
@@ -197,12 +200,12 @@ class UserLoyaltyAdmin(admin.ModelAdmin):
 
     def recalculate_tiers(self, request, queryset):
         """Action to recalculate tiers for selected users."""
-        updated = 0
-        for profile in queryset:
-            if profile.update_tier():
-                updated += 1
+        engine = TierEngine()
+        # Selected profiles are recalculated whether or not they are active, as before
+        result = engine.recalculate(profile_ids=queryset.values_list("id", flat=True), active_only=False)
+        enqueue_tier_upgrade_notifications(result.upgraded, engine)
 
-        self.message_user(request, _(f"Updated {updated} user tiers"), messages.SUCCESS)
+        self.message_user(request, _(f"Updated {result.changed} user tiers"), messages.SUCCESS)
 
     recalculate_tiers.short_description = _("Recalculate tiers")
 
@@ -332,3 +335,20 @@ class LoyaltyTransactionArchiveAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(PointsLot)
+class PointsLotAdmin(admin.ModelAdmin):
+    """Admin for points lots (read-only ledger)."""
+
+    list_display = ["user_loyalty", "points", "remaining", "earned_at", "expires_at"]
+    list_filter = ["earned_at", "expires_at"]
+    search_fields = ["user_loyalty__user__username", "user_loyalty__user__email"]
+    list_select_related = ["user_loyalty__user"]
+    readonly_fields = ["user_loyalty", "earn_transaction", "points", "remaining", "earned_at", "expires_at"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
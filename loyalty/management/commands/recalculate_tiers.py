@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 
 from loyalty.models import UserLoyalty
+from loyalty.services import TierEngine
+from loyalty.tasks import enqueue_tier_upgrade_notifications
 
 
 class Command(BaseCommand):
@@ -9,13 +11,16 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write("Recalculating tiers for all users...")
 
-        profiles = UserLoyalty.objects.filter(is_active=True).select_related("tier")
+        total = UserLoyalty.objects.filter(is_active=True).count()
 
-        updated = 0
-        total = profiles.count()
+        engine = TierEngine()
+        result = engine.recalculate()
+        enqueue_tier_upgrade_notifications(result.upgraded, engine)
 
-        for profile in profiles:
-            if profile.update_tier():
-                updated += 1
-
-        self.stdout.write(self.style.SUCCESS(f"Successfully recalculated tiers. " f"Updated: {updated}/{total}"))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully recalculated tiers. "
+                f"Updated: {result.changed}/{total} "
+                f"(upgraded {len(result.upgraded)}, downgraded {len(result.downgraded)})"
+            )
+        )
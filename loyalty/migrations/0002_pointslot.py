@@ -0,0 +1,100 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Attribute each current balance to the newest positive transactions (what is
+# left after oldest-first consumption), then cover any balance not explained
+# by transactions with a non-expiring lot so open lots always sum to points.
+# An expiry of 0 days means "never", as in award_points, so it maps to NULL.
+BACKFILL_LOTS_SQL = """
+INSERT INTO loyalty_pointslot (user_loyalty_id, earn_transaction_id, points, remaining, earned_at, expires_at)
+SELECT e.user_loyalty_id,
+       e.id,
+       e.points,
+       LEAST(e.points, ul.points - (e.running - e.points)),
+       e.created_at,
+       e.created_at + INTERVAL '1 day' * (
+           SELECT NULLIF(points_expiry_days, 0) FROM loyalty_loyaltyconfiguration ORDER BY id LIMIT 1
+       )
+FROM (
+    SELECT t.id, t.user_loyalty_id, t.points, t.created_at,
+           SUM(t.points) OVER (PARTITION BY t.user_loyalty_id ORDER BY t.created_at DESC, t.id DESC) AS running
+    FROM loyalty_loyaltytransaction t
+    WHERE t.points > 0 AND t.transaction_type IN ('earn', 'bonus', 'admin_add', 'refund')
+) AS e
+JOIN loyalty_userloyalty ul ON ul.id = e.user_loyalty_id
+WHERE e.running - e.points < ul.points;
+
+INSERT INTO loyalty_pointslot (user_loyalty_id, earn_transaction_id, points, remaining, earned_at, expires_at)
+SELECT ul.id, NULL, ul.points - COALESCE(l.total, 0), ul.points - COALESCE(l.total, 0), ul.created_at, NULL
+FROM loyalty_userloyalty ul
+LEFT JOIN (
+    SELECT user_loyalty_id, SUM(remaining) AS total FROM loyalty_pointslot GROUP BY user_loyalty_id
+) AS l ON l.user_loyalty_id = ul.id
+WHERE ul.points > COALESCE(l.total, 0);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("loyalty", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PointsLot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("points", models.PositiveIntegerField(help_text="Points originally credited", verbose_name="Points")),
+                (
+                    "remaining",
+                    models.PositiveIntegerField(help_text="Points not yet redeemed or expired", verbose_name="Remaining"),
+                ),
+                ("earned_at", models.DateTimeField(verbose_name="Earned At")),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        blank=True, help_text="Null means the points never expire", null=True, verbose_name="Expires At"
+                    ),
+                ),
+                (
+                    "earn_transaction",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="point_lots",
+                        to="loyalty.loyaltytransaction",
+                        verbose_name="Earning Transaction",
+                    ),
+                ),
+                (
+                    "user_loyalty",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="point_lots",
+                        to="loyalty.userloyalty",
+                        verbose_name="User Loyalty",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Points Lot",
+                "verbose_name_plural": "Points Lots",
+                "ordering": ["earned_at", "id"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("remaining__gt", 0)), fields=["expires_at"], name="loyalty_lot_open_expiry_idx"
+                    ),
+                    models.Index(
+                        condition=models.Q(("remaining__gt", 0)),
+                        fields=["user_loyalty", "earned_at", "id"],
+                        name="loyalty_lot_open_fifo_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_LOTS_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
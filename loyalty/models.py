@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -241,6 +242,45 @@ class LoyaltyTransaction(models.Model):
         return f"{self.user_loyalty.user.username}: {self.points} ({self.transaction_type})"
 
 
+class PointsLot(models.Model):
+    """
+    Points credited by one earning transaction, consumed oldest-first.
+    The sum of open ``remaining`` balances equals ``UserLoyalty.points``.
+    """
+
+    user_loyalty = models.ForeignKey(
+        UserLoyalty, on_delete=models.CASCADE, related_name="point_lots", verbose_name=_("User Loyalty")
+    )
+    earn_transaction = models.ForeignKey(
+        LoyaltyTransaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="point_lots",
+        verbose_name=_("Earning Transaction"),
+    )
+    points = models.PositiveIntegerField(verbose_name=_("Points"), help_text=_("Points originally credited"))
+    remaining = models.PositiveIntegerField(verbose_name=_("Remaining"), help_text=_("Points not yet redeemed or expired"))
+    earned_at = models.DateTimeField(verbose_name=_("Earned At"))
+    expires_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Expires At"), help_text=_("Null means the points never expire")
+    )
+
+    class Meta:
+        ordering = ["earned_at", "id"]
+        verbose_name = _("Points Lot")
+        verbose_name_plural = _("Points Lots")
+        indexes = [
+            models.Index(fields=["expires_at"], condition=Q(remaining__gt=0), name="loyalty_lot_open_expiry_idx"),
+            models.Index(
+                fields=["user_loyalty", "earned_at", "id"], condition=Q(remaining__gt=0), name="loyalty_lot_open_fifo_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_loyalty_id}: {self.remaining}/{self.points} (expires {self.expires_at})"
+
+
 class LoyaltyTransactionArchive(models.Model):
     """
     Archived loyalty transactions for long-term storage.
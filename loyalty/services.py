@@ -1,16 +1,19 @@
 import logging
+from dataclasses import dataclass, field
 from decimal import ROUND_HALF_UP, Decimal
-from typing import Optional, Tuple, Union
+from typing import Iterable, List, Optional, Tuple, Union
 
-from django.db import transaction
-from django.db.models import F, Sum
+from django.db import connection, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.utils.functional import cached_property
 
-from .models import LoyaltyConfiguration, LoyaltyTransaction, UserLoyalty
+from .models import LoyaltyConfiguration, LoyaltyTier, LoyaltyTransaction, PointsLot, UserLoyalty
 
 logger = logging.getLogger(__name__)
 
+EXPIRY_CHUNK_SIZE = 5000
+
 
 class LoyaltyError(Exception):
     pass
@@ -97,6 +100,16 @@ class LoyaltyService:
             **kwargs,
         )
 
+        expiry_days = LoyaltyConfiguration.get_config().points_expiry_days
+        PointsLot.objects.create(
+            user_loyalty=profile,
+            earn_transaction=txn,
+            points=points,
+            remaining=points,
+            earned_at=txn.created_at,
+            expires_at=txn.created_at + timezone.timedelta(days=expiry_days) if expiry_days else None,
+        )
+
         profile.update_tier()
         return points, txn
 
@@ -123,6 +136,7 @@ class LoyaltyService:
 
         UserLoyalty.objects.filter(pk=profile.pk).update(points=F("points") - points)
         profile.refresh_from_db()
+        LoyaltyService._consume_lots(profile, points)
 
         txn = LoyaltyTransaction.objects.create(
             user_loyalty=profile,
@@ -136,46 +150,86 @@ class LoyaltyService:
         return True, "Success", txn
 
     @staticmethod
-    def expire_old_points(days_override: Optional[int] = None) -> int:
+    def _consume_lots(profile: UserLoyalty, points: int) -> None:
+        """Debit ``points`` from the profile's open lots, oldest first. The profile row must be locked."""
+        lots = []
+        for lot in (
+            PointsLot.objects.select_for_update()
+            .filter(user_loyalty=profile, remaining__gt=0)
+            .order_by("earned_at", "id")
+            .only("id", "remaining")
+        ):
+            if points <= 0:
+                break
+            taken = min(lot.remaining, points)
+            lot.remaining -= taken
+            points -= taken
+            lots.append(lot)
+        PointsLot.objects.bulk_update(lots, ["remaining"])
+
+    @staticmethod
+    def expire_old_points(days_override: Optional[int] = None, chunk_size: int = EXPIRY_CHUNK_SIZE) -> int:
         """
-        High-performance bulk expiry.
-        Uses a 'Sweep and Aggregate' approach to avoid N+1 queries.
+        Expire open points lots in chunked set-based statements.
+
+        Each chunk zeroes up to ``chunk_size`` lots past ``expires_at`` (an
+        index range scan), debits the affected profiles and writes one
+        "expire" transaction per profile, all in one statement. Lots and
+        profiles locked by a concurrent redemption are skipped until the next
+        run. ``days_override`` expires lots by age instead of ``expires_at``.
+        Returns the number of profiles affected.
+        """
+        now = timezone.now()
+        if days_override:
+            expiry_condition, cutoff = "l.earned_at <= %s", now - timezone.timedelta(days=days_override)
+        else:
+            expiry_condition, cutoff = "l.expires_at <= %s", now
+
+        lots = PointsLot._meta.db_table
+        profiles = UserLoyalty._meta.db_table
+        transactions = LoyaltyTransaction._meta.db_table
+        sql = f"""
+            WITH expired AS (
+                SELECT l.id, l.user_loyalty_id, l.remaining
+                FROM {lots} AS l
+                JOIN {profiles} AS ul ON ul.id = l.user_loyalty_id
+                WHERE l.remaining > 0 AND {expiry_condition}
+                ORDER BY l.expires_at, l.id
+                LIMIT %s
+                FOR UPDATE OF l, ul SKIP LOCKED
+            ),
+            zeroed AS (
+                UPDATE {lots} AS l SET remaining = 0
+                FROM expired AS e
+                WHERE l.id = e.id
+                RETURNING e.user_loyalty_id, e.remaining
+            ),
+            per_profile AS (
+                SELECT user_loyalty_id, SUM(remaining) AS expired_points FROM zeroed GROUP BY user_loyalty_id
+            ),
+            debited AS (
+                UPDATE {profiles} AS ul
+                SET points = GREATEST(ul.points - p.expired_points, 0), updated_at = %s
+                FROM per_profile AS p
+                WHERE ul.id = p.user_loyalty_id
+                RETURNING ul.id, ul.points, p.expired_points
+            )
+            INSERT INTO {transactions}
+                (user_loyalty_id, points, transaction_type, description, created_at, metadata, balance_after)
+            SELECT id, -expired_points, 'expire', 'Points expired', %s, '{{}}'::jsonb, points
+            FROM debited
+            RETURNING user_loyalty_id
         """
-        config = LoyaltyConfiguration.get_config()
-        days = days_override or config.points_expiry_days
-        if not days:
-            return 0
-
-        cutoff = timezone.now() - timezone.timedelta(days=days)
-
-        expired_refs = LoyaltyTransaction.objects.filter(transaction_type="expire").values_list("reference_id", flat=True)
-
-        to_expire = (
-            LoyaltyTransaction.objects.filter(transaction_type="earn", created_at__lt=cutoff)
-            .exclude(reference_id__in=expired_refs)
-            .values("user_loyalty")
-            .annotate(total_to_expire=Sum("points"))
-        )
 
-        processed_count = 0
-        for entry in to_expire:
-            with transaction.atomic():
-                profile = UserLoyalty.objects.select_for_update().get(pk=entry["user_loyalty"])
-                points_deducted = min(profile.points, entry["total_to_expire"])
-
-                if points_deducted > 0:
-                    UserLoyalty.objects.filter(pk=profile.pk).update(points=F("points") - points_deducted)
-                    profile.refresh_from_db()
-
-                    LoyaltyTransaction.objects.create(
-                        user_loyalty=profile,
-                        points=-points_deducted,
-                        transaction_type="expire",
-                        description="Bulk expiry",
-                        balance_after=profile.points,
-                    )
-                    processed_count += 1
-        return processed_count
+        affected = set()
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [cutoff, chunk_size, now, now])
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            affected.update(row[0] for row in rows)
+        return len(affected)
 
     @staticmethod
     def get_user_perks(user):
@@ -219,3 +273,103 @@ class LoyaltyService:
             "transaction_count": profile.transactions.count(),
             "member_since": profile.created_at,
         }
+
+
+@dataclass(frozen=True)
+class TierChange:
+    profile_id: int
+    user_id: int
+    old_tier_id: Optional[int]
+    new_tier_id: Optional[int]
+
+
+@dataclass
+class TierRecalculation:
+    upgraded: List[TierChange] = field(default_factory=list)
+    downgraded: List[TierChange] = field(default_factory=list)
+
+    @property
+    def changed(self) -> int:
+        return len(self.upgraded) + len(self.downgraded)
+
+
+class TierEngine:
+    """
+    Set-based tier assignment.
+
+    Active tier thresholds are loaded once and turned into a single
+    ``CASE`` expression on ``lifetime_points``; one ``UPDATE ... RETURNING``
+    then moves every profile whose tier differs and reports the old and new
+    tier of each moved row, so no profile is loaded into Python.
+    """
+
+    def __init__(self, tiers: Optional[Iterable[LoyaltyTier]] = None):
+        if tiers is None:
+            tiers = LoyaltyTier.objects.all()
+        self.tiers = {tier.id: tier for tier in tiers}
+        # Highest threshold first: the first matching WHEN wins
+        self.thresholds = sorted(
+            ((tier.min_points, tier.id) for tier in self.tiers.values() if tier.is_active),
+            reverse=True,
+        )
+
+    def tier_for(self, lifetime_points: int) -> Optional[LoyaltyTier]:
+        for min_points, tier_id in self.thresholds:
+            if lifetime_points >= min_points:
+                return self.tiers[tier_id]
+        return None
+
+    def _tier_case(self) -> Tuple[str, list]:
+        if not self.thresholds:
+            return "NULL::bigint", []
+        whens = " ".join("WHEN lifetime_points >= %s THEN %s" for _ in self.thresholds)
+        params = [value for threshold in self.thresholds for value in threshold]
+        return f"CASE {whens} ELSE NULL END", params
+
+    def is_upgrade(self, change: TierChange) -> bool:
+        old_tier = self.tiers.get(change.old_tier_id)
+        new_tier = self.tiers.get(change.new_tier_id)
+        if old_tier and new_tier:
+            return new_tier.min_points > old_tier.min_points
+        return new_tier is not None
+
+    def recalculate(self, profile_ids: Optional[Iterable[int]] = None, active_only: bool = True) -> TierRecalculation:
+        """
+        Reassign tiers of all active profiles (or only ``profile_ids``) in one
+        statement. ``active_only=False`` also moves inactive profiles, as
+        ``UserLoyalty.update_tier`` does.
+        """
+        table = UserLoyalty._meta.db_table
+        case_sql, params = self._tier_case()
+        conditions = ["is_active"] if active_only else []
+        if profile_ids is not None:
+            profile_ids = list(profile_ids)
+            if not profile_ids:
+                return TierRecalculation()
+            conditions.append("id = ANY(%s)")
+            params.append(profile_ids)
+        scope_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        now = timezone.now()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS ul
+                SET tier_id = target.new_tier_id, tier_updated_at = %s, updated_at = %s
+                FROM (
+                    SELECT id, tier_id AS old_tier_id, {case_sql} AS new_tier_id
+                    FROM {table}
+                    {scope_sql}
+                ) AS target
+                WHERE ul.id = target.id AND target.new_tier_id IS DISTINCT FROM target.old_tier_id
+                RETURNING ul.id, ul.user_id, target.old_tier_id, ul.tier_id
+                """,
+                [now, now, *params],
+            )
+            rows = cursor.fetchall()
+
+        result = TierRecalculation()
+        for row in rows:
+            change = TierChange(*row)
+            (result.upgraded if self.is_upgrade(change) else result.downgraded).append(change)
+        return result
@@ -3,7 +3,7 @@ from decimal import Decimal
 
 from celery import shared_task
 from django.contrib.auth.models import User
-from django.db.models import Count, Sum
+from django.db.models import Count, Min, Sum
 from django.utils import timezone
 
 from market.models import MarketplaceSale
@@ -15,9 +15,10 @@ from .models import (
     LoyaltyTier,
     LoyaltyTransaction,
     LoyaltyTransactionArchive,
+    PointsLot,
     UserLoyalty,
 )
-from .services import LoyaltyService
+from .services import LoyaltyService, TierEngine
 
 logger = logging.getLogger(__name__)
 
@@ -37,57 +38,32 @@ def expire_old_points(self, days_threshold=None):
         raise self.retry(exc=exc, countdown=300)
 
 
+TIER_NOTIFICATION_BATCH_SIZE = 500
+
+
 @shared_task(bind=True, max_retries=3)
 def recalculate_all_tiers(self):
     try:
         logger.info("Starting tier recalculation...")
 
-        profiles = UserLoyalty.objects.filter(is_active=True).select_related("user", "tier")
-
-        upgraded = 0
-        downgraded = 0
-        unchanged = 0
-        errors = []
-
-        for profile in profiles:
-            try:
-                old_tier = profile.tier
-                tier_changed = profile.update_tier()
-
-                if tier_changed:
-                    profile.refresh_from_db()
-                    if old_tier and profile.tier:
-                        if profile.tier.min_points > old_tier.min_points:
-                            upgraded += 1
-                            logger.info(f"User {profile.user.username} upgraded: " f"{old_tier.name} → {profile.tier.name}")
-                        else:
-                            downgraded += 1
-                            logger.info(
-                                f"User {profile.user.username} downgraded: " f"{old_tier.name} → {profile.tier.name}"
-                            )
-                    elif profile.tier:
-                        upgraded += 1
-                    else:
-                        downgraded += 1
-                else:
-                    unchanged += 1
-            except Exception as e:
-                logger.error(f"Error updating tier for user {profile.user.username}: {e}")
-                errors.append({"user_id": profile.user.id, "username": profile.user.username, "error": str(e)})
+        total_processed = UserLoyalty.objects.filter(is_active=True).count()
+        engine = TierEngine()
+        result = engine.recalculate()
+        enqueue_tier_upgrade_notifications(result.upgraded, engine)
 
         logger.info(
             f"Tier recalculation completed. "
-            f"Upgraded: {upgraded}, Downgraded: {downgraded}, Unchanged: {unchanged}, "
-            f"Errors: {len(errors)}"
+            f"Upgraded: {len(result.upgraded)}, Downgraded: {len(result.downgraded)}, "
+            f"Unchanged: {total_processed - result.changed}"
         )
 
         return {
             "status": "success",
-            "upgraded": upgraded,
-            "downgraded": downgraded,
-            "unchanged": unchanged,
-            "total_processed": profiles.count(),
-            "errors": errors,
+            "upgraded": len(result.upgraded),
+            "downgraded": len(result.downgraded),
+            "unchanged": total_processed - result.changed,
+            "total_processed": total_processed,
+            "errors": [],
             "completed_at": timezone.now().isoformat(),
         }
     except Exception as exc:
@@ -95,6 +71,21 @@ def recalculate_all_tiers(self):
         raise self.retry(exc=exc, countdown=300)
 
 
+def enqueue_tier_upgrade_notifications(upgrades, engine):
+    """Queue upgrade notifications for ``TierChange`` rows in batches of ``TIER_NOTIFICATION_BATCH_SIZE``."""
+    payload = [
+        [
+            change.user_id,
+            engine.tiers[change.new_tier_id].name,
+            engine.tiers[change.old_tier_id].name if change.old_tier_id in engine.tiers else None,
+        ]
+        for change in upgrades
+    ]
+    for start in range(0, len(payload), TIER_NOTIFICATION_BATCH_SIZE):
+        send_tier_upgrade_notifications.delay(payload[start : start + TIER_NOTIFICATION_BATCH_SIZE])
+    return len(payload)
+
+
 @shared_task
 def generate_loyalty_report(start_date=None, end_date=None):
     try:
@@ -291,8 +282,54 @@ def send_tier_upgrade_notification(user_id, new_tier_name, old_tier_name=None):
         return {"status": "error", "message": str(exc)}
 
 
+@shared_task
+def send_tier_upgrade_notifications(upgrades):
+    """
+    Bulk variant of ``send_tier_upgrade_notification`` for ``[user_id, new_tier_name, old_tier_name]`` rows.
+    """
+    try:
+        emails = dict(User.objects.filter(id__in=[row[0] for row in upgrades]).values_list("id", "email"))
+
+        notifications = []
+        for user_id, new_tier_name, _old_tier_name in upgrades:
+            if user_id not in emails:
+                continue
+            notifications.append(
+                Notification(
+                    user_id=user_id,
+                    notification_type="in_app",
+                    title=f"Welcome to {new_tier_name}!",
+                    body=f"Congratulations! You have been upgraded to the {new_tier_name} tier. Enjoy your new perks!",
+                    action_url="/loyalty/status/",
+                )
+            )
+            if emails[user_id]:
+                notifications.append(
+                    Notification(
+                        user_id=user_id,
+                        notification_type="email",
+                        title=f"Congratulations! You are now {new_tier_name}",
+                        body=f"You have been upgraded to {new_tier_name} tier! Check out your new perks in the app.",
+                    )
+                )
+
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        for notification in notifications:
+            send_notification_task.delay(str(notification.id))
+
+        logger.info(f"Queued {len(notifications)} tier upgrade notifications")
+        return {"status": "success", "notifications": len(notifications)}
+    except Exception as exc:
+        logger.error(f"Error sending tier notifications: {exc}", exc_info=True)
+        return {"status": "error", "message": str(exc)}
+
+
 @shared_task
 def send_points_expiry_warning(days_before=7):
+    """
+    Warn users whose open points lots expire on the day ``days_before`` days from now.
+    Served by the partial index on open lots' ``expires_at``.
+    """
     try:
         config = LoyaltyConfiguration.get_config()
 
@@ -300,58 +337,58 @@ def send_points_expiry_warning(days_before=7):
             logger.info("Points expiry is disabled, skipping warning task")
             return {"status": "skipped", "message": "Points expiry is disabled"}
 
-        expiry_date = timezone.now() - timezone.timedelta(days=config.points_expiry_days)
-        warning_date = expiry_date + timezone.timedelta(days=days_before)
+        warning_date = (timezone.now() + timezone.timedelta(days=days_before)).date()
+        day_start = timezone.make_aware(timezone.datetime.combine(warning_date, timezone.datetime.min.time()))
+        day_end = day_start + timezone.timedelta(days=1)
 
-        logger.info(f"Checking for points expiring around {warning_date.date()}")
+        logger.info(f"Checking for points expiring on {warning_date}")
 
-        expiring_transactions = LoyaltyTransaction.objects.filter(
-            transaction_type="earn", created_at__date=warning_date.date()
-        ).select_related("user_loyalty__user")
+        expiring = (
+            PointsLot.objects.filter(remaining__gt=0, expires_at__gte=day_start, expires_at__lt=day_end)
+            .values("user_loyalty__user_id", "user_loyalty__user__username", "user_loyalty__user__email")
+            .annotate(points=Sum("remaining"), expires_at=Min("expires_at"))
+            .order_by("user_loyalty__user_id")
+        )
 
-        users_notified = 0
+        notifications = []
         notification_data = []
-
-        for trans in expiring_transactions:
-            expired_ref = f"expire_{trans.id}"
-            if not LoyaltyTransaction.objects.filter(reference_id=expired_ref).exists():
-                user = trans.user_loyalty.user
-                points = trans.points
-                expiry_date_str = (trans.created_at + timezone.timedelta(days=config.points_expiry_days)).strftime(
-                    "%Y-%m-%d"
-                )
-
-                logger.info(f"Warning: {points} points will expire on {expiry_date_str} " f"for user {user.username}")
-
-                notification_data.append(
-                    {"user_id": user.id, "username": user.username, "points": points, "expiry_date": expiry_date_str}
-                )
-
-                notif = Notification.objects.create(
-                    user=user,
+        for entry in expiring:
+            user_id = entry["user_loyalty__user_id"]
+            username = entry["user_loyalty__user__username"]
+            points = entry["points"]
+            expiry_date_str = entry["expires_at"].strftime("%Y-%m-%d")
+
+            notification_data.append(
+                {"user_id": user_id, "username": username, "points": points, "expiry_date": expiry_date_str}
+            )
+            notifications.append(
+                Notification(
+                    user_id=user_id,
                     notification_type="in_app",
                     title=f"{points} Points Expiring Soon!",
                     body=f"Your {points} points will expire on {expiry_date_str}. Use them before they expire!",
                     action_url="/loyalty/transactions/",
                 )
-                send_notification_task.delay(str(notif.id))
-
-                if user.email:
-                    email_notif = Notification.objects.create(
-                        user=user,
+            )
+            if entry["user_loyalty__user__email"]:
+                notifications.append(
+                    Notification(
+                        user_id=user_id,
                         notification_type="email",
                         title=f"{points} Points Expiring Soon!",
-                        body=f"Hi {user.username}, your {points} points will expire on {expiry_date_str}. Don't let them go to waste!",
+                        body=f"Hi {username}, your {points} points will expire on {expiry_date_str}. Don't let them go to waste!",
                     )
-                    send_notification_task.delay(str(email_notif.id))
+                )
 
-                users_notified += 1
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        for notification in notifications:
+            send_notification_task.delay(str(notification.id))
 
-        logger.info(f"Sent expiry warnings to {users_notified} users")
+        logger.info(f"Sent expiry warnings to {len(notification_data)} users")
 
         return {
             "status": "success",
-            "users_notified": users_notified,
+            "users_notified": len(notification_data),
             "days_before_expiry": days_before,
             "notifications": notification_data,
             "completed_at": timezone.now().isoformat(),
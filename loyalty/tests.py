@@ -0,0 +1,209 @@
+import importlib
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import LoyaltyConfiguration, LoyaltyTier, LoyaltyTransaction, PointsLot, UserLoyalty
+from .services import LoyaltyService, TierEngine
+
+backfill_migration = importlib.import_module("loyalty.migrations.0002_pointslot")
+
+
+class LoyaltyTestMixin:
+    """One point per currency unit, no redemption minimum and a fresh ledger (without the signup bonus)."""
+
+    def configure(self, **fields):
+        config = LoyaltyConfiguration.get_config()
+        fields = {"points_per_unit": 1, "unit_amount": Decimal("1.00"), "min_redemption_points": 1, **fields}
+        for name, value in fields.items():
+            setattr(config, name, value)
+        config.save()
+
+    def create_member(self, username):
+        user = User.objects.create_user(username=username, password="testpass123")
+        profile, _created = UserLoyalty.objects.get_or_create(user=user)
+        PointsLot.objects.filter(user_loyalty=profile).delete()
+        LoyaltyTransaction.objects.filter(user_loyalty=profile).delete()
+        UserLoyalty.objects.filter(pk=profile.pk).update(points=0, lifetime_points=0, tier=None)
+        return user, profile
+
+
+class PointsLotLedgerTest(LoyaltyTestMixin, TestCase):
+    def setUp(self):
+        self.configure(points_expiry_days=30)
+        self.user, self.profile = self.create_member("lots")
+
+    def test_award_opens_a_lot_expiring_after_the_configured_days(self):
+        points, txn = LoyaltyService.award_points(self.user, 150, "Order")
+
+        lot = PointsLot.objects.get(user_loyalty=self.profile)
+        self.assertEqual((lot.points, lot.remaining), (150, 150))
+        self.assertEqual(lot.earn_transaction, txn)
+        self.assertEqual(lot.expires_at, txn.created_at + timezone.timedelta(days=30))
+
+    def test_award_without_expiry_opens_a_non_expiring_lot(self):
+        for days in (None, 0):
+            self.configure(points_expiry_days=days)
+            LoyaltyService.award_points(self.user, 10, f"Order {days}")
+        self.assertFalse(PointsLot.objects.filter(user_loyalty=self.profile, expires_at__isnull=False).exists())
+
+    def test_redemption_consumes_lots_oldest_first(self):
+        LoyaltyService.award_points(self.user, 100, "First")
+        LoyaltyService.award_points(self.user, 50, "Second")
+
+        success, _message, _txn = LoyaltyService.redeem_points(self.user, 120, "Reward")
+
+        self.assertTrue(success)
+        remaining = PointsLot.objects.filter(user_loyalty=self.profile).values_list("remaining", flat=True)
+        self.assertEqual(list(remaining), [0, 30])
+        self.assertEqual(UserLoyalty.objects.get(pk=self.profile.pk).points, 30)
+
+
+class ExpireOldPointsTest(LoyaltyTestMixin, TestCase):
+    def setUp(self):
+        self.configure(points_expiry_days=30)
+        self.user, self.profile = self.create_member("expiry")
+
+    def backdate(self, lot, days):
+        PointsLot.objects.filter(pk=lot.pk).update(expires_at=timezone.now() - timezone.timedelta(days=days))
+
+    def test_only_the_remaining_points_of_due_lots_expire(self):
+        LoyaltyService.award_points(self.user, 100, "Old")
+        LoyaltyService.award_points(self.user, 40, "Recent")
+        old_lot, recent_lot = PointsLot.objects.filter(user_loyalty=self.profile)
+        self.backdate(old_lot, 1)
+        LoyaltyService.redeem_points(self.user, 30, "Reward")
+
+        self.assertEqual(LoyaltyService.expire_old_points(), 1)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.points, 40)
+        self.assertEqual(PointsLot.objects.get(pk=old_lot.pk).remaining, 0)
+        self.assertEqual(PointsLot.objects.get(pk=recent_lot.pk).remaining, 40)
+
+        expire = LoyaltyTransaction.objects.get(user_loyalty=self.profile, transaction_type="expire")
+        self.assertEqual((expire.points, expire.balance_after), (-70, 40))
+
+        # Expired lots are closed, so a second run finds nothing
+        self.assertEqual(LoyaltyService.expire_old_points(), 0)
+        self.assertEqual(LoyaltyTransaction.objects.filter(transaction_type="expire").count(), 1)
+
+    def test_chunks_cover_every_due_profile_with_one_transaction_each(self):
+        other_user, other_profile = self.create_member("expiry-other")
+        for user in (self.user, self.user, other_user):
+            LoyaltyService.award_points(user, 20, "Order")
+        for lot in PointsLot.objects.filter(user_loyalty__in=[self.profile, other_profile]):
+            self.backdate(lot, 2)
+
+        self.assertEqual(LoyaltyService.expire_old_points(chunk_size=1), 2)
+
+        self.assertEqual(UserLoyalty.objects.get(pk=self.profile.pk).points, 0)
+        self.assertEqual(UserLoyalty.objects.get(pk=other_profile.pk).points, 0)
+        self.assertEqual(
+            sorted(LoyaltyTransaction.objects.filter(transaction_type="expire").values_list("points", flat=True)),
+            [-20, -20, -20],
+        )
+
+    def test_days_override_expires_by_age(self):
+        LoyaltyService.award_points(self.user, 25, "Order")
+        PointsLot.objects.filter(user_loyalty=self.profile).update(earned_at=timezone.now() - timezone.timedelta(days=10))
+
+        self.assertEqual(LoyaltyService.expire_old_points(days_override=30), 0)
+        self.assertEqual(LoyaltyService.expire_old_points(days_override=7), 1)
+        self.assertEqual(UserLoyalty.objects.get(pk=self.profile.pk).points, 0)
+
+
+class PointsLotBackfillTest(LoyaltyTestMixin, TestCase):
+    def setUp(self):
+        self.user, self.profile = self.create_member("backfill")
+
+    def backfill(self):
+        PointsLot.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(backfill_migration.BACKFILL_LOTS_SQL)
+        return list(PointsLot.objects.filter(user_loyalty=self.profile).order_by("earned_at", "id"))
+
+    def test_balance_is_attributed_to_the_newest_earnings(self):
+        self.configure(points_expiry_days=30)
+        LoyaltyService.award_points(self.user, 100, "First")
+        LoyaltyService.award_points(self.user, 50, "Second")
+        LoyaltyService.redeem_points(self.user, 120, "Reward")
+
+        lots = self.backfill()
+
+        self.assertEqual([(lot.points, lot.remaining) for lot in lots], [(50, 30)])
+        self.assertEqual(lots[0].expires_at, lots[0].earned_at + timezone.timedelta(days=30))
+
+    def test_zero_expiry_days_backfills_non_expiring_lots(self):
+        self.configure(points_expiry_days=0)
+        LoyaltyService.award_points(self.user, 100, "Order")
+
+        lots = self.backfill()
+
+        self.assertEqual([(lot.remaining, lot.expires_at) for lot in lots], [(100, None)])
+
+
+class TierEngineTest(LoyaltyTestMixin, TestCase):
+    def setUp(self):
+        self.silver = LoyaltyTier.objects.create(name="Silver", min_points=1000, point_multiplier=Decimal("1.10"))
+        self.gold = LoyaltyTier.objects.create(name="Gold", min_points=5000, point_multiplier=Decimal("1.25"))
+        self.retired = LoyaltyTier.objects.create(
+            name="Platinum", min_points=10000, point_multiplier=Decimal("1.50"), is_active=False
+        )
+
+    def member(self, username, lifetime_points, tier=None, is_active=True):
+        _user, profile = self.create_member(username)
+        UserLoyalty.objects.filter(pk=profile.pk).update(lifetime_points=lifetime_points, tier=tier, is_active=is_active)
+        return profile
+
+    def tier_of(self, profile):
+        return UserLoyalty.objects.get(pk=profile.pk).tier
+
+    def test_promotes_and_demotes_by_lifetime_points(self):
+        promoted = self.member("promoted", 6000, tier=self.silver)
+        first_tier = self.member("first-tier", 1500)
+        demoted = self.member("demoted", 2000, tier=self.gold)
+        dropped = self.member("dropped", 100, tier=self.silver)
+        unchanged = self.member("unchanged", 1200, tier=self.silver)
+        on_retired_tier = self.member("retired", 12000, tier=self.retired)
+
+        result = TierEngine().recalculate()
+
+        self.assertEqual({change.profile_id for change in result.upgraded}, {promoted.pk, first_tier.pk})
+        self.assertEqual({change.profile_id for change in result.downgraded}, {demoted.pk, dropped.pk, on_retired_tier.pk})
+        self.assertEqual(self.tier_of(promoted), self.gold)
+        self.assertEqual(self.tier_of(first_tier), self.silver)
+        self.assertEqual(self.tier_of(demoted), self.silver)
+        self.assertIsNone(self.tier_of(dropped))
+        self.assertEqual(self.tier_of(unchanged), self.silver)
+        # Inactive tiers are never assigned
+        self.assertEqual(self.tier_of(on_retired_tier), self.gold)
+        self.assertEqual(TierEngine().recalculate().changed, 0)
+
+    def test_matches_update_tier(self):
+        profiles = [self.member(f"member-{points}", points) for points in (0, 999, 1000, 4999, 5000, 20000)]
+        TierEngine().recalculate()
+        for profile in profiles:
+            expected = UserLoyalty.objects.get(pk=profile.pk)
+            UserLoyalty.objects.filter(pk=profile.pk).update(tier=None)
+            recomputed = UserLoyalty.objects.get(pk=profile.pk)
+            recomputed.update_tier()
+            self.assertEqual(recomputed.tier, expected.tier)
+
+    def test_scope_and_inactive_profiles(self):
+        selected = self.member("selected", 6000)
+        other = self.member("other", 6000)
+        inactive = self.member("inactive", 6000, is_active=False)
+
+        result = TierEngine().recalculate(profile_ids=[selected.pk, inactive.pk])
+        self.assertEqual([change.profile_id for change in result.upgraded], [selected.pk])
+        self.assertIsNone(self.tier_of(other))
+        self.assertIsNone(self.tier_of(inactive))
+
+        # The admin action recalculates the selected profiles whether or not they are active
+        result = TierEngine().recalculate(profile_ids=[inactive.pk], active_only=False)
+        self.assertEqual([change.profile_id for change in result.upgraded], [inactive.pk])
+        self.assertEqual(self.tier_of(inactive), self.gold)
@@ -1,20 +1,50 @@
 from threading import local
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
 _thread_locals = local()
 
+SHOP_CACHE_PREFIX = "main:shop_id"
+NO_SHOP = ""  # cached for users without a profile or shop, so they do not miss every time
+
 
 def get_current_shop():
     return getattr(_thread_locals, "shop_id", None)
 
 
+def shop_cache_key(user_id):
+    return f"{SHOP_CACHE_PREFIX}:{user_id}"
+
+
+def resolve_shop_id(user_id):
+    """
+    Shop id of the user's profile, cached per user. The entry is dropped
+    whenever the profile is saved or deleted (see ``user.receivers``).
+    """
+    key = shop_cache_key(user_id)
+    shop_id = cache.get(key)
+    if shop_id is None:
+        from user.models import UserProfile
+
+        shop_id = UserProfile.objects.filter(user_id=user_id).values_list("shop_id", flat=True).first() or NO_SHOP
+        cache.set(key, shop_id, getattr(settings, "SHOP_ID_CACHE_TTL", 3600))
+    return shop_id or None
+
+
+def invalidate_shop_id(user_id):
+    cache.delete(shop_cache_key(user_id))
+
+
 class ShopSpecificQuerySet(models.QuerySet):
     def _filter_by_shop(self):
         shop_id = get_current_shop()
-        print(f"Current shop_id in queryset: {shop_id}")
         if shop_id:
-            return self.filter(user__userprofile__shop_id=shop_id)
+            # Tenant models carry a denormalized, indexed shop_id; avoid the user -> profile join where possible
+            if any(field.name == "shop_id" for field in self.model._meta.concrete_fields):
+                return self.filter(shop_id=shop_id)
+            return self.filter(user__user_profile__shop_id=shop_id)
         return self.none()
 
     def all(self):
@@ -1,17 +1,17 @@
 import json
 import logging
-import time
+import re
 from collections import defaultdict
 from datetime import datetime, timedelta
 
 from django.conf import settings
-from django.core.cache import cache
 from django.http import JsonResponse
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
-from main.manager import set_current_shop
-from user.models import LoginAttempt, UserProfile
+from main.manager import resolve_shop_id, set_current_shop
+from main.rate_limiter import rate_limiter
+from user.models import LoginAttempt
 
 logger = logging.getLogger(__name__)
 
@@ -23,13 +23,9 @@ class ShopIDMiddleware:
     def __call__(self, request):
         if request.user and request.user.is_authenticated:
             try:
-                user_profile = UserProfile.objects.filter(user=request.user).first()
-                if user_profile:
-                    set_current_shop(user_profile.shop_id)
-                    logger.debug(f"Shop ID set to: {user_profile.shop_id}")
-                else:
-                    set_current_shop(None)
-                    logger.debug("User profile not found, setting shop to None.")
+                shop_id = resolve_shop_id(request.user.id)
+                set_current_shop(shop_id)
+                logger.debug(f"Shop ID set to: {shop_id}")
             except Exception as e:
                 set_current_shop(None)
                 logger.warning(f"Exception in middleware: {e}")
@@ -59,6 +55,17 @@ Implements sliding window algorithm for better rate limiting accuracy.
 """
 
 
+# Path segments that identify an object rather than a route (numeric ids, UUIDs, long hex tokens)
+ID_SEGMENT_RE = re.compile(
+    r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{16,})$"
+)
+
+
+def route_template(path):
+    """``/api/v1/products/42/`` -> ``/api/v1/products/{id}/``, so every object of a route shares one bucket."""
+    return "/".join("{id}" if ID_SEGMENT_RE.match(segment) else segment for segment in path.split("/"))
+
+
 class RateLimitMiddleware(MiddlewareMixin):
     """
     Middleware to implement sliding window rate limiting for login protection.
@@ -67,7 +74,10 @@ class RateLimitMiddleware(MiddlewareMixin):
     - Sliding window rate limiting by IP address
     - Configurable limits for different endpoints
     - Special protection for login endpoints
-    - Cache-based sliding window implementation
+    - Atomic check-and-record in one Redis call (see ``main.rate_limiter``)
+
+    Each configured route is one bucket per IP; other requests are bucketed
+    by their route template, with ids collapsed to ``{id}``.
     """
 
     # Rate limit configurations
@@ -76,8 +86,9 @@ class RateLimitMiddleware(MiddlewareMixin):
         "default": {"requests": 100, "window": 60},  # 100 requests per minute for other endpoints
     }
 
-    def __init__(self, get_response):
+    def __init__(self, get_response, limiter=None):
         self.get_response = get_response
+        self.limiter = limiter or rate_limiter
         super().__init__(get_response)
 
     def process_request(self, request):
@@ -106,17 +117,20 @@ class RateLimitMiddleware(MiddlewareMixin):
                 )
 
         # Apply sliding window rate limiting
-        if self.is_rate_limited(ip_address, path):
-            rate_limit_info = self.get_rate_limit_for_path(path)
-            return JsonResponse(
+        decision = self.check_rate_limit(ip_address, path)
+        request._rate_limit_decision = decision
+        if not decision.allowed:
+            response = JsonResponse(
                 {
                     "error": "Rate limit exceeded. Too many requests.",
-                    "retry_after": rate_limit_info["window"],
-                    "limit": rate_limit_info["requests"],
-                    "window": rate_limit_info["window"],
+                    "retry_after": decision.retry_after,
+                    "limit": decision.limit,
+                    "window": decision.window,
                 },
                 status=429,
             )
+            response["Retry-After"] = str(decision.retry_after)
+            return response
 
         return None
 
@@ -134,74 +148,38 @@ class RateLimitMiddleware(MiddlewareMixin):
 
     def get_rate_limit_for_path(self, path):
         """
-        Get rate limit configuration for a specific path.
+        Get ``(bucket, config)`` for a specific path.
         """
         for route, config in self.DEFAULT_RATE_LIMITS.items():
             if route != "default" and route in path:
-                return config
-        return self.DEFAULT_RATE_LIMITS["default"]
+                return route, config
+        return route_template(path), self.DEFAULT_RATE_LIMITS["default"]
+
+    def check_rate_limit(self, ip_address, path):
+        """
+        Count the request against its bucket and return the ``RateLimitDecision``.
+        """
+        bucket, config = self.get_rate_limit_for_path(path)
+        return self.limiter.hit(ip_address, bucket, config["requests"], config["window"])
 
     def is_rate_limited(self, ip_address, path):
         """
         Check if the IP address is rate limited using sliding window algorithm.
         """
-        rate_limit_config = self.get_rate_limit_for_path(path)
-        max_requests = rate_limit_config["requests"]
-        window_seconds = rate_limit_config["window"]
-
-        # Create cache key for this IP and path
-        cache_key = f"rate_limit:{ip_address}:{path}"
-
-        # Get current time
-        now = time.time()
-
-        # Get existing requests from cache
-        requests = cache.get(cache_key, [])
-
-        # Remove requests outside the current window (sliding window)
-        cutoff_time = now - window_seconds
-        requests = [req_time for req_time in requests if req_time > cutoff_time]
-
-        # Check if we've exceeded the limit
-        if len(requests) >= max_requests:
-            return True
-
-        # Add current request timestamp
-        requests.append(now)
-
-        # Update cache with TTL equal to window size
-        cache.set(cache_key, requests, timeout=window_seconds)
-
-        return False
+        return not self.check_rate_limit(ip_address, path).allowed
 
     def process_response(self, request, response):
         """
         Add rate limit headers to response.
         """
-        ip_address = self.get_client_ip(request)
-        path = request.path
-        rate_limit_config = self.get_rate_limit_for_path(path)
-
-        # Add rate limit headers
-        response["X-RateLimit-Limit"] = str(rate_limit_config["requests"])
-        response["X-RateLimit-Window"] = str(rate_limit_config["window"])
-
-        # Calculate remaining requests
-        cache_key = f"rate_limit:{ip_address}:{path}"
-        requests = cache.get(cache_key, [])
-        now = time.time()
-        cutoff_time = now - rate_limit_config["window"]
-        current_requests = len([req_time for req_time in requests if req_time > cutoff_time])
-
-        remaining = max(0, rate_limit_config["requests"] - current_requests)
-        response["X-RateLimit-Remaining"] = str(remaining)
-
-        # Add reset time (when the window resets)
-        if requests:
-            oldest_request = min([req_time for req_time in requests if req_time > cutoff_time], default=now)
-            reset_time = int(oldest_request + rate_limit_config["window"])
-            response["X-RateLimit-Reset"] = str(reset_time)
-
+        decision = getattr(request, "_rate_limit_decision", None)
+        if decision is None:
+            return response
+
+        response["X-RateLimit-Limit"] = str(decision.limit)
+        response["X-RateLimit-Window"] = str(decision.window)
+        response["X-RateLimit-Remaining"] = str(decision.remaining)
+        response["X-RateLimit-Reset"] = str(int(decision.reset_at))
         return response
 
 
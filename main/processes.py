@@ -0,0 +1,35 @@
+"""
+Helpers for spreading CPU-bound work over a process pool.
+
+A pool cannot always be started: daemonic processes such as Celery prefork
+children may not have children of their own (``multiprocessing`` raises an
+``AssertionError``), and restricted containers can refuse to fork or to create
+the pool's semaphores. Callers check ``can_fork`` up front, size the pool with
+``pool_workers`` and fall back to running in-process on
+``POOL_UNAVAILABLE_ERRORS``.
+"""
+
+import multiprocessing
+import os
+
+# OSError: fork or semaphores refused; RuntimeError: includes BrokenProcessPool;
+# AssertionError: "daemonic processes are not allowed to have children"
+POOL_UNAVAILABLE_ERRORS = (OSError, RuntimeError, AssertionError)
+
+
+def can_fork():
+    """Whether this process may start worker processes; daemonic ones (e.g. Celery prefork children) may not."""
+    return not multiprocessing.current_process().daemon
+
+
+def pool_workers(workers=None):
+    """
+    How many worker processes to use: ``workers`` when given (0 or 1 means
+    in-process), one per CPU when it is None, and 1 whenever this process
+    cannot fork.
+    """
+    if not can_fork():
+        return 1
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
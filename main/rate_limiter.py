@@ -0,0 +1,154 @@
+"""
+Sliding-log rate limiting for ``main.middleware.RateLimitMiddleware``.
+
+Every bucket (client + route) is a sorted set of request timestamps. A single
+Lua script trims entries older than the window, counts what is left, records
+the request if it fits and returns the decision together with the remaining
+allowance and the time the oldest counted request leaves the window, so one
+Redis round-trip both decides and supplies the response headers, and
+concurrent workers cannot overshoot the limit. The set never holds more than
+``limit`` entries.
+
+When the default cache is not backed by Redis (local development, tests) an
+in-process implementation of the same algorithm is used instead.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "rl"
+
+SLIDING_LOG_SCRIPT = """
+-- KEYS[1]: sorted set of request timestamps (ms) for one bucket
+-- ARGV: now (ms), window (ms), limit, unique member for this request
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    count = count + 1
+    allowed = 1
+end
+redis.call('PEXPIRE', KEYS[1], window)
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local reset = now + window
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window
+end
+return {allowed, limit - count, reset}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    window: int
+    remaining: int
+    reset_at: float  # epoch seconds at which the oldest counted request leaves the window
+    retry_after: int = 0  # seconds until a denied request would be allowed
+
+
+def bucket_key(identity, bucket):
+    # The hash tag keeps every bucket of one client on the same cluster slot.
+    return f"{KEY_PREFIX}:{{{identity}}}:{bucket}"
+
+
+class LocalSlidingLogBackend:
+    """In-process sliding logs with the same semantics as the Redis script."""
+
+    def __init__(self):
+        self._logs = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0
+
+    def hit(self, key, now_ms, window_ms, limit):
+        with self._lock:
+            self._purge(now_ms)
+            log = self._logs.setdefault(key, deque())
+            while log and log[0] <= now_ms - window_ms:
+                log.popleft()
+            allowed = len(log) < limit
+            if allowed:
+                log.append(now_ms)
+            reset = log[0] + window_ms if log else now_ms + window_ms
+            return [int(allowed), limit - len(log), reset]
+
+    def _purge(self, now_ms):
+        # Drop idle buckets now and then; a bucket whose newest entry is an hour old is empty for any sane window
+        if now_ms - self._last_purge < 60_000:
+            return
+        self._last_purge = now_ms
+        for key in [key for key, log in self._logs.items() if not log or log[-1] <= now_ms - 3_600_000]:
+            del self._logs[key]
+
+    def reset(self):
+        with self._lock:
+            self._logs.clear()
+
+
+class RedisSlidingLogBackend:
+    def __init__(self, connection):
+        self._script = connection.register_script(SLIDING_LOG_SCRIPT)
+
+    def hit(self, key, now_ms, window_ms, limit):
+        member = f"{now_ms}:{uuid.uuid4().hex}"
+        return [int(value) for value in self._script(keys=[key], args=[now_ms, window_ms, limit, member])]
+
+
+class SlidingLogRateLimiter:
+    """
+    Check-and-record limiter: ``hit`` counts the request only when it is
+    allowed and returns a ``RateLimitDecision`` carrying everything needed
+    for the ``X-RateLimit-*`` headers.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._fallback = LocalSlidingLogBackend()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = self._default_backend()
+        return self._backend
+
+    def _default_backend(self):
+        try:
+            from django_redis import get_redis_connection
+
+            return RedisSlidingLogBackend(get_redis_connection("default"))
+        except Exception:
+            # Non-Redis cache backend (e.g. LocMemCache) or django_redis missing
+            return self._fallback
+
+    def hit(self, identity, bucket, limit, window, now=None):
+        now_ms = int((now if now is not None else time.time()) * 1000)
+        key = bucket_key(identity, bucket)
+        try:
+            allowed, remaining, reset_ms = self.backend.hit(key, now_ms, window * 1000, limit)
+        except Exception as e:
+            # Keep enforcing per process rather than failing open when Redis is unavailable
+            logger.warning(f"Rate limiter backend error, using local logs: {e}")
+            allowed, remaining, reset_ms = self._fallback.hit(key, now_ms, window * 1000, limit)
+
+        return RateLimitDecision(
+            allowed=bool(allowed),
+            limit=limit,
+            window=window,
+            remaining=max(0, remaining),
+            reset_at=reset_ms / 1000,
+            retry_after=0 if allowed else max(1, -(-(reset_ms - now_ms) // 1000)),
+        )
+
+
+rate_limiter = SlidingLogRateLimiter()
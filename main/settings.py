@@ -422,6 +422,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "transport.celery_tasks.periodic_cleanup",
         "schedule": crontab(minute=0, hour=1),  # Daily at 1 AM
     },
+    "periodic-location-flush": {
+        "task": "transport.celery_tasks.periodic_location_flush",
+        "schedule": crontab(minute="*"),  # Every minute
+    },
     "periodic-delivery-estimate-updates": {
         "task": "transport.celery_tasks.periodic_estimate_updates",
         "schedule": crontab(minute=0, hour="*/6"),  # Every 6 hours
@@ -594,6 +598,21 @@ else:
 PRODUCER_SEARCH_CACHE_TTL = int(os.environ.get("PRODUCER_SEARCH_CACHE_TTL", 30))
 PRODUCER_LIST_CACHE_TTL = int(os.environ.get("PRODUCER_LIST_CACHE_TTL", 15))
 TRENDING_CACHE_TTL = int(os.environ.get("TRENDING_CACHE_TTL", 20))
+PRICE_TIER_CACHE_TIMEOUT = int(os.environ.get("PRICE_TIER_CACHE_TIMEOUT", 3600))
+SHOP_ID_CACHE_TTL = int(os.environ.get("SHOP_ID_CACHE_TTL", 3600))
+VIDEO_FEED_SESSION_TTL = int(os.environ.get("VIDEO_FEED_SESSION_TTL", 1800))
+VIDEO_FEED_SESSION_SIZE = int(os.environ.get("VIDEO_FEED_SESSION_SIZE", 100))
+VIDEO_FEED_PAGE_SIZE = int(os.environ.get("VIDEO_FEED_PAGE_SIZE", 20))
+# Marketplace catalog (producer.catalog): listings in the shuffled pool, and how long a pool order is cached
+CATALOG_POOL_SIZE = int(os.environ.get("CATALOG_POOL_SIZE", 200))
+CATALOG_POOL_TTL = int(os.environ.get("CATALOG_POOL_TTL", 1800))
+
+# Worker threads that enforce circuit breaker timeouts (market.circuit_breakers)
+CIRCUIT_BREAKER_MAX_WORKERS = int(os.environ.get("CIRCUIT_BREAKER_MAX_WORKERS", 32))
+
+# Histogram metrics (market.metrics): seconds between flushes to Redis, and the bearer token for /metrics/
+METRICS_FLUSH_INTERVAL = int(os.environ.get("METRICS_FLUSH_INTERVAL", 10))
+METRICS_AUTH_TOKEN = os.environ.get("METRICS_AUTH_TOKEN", "")
 
 # Session cache settings (stored in cache backend)
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
@@ -858,16 +877,46 @@ HAYSTACK_CONNECTIONS = {
         "ENGINE": "haystack.backends.elasticsearch7_backend.Elasticsearch7SearchEngine",
         "URL": ELASTIC_SEARCH_HOST,
         "INDEX_NAME": "new_index",
+        "TIMEOUT": int(os.environ.get("ELASTIC_SEARCH_TIMEOUT", 5)),
+        # Raise instead of returning empty results, so searches can fall back to the embedded index
+        "SILENTLY_FAIL": False,
+    },
+    # In-process BM25 index (producer.search_backend): search fallback and deterministic test/benchmark target
+    "embedded": {
+        "ENGINE": "producer.search_backend.EmbeddedSearchEngine",
+        "PATH": os.environ.get("EMBEDDED_SEARCH_INDEX_PATH", str(BASE_DIR / "search_index")),
     },
 }
 
 HAYSTACK_LIMIT_TO_REGISTERED_MODELS = False
+# Changes are queued and indexed in batches by producer.tasks.flush_search_index (see producer.search_indexing)
+HAYSTACK_SIGNAL_PROCESSOR = "producer.search_indexing.QueuedSignalProcessor"
+SEARCH_INDEX_FLUSH_INTERVAL = int(os.environ.get("SEARCH_INDEX_FLUSH_INTERVAL", 15))  # seconds between flushes
+SEARCH_INDEX_BATCH_SIZE = int(os.environ.get("SEARCH_INDEX_BATCH_SIZE", 500))  # listings per bulk request
+SEARCH_INDEX_MIRRORS = ["embedded"]  # connections updated with every flush besides "default"
+# Connection MarketplaceProductViewSet.search reads from, and the one it falls back to when that fails
+MARKETPLACE_SEARCH_CONNECTION = os.environ.get("MARKETPLACE_SEARCH_CONNECTION", "default")
+MARKETPLACE_SEARCH_FALLBACK_CONNECTION = os.environ.get("MARKETPLACE_SEARCH_FALLBACK_CONNECTION", "embedded")
+CELERY_BEAT_SCHEDULE["flush-search-index"] = {
+    "task": "producer.tasks.flush_search_index",
+    "schedule": float(SEARCH_INDEX_FLUSH_INTERVAL),
+}
 
 
 # External Delivery API Settings
 EXTERNAL_API_MAX_REQUEST_SIZE = 1024 * 1024  # 1MB
 EXTERNAL_API_DEFAULT_RATE_LIMIT_MINUTE = 60
 EXTERNAL_API_DEFAULT_RATE_LIMIT_HOUR = 1000
+EXTERNAL_API_USAGE_BATCH_SIZE = 200  # raw usage rows per bulk insert
+EXTERNAL_API_USAGE_FLUSH_INTERVAL = 5  # seconds between usage flushes
+EXTERNAL_API_USAGE_LOG_SAMPLE_RATE = float(os.environ.get("EXTERNAL_API_USAGE_LOG_SAMPLE_RATE", 1.0))
+
+# Transporter location tracking
+TRANSPORT_LOCATION_FLUSH_INTERVAL = 60  # seconds between position flushes to Postgres
+TRANSPORT_LOCATION_FLUSH_BATCH_SIZE = 5000  # breadcrumbs per bulk insert
+TRANSPORT_LOCATION_STALE_AFTER = 1800  # seconds before a live position is dropped
+TRANSPORT_BREADCRUMB_MIN_DISTANCE_M = 50  # keep a breadcrumb after this much movement...
+TRANSPORT_BREADCRUMB_MAX_INTERVAL = 60  # ...or after this many seconds
 
 # Frontend base URL for tracking links
 FRONTEND_BASE_URL = env("FRONTEND_BASE_URL", default="https://yourapp.com")
@@ -876,6 +925,11 @@ FRONTEND_BASE_URL = env("FRONTEND_BASE_URL", default="https://yourapp.com")
 WEBHOOK_TIMEOUT = 30  # seconds
 WEBHOOK_MAX_RETRIES = 3
 WEBHOOK_RETRY_DELAYS = [60, 300, 900]  # 1 min, 5 min, 15 min
+WEBHOOK_RETRY_BASE_DELAY = 60  # seconds, doubled per attempt with jitter
+WEBHOOK_RETRY_MAX_DELAY = 3600
+WEBHOOK_MAX_WORKERS = 16  # concurrent webhook requests per dispatcher
+WEBHOOK_PER_PARTNER_CONCURRENCY = 4  # in-flight webhooks per external business
+WEBHOOK_COALESCE_WINDOW = 5  # seconds to merge rapid status changes of a delivery
 
 # External business limits by plan
 EXTERNAL_PLAN_LIMITS = {
@@ -0,0 +1,77 @@
+import threading
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from main.middleware import RateLimitMiddleware, route_template
+from main.rate_limiter import LocalSlidingLogBackend, SlidingLogRateLimiter
+
+
+class SlidingLogRateLimiterTest(SimpleTestCase):
+    def setUp(self):
+        self.limiter = SlidingLogRateLimiter(backend=LocalSlidingLogBackend())
+
+    def test_limit_enforced_exactly_under_concurrency(self):
+        now = 1_700_000_000.0
+        results = []
+
+        def worker():
+            for _ in range(10):
+                results.append(self.limiter.hit("1.2.3.4", "/api/v1/products/", 25, 60, now=now).allowed)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 25)
+
+    def test_decision_reports_remaining_and_reset(self):
+        now = 1_700_000_000.0
+        decisions = [self.limiter.hit("ip", "bucket", 3, 60, now=now + offset) for offset in range(4)]
+
+        self.assertEqual([decision.remaining for decision in decisions], [2, 1, 0, 0])
+        self.assertEqual(decisions[0].reset_at, now + 60)
+        self.assertFalse(decisions[3].allowed)
+        self.assertEqual(decisions[3].retry_after, 57)
+
+    def test_oldest_request_slides_out(self):
+        now = 1_700_000_000.0
+        for offset in range(3):
+            self.assertTrue(self.limiter.hit("ip", "bucket", 3, 60, now=now + offset).allowed)
+        self.assertFalse(self.limiter.hit("ip", "bucket", 3, 60, now=now + 59).allowed)
+        self.assertTrue(self.limiter.hit("ip", "bucket", 3, 60, now=now + 60).allowed)
+
+
+class RateLimitMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = RateLimitMiddleware(
+            lambda request: HttpResponse("ok"), limiter=SlidingLogRateLimiter(backend=LocalSlidingLogBackend())
+        )
+
+    def test_route_template_collapses_ids(self):
+        self.assertEqual(route_template("/api/v1/products/42/"), "/api/v1/products/{id}/")
+        self.assertEqual(
+            route_template("/api/v1/orders/3f2504e0-4f89-11d3-9a0c-0305e82c3301/items/"), "/api/v1/orders/{id}/items/"
+        )
+
+    def test_object_urls_share_one_bucket(self):
+        self.middleware.DEFAULT_RATE_LIMITS = {"default": {"requests": 2, "window": 60}}
+
+        responses = [self.middleware(self.factory.get(f"/api/v1/products/{pk}/")) for pk in (1, 2, 3)]
+
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertEqual(responses[1]["X-RateLimit-Remaining"], "0")
+        self.assertEqual(responses[2]["X-RateLimit-Limit"], "2")
+        self.assertIn("Retry-After", responses[2])
+
+    def test_headers_come_from_the_decision(self):
+        response = self.middleware(self.factory.get("/api/v1/products/"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-RateLimit-Limit"], "100")
+        self.assertEqual(response["X-RateLimit-Window"], "60")
+        self.assertEqual(response["X-RateLimit-Remaining"], "99")
+        self.assertIn("X-RateLimit-Reset", response)
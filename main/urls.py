@@ -6,6 +6,7 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework.routers import DefaultRouter
 
 from market.location_views import LocationBasedProductViewSet
+from market.monitoring_views import prometheus_metrics
 
 # Only import API documentation in DEBUG mode
 if settings.DEBUG:
@@ -387,6 +388,8 @@ urlpatterns = [
     # Trending Products API endpoints
     path("api/v1/trending/track-view/", track_product_view, name="track-product-view"),
     path("api/v1/trending/summary/", trending_summary, name="trending-summary"),
+    # Prometheus scrape endpoint (market.monitoring)
+    path("metrics/", prometheus_metrics, name="prometheus-metrics"),
     # External Delivery Integration URLs
     path("", include("external_delivery.urls")),
     path("api/v1/recommendations/", business_recommendations, name="business_recommendations"),
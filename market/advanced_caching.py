@@ -14,6 +14,8 @@ from django.contrib.gis.geos import Point
 from django.core.cache import cache, caches
 from django.utils import timezone
 
+from .tagged_cache import TaggedCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,8 +26,8 @@ class CacheConfig:
     ttl: int = 300  # Time to live in seconds
     max_entries: int = 10000  # Max entries in cache
     compression: bool = False  # Enable compression for large objects
-    version: int = 1  # Cache version for invalidation
-    tags: List[str] = None  # Cache tags for group invalidation
+    version: int = 1  # Key format version
+    tags: List[str] = None  # Cache tags for group invalidation (see market.tagged_cache)
 
 
 class LocationCacheManager:
@@ -51,8 +53,11 @@ class LocationCacheManager:
         self.default_cache = cache
         try:
             self.location_cache = caches["location_cache"]  # Dedicated location cache
+            alias = "location_cache"
         except (KeyError, Exception):
             self.location_cache = cache  # Fallback to default cache
+            alias = "default"
+        self.tagged_cache = TaggedCache(alias)
 
     def get_cache_key(self, key_type: str, **params) -> str:
         """
@@ -77,6 +82,17 @@ class LocationCacheManager:
 
         return f"location_cache:v{version}:{key_type}:{param_str}"
 
+    def get_cache_tags(self, cache_type: str, **params) -> List[str]:
+        """
+        Tags of an entry: those of its cache type, plus ``user:<id>`` when the
+        entry belongs to a user (a ``user_id`` or ``user`` parameter).
+        """
+        tags = list(self.CACHE_CONFIGS.get(cache_type, CacheConfig()).tags or [])
+        user_id = params.get("user_id") or getattr(params.get("user"), "id", None)
+        if user_id is not None:
+            tags.append(f"user:{user_id}")
+        return tags
+
     def get_with_fallback(
         self, key: str, fallback_func: Callable, cache_type: str = "default", **fallback_kwargs
     ) -> Optional[Any]:
@@ -92,8 +108,10 @@ class LocationCacheManager:
         Returns:
             Cached value or result from fallback function
         """
+        tags = self.get_cache_tags(cache_type, **fallback_kwargs)
+
         # Try to get from cache first
-        value = self.location_cache.get(key)
+        value = self.tagged_cache.get(key, tags)
         if value is not None:
             return self._deserialize_cache_value(value)
 
@@ -101,7 +119,7 @@ class LocationCacheManager:
         lock_key = f"lock:{key}"
         with self._get_lock(lock_key):
             # Check cache again in case another thread filled it
-            value = self.location_cache.get(key)
+            value, generations = self.tagged_cache.lookup(key, tags)
             if value is not None:
                 return self._deserialize_cache_value(value)
 
@@ -113,7 +131,7 @@ class LocationCacheManager:
                 config = self.CACHE_CONFIGS.get(cache_type, CacheConfig())
                 serialized_value = self._serialize_cache_value(result)
 
-                self.location_cache.set(key, serialized_value, config.ttl)
+                self.tagged_cache.set(key, serialized_value, config.ttl, tags, generations=generations)
 
                 # Track cache metrics
                 self._track_cache_metrics("miss", cache_type)
@@ -125,32 +143,22 @@ class LocationCacheManager:
                 self._track_cache_metrics("error", cache_type)
                 return None
 
-    def set_with_config(self, key: str, value: Any, cache_type: str = "default"):
+    def set_with_config(self, key: str, value: Any, cache_type: str = "default", user_id: Optional[int] = None):
         """Set value in cache with appropriate configuration."""
         config = self.CACHE_CONFIGS.get(cache_type, CacheConfig())
         serialized_value = self._serialize_cache_value(value)
 
-        self.location_cache.set(key, serialized_value, config.ttl)
+        self.tagged_cache.set(key, serialized_value, config.ttl, self.get_cache_tags(cache_type, user_id=user_id))
         self._track_cache_metrics("set", cache_type)
 
     def invalidate_by_tags(self, tags: List[str]):
-        """Invalidate cache entries by tags."""
-        for cache_type, config in self.CACHE_CONFIGS.items():
-            if config.tags and any(tag in config.tags for tag in tags):
-                # Increment version to invalidate
-                config.version += 1
-                logger.info(f"Invalidated cache type '{cache_type}' for tags: {tags}")
+        """Invalidate cache entries by tags, across all processes."""
+        self.tagged_cache.invalidate(*tags)
+        logger.info(f"Invalidated location cache tags: {tags}")
 
     def invalidate_user_location_cache(self, user_id: int):
         """Invalidate all location-related cache for a specific user."""
-        patterns = [
-            f"location_cache:*:user_zones:*user_id={user_id}*",
-            f"location_cache:*:delivery_info:*user_id={user_id}*",
-            f"location_cache:*:search_results:*user_id={user_id}*",
-        ]
-
-        for pattern in patterns:
-            self._delete_by_pattern(pattern)
+        self.tagged_cache.invalidate(f"user:{user_id}")
 
     def warm_cache_for_location(self, latitude: float, longitude: float, radius_km: float = 50):
         """
@@ -208,6 +216,9 @@ class LocationCacheManager:
         total_requests = stats["total_hits"] + stats["total_misses"]
         stats["hit_ratio"] = stats["total_hits"] / total_requests if total_requests > 0 else 0
 
+        # Per-tag hits, misses and invalidations seen by this process
+        stats["tags"] = self.tagged_cache.stats()
+
         return stats
 
     def _get_lock(self, lock_key: str) -> Lock:
@@ -259,15 +270,6 @@ class LocationCacheManager:
             stats[metric_type] += 1
             cache.set(stats_key, stats, 3600)  # 1 hour TTL for stats
 
-    def _delete_by_pattern(self, pattern: str):
-        """Delete cache keys matching pattern (Redis-specific)."""
-        try:
-            # This is Redis-specific - implement based on your cache backend
-            if hasattr(self.location_cache, "_cache") and hasattr(self.location_cache._cache, "delete_pattern"):
-                self.location_cache._cache.delete_pattern(pattern)
-        except Exception as e:
-            logger.warning(f"Pattern-based cache deletion failed: {e}")
-
 
 # Alias for geographic-specific caching
 class GeographicCacheManager(LocationCacheManager):
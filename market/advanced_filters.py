@@ -69,18 +69,17 @@ class RatingFilter(django_filters.FilterSet):
     def filter_min_rating(self, queryset, name, value):
         """Filter by minimum average rating"""
         if value:
-            return queryset.annotate(avg_rating=Avg("reviews__rating")).filter(avg_rating__gte=value)
+            return queryset.filter(review_count__gt=0, rating_sum__gte=F("review_count") * value)
         return queryset
 
     def filter_min_reviews(self, queryset, name, value):
         """Filter by minimum number of reviews"""
         if value:
-            return queryset.annotate(review_count=Count("reviews")).filter(review_count__gte=value)
+            return queryset.filter(review_count__gte=value)
         return queryset
 
     def filter_has_reviews(self, queryset, name, value):
         """Filter products with or without reviews"""
-        queryset = queryset.annotate(review_count=Count("reviews"))
         if value:
             return queryset.filter(review_count__gt=0)
         else:
@@ -382,12 +381,12 @@ class AdvancedMarketplaceProductFilter(django_filters.FilterSet):
 
     def filter_min_rating(self, queryset, name, value):
         if value:
-            return queryset.annotate(avg_rating=Avg("reviews__rating")).filter(avg_rating__gte=value)
+            return queryset.filter(review_count__gt=0, rating_sum__gte=F("review_count") * value)
         return queryset
 
     def filter_min_reviews(self, queryset, name, value):
         if value:
-            return queryset.annotate(review_count=Count("reviews")).filter(review_count__gte=value)
+            return queryset.filter(review_count__gte=value)
         return queryset
 
     def filter_in_stock(self, queryset, name, value):
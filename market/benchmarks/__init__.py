@@ -0,0 +1,9 @@
+"""
+Query-budget and latency benchmarks for the API endpoints the marketplace
+scales on. Run them with ``manage.py benchmark_endpoints``.
+"""
+
+from .harness import BenchmarkRunner, Scenario, ScenarioResult, load_budgets
+from .scenarios import SeedData, default_scenarios, seed
+
+__all__ = ["BenchmarkRunner", "Scenario", "ScenarioResult", "SeedData", "default_scenarios", "load_budgets", "seed"]
@@ -0,0 +1,170 @@
+"""
+Benchmark harness: runs scenarios, captures per-request query counts, DB time
+and latency, and compares them with the budgets checked in next to this file
+(``budgets.json``).
+
+Every scenario runs against a private local-memory cache, so the benchmark
+never touches a shared Redis. With ``cold_cache`` (the default) the cache is
+cleared before each iteration, so cached endpoints are measured on the path
+that actually queries the database.
+
+Query budgets are the measured count plus ``QUERY_HEADROOM``: enough for a
+conditional query on one path, never enough to hide a query per row.
+"""
+
+import json
+import math
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+DEFAULT_BUDGETS_PATH = Path(__file__).with_name("budgets.json")
+QUERY_HEADROOM = 2
+
+
+@dataclass
+class Scenario:
+    """
+    One measured operation: a GET of ``path`` (as ``user`` when given), or a
+    direct ``call`` for service-level entry points.
+    """
+
+    name: str
+    path: str = ""
+    params: Dict[str, Any] = field(default_factory=dict)
+    user: Any = None
+    call: Optional[Callable[[], Any]] = None
+    expected_status: int = 200
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    status: str = "ok"  # ok, over_budget or error
+    iterations: int = 0
+    queries: int = 0  # most queries any iteration ran
+    db_ms: float = 0.0  # median DB time per iteration
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    budget: Dict[str, float] = field(default_factory=dict)
+    violations: List[str] = field(default_factory=list)
+    error: str = ""
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (0 < q <= 1)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def load_budgets(path=None) -> Dict[str, Dict[str, float]]:
+    with open(path or DEFAULT_BUDGETS_PATH) as f:
+        return json.load(f)
+
+
+class BenchmarkRunner:
+    def __init__(self, budgets=None, iterations=20, warmup=2, cold_cache=True, check_latency=True):
+        self.budgets = budgets if budgets is not None else load_budgets()
+        self.iterations = iterations
+        self.warmup = warmup
+        self.cold_cache = cold_cache
+        self.check_latency = check_latency
+
+    def run(self, scenarios: List[Scenario], metadata: Optional[Dict] = None) -> Dict:
+        """Measure every scenario and return the JSON-serializable report."""
+        location = f"benchmark-{uuid.uuid4().hex}"
+        isolated_caches = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": location},
+            "location_cache": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"{location}-geo"},
+        }
+        with override_settings(CACHES=isolated_caches):
+            results = [self.measure(scenario) for scenario in scenarios]
+
+        return {
+            "generated_at": timezone.now().isoformat(),
+            "iterations": self.iterations,
+            "cold_cache": self.cold_cache,
+            "metadata": metadata or {},
+            "passed": all(result.status == "ok" for result in results),
+            "results": {result.name: result.as_dict() for result in results},
+        }
+
+    def measure(self, scenario: Scenario) -> ScenarioResult:
+        result = ScenarioResult(name=scenario.name, budget=self.budgets.get(scenario.name, {}))
+        client = APIClient()
+        if scenario.user is not None:
+            client.force_authenticate(user=scenario.user)
+
+        latencies, db_times = [], []
+        try:
+            for iteration in range(self.warmup + self.iterations):
+                if self.cold_cache:
+                    caches["default"].clear()
+                    caches["location_cache"].clear()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    self._invoke(scenario, client)
+                    elapsed = time.perf_counter() - started
+                if iteration < self.warmup:
+                    continue
+                latencies.append(elapsed * 1000)
+                db_times.append(sum(float(query.get("time") or 0) for query in captured.captured_queries) * 1000)
+                result.queries = max(result.queries, len(captured.captured_queries))
+        except Exception as e:
+            result.status = "error"
+            result.error = f"{type(e).__name__}: {e}"
+            return result
+
+        result.iterations = len(latencies)
+        result.p50_ms = round(percentile(latencies, 0.5), 2)
+        result.p95_ms = round(percentile(latencies, 0.95), 2)
+        result.db_ms = round(percentile(db_times, 0.5), 2)
+        result.violations = self.check(result)
+        if result.violations:
+            result.status = "over_budget"
+        return result
+
+    def _invoke(self, scenario: Scenario, client: APIClient):
+        if scenario.call is not None:
+            return scenario.call()
+        response = client.get(scenario.path, scenario.params)
+        if response.status_code != scenario.expected_status:
+            raise AssertionError(f"GET {scenario.path} returned {response.status_code}, expected {scenario.expected_status}")
+        return response
+
+    def check(self, result: ScenarioResult) -> List[str]:
+        """Budget violations of a measured result."""
+        violations = []
+        budget = result.budget
+        if "queries" in budget and result.queries > budget["queries"]:
+            violations.append(f"{result.queries} queries > budget {budget['queries']}")
+        if self.check_latency and "p95_ms" in budget and result.p95_ms > budget["p95_ms"]:
+            violations.append(f"p95 {result.p95_ms}ms > budget {budget['p95_ms']}ms")
+        return violations
+
+    @staticmethod
+    def budgets_from_report(
+        report: Dict, latency_headroom: float = 2.0, query_headroom: int = QUERY_HEADROOM
+    ) -> Dict[str, Dict[str, float]]:
+        """Budgets matching a report: its query counts and p95 latency, each with headroom."""
+        return {
+            name: {
+                "queries": result["queries"] + query_headroom,
+                "p95_ms": math.ceil(result["p95_ms"] * latency_headroom),
+            }
+            for name, result in sorted(report["results"].items())
+            if result["status"] != "error"
+        }
@@ -0,0 +1,128 @@
+"""
+Seed data and default scenarios for the endpoint benchmarks.
+
+Volumes are realistic rather than huge: large enough that an N+1 query or an
+unpaginated fetch shows up in the query counts and latency.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from django.urls import reverse
+from django.utils import timezone
+
+from market.models import ShoppableVideo
+from producer.factories import MarketplaceProductFactory, ProducerFactory, ProductFactory, UserFactory
+from transport.models import Delivery, Transporter, VehicleType
+from user.models import Role, UserProfile
+
+from .harness import Scenario
+
+DEFAULT_VOLUME = {"products": 300, "videos": 100, "b2b_users": 20, "deliveries": 200}
+
+# Kathmandu; deliveries are scattered within ~5 km of the transporter
+ORIGIN = (Decimal("27.717200"), Decimal("85.324000"))
+
+
+@dataclass
+class SeedData:
+    viewer: Any
+    seller: Any
+    transporter_user: Any
+    b2b_user: Any
+    volume: Dict[str, int] = field(default_factory=dict)
+
+
+def _user(role, **profile):
+    user = UserFactory()
+    # Profiles are normally created on commit, which never happens inside the benchmark's transaction
+    UserProfile.objects.get_or_create(user=user, defaults={"role": role, **profile})
+    return user
+
+
+def seed(volume=None, random_seed=42) -> SeedData:
+    """Create benchmark data with the factories; ``volume`` overrides ``DEFAULT_VOLUME`` counts."""
+    volume = {**DEFAULT_VOLUME, **(volume or {})}
+    rng = random.Random(random_seed)
+    Role.setup_default_roles()
+    general_user = Role.objects.get(code="general_user")
+    business_owner = Role.objects.get(code="business_owner")
+
+    viewer = _user(general_user)
+    seller = _user(business_owner)
+    producers = ProducerFactory.create_batch(max(1, volume["products"] // 25), user=seller)
+    listings = [
+        MarketplaceProductFactory(product=ProductFactory(producer=producers[index % len(producers)], user=seller))
+        for index in range(volume["products"])
+    ]
+
+    b2b_users = [_user(business_owner, b2b_verified=True) for _ in range(volume["b2b_users"])]
+    for b2b_user in b2b_users:
+        producer = ProducerFactory(user=b2b_user)
+        ProductFactory.create_batch(5, producer=producer, user=b2b_user)
+
+    for index in range(volume["videos"]):
+        ShoppableVideo.objects.create(
+            uploader=seller,
+            video_file="videos/benchmark.mp4",
+            title=f"Benchmark video {index}",
+            product=listings[index % len(listings)],
+        )
+
+    transporter_user = _user(general_user)
+    Transporter.objects.create(
+        user=transporter_user,
+        license_number=f"BENCH-{transporter_user.pk}",
+        vehicle_type=VehicleType.VAN,
+        vehicle_number="BA 1 PA 1234",
+        vehicle_capacity=Decimal("500.00"),
+        current_latitude=ORIGIN[0],
+        current_longitude=ORIGIN[1],
+    )
+    now = timezone.now()
+    for index in range(volume["deliveries"]):
+        Delivery.objects.create(
+            pickup_address=f"Pickup {index}",
+            pickup_latitude=ORIGIN[0] + Decimal(f"{rng.uniform(-0.04, 0.04):.6f}"),
+            pickup_longitude=ORIGIN[1] + Decimal(f"{rng.uniform(-0.04, 0.04):.6f}"),
+            pickup_contact_name="Benchmark Sender",
+            pickup_contact_phone="+9779800000000",
+            delivery_address=f"Drop-off {index}",
+            delivery_contact_name="Benchmark Receiver",
+            delivery_contact_phone="+9779800000001",
+            package_weight=Decimal(f"{rng.uniform(0.5, 40):.2f}"),
+            requested_pickup_date=now,
+            requested_delivery_date=now + timedelta(days=1),
+            delivery_fee=Decimal("150.00"),
+        )
+
+    return SeedData(viewer=viewer, seller=seller, transporter_user=transporter_user, b2b_user=b2b_users[0], volume=volume)
+
+
+_suggestion_service = None
+
+
+def get_suggestions(query):
+    # Built on first use, so its connection setup is absorbed by the warm-up iterations
+    global _suggestion_service
+    if _suggestion_service is None:
+        from search_suggestions.services.suggestion_service import SearchSuggestionService
+
+        _suggestion_service = SearchSuggestionService()
+    return _suggestion_service.get_suggestions(query, limit=5, use_cache=False)
+
+
+def default_scenarios(data: SeedData) -> List[Scenario]:
+    return [
+        Scenario("marketplace.list", reverse("marketplace-list"), user=data.viewer),
+        Scenario("products.list", reverse("product-list"), user=data.seller),
+        Scenario("trending.list", reverse("marketplace-trending-list"), user=data.viewer),
+        Scenario("shoppable_videos.list", reverse("shoppable-videos-list"), user=data.viewer),
+        Scenario("search_suggestions.get_suggestions", call=lambda: get_suggestions("rice")),
+        Scenario("transport.nearby_deliveries", reverse("nearby-deliveries"), {"radius": 10}, user=data.transporter_user),
+        Scenario("b2b.list", reverse("b2b-verified-users-products-list")),
+        Scenario("b2b.products", reverse("b2b-verified-users-products-products", args=[data.b2b_user.pk])),
+    ]
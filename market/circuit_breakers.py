@@ -1,17 +1,49 @@
+"""
+Circuit breakers for location services.
+
+Breaker state is shared by every worker through the cache, using only atomic
+operations:
+
+- failures are counted in a rolling window of per-bucket counters (``incr``),
+  and the first worker whose failure crosses the threshold opens the breaker
+  with ``add`` on ``<name>:opened_at``;
+- once ``recovery_timeout`` has passed, the breaker is half-open and exactly
+  one worker wins the ``<name>:probe`` key (``add`` again) and sends a trial
+  call; every other caller is still rejected. ``success_threshold``
+  successful probes close it, a failed probe re-opens it.
+
+Timeouts are enforced by running the call on a bounded thread pool and
+waiting on its future (``call``), or with ``asyncio.wait_for`` (``acall``),
+so breakers work in any thread, unlike ``SIGALRM``. A call that times out
+keeps its pool slot until it really returns, so hung calls cannot grow the
+pool without bound.
+"""
+
+import asyncio
 import logging
+import math
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass, field
 from enum import Enum
 from functools import wraps
 from threading import Lock
 from typing import Any, Callable, Dict, List, Optional
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
+from django.db import close_old_connections
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+CACHE_PREFIX = "circuit_breaker"
+FAILURE_BUCKETS = 10  # Resolution of the rolling failure window
+STATE_TTL = 3600  # An open breaker nobody calls for an hour closes by itself
+
 
 class CircuitBreakerState(Enum):
     """Circuit breaker states."""
@@ -25,66 +57,101 @@ class CircuitBreakerState(Enum):
 class CircuitBreakerConfig:
     """Configuration for circuit breaker behavior."""
 
-    failure_threshold: int = 5  # Failures before opening circuit
+    failure_threshold: int = 5  # Failures within failure_window before opening circuit
     recovery_timeout: int = 60  # Seconds before trying to recover
-    success_threshold: int = 2  # Successes needed to close circuit
-    timeout: float = 30.0  # Request timeout in seconds
+    success_threshold: int = 2  # Successful probes needed to close circuit
+    timeout: float = 30.0  # Request timeout in seconds (None disables it)
     expected_exception: tuple = (Exception,)  # Exceptions to count as failures
+    failure_window: int = 60  # Seconds over which failures are counted
 
 
 @dataclass
 class CircuitBreakerMetrics:
-    """Metrics tracking for circuit breaker."""
+    """Per-process metrics for a circuit breaker; the breaker state itself is shared."""
 
     total_requests: int = 0
     failed_requests: int = 0
     successful_requests: int = 0
-    consecutive_failures: int = 0
-    consecutive_successes: int = 0
+    rejected_requests: int = 0
+    timed_out_requests: int = 0
     last_failure_time: Optional[float] = None
     last_success_time: Optional[float] = None
     state_change_history: List[Dict] = field(default_factory=list)
 
 
+class BoundedExecutor:
+    """Thread pool that rejects work instead of queueing it once every worker is busy."""
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="circuit-breaker")
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def submit(self, func: Callable, *args, wait: Optional[float] = None, **kwargs):
+        """Submit ``func``, waiting up to ``wait`` seconds for a free worker. Returns None when none frees up."""
+        if not self._slots.acquire(timeout=wait):
+            return None
+        try:
+            future = self._executor.submit(self._run, func, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @staticmethod
+    def _run(func: Callable, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Worker threads hold their own database connections; recycle them like a request would
+            close_old_connections()
+
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor() -> BoundedExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = BoundedExecutor(getattr(settings, "CIRCUIT_BREAKER_MAX_WORKERS", 32))
+        return _executor
+
+
 class CircuitBreaker:
     """
     Circuit breaker implementation for protecting services from cascading failures.
+
+    Instances with the same name, in any thread or worker, share one state.
     """
 
     def __init__(self, name: str, config: CircuitBreakerConfig = None):
         self.name = name
         self.config = config or CircuitBreakerConfig()
         self.metrics = CircuitBreakerMetrics()
-        self.state = CircuitBreakerState.CLOSED
         self.lock = Lock()
 
-        # Cache key for persistence across requests
-        self.cache_key = f"circuit_breaker:{self.name}"
-        self._load_state()
+        # Cache keys for state shared across workers
+        self.cache_key = f"{CACHE_PREFIX}:{self.name}"
+        self.opened_key = f"{self.cache_key}:opened_at"
+        self.probe_key = f"{self.cache_key}:probe"
+        self.successes_key = f"{self.cache_key}:half_open_successes"
 
-    def _load_state(self):
-        """Load circuit breaker state from cache."""
+    @property
+    def state(self) -> CircuitBreakerState:
         try:
-            cached_data = cache.get(self.cache_key)
-            if cached_data:
-                self.state = CircuitBreakerState(cached_data.get("state", "closed"))
-                self.metrics.consecutive_failures = cached_data.get("consecutive_failures", 0)
-                self.metrics.last_failure_time = cached_data.get("last_failure_time")
+            return self._state(cache.get(self.opened_key), time.time())
         except Exception as e:
             logger.warning(f"Failed to load circuit breaker state: {e}")
+            return CircuitBreakerState.CLOSED
 
-    def _save_state(self):
-        """Save circuit breaker state to cache."""
-        try:
-            cache_data = {
-                "state": self.state.value,
-                "consecutive_failures": self.metrics.consecutive_failures,
-                "last_failure_time": self.metrics.last_failure_time,
-                "last_success_time": self.metrics.last_success_time,
-            }
-            cache.set(self.cache_key, cache_data, 3600)  # 1 hour TTL
-        except Exception as e:
-            logger.warning(f"Failed to save circuit breaker state: {e}")
+    def _state(self, opened_at: Optional[float], now: float) -> CircuitBreakerState:
+        if opened_at is None:
+            return CircuitBreakerState.CLOSED
+        if now - opened_at < self.config.recovery_timeout:
+            return CircuitBreakerState.OPEN
+        return CircuitBreakerState.HALF_OPEN
 
     def call(self, func: Callable, *args, **kwargs) -> Any:
         """
@@ -100,111 +167,207 @@ class CircuitBreaker:
 
         Raises:
             CircuitBreakerOpenError: When circuit is open
+            CircuitBreakerTimeoutError: When the call exceeds ``config.timeout``
             Original exception: When function fails and circuit allows it
         """
-        with self.lock:
-            if self.state == CircuitBreakerState.OPEN:
-                if self._should_attempt_reset():
-                    self.state = CircuitBreakerState.HALF_OPEN
-                    self._log_state_change("OPEN -> HALF_OPEN")
-                else:
-                    raise CircuitBreakerOpenError(f"Circuit breaker '{self.name}' is OPEN")
-
-            self.metrics.total_requests += 1
-
+        probe = self._before_call()
         try:
-            # Execute the function with timeout
             result = self._execute_with_timeout(func, *args, **kwargs)
-            self._on_success()
-            return result
+        except BaseException as e:
+            self._after_error(e, probe)
+            raise
+        self._on_success(probe)
+        return result
 
-        except self.config.expected_exception as e:
-            self._on_failure(e)
+    async def acall(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Async counterpart of ``call`` for the ASGI/GraphQL path. ``func`` may be
+        a coroutine function; plain functions run in a worker thread.
+        """
+        probe = await sync_to_async(self._before_call, thread_sensitive=False)()
+        try:
+            if asyncio.iscoroutinefunction(func):
+                awaitable = func(*args, **kwargs)
+            else:
+                awaitable = sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+            if self.config.timeout:
+                try:
+                    result = await asyncio.wait_for(awaitable, self.config.timeout)
+                except asyncio.TimeoutError:
+                    raise self._timeout_error(func)
+            else:
+                result = await awaitable
+        except BaseException as e:
+            await sync_to_async(self._after_error, thread_sensitive=False)(e, probe)
             raise
+        await sync_to_async(self._on_success, thread_sensitive=False)(probe)
+        return result
 
     def _execute_with_timeout(self, func: Callable, *args, **kwargs) -> Any:
         """Execute function with timeout protection."""
-        import signal
+        if not self.config.timeout:
+            return func(*args, **kwargs)
 
-        def timeout_handler(signum, frame):
-            raise TimeoutError(f"Function {func.__name__} timed out after {self.config.timeout}s")
+        deadline = time.monotonic() + self.config.timeout
+        future = get_executor().submit(func, *args, wait=self.config.timeout, **kwargs)
+        if future is None:
+            raise self._timeout_error(func, "no worker became free")
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            raise self._timeout_error(func)
+
+    def _timeout_error(self, func: Callable, reason: str = None) -> "CircuitBreakerTimeoutError":
+        name = getattr(func, "__name__", repr(func))
+        detail = f" ({reason})" if reason else ""
+        return CircuitBreakerTimeoutError(f"Function {name} timed out after {self.config.timeout}s{detail}")
 
-        # Set timeout for non-async functions
-        old_handler = signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(int(self.config.timeout))
+    def _before_call(self) -> bool:
+        """
+        Admit or reject a call. Returns True when the call is the half-open
+        probe, which the caller must report through ``_on_success``/``_on_failure``.
+        """
+        with self.lock:
+            self.metrics.total_requests += 1
 
         try:
-            return func(*args, **kwargs)
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old_handler)
+            state = self.state
+            probe = state == CircuitBreakerState.HALF_OPEN and cache.add(
+                self.probe_key, time.time(), self._probe_ttl()
+            )
+        except Exception as e:
+            # Fail closed on the shared state rather than blocking the service when the cache is down
+            logger.warning(f"Circuit breaker '{self.name}' state unavailable: {e}")
+            return False
+
+        if state == CircuitBreakerState.CLOSED:
+            return False
+        if probe:
+            self._log_state_change("OPEN -> HALF_OPEN")
+            return True
 
-    def _on_success(self):
+        with self.lock:
+            self.metrics.rejected_requests += 1
+        if state == CircuitBreakerState.OPEN:
+            raise CircuitBreakerOpenError(f"Circuit breaker '{self.name}' is OPEN")
+        raise CircuitBreakerOpenError(f"Circuit breaker '{self.name}' is HALF_OPEN, probe in flight")
+
+    def _probe_ttl(self) -> int:
+        # Outlives the probe call, so a worker dying mid-probe only delays the next probe
+        return math.ceil(self.config.timeout or self.config.recovery_timeout) + 1
+
+    def _after_error(self, exception: BaseException, probe: bool):
+        if isinstance(exception, CircuitBreakerTimeoutError):
+            with self.lock:
+                self.metrics.timed_out_requests += 1
+            self._on_failure(exception, probe)
+        elif isinstance(exception, self.config.expected_exception):
+            self._on_failure(exception, probe)
+        elif probe:
+            # Not a service failure; let the next caller probe instead
+            self._release_probe()
+
+    def _on_success(self, probe: bool = False):
         """Handle successful function execution."""
         with self.lock:
             self.metrics.successful_requests += 1
-            self.metrics.consecutive_successes += 1
-            self.metrics.consecutive_failures = 0
             self.metrics.last_success_time = time.time()
 
-            if self.state == CircuitBreakerState.HALF_OPEN:
-                if self.metrics.consecutive_successes >= self.config.success_threshold:
-                    self.state = CircuitBreakerState.CLOSED
-                    self._log_state_change("HALF_OPEN -> CLOSED")
-
-            self._save_state()
+        if not probe:
+            return
+        try:
+            cache.add(self.successes_key, 0, STATE_TTL)
+            successes = cache.incr(self.successes_key)
+            if successes >= self.config.success_threshold:
+                cache.delete_many([self.opened_key, self.successes_key, *self._failure_keys(time.time())])
+                self._log_state_change("HALF_OPEN -> CLOSED")
+        except Exception as e:
+            logger.warning(f"Failed to save circuit breaker state: {e}")
+        finally:
+            self._release_probe()
 
-    def _on_failure(self, exception: Exception):
+    def _on_failure(self, exception: Exception, probe: bool = False):
         """Handle failed function execution."""
+        now = time.time()
         with self.lock:
             self.metrics.failed_requests += 1
-            self.metrics.consecutive_failures += 1
-            self.metrics.consecutive_successes = 0
-            self.metrics.last_failure_time = time.time()
+            self.metrics.last_failure_time = now
 
-            if (
-                self.state == CircuitBreakerState.CLOSED
-                and self.metrics.consecutive_failures >= self.config.failure_threshold
+        try:
+            if probe:
+                cache.set(self.opened_key, now, STATE_TTL)
+                cache.delete(self.successes_key)
+                self._log_state_change("HALF_OPEN -> OPEN")
+            elif self._record_failure(now) >= self.config.failure_threshold and cache.add(
+                self.opened_key, now, STATE_TTL
             ):
-                self.state = CircuitBreakerState.OPEN
+                # add() succeeds for exactly one worker, so the breaker opens once
                 self._log_state_change("CLOSED -> OPEN")
+        except Exception as e:
+            logger.warning(f"Failed to save circuit breaker state: {e}")
+        finally:
+            if probe:
+                self._release_probe()
+        logger.warning(f"Circuit breaker '{self.name}' recorded failure: {exception}")
 
-            elif self.state == CircuitBreakerState.HALF_OPEN:
-                self.state = CircuitBreakerState.OPEN
-                self._log_state_change("HALF_OPEN -> OPEN")
-
-            self._save_state()
-            logger.warning(f"Circuit breaker '{self.name}' recorded failure: {exception}")
-
-    def _should_attempt_reset(self) -> bool:
-        """Check if circuit breaker should attempt to reset."""
-        if not self.metrics.last_failure_time:
-            return True
-        return (time.time() - self.metrics.last_failure_time) >= self.config.recovery_timeout
+    def _release_probe(self):
+        try:
+            cache.delete(self.probe_key)
+        except Exception as e:
+            logger.warning(f"Failed to release circuit breaker probe: {e}")
+
+    def _bucket_width(self) -> float:
+        return max(self.config.failure_window / FAILURE_BUCKETS, 1)
+
+    def _failure_keys(self, now: float) -> List[str]:
+        """Keys of the failure buckets covering the window that ends at ``now``."""
+        width = self._bucket_width()
+        current = int(now // width)
+        count = math.ceil(self.config.failure_window / width)
+        return [f"{self.cache_key}:failures:{bucket}" for bucket in range(current - count + 1, current + 1)]
+
+    def _record_failure(self, now: float) -> int:
+        """Count a failure and return the failures within the rolling window."""
+        keys = self._failure_keys(now)
+        cache.add(keys[-1], 0, math.ceil(self.config.failure_window + self._bucket_width()))
+        current = cache.incr(keys[-1])
+        return current + sum(cache.get_many(keys[:-1]).values())
+
+    def failure_count(self) -> int:
+        """Failures recorded by all workers within the rolling window."""
+        return sum(cache.get_many(self._failure_keys(time.time())).values())
+
+    def reset(self):
+        """Close the breaker and forget recorded failures, for every worker."""
+        cache.delete_many(
+            [self.opened_key, self.probe_key, self.successes_key, *self._failure_keys(time.time())]
+        )
 
     def _log_state_change(self, transition: str):
         """Log circuit breaker state changes."""
         logger.info(f"Circuit breaker '{self.name}' state change: {transition}")
-        self.metrics.state_change_history.append(
-            {
-                "timestamp": time.time(),
-                "transition": transition,
-                "consecutive_failures": self.metrics.consecutive_failures,
-            }
-        )
+        with self.lock:
+            self.metrics.state_change_history.append({"timestamp": time.time(), "transition": transition})
 
     def get_stats(self) -> Dict:
         """Get circuit breaker statistics."""
+        try:
+            state, window_failures = self.state.value, self.failure_count()
+        except Exception:
+            state, window_failures = "unknown", None
         return {
             "name": self.name,
-            "state": self.state.value,
+            "state": state,
+            "window_failures": window_failures,
             "total_requests": self.metrics.total_requests,
             "failed_requests": self.metrics.failed_requests,
             "successful_requests": self.metrics.successful_requests,
+            "rejected_requests": self.metrics.rejected_requests,
+            "timed_out_requests": self.metrics.timed_out_requests,
             "failure_rate": (
                 self.metrics.failed_requests / self.metrics.total_requests if self.metrics.total_requests > 0 else 0
             ),
-            "consecutive_failures": self.metrics.consecutive_failures,
             "last_failure": self.metrics.last_failure_time,
             "last_success": self.metrics.last_success_time,
         }
@@ -216,6 +379,12 @@ class CircuitBreakerOpenError(Exception):
     pass
 
 
+class CircuitBreakerTimeoutError(TimeoutError):
+    """Raised when a protected call exceeds the breaker's timeout."""
+
+    pass
+
+
 class LocationServiceCircuitBreakers:
     """
     Circuit breakers specifically for location-based services.
@@ -257,13 +426,16 @@ class LocationServiceCircuitBreakers:
 
     _instances = {}
 
+    _instances_lock = Lock()
+
     @classmethod
     def get_breaker(cls, service_name: str) -> CircuitBreaker:
         """Get or create circuit breaker for service."""
-        if service_name not in cls._instances:
-            config = cls.CONFIGS.get(service_name, CircuitBreakerConfig())
-            cls._instances[service_name] = CircuitBreaker(service_name, config)
-        return cls._instances[service_name]
+        with cls._instances_lock:
+            if service_name not in cls._instances:
+                config = cls.CONFIGS.get(service_name, CircuitBreakerConfig())
+                cls._instances[service_name] = CircuitBreaker(service_name, config)
+            return cls._instances[service_name]
 
     @classmethod
     def get_all_stats(cls) -> Dict[str, Dict]:
@@ -287,6 +459,22 @@ def circuit_breaker_protected(service_name: str, fallback: Callable = None):
     """
 
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                breaker = LocationServiceCircuitBreakers.get_breaker(service_name)
+
+                try:
+                    return await breaker.acall(func, *args, **kwargs)
+                except CircuitBreakerOpenError:
+                    logger.warning(f"Circuit breaker open for {service_name}, using fallback")
+                    if fallback:
+                        return fallback(*args, **kwargs)
+                    raise
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             breaker = LocationServiceCircuitBreakers.get_breaker(service_name)
@@ -0,0 +1,171 @@
+"""
+Cursor-paged personalized video feed sessions.
+
+Building a personalized feed runs FAISS retrieval, a candidate fetch and MMR
+re-ranking. Rather than rebuilding it for every page, the first request of a
+session ranks up to ``VIDEO_FEED_SESSION_SIZE`` videos once and stores the
+ranking in the cache; later pages are served from it by an opaque, signed
+cursor, so deep scrolling is a cache read and the order of pages already
+served never shifts.
+
+The ranked ids past the last served position (the unseen tail) are re-ranked
+whenever the viewer's session interests (categories and tags collected from
+their views) change, so what they watch now still shapes what comes next.
+"""
+
+import json
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from .recommendation import VideoRecommendationService
+
+FEED_SESSION_CACHE_PREFIX = "market:video_feed_session"
+CURSOR_SALT = "market.feed_sessions.cursor"
+
+# Weight of session interests relative to the recommender's own ranking, whose base scores span 0..1:
+# a video matching everything the viewer watched this session can overtake any other in the tail
+INTEREST_WEIGHT = 1.0
+
+
+class InvalidFeedCursor(Exception):
+    pass
+
+
+def feed_session_cache_key(key):
+    return f"{FEED_SESSION_CACHE_PREFIX}:{key}"
+
+
+def interests_signature(interests):
+    return json.dumps(interests or {}, sort_keys=True)
+
+
+def interest_boost(category_id, tags, interests):
+    """Share of the session's category and tag interest that a video matches, weighted by ``INTEREST_WEIGHT``."""
+    if not interests:
+        return 0.0
+    categories = interests.get("categories") or {}
+    tag_counts = interests.get("tags") or {}
+
+    boost = 0.0
+    category_total = sum(categories.values())
+    if category_total and category_id is not None:
+        boost += categories.get(str(category_id), 0) / category_total
+    tag_total = sum(tag_counts.values())
+    if tag_total and tags:
+        boost += sum(tag_counts.get(tag, 0) for tag in set(tags)) / tag_total
+    return INTEREST_WEIGHT * boost
+
+
+@dataclass
+class FeedSession:
+    """
+    A ranked feed. ``video_ids[:served]`` has been handed out and is frozen;
+    the rest is re-ranked against session interests as they change.
+    """
+
+    key: str
+    user_id: Optional[int]
+    video_ids: list = field(default_factory=list)
+    base_scores: dict = field(default_factory=dict)
+    categories: dict = field(default_factory=dict)
+    tags: dict = field(default_factory=dict)
+    served: int = 0
+    interests_signature: str = ""
+
+    @classmethod
+    def from_videos(cls, videos, user_id=None):
+        """Session over ``videos`` in recommender order; the first video gets base score 1."""
+        session = cls(key=uuid.uuid4().hex, user_id=user_id)
+        total = len(videos)
+        for rank, video in enumerate(videos):
+            if video.id in session.base_scores:
+                continue
+            session.video_ids.append(video.id)
+            session.base_scores[video.id] = 1.0 - rank / total
+            session.categories[video.id] = video.category_id
+            session.tags[video.id] = list(video.tags or [])
+        return session
+
+    def score(self, video_id, interests):
+        return self.base_scores[video_id] + interest_boost(self.categories[video_id], self.tags[video_id], interests)
+
+    def rerank(self, interests):
+        """Re-rank the unseen tail for ``interests``; returns True if the session changed."""
+        signature = interests_signature(interests)
+        if signature == self.interests_signature:
+            return False
+        tail = self.video_ids[self.served :]
+        tail.sort(key=lambda video_id: self.score(video_id, interests), reverse=True)
+        self.video_ids[self.served :] = tail
+        self.interests_signature = signature
+        return True
+
+    def page(self, offset, size):
+        """Ids of the page starting at ``offset``, marking them as served."""
+        offset = max(0, min(offset, len(self.video_ids)))
+        end = min(offset + size, len(self.video_ids))
+        self.served = max(self.served, end)
+        return self.video_ids[offset:end]
+
+
+class VideoFeedSessionService:
+    """Creates, pages and stores ``FeedSession`` objects in the cache."""
+
+    def __init__(self, recommendation_service=None):
+        self._recommendation_service = recommendation_service
+
+    @property
+    def recommendation_service(self):
+        if self._recommendation_service is None:
+            self._recommendation_service = VideoRecommendationService()
+        return self._recommendation_service
+
+    def encode_cursor(self, session, offset):
+        return signing.dumps([session.key, offset], salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            key, offset = signing.loads(cursor, salt=CURSOR_SALT)
+            return str(key), int(offset)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise InvalidFeedCursor("Invalid cursor")
+
+    def load(self, key):
+        return cache.get(feed_session_cache_key(key))
+
+    def save(self, session):
+        timeout = getattr(settings, "VIDEO_FEED_SESSION_TTL", 1800)
+        cache.set(feed_session_cache_key(session.key), session, timeout)
+
+    def start(self, user, interests=None):
+        """Rank a fresh feed for ``user`` (None for anonymous viewers)."""
+        size = getattr(settings, "VIDEO_FEED_SESSION_SIZE", 100)
+        videos = self.recommendation_service.generate_feed(user, feed_size=size, session_interests=interests)
+        return FeedSession.from_videos(videos, user_id=user.id if user else None)
+
+    def get_page(self, user, interests=None, cursor=None, size=20):
+        """
+        Return ``(session, video_ids, offset)`` for the page at ``cursor``, or
+        the first page of a new session when there is no cursor or its session
+        has expired. Raises ``InvalidFeedCursor`` for tampered cursors and for
+        cursors issued to another user.
+        """
+        user_id = user.id if user else None
+        session, offset = None, 0
+        if cursor:
+            key, offset = self.decode_cursor(cursor)
+            session = self.load(key)
+            if session is not None and session.user_id != user_id:
+                raise InvalidFeedCursor("Invalid cursor")
+        if session is None:
+            session, offset = self.start(user, interests), 0
+
+        session.rerank(interests)
+        video_ids = session.page(offset, size)
+        self.save(session)
+        return session, video_ids, offset
@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from market.benchmarks import BenchmarkRunner, default_scenarios, load_budgets, seed
+from market.benchmarks.harness import DEFAULT_BUDGETS_PATH
+from market.benchmarks.scenarios import DEFAULT_VOLUME
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed benchmark data, measure query counts, DB time and p50/p95 latency of the hot API endpoints, "
+        "compare them with the checked-in budgets and write a JSON report. Seed data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Measured iterations per scenario")
+        parser.add_argument("--warmup", type=int, default=2, help="Unmeasured iterations per scenario")
+        parser.add_argument("--scenario", action="append", default=[], help="Only run this scenario (repeatable)")
+        for name, count in DEFAULT_VOLUME.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=count, dest=name, help=f"Seeded {name}")
+        parser.add_argument("--warm-cache", action="store_true", help="Keep the cache between iterations")
+        parser.add_argument("--skip-latency", action="store_true", help="Only enforce query budgets (noisy CI hosts)")
+        parser.add_argument("--budgets", default=str(DEFAULT_BUDGETS_PATH), help="Budgets JSON file")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+        parser.add_argument(
+            "--update-budgets", action="store_true", help="Rewrite the budgets file from this run instead of checking"
+        )
+        parser.add_argument("--no-fail", action="store_true", help="Exit 0 even when a budget is exceeded")
+
+    def handle(self, *args, **options):
+        runner = BenchmarkRunner(
+            budgets=load_budgets(options["budgets"]),
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            cold_cache=not options["warm_cache"],
+            check_latency=not options["skip_latency"],
+        )
+        volume = {name: options[name] for name in DEFAULT_VOLUME}
+
+        report = None
+        try:
+            with transaction.atomic():
+                data = seed(volume)
+                scenarios = default_scenarios(data)
+                if options["scenario"]:
+                    scenarios = [scenario for scenario in scenarios if scenario.name in options["scenario"]]
+                report = runner.run(scenarios, metadata={"volume": volume})
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        rendered = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(rendered + "\n")
+        else:
+            self.stdout.write(rendered)
+
+        for name, result in report["results"].items():
+            line = (
+                f"{name}: {result['queries']} queries, db {result['db_ms']}ms, "
+                f"p50 {result['p50_ms']}ms, p95 {result['p95_ms']}ms"
+            )
+            if result["status"] == "ok":
+                self.stderr.write(self.style.SUCCESS(line))
+            else:
+                problems = result["error"] or "; ".join(result["violations"])
+                self.stderr.write(self.style.ERROR(f"{line} [{result['status']}] {problems}"))
+
+        if options["update_budgets"]:
+            budgets = {**load_budgets(options["budgets"]), **BenchmarkRunner.budgets_from_report(report)}
+            with open(options["budgets"], "w") as f:
+                f.write(json.dumps(budgets, indent=2, sort_keys=True) + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Budgets written to {options['budgets']}"))
+        elif not report["passed"] and not options["no_fail"]:
+            raise CommandError("Endpoint benchmarks exceeded their budgets or failed")
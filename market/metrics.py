@@ -0,0 +1,515 @@
+"""
+Histogram metrics backend for ``market.monitoring``.
+
+Each series (metric name + tags) is aggregated into fixed time slots of
+``SLOT_SECONDS``. A slot holds a count, sum, sum of squares, min, max, the
+latest value and, for histograms and timers, counts per fixed bucket, so
+recording is O(1) and a window query merges at most one hour of slots
+without copying or sorting raw values. Percentiles are interpolated within
+their bucket (and clamped to the observed min/max).
+
+Recorded values are also queued per slot and flushed every
+``METRICS_FLUSH_INTERVAL`` seconds by a background thread into Redis hashes
+(one Lua call per slot, atomic increments), so stats and the Prometheus
+exposition cover every worker process. Without a Redis-backed default cache
+only this process is reported.
+"""
+
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+COUNTER, GAUGE, HISTOGRAM, TIMER = "counter", "gauge", "histogram", "timer"
+
+# Upper bounds (inclusive) of the histogram buckets; values above the last one land in the +Inf bucket
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(float(4**i) for i in range(4, 14))  # 256 B .. 64 MB
+
+SLOT_SECONDS = 10
+HISTORY_SECONDS = 3600
+
+KEY_PREFIX = "metrics"
+SERIES_KEY = f"{KEY_PREFIX}:series"
+TOTALS_KEY = f"{KEY_PREFIX}:totals"
+
+FLUSH_SCRIPT = """
+-- KEYS[1]: hash of one slot (or of the totals); ARGV[1]: TTL in seconds (0 keeps the hash)
+-- ARGV[2..]: triples of op ('incr', 'min', 'max' or 'set'), field, value
+for i = 2, #ARGV, 3 do
+    local op, field, value = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    if op == 'incr' then
+        redis.call('HINCRBYFLOAT', KEYS[1], field, value)
+    elseif op == 'set' then
+        redis.call('HSET', KEYS[1], field, value)
+    else
+        local current = tonumber(redis.call('HGET', KEYS[1], field))
+        local number = tonumber(value)
+        if current == nil or (op == 'min' and number < current) or (op == 'max' and number > current) then
+            redis.call('HSET', KEYS[1], field, value)
+        end
+    end
+end
+if tonumber(ARGV[1]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+def slot_key(epoch):
+    return f"{KEY_PREFIX}:slot:{epoch}"
+
+
+def buckets_for(name):
+    return SIZE_BUCKETS if name.endswith("_bytes") else DEFAULT_BUCKETS
+
+
+@dataclass(frozen=True)
+class SeriesInfo:
+    name: str
+    labels: Tuple[Tuple[str, str], ...]
+    type: str
+    bounds: Tuple[float, ...] = ()
+
+    @property
+    def size(self):
+        """Number of bucket counters: one per bound plus +Inf."""
+        return len(self.bounds) + 1 if self.bounds else 0
+
+    @property
+    def id(self):
+        return json.dumps([self.name, self.labels], separators=(",", ":"))
+
+    def to_json(self):
+        return json.dumps({"name": self.name, "labels": self.labels, "type": self.type, "bounds": self.bounds})
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        return cls(data["name"], tuple(tuple(label) for label in data["labels"]), data["type"], tuple(data["bounds"]))
+
+
+class Slot:
+    """Aggregate of the values of one series over one time slot (or any merge of slots)."""
+
+    __slots__ = ("count", "sum", "sum_sq", "min", "max", "latest", "buckets")
+
+    def __init__(self, size=0):
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.latest = None
+        self.buckets = [0] * size
+
+    def observe(self, value, index=None):
+        self.count += 1
+        self.sum += value
+        self.sum_sq += value * value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.latest = value
+        if index is not None:
+            self.buckets[index] += 1
+
+    def merge(self, other):
+        """Fold ``other`` (a later slot, when merging in time order) into this one."""
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.latest is not None:
+            self.latest = other.latest
+        if len(self.buckets) < len(other.buckets):
+            self.buckets.extend([0] * (len(other.buckets) - len(self.buckets)))
+        for index, count in enumerate(other.buckets):
+            self.buckets[index] += count
+        return self
+
+    def flush_args(self, series_id):
+        args = [
+            "incr", f"{series_id}|count", self.count,
+            "incr", f"{series_id}|sum", repr(self.sum),
+            "incr", f"{series_id}|sum_sq", repr(self.sum_sq),
+            "min", f"{series_id}|min", repr(self.min),
+            "max", f"{series_id}|max", repr(self.max),
+        ]  # fmt: skip
+        if self.latest is not None:
+            args += ["set", f"{series_id}|latest", repr(self.latest)]
+        for index, count in enumerate(self.buckets):
+            if count:
+                args += ["incr", f"{series_id}|b{index}", count]
+        return args
+
+    @classmethod
+    def from_fields(cls, fields, size):
+        slot = cls(size)
+        slot.count = int(float(fields.get("count", 0)))
+        slot.sum = float(fields.get("sum", 0))
+        slot.sum_sq = float(fields.get("sum_sq", 0))
+        slot.min = float(fields.get("min", math.inf))
+        slot.max = float(fields.get("max", -math.inf))
+        slot.latest = float(fields["latest"]) if "latest" in fields else None
+        for index in range(size):
+            slot.buckets[index] = int(float(fields.get(f"b{index}", 0)))
+        return slot
+
+    def percentile(self, bounds, q):
+        """Estimate of the ``q`` quantile (0..1) from the bucket counts."""
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            if not count:
+                continue
+            if cumulative + count >= rank:
+                lower = max(bounds[index - 1] if index > 0 else self.min, self.min)
+                upper = min(bounds[index] if index < len(bounds) else self.max, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+
+def group_fields(raw):
+    """``{series_id: {field: value}}`` from a Redis hash of ``<series_id>|<field>`` entries."""
+    grouped = {}
+    for key, value in raw.items():
+        key, value = key.decode() if isinstance(key, bytes) else key, value.decode() if isinstance(value, bytes) else value
+        series_id, _, name = key.rpartition("|")
+        grouped.setdefault(series_id, {})[name] = value
+    return grouped
+
+
+class RedisMetricsBackend:
+    """Shares flushed slots and totals between processes through Redis hashes."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._script = connection.register_script(FLUSH_SCRIPT)
+
+    def flush(self, new_series, slots, totals):
+        pipe = self._connection.pipeline(transaction=False)
+        if new_series:
+            pipe.hset(SERIES_KEY, mapping={info.id: info.to_json() for info in new_series})
+        ttl = HISTORY_SECONDS + 2 * SLOT_SECONDS
+        for epoch, series_slots in slots.items():
+            args = [ttl]
+            for series_id, slot in series_slots.items():
+                args += slot.flush_args(series_id)
+            self._script(keys=[slot_key(epoch)], args=args, client=pipe)
+        if totals:
+            args = [0]
+            for series_id, slot in totals.items():
+                args += slot.flush_args(series_id)
+            self._script(keys=[TOTALS_KEY], args=args, client=pipe)
+        pipe.execute()
+
+    def series(self):
+        return {
+            (key.decode() if isinstance(key, bytes) else key): SeriesInfo.from_json(value)
+            for key, value in self._connection.hgetall(SERIES_KEY).items()
+        }
+
+    def slots(self, epochs):
+        pipe = self._connection.pipeline(transaction=False)
+        for epoch in epochs:
+            pipe.hgetall(slot_key(epoch))
+        return {epoch: group_fields(raw) for epoch, raw in zip(epochs, pipe.execute())}
+
+    def totals(self):
+        return group_fields(self._connection.hgetall(TOTALS_KEY))
+
+
+class MetricsRegistry:
+    """
+    Records metric values and answers windowed stats and Prometheus scrapes.
+    One lock guards all series; every operation under it is O(1).
+    """
+
+    def __init__(self, backend=None, flush_interval=None):
+        self._lock = threading.Lock()
+        self._series = {}  # (name, labels) -> SeriesInfo
+        self._by_id = {}  # series id -> SeriesInfo
+        self._slots = {}  # epoch -> {series id: Slot}, this process only
+        self._totals = {}  # series id -> Slot since the process started
+        self._pending_slots = {}  # not yet flushed to the backend
+        self._pending_totals = {}
+        self._new_series = []
+        self._last_epoch = None
+        self._backend = backend
+        self._backend_resolved = backend is not None
+        self._flush_interval = flush_interval
+        self._flusher_pid = None
+
+    @property
+    def backend(self) -> Optional[RedisMetricsBackend]:
+        if not self._backend_resolved:
+            self._backend_resolved = True
+            try:
+                from django_redis import get_redis_connection
+
+                self._backend = RedisMetricsBackend(get_redis_connection("default"))
+            except Exception:
+                # Non-Redis cache backend (e.g. LocMemCache) or django_redis missing
+                self._backend = None
+        return self._backend
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is None:
+            return getattr(settings, "METRICS_FLUSH_INTERVAL", 10)
+        return self._flush_interval
+
+    def record(self, name, value, tags=None, metric_type=GAUGE, now=None):
+        labels = tuple(sorted((str(key), str(label)) for key, label in tags.items())) if tags else ()
+        epoch = int((time.time() if now is None else now) // SLOT_SECONDS)
+        shared = self.backend is not None
+
+        with self._lock:
+            info = self._series.get((name, labels))
+            if info is None:
+                info = self._register(name, labels, metric_type)
+            index = bisect.bisect_left(info.bounds, value) if info.bounds else None
+
+            targets = [self._slots.setdefault(epoch, {}), self._totals]
+            if shared:
+                targets += [self._pending_slots.setdefault(epoch, {}), self._pending_totals]
+            for slots in targets:
+                slot = slots.get(info.id)
+                if slot is None:
+                    slot = slots[info.id] = Slot(info.size)
+                slot.observe(value, index)
+
+            if epoch != self._last_epoch:
+                self._last_epoch = epoch
+                oldest = epoch - HISTORY_SECONDS // SLOT_SECONDS
+                for stale in [stale for stale in self._slots if stale < oldest]:
+                    del self._slots[stale]
+
+        if shared:
+            self._ensure_flusher()
+
+    def _register(self, name, labels, metric_type):
+        bounds = buckets_for(name) if metric_type in (HISTOGRAM, TIMER) else ()
+        info = SeriesInfo(name, labels, metric_type, bounds)
+        self._series[(name, labels)] = info
+        self._by_id[info.id] = info
+        self._new_series.append(info)
+        return info
+
+    def _ensure_flusher(self):
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            if self._flusher_pid is not None:
+                # Forked child: the parent flushes what it had queued
+                self._pending_slots, self._pending_totals = {}, {}
+                self._new_series = list(self._by_id.values())
+            self._flusher_pid = pid
+        threading.Thread(target=self._flush_loop, daemon=True, name="metrics-flusher").start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Push queued slots and totals to the shared backend."""
+        backend = self.backend
+        if backend is None:
+            return
+        with self._lock:
+            new_series, self._new_series = self._new_series, []
+            slots, self._pending_slots = self._pending_slots, {}
+            totals, self._pending_totals = self._pending_totals, {}
+        if not (new_series or slots or totals):
+            return
+        try:
+            backend.flush(new_series, slots, totals)
+        except Exception as e:
+            # Values are dropped rather than queued without bound; series are registered again next time
+            logger.warning(f"Metrics flush failed, dropping {len(slots)} slots: {e}")
+            with self._lock:
+                self._new_series = new_series + self._new_series
+
+    def _window_slots(self, start, end):
+        """``{epoch: {series id: Slot}}`` for epochs start..end, across processes when shared."""
+        backend = self.backend
+        if backend is not None:
+            try:
+                epochs = list(range(start, end + 1))
+                known = {**backend.series(), **self._by_id}
+                merged = {}
+                for epoch, grouped in backend.slots(epochs).items():
+                    merged[epoch] = {
+                        series_id: Slot.from_fields(fields, known[series_id].size)
+                        for series_id, fields in grouped.items()
+                        if series_id in known
+                    }
+                with self._lock:
+                    for epoch in epochs:
+                        for series_id, slot in self._pending_slots.get(epoch, {}).items():
+                            merged[epoch].setdefault(series_id, Slot()).merge(slot)
+                return merged, known
+            except Exception as e:
+                logger.warning(f"Shared metrics unavailable, reporting this process only: {e}")
+        with self._lock:
+            return (
+                {epoch: dict(self._slots.get(epoch, {})) for epoch in range(start, end + 1)},
+                dict(self._by_id),
+            )
+
+    def window(self, name, window_seconds, now=None):
+        """Merged ``Slot`` of every series called ``name`` over the last ``window_seconds``, and its info."""
+        now = time.time() if now is None else now
+        end = int(now // SLOT_SECONDS)
+        start = int((now - window_seconds) // SLOT_SECONDS)
+        slots, known = self._window_slots(start, end)
+
+        merged, info = None, None
+        for epoch in range(start, end + 1):
+            for series_id, slot in slots.get(epoch, {}).items():
+                series = known.get(series_id)
+                if series is None or series.name != name:
+                    continue
+                info = info or series
+                merged = (merged or Slot(len(slot.buckets))).merge(slot)
+        return merged, info
+
+    def stats(self, name, window_seconds=60, now=None) -> Dict:
+        """Statistical summary of ``name`` over the window; empty when nothing was recorded."""
+        slot, info = self.window(name, window_seconds, now)
+        if slot is None or not slot.count:
+            return {}
+
+        stats = {
+            "type": info.type,
+            "count": slot.count,
+            "sum": slot.sum,
+            "avg": slot.sum / slot.count,
+            "min": slot.min,
+            "max": slot.max,
+            "latest": slot.latest if slot.latest is not None else 0,
+            "window_seconds": window_seconds,
+        }
+        if slot.count >= 2:
+            variance = (slot.sum_sq - slot.sum * slot.sum / slot.count) / (slot.count - 1)
+            stats["stddev"] = math.sqrt(max(variance, 0.0))
+            # Percentiles need the bucket counts, which only histograms and timers keep
+            if info.bounds:
+                stats.update(
+                    {
+                        "median": slot.percentile(info.bounds, 0.5),
+                        "p95": slot.percentile(info.bounds, 0.95),
+                        "p99": slot.percentile(info.bounds, 0.99),
+                    }
+                )
+        return stats
+
+    def names(self):
+        backend = self.backend
+        names = {info.name for info in self._by_id.values()}
+        if backend is not None:
+            try:
+                names |= {info.name for info in backend.series().values()}
+            except Exception as e:
+                logger.warning(f"Shared metrics unavailable: {e}")
+        return sorted(names)
+
+    def _all_totals(self):
+        backend = self.backend
+        if backend is not None:
+            try:
+                known = {**backend.series(), **self._by_id}
+                totals = {
+                    series_id: Slot.from_fields(fields, known[series_id].size)
+                    for series_id, fields in backend.totals().items()
+                    if series_id in known
+                }
+                with self._lock:
+                    for series_id, slot in self._pending_totals.items():
+                        totals.setdefault(series_id, Slot()).merge(slot)
+                return totals, known
+            except Exception as e:
+                logger.warning(f"Shared metrics unavailable, exposing this process only: {e}")
+        with self._lock:
+            return dict(self._totals), dict(self._by_id)
+
+    def prometheus_text(self) -> str:
+        """Totals of every series in the Prometheus text exposition format (0.0.4)."""
+        totals, known = self._all_totals()
+        by_name = {}
+        for series_id, slot in totals.items():
+            by_name.setdefault(known[series_id].name, []).append((known[series_id], slot))
+
+        lines = []
+        for name in sorted(by_name):
+            metric = prometheus_name(name)
+            series = sorted(by_name[name], key=lambda item: item[0].labels)
+            kind = series[0][0].type
+            lines.append(f"# TYPE {metric} {'histogram' if kind in (HISTOGRAM, TIMER) else kind}")
+            for info, slot in series:
+                if kind == COUNTER:
+                    lines.append(f"{metric}{format_labels(info.labels)} {format_value(slot.sum)}")
+                elif kind == GAUGE:
+                    lines.append(f"{metric}{format_labels(info.labels)} {format_value(slot.latest or 0)}")
+                else:
+                    cumulative = 0
+                    for bound, count in zip((*info.bounds, math.inf), slot.buckets):
+                        cumulative += count
+                        labels = format_labels((*info.labels, ("le", format_value(bound))))
+                        lines.append(f"{metric}_bucket{labels} {cumulative}")
+                    lines.append(f"{metric}_sum{format_labels(info.labels)} {format_value(slot.sum)}")
+                    lines.append(f"{metric}_count{format_labels(info.labels)} {slot.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._by_id.clear()
+            self._slots.clear()
+            self._totals.clear()
+            self._pending_slots.clear()
+            self._pending_totals.clear()
+            self._new_series.clear()
+            self._last_epoch = None
+
+
+def prometheus_name(name):
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def escape_label_value(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{prometheus_name(key)}="{escape_label_value(value)}"' for key, value in labels) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+metrics_registry = MetricsRegistry()
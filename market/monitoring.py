@@ -16,10 +16,9 @@ import json
 import logging
 import queue
 import smtplib
-import statistics
 import threading
 import time
-from collections import defaultdict, deque
+from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
@@ -34,6 +33,8 @@ from django.core.cache import cache
 from django.db import connection
 from django.utils import timezone
 
+from .metrics import MetricsRegistry, metrics_registry
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,17 +55,6 @@ class MetricType(Enum):
     TIMER = "timer"  # Duration measurements
 
 
-@dataclass
-class Metric:
-    """Individual metric measurement."""
-
-    name: str
-    value: float
-    tags: Dict[str, str] = field(default_factory=dict)
-    timestamp: datetime = field(default_factory=timezone.now)
-    metric_type: MetricType = MetricType.GAUGE
-
-
 @dataclass
 class Alert:
     """Alert definition and status."""
@@ -84,72 +74,36 @@ class Alert:
 class MetricsCollector:
     """
     Collects and aggregates metrics for location-based operations.
+
+    Values go into fixed-bucket histograms (see ``market.metrics``), so
+    recording is O(1), stats over a window never sort raw values, and stats
+    are aggregated across worker processes when Redis is available.
     """
 
-    def __init__(self):
-        self.metrics = defaultdict(deque)  # Store recent metrics per name
-        self.metric_locks = defaultdict(threading.Lock)
-        self.max_history = 1000  # Keep last 1000 measurements per metric
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or metrics_registry
         self.aggregation_window = 60  # Aggregate over 60 seconds
 
     def record_metric(
         self, name: str, value: float, tags: Optional[Dict[str, str]] = None, metric_type: MetricType = MetricType.GAUGE
     ):
         """Record a metric measurement."""
-        metric = Metric(name=name, value=value, tags=tags or {}, metric_type=metric_type)
-
-        with self.metric_locks[name]:
-            self.metrics[name].append(metric)
-
-            # Maintain max history
-            while len(self.metrics[name]) > self.max_history:
-                self.metrics[name].popleft()
+        self.registry.record(name, value, tags, metric_type.value)
 
     def get_metric_stats(self, metric_name: str, window_seconds: Optional[int] = None) -> Dict:
-        """Get statistical summary of a metric."""
-        window_seconds = window_seconds or self.aggregation_window
-        cutoff_time = timezone.now() - timedelta(seconds=window_seconds)
-
-        with self.metric_locks[metric_name]:
-            recent_metrics = [m for m in self.metrics[metric_name] if m.timestamp >= cutoff_time]
-
-        if not recent_metrics:
-            return {}
-
-        values = [m.value for m in recent_metrics]
-
-        stats = {
-            "count": len(values),
-            "sum": sum(values),
-            "avg": statistics.mean(values),
-            "min": min(values),
-            "max": max(values),
-            "latest": values[-1] if values else 0,
-            "window_seconds": window_seconds,
-        }
-
-        # Add percentiles for distributions
-        if len(values) >= 2:
-            sorted_values = sorted(values)
-            stats.update(
-                {
-                    "median": statistics.median(sorted_values),
-                    "p95": sorted_values[int(len(sorted_values) * 0.95)],
-                    "p99": sorted_values[int(len(sorted_values) * 0.99)],
-                    "stddev": statistics.stdev(values) if len(values) > 1 else 0,
-                }
-            )
-
-        return stats
+        """
+        Get statistical summary of a metric. Histograms and timers also report
+        median, p95 and p99, estimated from their buckets.
+        """
+        return self.registry.stats(metric_name, window_seconds or self.aggregation_window)
 
     def get_all_metrics(self) -> Dict[str, Dict]:
         """Get stats for all metrics."""
-        all_stats = {}
-
-        for metric_name in list(self.metrics.keys()):
-            all_stats[metric_name] = self.get_metric_stats(metric_name)
+        return {metric_name: self.get_metric_stats(metric_name) for metric_name in self.registry.names()}
 
-        return all_stats
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return self.registry.prometheus_text()
 
 
 class PerformanceMonitor:
@@ -170,9 +124,11 @@ class PerformanceMonitor:
                 "start_time": time.time(),
                 "user_location": user_location,
             }
+            in_flight = len(self.active_requests)
 
         # Record request start
         self.metrics.record_metric("requests_started", 1, {"endpoint": endpoint}, MetricType.COUNTER)
+        self.metrics.record_metric("requests_in_flight", in_flight)
 
     def end_request_tracking(
         self, request_id: str, status_code: int, response_size: Optional[int] = None, error: Optional[str] = None
@@ -180,10 +136,13 @@ class PerformanceMonitor:
         """End tracking a request."""
         with self.request_lock:
             request_info = self.active_requests.pop(request_id, None)
+            in_flight = len(self.active_requests)
 
         if not request_info:
             return
 
+        self.metrics.record_metric("requests_in_flight", in_flight)
+
         duration = time.time() - request_info["start_time"]
         endpoint = request_info["endpoint"]
 
@@ -249,9 +208,13 @@ class ResourceMonitor:
         """Main monitoring loop."""
         while self.monitoring:
             try:
+                start_time = time.time()
                 self._collect_system_metrics()
                 self._collect_database_metrics()
                 self._collect_cache_metrics()
+                self.metrics.record_metric(
+                    "resource_collection_duration_seconds", time.time() - start_time, metric_type=MetricType.TIMER
+                )
                 time.sleep(self.collection_interval)
             except Exception as e:
                 logger.error(f"Resource monitoring error: {e}")
@@ -272,10 +235,10 @@ class ResourceMonitor:
         disk = psutil.disk_usage("/")
         self.metrics.record_metric("system_disk_percent", (disk.used / disk.total) * 100)
 
-        # Network I/O
+        # Network I/O (psutil reports running totals, so they are gauges rather than increments)
         network = psutil.net_io_counters()
-        self.metrics.record_metric("system_network_bytes_sent", network.bytes_sent, metric_type=MetricType.COUNTER)
-        self.metrics.record_metric("system_network_bytes_recv", network.bytes_recv, metric_type=MetricType.COUNTER)
+        self.metrics.record_metric("system_network_bytes_sent", network.bytes_sent)
+        self.metrics.record_metric("system_network_bytes_recv", network.bytes_recv)
 
         # Active connections
         connections = len(psutil.net_connections(kind="tcp"))
@@ -317,13 +280,9 @@ class ResourceMonitor:
 
             self.metrics.record_metric("cache_connected_clients", redis_info.get("connected_clients", 0))
 
-            self.metrics.record_metric(
-                "cache_keyspace_hits", redis_info.get("keyspace_hits", 0), metric_type=MetricType.COUNTER
-            )
+            self.metrics.record_metric("cache_keyspace_hits", redis_info.get("keyspace_hits", 0))
 
-            self.metrics.record_metric(
-                "cache_keyspace_misses", redis_info.get("keyspace_misses", 0), metric_type=MetricType.COUNTER
-            )
+            self.metrics.record_metric("cache_keyspace_misses", redis_info.get("keyspace_misses", 0))
 
         except Exception as e:
             logger.error(f"Cache metrics collection error: {e}")
@@ -430,6 +389,10 @@ class AlertManager:
             except Exception as e:
                 logger.error(f"Error checking rule {rule['name']}: {e}")
 
+        for level in AlertLevel:
+            active = sum(1 for alert in self.active_alerts.values() if not alert.resolved and alert.level == level)
+            self.metrics.record_metric("alerts_active", active, {"level": level.value})
+
     def _check_single_rule(self, rule: Dict):
         """Check a single alert rule."""
         metric_stats = self.metrics.get_metric_stats(rule["metric_name"])
@@ -437,7 +400,7 @@ class AlertManager:
         if not metric_stats:
             return  # No data available
 
-        current_value = metric_stats.get("latest", 0)
+        current_value = self._rule_value(metric_stats)
         threshold = rule["threshold"]
         condition = rule["condition"]
 
@@ -461,6 +424,16 @@ class AlertManager:
         else:
             self._handle_resolved_alert(rule)
 
+    @staticmethod
+    def _rule_value(metric_stats: Dict) -> float:
+        """Value a rule compares: total for counters, average for distributions, latest for gauges."""
+        metric_type = metric_stats.get("type")
+        if metric_type == MetricType.COUNTER.value:
+            return metric_stats.get("sum", 0)
+        if metric_type in (MetricType.HISTOGRAM.value, MetricType.TIMER.value):
+            return metric_stats.get("avg", 0)
+        return metric_stats.get("latest", 0)
+
     def _handle_triggered_alert(self, rule: Dict, current_value: float, metric_stats: Dict):
         """Handle a triggered alert."""
         rule_name = rule["name"]
@@ -485,6 +458,9 @@ class AlertManager:
 
         self.active_alerts[alert_id] = alert
         rule["last_triggered"] = timezone.now()
+        self.metrics.record_metric(
+            "alerts_triggered", 1, {"alert": rule_name, "level": alert.level.value}, MetricType.COUNTER
+        )
 
         # Send notifications
         self._send_notifications(alert)
@@ -518,6 +494,9 @@ class AlertManager:
                     self._send_webhook_notification(alert, channel["config"])
             except Exception as e:
                 logger.error(f"Failed to send {channel['type']} notification: {e}")
+                self.metrics.record_metric(
+                    "alert_notification_failures", 1, {"channel": channel["type"]}, MetricType.COUNTER
+                )
 
     def _send_email_notification(self, alert: Alert, config: Dict):
         """Send email notification."""
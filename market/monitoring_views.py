@@ -0,0 +1,29 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from .monitoring import get_monitoring_components
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _authorized(request):
+    """Staff users, or scrapers presenting ``METRICS_AUTH_TOKEN`` as a bearer token."""
+    token = getattr(settings, "METRICS_AUTH_TOKEN", None)
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if token and header.startswith("Bearer ") and hmac.compare_digest(header[len("Bearer ") :], token):
+        return True
+    user = getattr(request, "user", None)
+    return bool(user and user.is_authenticated and user.is_staff)
+
+
+@require_GET
+def prometheus_metrics(request):
+    """Prometheus text exposition of the marketplace metrics, aggregated across workers."""
+    if not _authorized(request):
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+
+    metrics_collector = get_monitoring_components()[0]
+    return HttpResponse(metrics_collector.prometheus_text(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -11,13 +11,15 @@ from django.contrib.gis.db.models.functions import Distance
 from django.contrib.gis.geos import Point
 from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.utils import timezone
 from rest_framework import serializers
 
 from geo.services import GeoLocationService, GeoProductFilterService
 from market.utils import notify_event
-from producer.models import MarketplaceProduct, Product, Sale
-from producer.serializers import MarketplaceProductSerializer
+from producer.models import Category, MarketplaceProduct, Product, Sale, Subcategory
+from producer.pricing import PriceResolver
+from producer.serializers import CreatorProfileSerializer, MarketplaceProductSerializer, marketplace_product_prefetches
 
 from .locks import lock_manager, view_manager
 from .models import (
@@ -595,6 +597,12 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "is_active", "items", "subtotal", "shipping", "total", "created_at"]
         read_only_fields = ["id", "user", "items", "created_at"]
 
+    def to_representation(self, instance):
+        # Items, subtotal and shipping all walk the items: load them and their products' price tiers once
+        prefetch_related_objects([instance], "items__product__product")
+        PriceResolver.from_context(self.context).prefetch([item.product for item in instance.items.all()])
+        return super().to_representation(instance)
+
     def get_subtotal(self, obj):
         def effective_price(item):
             p = item.product
@@ -1296,6 +1304,73 @@ class ShoppableVideoItemSerializer(serializers.ModelSerializer):
         fields = ["id", "file", "thumbnail", "order", "created_at"]
 
 
+def creator_profile_prefetches(prefix):
+    """Prefetch lookups for rendering the creator profiles found at ``prefix`` with ``CreatorProfileSerializer``."""
+    categories = Category.objects.prefetch_related(
+        Prefetch("subcategories", queryset=Subcategory.objects.filter(is_active=True), to_attr="active_subcategories")
+    )
+    return [
+        f"{prefix}__user",
+        Prefetch(f"{prefix}__categories", queryset=categories),
+        f"{prefix}__video_categories",
+    ]
+
+
+SHOPPABLE_VIDEO_PREFETCHES = [
+    "uploader",
+    "category",
+    "items",
+    *creator_profile_prefetches("uploader__creator_profile"),
+    *creator_profile_prefetches("creator_profile"),
+    "product__product",
+    *marketplace_product_prefetches("product__"),
+    Prefetch("product_tags", queryset=ProductTag.objects.select_related("product__product")),
+    *marketplace_product_prefetches("product_tags__product__"),
+]
+
+
+def build_shoppable_video_context(videos, context):
+    """
+    Load everything ``ShoppableVideoSerializer`` reads for a page of ``videos``
+    in a fixed number of queries and record the per-user sets in ``context``
+    (``liked_ids``, ``saved_ids``, ``followed_user_ids``). Keys already present
+    in ``context`` are kept. Returns ``context``.
+    """
+    videos = list(videos)
+    prefetch_related_objects(videos, *SHOPPABLE_VIDEO_PREFETCHES)
+
+    request = context.get("request")
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        video_ids = [video.id for video in videos]
+        uploader_ids = {video.uploader_id for video in videos if video.uploader_id}
+        if "liked_ids" not in context:
+            likes = VideoLike.objects.filter(user=user, video_id__in=video_ids)
+            context["liked_ids"] = set(likes.values_list("video_id", flat=True))
+        if "saved_ids" not in context:
+            saves = VideoSave.objects.filter(user=user, video_id__in=video_ids)
+            context["saved_ids"] = set(saves.values_list("video_id", flat=True))
+        if "followed_user_ids" not in context:
+            follows = UserFollow.objects.filter(follower=user, following_id__in=uploader_ids)
+            context["followed_user_ids"] = set(follows.values_list("following_id", flat=True))
+    else:
+        context.setdefault("liked_ids", set())
+        context.setdefault("saved_ids", set())
+        context.setdefault("followed_user_ids", set())
+
+    products = [video.product for video in videos]
+    products += [tag.product for video in videos for tag in video.product_tags.all()]
+    PriceResolver.from_context(context).prefetch(products)
+    return context
+
+
+class ShoppableVideoListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        videos = list(data.all() if hasattr(data, "all") else data)
+        build_shoppable_video_context(videos, self.context)
+        return super().to_representation(videos)
+
+
 class ShoppableVideoSerializer(serializers.ModelSerializer):
     uploader_name = serializers.CharField(source="uploader.username", read_only=True)
     uploader_profile = serializers.SerializerMethodField()
@@ -1310,10 +1385,12 @@ class ShoppableVideoSerializer(serializers.ModelSerializer):
     )
     is_liked = serializers.SerializerMethodField()
     is_saved = serializers.SerializerMethodField()
+    is_following_uploader = serializers.SerializerMethodField()
     product_tags = serializers.SerializerMethodField()
 
     class Meta:
         model = ShoppableVideo
+        list_serializer_class = ShoppableVideoListSerializer
         fields = [
             "id",
             "uploader",
@@ -1342,9 +1419,17 @@ class ShoppableVideoSerializer(serializers.ModelSerializer):
             "created_at",
             "is_liked",
             "is_saved",
+            "is_following_uploader",
         ]
         read_only_fields = ["uploader", "views_count", "likes_count", "shares_count", "created_at", "trend_score"]
 
+    def _creator_profile_data(self, profile):
+        # The uploader's profile and the video's creator profile are usually the same; serialize each once per page
+        serialized = self.context.setdefault("creator_profiles", {})
+        if profile.pk not in serialized:
+            serialized[profile.pk] = CreatorProfileSerializer(profile, context=self.context).data
+        return serialized[profile.pk]
+
     def get_is_liked(self, obj):
         request = self.context.get("request")
         liked_ids = self.context.get("liked_ids")
@@ -1356,10 +1441,8 @@ class ShoppableVideoSerializer(serializers.ModelSerializer):
 
     def get_uploader_profile(self, obj):
         try:
-            from producer.serializers import CreatorProfileSerializer
-
             if hasattr(obj.uploader, "creator_profile"):
-                return CreatorProfileSerializer(obj.uploader.creator_profile, context=self.context).data
+                return self._creator_profile_data(obj.uploader.creator_profile)
         except Exception:
             return None
         return None
@@ -1383,9 +1466,7 @@ class ShoppableVideoSerializer(serializers.ModelSerializer):
     def get_creator_profile(self, obj):
         try:
             if hasattr(obj, "creator_profile") and obj.creator_profile is not None:
-                from producer.serializers import CreatorProfileSerializer
-
-                return CreatorProfileSerializer(obj.creator_profile, context=self.context).data
+                return self._creator_profile_data(obj.creator_profile)
         except Exception:
             return None
         return None
@@ -1399,6 +1480,15 @@ class ShoppableVideoSerializer(serializers.ModelSerializer):
             return VideoSave.objects.filter(user=request.user, video=obj).exists()
         return False
 
+    def get_is_following_uploader(self, obj):
+        request = self.context.get("request")
+        followed_user_ids = self.context.get("followed_user_ids")
+        if followed_user_ids is not None:
+            return obj.uploader_id in followed_user_ids
+        if request and request.user.is_authenticated and obj.uploader_id:
+            return UserFollow.objects.filter(follower=request.user, following_id=obj.uploader_id).exists()
+        return False
+
     def create(self, validated_data):
         # If request user is authenticated, set uploader; otherwise allow creator_profile via payload
         request = self.context.get("request")
@@ -1428,7 +1518,7 @@ class ShoppableVideoSerializer(serializers.ModelSerializer):
         tags = getattr(obj, "product_tags", None)
         if tags is None:
             return []
-        return ProductTagSerializer(tags.all(), many=True).data
+        return ProductTagSerializer(tags.all(), many=True, context=self.context).data
 
 
 class VideoLikeSerializer(serializers.ModelSerializer):
@@ -1491,9 +1581,7 @@ class ProductTagSerializer(serializers.ModelSerializer):
 
     def get_product_detail(self, obj):
         try:
-            from producer.serializers import MarketplaceProductSerializer
-
-            return MarketplaceProductSerializer(obj.product).data
+            return MarketplaceProductSerializer(obj.product, context=self.context).data
         except Exception:
             return None
 
@@ -2215,14 +2303,12 @@ class EnhancedMarketplaceProductSerializer(LocationBasedProductSerializer):
 
     def get_reviews_count(self, obj):
         """Get total number of reviews."""
-        return obj.marketplaceproductreview_set.count()
+        return obj.review_count
 
     def get_average_rating(self, obj):
-        """Calculate average rating."""
-        reviews = obj.marketplaceproductreview_set.all()
-        if reviews:
-            total_rating = sum(review.rating for review in reviews)
-            return round(total_rating / len(reviews), 1)
+        """Average rating from the stored review aggregates."""
+        if obj.review_count:
+            return round(obj.rating_sum / obj.review_count, 1)
         return None
 
     def get_seller_info(self, obj):
@@ -0,0 +1,164 @@
+"""
+Tag-based cache invalidation without keyspace scans.
+
+Every tag (``trending``, ``producer``, ``category:<name>``, ``region:<name>``,
+``user:<id>`` ...) has a generation counter in the cache. An entry is stored
+together with the generations of its tags at write time and is only served
+while all of them are unchanged, so invalidating a tag is a single ``INCR``
+however many entries carry it; stale entries are never read again and simply
+expire with their TTL.
+
+A read fetches the entry and its tag generations in one ``get_many`` call.
+A value computed after a miss is stored under the generations of that read,
+not those current when it is written, so an invalidation that lands while
+the value is being computed still makes it stale.
+A missing generation (never set, or evicted) makes the entry a miss, so an
+evicted counter can never resurrect stale data; new counters start from the
+current time in milliseconds rather than zero for the same reason.
+
+Per-tag hit, miss and invalidation counts are kept per process and exposed
+by ``stats()``.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+GENERATION_PREFIX = "tagcache:gen"
+# Counters outlive any entry TTL; one that expires only turns the entries of its tag into misses
+GENERATION_TIMEOUT = 30 * 24 * 3600
+
+
+def generation_key(tag):
+    return f"{GENERATION_PREFIX}:{tag}"
+
+
+def category_tag(name):
+    return f"category:{str(name).strip().lower()}"
+
+
+def filter_category_tags(value):
+    """
+    The tags of the categories a ``category`` filter value can select: the
+    node with that id or every node whose name contains it, at any level of
+    the taxonomy, each tagged by its top-level category's name, which is
+    what product changes invalidate.
+    """
+    from producer.taxonomy import LEVELS, get_taxonomy
+
+    taxonomy = get_taxonomy()
+    fragment = str(value).strip().lower()
+    names = set()
+    for level in LEVELS:
+        for node in taxonomy.by_id[level].values():
+            if str(node.id) == fragment or fragment in node.name.lower():
+                while node.parent is not None:
+                    node = node.parent
+                names.add(node.name)
+    return sorted(category_tag(name) for name in names)
+
+
+def request_cache_tags(request, *tags):
+    """``tags`` plus the category tags of a ``?category=`` filter on ``request``."""
+    tags = list(tags)
+    category = request.query_params.get("category")
+    if category:
+        tags.extend(filter_category_tags(category))
+    return tags
+
+
+class TaggedCache:
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self._stats = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key, tags=(), default=None):
+        return self.lookup(key, tags, default)[0]
+
+    def lookup(self, key, tags=(), default=None):
+        """
+        ``(value, generations)``: the entry (``default`` when missing or stale)
+        and, on a miss, the tag generations read alongside it. Pass those to
+        ``set`` when storing the value computed for the miss, so an
+        invalidation that lands while it is being computed leaves it stale.
+        """
+        tags = sorted(set(tags))
+        found = self.cache.get_many([key, *(generation_key(tag) for tag in tags)])
+        entry = found.get(key)
+        generations = {tag: found[generation_key(tag)] for tag in tags if generation_key(tag) in found}
+        fresh = entry is not None and all(tag in generations and entry[1].get(tag) == generations[tag] for tag in tags)
+        self._record("hits" if fresh else "misses", tags)
+        if fresh:
+            return entry[0], generations
+        missing = [tag for tag in tags if tag not in generations]
+        if missing:
+            generations.update(self.generations(missing))
+        return default, generations
+
+    def set(self, key, value, timeout, tags=(), generations=None):
+        """
+        Store ``value`` under the ``generations`` its inputs were read at (from
+        ``lookup``); the current ones when not given.
+        """
+        if generations is None:
+            generations = self.generations(tags)
+        self.cache.set(key, (value, {tag: generations[tag] for tag in set(tags)}), timeout)
+
+    def get_or_set(self, key, default_func, timeout, tags=()):
+        marker = object()
+        value, generations = self.lookup(key, tags, default=marker)
+        if value is marker:
+            value = default_func()
+            self.set(key, value, timeout, tags, generations=generations)
+        return value
+
+    def generations(self, tags):
+        """Current generation of each tag, creating missing counters."""
+        keys = {generation_key(tag): tag for tag in set(tags)}
+        found = self.cache.get_many(list(keys))
+        for key in keys.keys() - found.keys():
+            self.cache.add(key, int(time.time() * 1000), GENERATION_TIMEOUT)
+            found[key] = self.cache.get(key)
+        return {tag: found[key] for key, tag in keys.items()}
+
+    def invalidate(self, *tags):
+        """Invalidate every entry carrying any of ``tags``."""
+        for tag in set(tags):
+            key = generation_key(tag)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                # No counter yet: no entry can carry this generation, but start one so later writes are tracked
+                self.cache.add(key, int(time.time() * 1000), GENERATION_TIMEOUT)
+        self._record("invalidations", tags)
+        logger.debug(f"Invalidated cache tags: {sorted(set(tags))}")
+
+    def stats(self):
+        """``{tag: {"hits": n, "misses": n, "invalidations": n}}`` for this process."""
+        with self._lock:
+            return {
+                tag: {name: counts[name] for name in ("hits", "misses", "invalidations")}
+                for tag, counts in sorted(self._stats.items())
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _record(self, name, tags):
+        with self._lock:
+            for tag in set(tags):
+                self._stats[tag][name] += 1
+
+
+tagged_cache = TaggedCache()
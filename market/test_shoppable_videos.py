@@ -1,10 +1,19 @@
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from market.factories import MarketplaceProductFactory, UserFactory
-from market.models import ShoppableVideo, VideoLike
+from market.models import ProductTag, ShoppableVideo, UserFollow, VideoLike
+from market.recommendation import VideoRecommendationService
+from producer.models import CreatorProfile
 
 
 class ShoppableVideoAPITestCase(APITestCase):
@@ -94,3 +103,93 @@ class ShoppableVideoAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         video.refresh_from_db()
         self.assertEqual(video.views_count, 1)
+
+
+class ShoppableVideoFeedQueryBudgetTestCase(APITestCase):
+    def setUp(self):
+        self.user = UserFactory(username="viewer")
+        self.client.force_authenticate(user=self.user)
+        products = [MarketplaceProductFactory() for _ in range(3)]
+        creators = [UserFactory() for _ in range(3)]
+        for creator in creators:
+            CreatorProfile.objects.create(user=creator, handle=creator.username)
+            UserFollow.objects.create(follower=self.user, following=creator)
+
+        video_type = ContentType.objects.get_for_model(ShoppableVideo)
+        for index in range(100):
+            creator = creators[index % len(creators)]
+            video = ShoppableVideo.objects.create(
+                uploader=creator,
+                creator_profile=creator.creator_profile,
+                video_file="videos/feed.mp4",
+                title=f"Video {index}",
+                product=products[index % len(products)],
+            )
+            ProductTag.objects.create(
+                content_type=video_type, object_id=video.id, product=products[(index + 1) % len(products)], x=0.5, y=0.5
+            )
+            if index % 2:
+                VideoLike.objects.create(user=self.user, video=video)
+
+    def count_feed_queries(self, limit):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("shoppable-videos-following-feed"), {"limit": limit})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), limit)
+        return len(queries), response.data["results"]
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        small_page_queries, _ = self.count_feed_queries(10)
+        large_page_queries, results = self.count_feed_queries(100)
+
+        self.assertEqual(small_page_queries, large_page_queries)
+        self.assertTrue(all(video["is_following_uploader"] for video in results))
+        self.assertEqual(sum(video["is_liked"] for video in results), 50)
+        self.assertTrue(all(video["creator_profile"]["username"] for video in results))
+        self.assertTrue(all(len(video["product_tags"]) == 1 for video in results))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ShoppableVideoFeedSessionTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory(username="scroller")
+        self.client.force_authenticate(user=self.user)
+        product = MarketplaceProductFactory()
+        self.videos = [
+            ShoppableVideo.objects.create(
+                uploader=self.user, video_file="videos/feed.mp4", title=f"Video {index}", product=product
+            )
+            for index in range(25)
+        ]
+        self.url = reverse("shoppable-videos-list")
+
+    def test_pages_are_served_by_cursor_without_recomputing_the_feed(self):
+        with mock.patch.object(
+            VideoRecommendationService, "generate_feed", autospec=True, return_value=self.videos
+        ) as generate_feed:
+            first = self.client.get(self.url, {"limit": 10})
+            second = self.client.get(first.data["next"])
+            third = self.client.get(second.data["next"])
+
+        self.assertEqual(generate_feed.call_count, 1)
+        ids = [video["id"] for page in (first, second, third) for video in page.data["results"]]
+        self.assertEqual(ids, [video.id for video in self.videos])
+        self.assertEqual(first.data["count"], 25)
+        self.assertIsNone(third.data["next"])
+        self.assertIsNotNone(third.data["previous"])
+
+    def test_unseen_tail_follows_session_interests(self):
+        self.videos[-1].tags = ["boots"]
+        self.videos[-1].save()
+        with mock.patch.object(VideoRecommendationService, "generate_feed", autospec=True, return_value=self.videos):
+            first = self.client.get(self.url, {"limit": 10})
+            self.client.post(reverse("shoppable-videos-track-interaction", args=[self.videos[-1].id]))
+            second = self.client.get(first.data["next"])
+
+        self.assertEqual([video["id"] for video in first.data["results"]], [video.id for video in self.videos[:10]])
+        self.assertEqual(second.data["results"][0]["id"], self.videos[-1].id)
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,55 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from market.benchmarks import BenchmarkRunner, Scenario
+from market.benchmarks.harness import percentile
+
+
+class BenchmarkRunnerTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"bench{index}") for index in range(3)]
+
+    def n_plus_one(self):
+        # One query for the users, then one per user
+        return [User.objects.filter(pk=user.pk).exists() for user in User.objects.all()]
+
+    def test_report_records_queries_and_latency(self):
+        runner = BenchmarkRunner(budgets={"users": {"queries": 4, "p95_ms": 60_000}}, iterations=3, warmup=1)
+
+        report = runner.run([Scenario("users", call=self.n_plus_one)])
+
+        result = report["results"]["users"]
+        self.assertTrue(report["passed"])
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(result["iterations"], 3)
+        self.assertEqual(result["queries"], 4)
+        self.assertGreaterEqual(result["p95_ms"], result["p50_ms"])
+        json.dumps(report)
+
+    def test_new_n_plus_one_exceeds_the_query_budget(self):
+        User.objects.create_user(username="one-more")
+        runner = BenchmarkRunner(budgets={"users": {"queries": 4}}, iterations=1, warmup=0)
+
+        report = runner.run([Scenario("users", call=self.n_plus_one)])
+
+        self.assertFalse(report["passed"])
+        self.assertEqual(report["results"]["users"]["status"], "over_budget")
+        self.assertEqual(report["results"]["users"]["violations"], ["5 queries > budget 4"])
+
+    def test_failing_scenario_is_reported_as_error(self):
+        runner = BenchmarkRunner(budgets={}, iterations=1, warmup=0)
+
+        report = runner.run([Scenario("missing", "/api/v1/does-not-exist/")])
+
+        self.assertEqual(report["results"]["missing"]["status"], "error")
+        self.assertIn("404", report["results"]["missing"]["error"])
+
+    def test_budgets_from_report(self):
+        report = {"results": {"users": {"status": "ok", "queries": 4, "p95_ms": 12.3}}}
+
+        self.assertEqual(BenchmarkRunner.budgets_from_report(report), {"users": {"queries": 6, "p95_ms": 25}})
+        self.assertEqual(BenchmarkRunner.budgets_from_report(report, query_headroom=0)["users"]["queries"], 4)
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 0.95), 5)
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 0.5), 3)
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from market.circuit_breakers import (
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitBreakerOpenError,
+    CircuitBreakerState,
+    CircuitBreakerTimeoutError,
+)
+
+
+def failing_service():
+    raise ConnectionError("Service down")
+
+
+def run_in_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.config = CircuitBreakerConfig(failure_threshold=5, recovery_timeout=60, success_threshold=1, timeout=None)
+
+    def test_timeout_enforced_outside_the_main_thread(self):
+        breaker = CircuitBreaker("slow", CircuitBreakerConfig(timeout=0.05))
+        errors = []
+
+        def worker(_):
+            try:
+                breaker.call(time.sleep, 0.5)
+            except CircuitBreakerTimeoutError as e:
+                errors.append(e)
+
+        started = time.monotonic()
+        run_in_threads(worker, 1)
+
+        self.assertEqual(len(errors), 1)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(breaker.get_stats()["timed_out_requests"], 1)
+
+    def test_async_timeout(self):
+        breaker = CircuitBreaker("slow_async", CircuitBreakerConfig(timeout=0.05))
+
+        with self.assertRaises(CircuitBreakerTimeoutError):
+            asyncio.run(breaker.acall(asyncio.sleep, 0.5))
+        self.assertEqual(asyncio.run(breaker.acall(asyncio.sleep, 0, result="ok")), "ok")
+
+    def test_workers_open_the_breaker_once_and_agree_on_it(self):
+        # One instance per "worker"; they only share the cache
+        workers = [CircuitBreaker("shared", self.config) for _ in range(8)]
+
+        def worker(i):
+            for _ in range(5):
+                try:
+                    workers[i].call(failing_service)
+                except (ConnectionError, CircuitBreakerOpenError):
+                    pass
+
+        run_in_threads(worker, len(workers))
+
+        opened = [
+            change for breaker in workers for change in breaker.metrics.state_change_history
+            if change["transition"] == "CLOSED -> OPEN"
+        ]
+        self.assertEqual(len(opened), 1)
+        self.assertEqual({breaker.state for breaker in workers}, {CircuitBreakerState.OPEN})
+        with self.assertRaises(CircuitBreakerOpenError):
+            CircuitBreaker("shared", self.config).call(lambda: "ok")
+
+    def test_half_open_admits_a_single_probe(self):
+        config = CircuitBreakerConfig(failure_threshold=1, recovery_timeout=0, success_threshold=1, timeout=None)
+        workers = [CircuitBreaker("probe", config) for _ in range(8)]
+        self.assertRaises(ConnectionError, workers[0].call, failing_service)
+
+        probes, rejected = [], []
+        barrier = threading.Barrier(len(workers))
+
+        def slow_probe(i):
+            probes.append(i)
+            time.sleep(0.1)
+
+        def worker(i):
+            barrier.wait()
+            try:
+                workers[i].call(slow_probe, i)
+            except CircuitBreakerOpenError:
+                rejected.append(i)
+
+        run_in_threads(worker, len(workers))
+
+        self.assertEqual(len(probes), 1)
+        self.assertEqual(len(rejected), len(workers) - 1)
+        self.assertEqual(workers[0].state, CircuitBreakerState.CLOSED)
+        self.assertEqual(workers[0].failure_count(), 0)
+
+    def test_failed_probe_reopens(self):
+        config = CircuitBreakerConfig(failure_threshold=1, recovery_timeout=60, success_threshold=1, timeout=None)
+        breaker = CircuitBreaker("reopen", config)
+        self.assertRaises(ConnectionError, breaker.call, failing_service)
+
+        cache.set(breaker.opened_key, time.time() - 61)
+        self.assertEqual(breaker.state, CircuitBreakerState.HALF_OPEN)
+        self.assertRaises(ConnectionError, breaker.call, failing_service)
+
+        self.assertEqual(breaker.state, CircuitBreakerState.OPEN)
+        self.assertIsNone(cache.get(breaker.probe_key))
+
+    def test_failures_outside_the_window_do_not_count(self):
+        config = CircuitBreakerConfig(failure_threshold=2, failure_window=10, timeout=None)
+        breaker = CircuitBreaker("window", config)
+
+        self.assertEqual(breaker._record_failure(1_000.0), 1)
+        self.assertEqual(breaker._record_failure(1_005.0), 2)
+        self.assertEqual(breaker._record_failure(1_020.0), 1)
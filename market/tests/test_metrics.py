@@ -0,0 +1,89 @@
+import bisect
+import math
+import random
+
+from django.test import SimpleTestCase
+
+from market.metrics import COUNTER, DEFAULT_BUCKETS, GAUGE, HISTOGRAM, SLOT_SECONDS, MetricsRegistry
+from market.monitoring import AlertLevel, AlertManager, MetricsCollector, MetricType
+
+NOW = 1_700_000_000.0
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry(backend=None)
+        self.registry._backend_resolved = True  # process-local only
+
+    def test_percentiles_from_buckets_track_exact_values(self):
+        rng = random.Random(7)
+        values = [rng.lognormvariate(-3, 1) for _ in range(5000)]
+        for value in values:
+            self.registry.record("request_duration_seconds", value, {"endpoint": "/x"}, HISTOGRAM, now=NOW)
+
+        stats = self.registry.stats("request_duration_seconds", 60, now=NOW)
+        exact = sorted(values)
+
+        self.assertEqual(stats["count"], 5000)
+        self.assertAlmostEqual(stats["avg"], sum(values) / len(values))
+        self.assertAlmostEqual(stats["max"], exact[-1])
+        bounds = (0.0, *DEFAULT_BUCKETS, math.inf)
+        for key, q in (("median", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            true_value = exact[int(len(exact) * q)]
+            # The estimate lies in the bucket the true value falls in
+            index = bisect.bisect_left(bounds, true_value)
+            self.assertTrue(bounds[index - 1] <= stats[key] <= bounds[index], key)
+
+    def test_window_excludes_old_slots(self):
+        self.registry.record("requests_completed", 1, metric_type=COUNTER, now=NOW - 600)
+        for _ in range(3):
+            self.registry.record("requests_completed", 1, metric_type=COUNTER, now=NOW)
+
+        self.assertEqual(self.registry.stats("requests_completed", 60, now=NOW)["sum"], 3)
+        self.assertEqual(self.registry.stats("requests_completed", 3600, now=NOW)["sum"], 4)
+        self.assertEqual(self.registry.stats("requests_completed", 60, now=NOW + 3600 + SLOT_SECONDS), {})
+
+    def test_stats_aggregate_every_tag_set(self):
+        self.registry.record("system_cpu_percent", 20, {"host": "a"}, GAUGE, now=NOW)
+        self.registry.record("system_cpu_percent", 40, {"host": "b"}, GAUGE, now=NOW + 1)
+
+        stats = self.registry.stats("system_cpu_percent", 60, now=NOW + 1)
+
+        self.assertEqual(stats["latest"], 40)
+        self.assertEqual(stats["avg"], 30)
+        self.assertNotIn("p95", stats)
+
+    def test_prometheus_exposition(self):
+        self.registry.record("request_duration_seconds", 0.003, {"endpoint": '/a"b'}, HISTOGRAM, now=NOW)
+        self.registry.record("request_duration_seconds", 7, {"endpoint": '/a"b'}, HISTOGRAM, now=NOW)
+        self.registry.record("requests_completed", 1, {"status": "200"}, COUNTER, now=NOW)
+        self.registry.record("requests_completed", 1, {"status": "200"}, COUNTER, now=NOW)
+
+        text = self.registry.prometheus_text()
+
+        self.assertIn("# TYPE request_duration_seconds histogram\n", text)
+        self.assertIn('request_duration_seconds_bucket{endpoint="/a\\"b",le="0.005"} 1\n', text)
+        self.assertIn('request_duration_seconds_bucket{endpoint="/a\\"b",le="10"} 2\n', text)
+        self.assertIn('request_duration_seconds_bucket{endpoint="/a\\"b",le="+Inf"} 2\n', text)
+        self.assertIn('request_duration_seconds_count{endpoint="/a\\"b"} 2\n', text)
+        self.assertIn("# TYPE requests_completed counter\n", text)
+        self.assertIn('requests_completed{status="200"} 2\n', text)
+
+
+class AlertManagerMetricsTests(SimpleTestCase):
+    def setUp(self):
+        registry = MetricsRegistry(backend=None)
+        registry._backend_resolved = True
+        self.collector = MetricsCollector(registry)
+        self.alerts = AlertManager(self.collector)
+
+    def test_counter_rules_compare_the_window_total(self):
+        self.alerts.add_alert_rule("High Error Rate", "request_errors", threshold=10, condition=">")
+        for _ in range(11):
+            self.collector.record_metric("request_errors", 1, {"status": "500"}, MetricType.COUNTER)
+
+        self.alerts._check_alert_rules()
+
+        self.assertEqual(len(self.alerts.active_alerts), 1)
+        self.assertEqual(self.collector.get_metric_stats("alerts_triggered")["sum"], 1)
+        self.assertEqual(self.collector.get_metric_stats("alerts_active")["count"], len(AlertLevel))
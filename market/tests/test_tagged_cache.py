@@ -0,0 +1,128 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from market.advanced_caching import LocationCacheManager
+from market.signals import _clear_trending_and_producer_cache
+from market.tagged_cache import TaggedCache, category_tag, request_cache_tags
+from producer.taxonomy import Taxonomy
+
+
+class TaggedCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.tagged = TaggedCache()
+
+    def test_invalidating_a_tag_drops_only_its_entries(self):
+        self.tagged.set("trending:all", [1, 2], 60, tags=["trending"])
+        self.tagged.set("trending:fruit", [3], 60, tags=["trending", category_tag("Fruit")])
+        self.tagged.set("producer:veg", [4], 60, tags=["producer", category_tag("veg")])
+
+        self.tagged.invalidate(category_tag(" fruit "))
+
+        self.assertEqual(self.tagged.get("trending:all", ["trending"]), [1, 2])
+        self.assertIsNone(self.tagged.get("trending:fruit", ["trending", category_tag("Fruit")]))
+        self.assertEqual(self.tagged.get("producer:veg", ["producer", category_tag("veg")]), [4])
+
+    def test_product_changes_drop_the_unfiltered_listings(self):
+        self.tagged.set("trending:all", [1, 2], 60, tags=["trending"])
+        self.tagged.set("producer:all", [5], 60, tags=["producer"])
+        self.tagged.set("trending:fruit", [3], 60, tags=["trending", category_tag("Fruit")])
+
+        with mock.patch("market.signals.tagged_cache", self.tagged):
+            _clear_trending_and_producer_cache(category_name="Fruit")
+
+        self.assertIsNone(self.tagged.get("trending:all", ["trending"]))
+        self.assertIsNone(self.tagged.get("producer:all", ["producer"]))
+        self.assertIsNone(self.tagged.get("trending:fruit", ["trending", category_tag("Fruit")]))
+
+    def test_filter_values_resolve_to_the_invalidated_category_names(self):
+        stamps = {"description": "", "is_active": True, "created_at": None, "updated_at": None}
+        taxonomy = Taxonomy(
+            categories=[
+                {"id": 5, "code": "FR", "name": "Fruits & Nuts", **stamps},
+                {"id": 6, "code": "VG", "name": "Vegetables", **stamps},
+            ],
+            subcategories=[{"id": 7, "code": "FR_DR", "name": "Dried", "category_id": 5, **stamps}],
+        )
+        request = mock.Mock()
+
+        with mock.patch("producer.taxonomy.get_taxonomy", return_value=taxonomy):
+            for value, expected in (
+                ("5", [category_tag("Fruits & Nuts")]),
+                ("fru", [category_tag("Fruits & Nuts")]),
+                ("7", [category_tag("Fruits & Nuts")]),
+                ("e", [category_tag("Fruits & Nuts"), category_tag("Vegetables")]),
+                ("none", []),
+            ):
+                request.query_params = {"category": value}
+                self.assertEqual(request_cache_tags(request, "trending"), ["trending", *expected])
+
+    def test_invalidation_does_not_scan_the_keyspace(self):
+        self.tagged.set("trending:all", [1], 60, tags=["trending"])
+
+        with mock.patch.object(type(caches["default"]), "clear") as clear:
+            self.tagged.invalidate("trending")
+
+        clear.assert_not_called()
+        self.assertIsNone(self.tagged.get("trending:all", ["trending"]))
+
+    def test_evicted_generation_is_a_miss(self):
+        self.tagged.set("trending:all", [1], 60, tags=["trending"])
+        caches["default"].delete("tagcache:gen:trending")
+
+        self.assertIsNone(self.tagged.get("trending:all", ["trending"]))
+
+    def test_invalidation_while_computing_leaves_the_value_stale(self):
+        def compute():
+            # A write lands between the miss and the store
+            self.tagged.invalidate("trending")
+            return [1]
+
+        self.assertEqual(self.tagged.get_or_set("trending:all", compute, 60, tags=["trending"]), [1])
+        self.assertIsNone(self.tagged.get("trending:all", ["trending"]))
+
+    def test_set_uses_the_generations_of_the_lookup(self):
+        value, generations = self.tagged.lookup("trending:all", ["trending", category_tag("fruit")])
+        self.assertIsNone(value)
+        self.tagged.invalidate(category_tag("fruit"))
+        self.tagged.set("trending:all", [1], 60, tags=["trending", category_tag("fruit")], generations=generations)
+
+        self.assertIsNone(self.tagged.get("trending:all", ["trending", category_tag("fruit")]))
+
+        _value, generations = self.tagged.lookup("trending:all", ["trending", category_tag("fruit")])
+        self.tagged.set("trending:all", [2], 60, tags=["trending", category_tag("fruit")], generations=generations)
+        self.assertEqual(self.tagged.get("trending:all", ["trending", category_tag("fruit")]), [2])
+
+    def test_stats_count_hits_misses_and_invalidations_per_tag(self):
+        self.tagged.get_or_set("trending:all", lambda: [1], 60, tags=["trending"])
+        self.tagged.get_or_set("trending:all", lambda: [1], 60, tags=["trending"])
+        self.tagged.invalidate("trending")
+
+        self.assertEqual(self.tagged.stats(), {"trending": {"hits": 1, "misses": 1, "invalidations": 1}})
+
+
+class LocationCacheManagerTagTests(SimpleTestCase):
+    def setUp(self):
+        self.manager = LocationCacheManager()
+        self.manager.location_cache.clear()
+
+    def test_user_invalidation_leaves_other_users_cached(self):
+        calls = []
+
+        def zone(user_id):
+            calls.append(user_id)
+            return f"zone-{user_id}"
+
+        for user_id in (1, 2):
+            key = self.manager.get_cache_key("user_zones", user_id=user_id)
+            self.manager.get_with_fallback(key, zone, "user_zones", user_id=user_id)
+
+        self.manager.invalidate_user_location_cache(1)
+
+        for user_id in (1, 2):
+            key = self.manager.get_cache_key("user_zones", user_id=user_id)
+            self.assertEqual(self.manager.get_with_fallback(key, zone, "user_zones", user_id=user_id), f"zone-{user_id}")
+        self.assertEqual(calls, [1, 2, 1])
+        self.assertIn("user:1", self.manager.get_cache_stats()["tags"])
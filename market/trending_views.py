@@ -2,7 +2,6 @@ import hashlib
 from datetime import timedelta
 
 from django.conf import settings
-from django.core.cache import cache
 from django.db.models import (
     Avg,
     Case,
@@ -30,6 +29,7 @@ from rest_framework.response import Response
 
 from producer.models import MarketplaceProduct
 
+from .tagged_cache import request_cache_tags, tagged_cache
 from .trending_serializers import (
     TrendingCategorySerializer,
     TrendingProductSerializer,
@@ -37,6 +37,10 @@ from .trending_serializers import (
 )
 
 
+def trending_cache_tags(request, *tags):
+    return request_cache_tags(request, "trending", *tags)
+
+
 class TrendingProductsManager:
     """
     Manager class to handle trending products calculations and queries
@@ -177,7 +181,7 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         if not nocache:
-            cached = cache.get(cache_key)
+            cached, generations = tagged_cache.lookup(cache_key, trending_cache_tags(request))
             if cached is not None:
                 return Response(cached)
 
@@ -215,7 +219,9 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
 
         try:
             if not nocache:
-                cache.set(cache_key, payload, TRENDING_CACHE_TTL)
+                tagged_cache.set(
+                    cache_key, payload, TRENDING_CACHE_TTL, trending_cache_tags(request), generations=generations
+                )
         except Exception:
             pass
 
@@ -236,7 +242,7 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         if not nocache:
-            cached = cache.get(cache_key)
+            cached, generations = tagged_cache.lookup(cache_key, trending_cache_tags(request))
             if cached is not None:
                 return Response(cached)
 
@@ -252,7 +258,9 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         payload = {"results": serializer.data, "period": "weekly", "count": len(serializer.data)}
         try:
             if not nocache:
-                cache.set(cache_key, payload, TRENDING_CACHE_TTL)
+                tagged_cache.set(
+                    cache_key, payload, TRENDING_CACHE_TTL, trending_cache_tags(request), generations=generations
+                )
         except Exception:
             pass
 
@@ -273,7 +281,7 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         if not nocache:
-            cached = cache.get(cache_key)
+            cached, generations = tagged_cache.lookup(cache_key, trending_cache_tags(request))
             if cached is not None:
                 return Response(cached)
 
@@ -360,7 +368,9 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
 
         try:
             if not nocache:
-                cache.set(cache_key, payload, TRENDING_CACHE_TTL)
+                tagged_cache.set(
+                    cache_key, payload, TRENDING_CACHE_TTL, trending_cache_tags(request), generations=generations
+                )
         except Exception:
             pass
 
@@ -382,7 +392,7 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         if not nocache:
-            cached = cache.get(cache_key)
+            cached, generations = tagged_cache.lookup(cache_key, trending_cache_tags(request))
             if cached is not None:
                 return Response(cached)
 
@@ -392,7 +402,9 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         payload = {"results": serializer.data, "period": "fastest_selling", "count": len(serializer.data)}
         try:
             if not nocache:
-                cache.set(cache_key, payload, TRENDING_CACHE_TTL)
+                tagged_cache.set(
+                    cache_key, payload, TRENDING_CACHE_TTL, trending_cache_tags(request), generations=generations
+                )
         except Exception:
             pass
 
@@ -414,7 +426,7 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         if not nocache:
-            cached = cache.get(cache_key)
+            cached, generations = tagged_cache.lookup(cache_key, trending_cache_tags(request))
             if cached is not None:
                 return Response(cached)
 
@@ -428,7 +440,9 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         payload = {"results": serializer.data, "period": "new_trending", "count": len(serializer.data)}
         try:
             if not nocache:
-                cache.set(cache_key, payload, TRENDING_CACHE_TTL)
+                tagged_cache.set(
+                    cache_key, payload, TRENDING_CACHE_TTL, trending_cache_tags(request), generations=generations
+                )
         except Exception:
             pass
 
@@ -556,7 +570,7 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         if not nocache:
-            cached = cache.get(cache_key)
+            cached, generations = tagged_cache.lookup(cache_key, trending_cache_tags(request, "featured"))
             if cached is not None:
                 return Response(cached)
 
@@ -564,7 +578,13 @@ class TrendingProductsViewSet(viewsets.ReadOnlyModelViewSet):
         payload = {"results": serializer.data, "count": len(serializer.data), "type": "featured"}
         try:
             if not nocache:
-                cache.set(cache_key, payload, TRENDING_CACHE_TTL)
+                tagged_cache.set(
+                    cache_key,
+                    payload,
+                    TRENDING_CACHE_TTL,
+                    trending_cache_tags(request, "featured"),
+                    generations=generations,
+                )
         except Exception:
             pass
 
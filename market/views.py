@@ -2,6 +2,7 @@ import hashlib
 import logging
 import random
 from decimal import Decimal
+from urllib.parse import urlencode
 
 import requests
 from django.conf import settings
@@ -35,6 +36,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 from rest_framework import generics, serializers, status, views, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.permissions import (
     AllowAny,
@@ -98,6 +100,7 @@ from .models import (
     VideoReport,
     VideoSave,
 )
+from .feed_sessions import InvalidFeedCursor, VideoFeedSessionService
 from .recommendation import VideoRecommendationService
 from .serializers import (
     BidSerializer,
@@ -2281,46 +2284,57 @@ class ShoppableVideoViewSet(viewsets.ModelViewSet):
             session_interests["categories"][cat_id_str] = session_interests["categories"].get(cat_id_str, 0) + 1
             request.session["video_session_interests"] = session_interests
             videos = self.get_queryset().filter(category_id=category_id)
-        else:
-            service = VideoRecommendationService()
-            videos = service.generate_feed(user, feed_size=100, session_interests=session_interests)
 
-        liked_ids = set()
-        saved_ids = set()
-        if user:
-            video_ids = [v.id for v in videos]
-            liked_ids = set(VideoLike.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
-            saved_ids = set(VideoSave.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
+            page = self.paginate_queryset(videos)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
 
-        page = self.paginate_queryset(videos)
-        if page is not None:
-            serializer = self.get_serializer(
-                page, many=True, context={"request": request, "liked_ids": liked_ids, "saved_ids": saved_ids}
+            serializer = self.get_serializer(videos, many=True)
+            return Response(serializer.data)
+
+        # The personalized feed is ranked once per feed session and paged by cursor
+        page_size = getattr(settings, "VIDEO_FEED_PAGE_SIZE", 20)
+        try:
+            page_size = max(1, min(int(request.query_params.get("limit", page_size)), 100))
+        except ValueError:
+            pass
+
+        feed_sessions = VideoFeedSessionService()
+        try:
+            session, video_ids, offset = feed_sessions.get_page(
+                user, session_interests, cursor=request.query_params.get("cursor"), size=page_size
             )
-            return self.get_paginated_response(serializer.data)
+        except InvalidFeedCursor as e:
+            raise NotFound(str(e))
+
+        videos = self.get_queryset().in_bulk(video_ids)
+        serializer = self.get_serializer([videos[vid] for vid in video_ids if vid in videos], many=True)
 
-        serializer = self.get_serializer(
-            videos, many=True, context={"request": request, "liked_ids": liked_ids, "saved_ids": saved_ids}
+        next_offset = offset + len(video_ids)
+        next_cursor = feed_sessions.encode_cursor(session, next_offset) if next_offset < len(session.video_ids) else None
+        previous_cursor = feed_sessions.encode_cursor(session, max(0, offset - page_size)) if offset else None
+        return Response(
+            {
+                "count": len(session.video_ids),
+                "next": self._feed_cursor_url(request, next_cursor, page_size),
+                "previous": self._feed_cursor_url(request, previous_cursor, page_size),
+                "results": serializer.data,
+            }
         )
-        return Response(serializer.data)
+
+    def _feed_cursor_url(self, request, cursor, page_size):
+        if cursor is None:
+            return None
+        url = request.build_absolute_uri(request.path)
+        return f"{url}?{urlencode({'cursor': cursor, 'limit': page_size})}"
 
     @action(detail=True, methods=["get"], url_path="more-like-this")
     def more_like_this(self, request, pk=None):
         """Return videos similar to the one being viewed."""
         service = VideoRecommendationService()
         videos = service.get_similar_videos(pk)
-
-        user = request.user if request.user.is_authenticated else None
-        liked_ids = set()
-        saved_ids = set()
-        if user:
-            video_ids = [v.id for v in videos]
-            liked_ids = set(VideoLike.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
-            saved_ids = set(VideoSave.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
-
-        serializer = self.get_serializer(
-            videos, many=True, context={"request": request, "liked_ids": liked_ids, "saved_ids": saved_ids}
-        )
+        serializer = self.get_serializer(videos, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"], url_path="also-watched")
@@ -2328,18 +2342,7 @@ class ShoppableVideoViewSet(viewsets.ModelViewSet):
         """Collaborative filtering: People who watched this also watched..."""
         service = VideoRecommendationService()
         videos = service.get_social_proof_videos(pk)
-
-        user = request.user if request.user.is_authenticated else None
-        liked_ids = set()
-        saved_ids = set()
-        if user:
-            video_ids = [v.id for v in videos]
-            liked_ids = set(VideoLike.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
-            saved_ids = set(VideoSave.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
-
-        serializer = self.get_serializer(
-            videos, many=True, context={"request": request, "liked_ids": liked_ids, "saved_ids": saved_ids}
-        )
+        serializer = self.get_serializer(videos, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"], url_path="feed/following", permission_classes=[IsAuthenticated])
@@ -2349,21 +2352,12 @@ class ShoppableVideoViewSet(viewsets.ModelViewSet):
         following_ids = UserFollow.objects.filter(follower=user).values_list("following_id", flat=True)
         qs = self.get_queryset().filter(uploader__id__in=following_ids)
 
-        # Optimized engagement fetch
-        video_ids = list(qs.values_list("id", flat=True)[:100])  # Limit for optimization
-        liked_ids = set(VideoLike.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
-        saved_ids = set(VideoSave.objects.filter(user=user, video_id__in=video_ids).values_list("video_id", flat=True))
-
         page = self.paginate_queryset(qs)
         if page is not None:
-            serializer = self.get_serializer(
-                page, many=True, context={"request": request, "liked_ids": liked_ids, "saved_ids": saved_ids}
-            )
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(
-            qs, many=True, context={"request": request, "liked_ids": liked_ids, "saved_ids": saved_ids}
-        )
+        serializer = self.get_serializer(qs, many=True)
         return Response(serializer.data)
 
     def perform_create(self, serializer):
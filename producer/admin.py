@@ -148,7 +148,7 @@ class ProducerAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -222,7 +222,7 @@ class CustomerAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -269,7 +269,7 @@ class ProductAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -377,7 +377,7 @@ class OrderAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -420,7 +420,7 @@ class SaleAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(order__user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(order__shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -455,7 +455,7 @@ class StockListAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(product__user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(product__shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -488,7 +488,7 @@ class StockHistoryAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(product__user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(product__shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -545,7 +545,7 @@ class MarketplaceProductAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
             if not user_profile.role:
                 filtered = qs.none()
             elif user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-                filtered = qs.filter(product__user__user_profile__shop_id=user_profile.shop_id)
+                filtered = qs.filter(product__shop_id=user_profile.shop_id)
             elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
                 filtered = qs.all()
             else:
@@ -769,7 +769,7 @@ class LedgerEntryAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
             role = request.user.user_profile.role.code
             if role == "business_owner":
                 # Business owners can only see their organization's ledger entries
-                return qs.filter(product__user__user_profile__shop_id=request.user.user_profile.shop_id)
+                return qs.filter(product__shop_id=request.user.user_profile.shop_id)
         return qs.none()
 
     list_display = (
@@ -838,7 +838,7 @@ class PurchaseOrderAdmin(RoleBasedAdminMixin, admin.ModelAdmin):
 
         # Filter by shop_id if user is business_owner or business_staff
         if user_profile.role.code in ["business_owner", "business_staff"] and user_profile.shop_id:
-            return qs.filter(product__user__user_profile__shop_id=user_profile.shop_id)
+            return qs.filter(product__shop_id=user_profile.shop_id)
         # For other roles, only show their own records
         elif user_profile.role.code in ["agent", "admin"] and user_profile.shop_id:
             return qs.all()
@@ -134,11 +134,11 @@ class ProductImportValidator:
 
         # Validate category if provided
         if row_data.get("category_id"):
-            from .models import Category
+            from .taxonomy import CATEGORY, get_taxonomy
 
             try:
                 category_id = int(row_data["category_id"])
-                if not Category.objects.filter(id=category_id).exists():
+                if get_taxonomy().get(CATEGORY, category_id) is None:
                     import_row.errors.append(f"Category ID {category_id} does not exist")
                     import_row.is_valid = False
             except ValueError:
@@ -294,6 +294,7 @@ class ProductImporter:
     def _process_batch(self, rows: List[Dict], start_row: int, result: ImportResult):
         """Process a batch of rows"""
         from .models import Brand, Category, Product
+        from .search_indexing import search_indexer
 
         import_rows = []
 
@@ -309,7 +310,8 @@ class ProductImporter:
         # Process valid rows
         valid_rows = [r for r in import_rows if r.is_valid]
 
-        with transaction.atomic():
+        # Saved products are queued for reindexing together once the batch commits
+        with search_indexer.collect(), transaction.atomic():
             for import_row in valid_rows:
                 try:
                     product = self._create_or_update_product(import_row.data)
@@ -0,0 +1,224 @@
+"""
+Seeded, keyset-paged marketplace catalog.
+
+The catalog opens with a pool of up to ``CATALOG_POOL_SIZE`` listings: the
+cheapest and the most expensive halves, each shuffled and then interleaved
+high/low. Every other listing follows, newest first.
+
+The shuffle is driven by a seed that is drawn on a session's first page and
+carried in its cursors, so every page of a session sees the same pool. The
+pool's id order (and the catalog count) is cached per seed and filter set;
+after expiry it is rebuilt from the seed. The tail is paged with a keyset on
+``(listed_date, id)`` rather than an offset, so a page costs the same
+however deep it is: only the page's listings are fetched and serialized.
+
+``Catalog`` also supports ``count()`` and slicing, so offset pagination can
+page it too; its tail pages then use a database ``OFFSET``.
+"""
+
+import hashlib
+import json
+import random
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+CATALOG_POOL_CACHE_PREFIX = "producer:catalog_pool"
+CURSOR_SALT = "producer.catalog.cursor"
+TAIL_ORDERING = ("-listed_date", "-id")
+# Query parameters that page the catalog rather than filter it
+PAGING_PARAMS = ("cursor", "limit", "offset")
+
+
+class InvalidCatalogCursor(Exception):
+    pass
+
+
+def new_seed():
+    return random.SystemRandom().getrandbits(32)
+
+
+def filter_signature(query_params):
+    """Stable digest of the filtering query parameters of a request."""
+    items = sorted((key, values) for key, values in query_params.lists() if key not in PAGING_PARAMS)
+    return hashlib.md5(json.dumps(items).encode()).hexdigest()
+
+
+def interleaved_pool(queryset, seed, size):
+    """
+    Ids of the ``size // 2`` cheapest and most expensive listings of
+    ``queryset``, each half shuffled by ``seed`` and interleaved high, low,
+    high, low ...
+    """
+    half = size // 2
+    # Effective price: the discounted price when set, otherwise the listed price
+    priced = queryset.annotate(effective_price=Coalesce("discounted_price", "listed_price"))
+    low_ids = list(priced.order_by("effective_price", "id").values_list("id", flat=True)[:half])
+    high_ids = list(priced.order_by("-effective_price", "-id").values_list("id", flat=True)[:half])
+
+    # Drop any overlap that arises when there are fewer listings than the pool size
+    low_set = set(low_ids)
+    high_ids = [pk for pk in high_ids if pk not in low_set]
+
+    rng = random.Random(seed)
+    rng.shuffle(low_ids)
+    rng.shuffle(high_ids)
+
+    pool = []
+    for index in range(max(len(high_ids), len(low_ids))):
+        pool.extend(group[index] for group in (high_ids, low_ids) if index < len(group))
+    return pool
+
+
+def encode_cursor(seed, signature, offset, anchor):
+    return signing.dumps([seed, signature, offset, anchor], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, signature):
+    """
+    ``(seed, offset, anchor)`` of ``cursor``. Raises ``InvalidCatalogCursor``
+    for tampered cursors and for cursors issued for other filters.
+    """
+    try:
+        seed, cursor_signature, offset, anchor = signing.loads(cursor, salt=CURSOR_SALT)
+        if anchor is not None:
+            anchor = [str(anchor[0]), int(anchor[1])]
+        seed, offset = int(seed), max(0, int(offset))
+    except (signing.BadSignature, TypeError, ValueError, IndexError):
+        raise InvalidCatalogCursor("Invalid cursor")
+    if cursor_signature != signature:
+        raise InvalidCatalogCursor("Invalid cursor")
+    return seed, offset, anchor
+
+
+@dataclass
+class CatalogPage:
+    """
+    Listings of one page. ``next`` and ``previous`` are the ``(offset, anchor)``
+    positions of the neighbouring pages, or None at either end.
+    """
+
+    items: List
+    next: Optional[tuple] = None
+    previous: Optional[tuple] = None
+
+
+class Catalog:
+    """
+    The catalog order of ``queryset`` for ``seed``. With a ``signature`` (see
+    ``filter_signature``) the pool is cached under it; without one the pool
+    is built for this instance only.
+    """
+
+    def __init__(self, queryset, seed, signature=None, pool_size=None):
+        self.queryset = queryset
+        self.seed = seed
+        self.signature = signature
+        self.pool_size = pool_size or getattr(settings, "CATALOG_POOL_SIZE", 200)
+        self._state = None
+
+    @property
+    def cache_key(self):
+        return f"{CATALOG_POOL_CACHE_PREFIX}:{self.seed}:{self.pool_size}:{self.signature}"
+
+    def _load(self):
+        if self._state is None:
+            if self.signature is not None:
+                self._state = cache.get(self.cache_key)
+            if self._state is None:
+                self._state = {"pool": interleaved_pool(self.queryset, self.seed, self.pool_size), "count": None}
+                if self.signature is not None:
+                    self._state["count"] = self.queryset.count()
+                    cache.set(self.cache_key, self._state, getattr(settings, "CATALOG_POOL_TTL", 1800))
+        return self._state
+
+    @property
+    def pool(self):
+        return self._load()["pool"]
+
+    def count(self):
+        """Listings in the catalog; cached with the pool for the length of a session."""
+        state = self._load()
+        if state["count"] is None:
+            state["count"] = self.queryset.count()
+        return state["count"]
+
+    def __len__(self):
+        return self.count()
+
+    def tail(self, anchor=None):
+        """Listings after the pool, newest first, starting after the ``(listed_date, id)`` key ``anchor``."""
+        tail = self.queryset.exclude(id__in=self.pool).order_by(*TAIL_ORDERING)
+        if anchor is not None:
+            listed_date, pk = parse_datetime(anchor[0]), anchor[1]
+            tail = tail.filter(Q(listed_date__lt=listed_date) | Q(listed_date=listed_date, id__lt=pk))
+        return tail
+
+    def pool_items(self, ids):
+        listings = self.queryset.in_bulk(ids)
+        return [listings[pk] for pk in ids if pk in listings]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError("Catalog supports only slicing without a step")
+        start, stop = max(0, index.start or 0), index.stop
+        pool = self.pool
+        items = self.pool_items(pool[start:stop])
+        if stop is None or stop > len(pool):
+            tail_start = max(0, start - len(pool))
+            tail_stop = None if stop is None else stop - len(pool)
+            items += list(self.tail()[tail_start:tail_stop])
+        return items
+
+    @staticmethod
+    def key(listing):
+        return [listing.listed_date.isoformat(), listing.pk]
+
+    def page(self, offset, size, anchor=None):
+        """
+        The ``size`` listings from position ``offset``. ``anchor`` is the key
+        of the tail listing just before ``offset``, or None when the page
+        starts within the pool or at the start of the tail.
+        """
+        pool = self.pool
+        pool_ids = pool[offset : offset + size]
+        remaining = size - len(pool_ids)
+        # One listing beyond the page tells whether there is a next page
+        tail = list(self.tail(anchor)[: remaining + 1])
+
+        items = self.pool_items(pool_ids) + tail[:remaining]
+        page = CatalogPage(items=items)
+        if offset + size < len(pool) or len(tail) > remaining:
+            page.next = (offset + size, self.key(tail[remaining - 1]) if remaining else None)
+        if offset:
+            page.previous = self._previous(offset, size, anchor)
+        return page
+
+    def _previous(self, offset, size, anchor):
+        previous_offset = max(0, offset - size)
+        if previous_offset < len(self.pool) or anchor is None:
+            return previous_offset, None
+        # The previous page ends at the anchor; the listing before its first one is the new anchor
+        listed_date, pk = parse_datetime(anchor[0]), anchor[1]
+        keys = list(
+            self.queryset.exclude(id__in=self.pool)
+            .filter(Q(listed_date__gt=listed_date) | Q(listed_date=listed_date, id__gte=pk))
+            .order_by("listed_date", "id")
+            .values_list("listed_date", "id")[: size + 1]
+        )
+        if len(keys) <= size:
+            return len(self.pool), None
+        return previous_offset, [keys[size][0].isoformat(), keys[size][1]]
+
+    def encode(self, position):
+        """Cursor for the ``(offset, anchor)`` ``position`` of a page, or None."""
+        if position is None:
+            return None
+        offset, anchor = position
+        return encode_cursor(self.seed, self.signature, offset, anchor)
@@ -4,7 +4,7 @@ from faker import Faker
 
 from user.models import User
 
-from .models import AuditLog, Customer, LedgerEntry, Order, Producer, Product, Sale
+from .models import AuditLog, Customer, LedgerEntry, MarketplaceProduct, Order, Producer, Product, Sale
 
 fake = Faker()
 
@@ -27,6 +27,7 @@ class ProducerFactory(DjangoModelFactory):
     email = factory.Faker("email")
     address = factory.Faker("address")
     registration_number = factory.Faker("isbn10")
+    user = factory.SubFactory(UserFactory)
 
 
 class CustomerFactory(DjangoModelFactory):
@@ -55,6 +56,16 @@ class ProductFactory(DjangoModelFactory):
     cost_price = factory.Faker("pydecimal", left_digits=3, right_digits=2, positive=True)
     stock = factory.Faker("random_int", min=1, max=500)
     producer = factory.SubFactory(ProducerFactory)
+    user = factory.SubFactory(UserFactory)
+
+
+class MarketplaceProductFactory(DjangoModelFactory):
+    class Meta:
+        model = MarketplaceProduct
+
+    product = factory.SubFactory(ProductFactory)
+    listed_price = factory.Faker("pyfloat", left_digits=3, right_digits=2, positive=True, min_value=1)
+    is_available = True
 
 
 class OrderFactory(DjangoModelFactory):
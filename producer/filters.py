@@ -63,8 +63,8 @@ class SaleFilter(django_filters.FilterSet):
         if user and user.is_authenticated:
             user_profile = getattr(user, "user_profile", None)
             if user_profile:
-                self.filters["customer"].queryset = Customer.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
-                self.filters["product"].queryset = Product.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
+                self.filters["customer"].queryset = Customer.objects.filter(shop_id=user_profile.shop_id)
+                self.filters["product"].queryset = Product.objects.filter(shop_id=user_profile.shop_id)
             else:
                 self.filters["customer"].queryset = Customer.objects.none()
                 self.filters["product"].queryset = Product.objects.none()
@@ -419,8 +419,8 @@ class OrderFilter(django_filters.FilterSet):
         if user and user.is_authenticated:
             user_profile = getattr(user, "user_profile", None)
             if user_profile:
-                self.filters["customer"].queryset = Customer.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
-                self.filters["product"].queryset = Product.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
+                self.filters["customer"].queryset = Customer.objects.filter(shop_id=user_profile.shop_id)
+                self.filters["product"].queryset = Product.objects.filter(shop_id=user_profile.shop_id)
             else:
                 self.filters["customer"].queryset = Customer.objects.none()
                 self.filters["product"].queryset = Product.objects.none()
@@ -15,6 +15,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 from producer.models import Brand, MarketplaceProduct
+from producer.search_indexing import search_indexer
 
 # Brand discount mapping (same as in create_date_range_sale.py)
 BRAND_DISCOUNT_MAP = {
@@ -60,7 +61,9 @@ class Command(BaseCommand):
         # Reset discounts if requested
         if reset and not dry_run:
             with transaction.atomic():
-                reset_count = MarketplaceProduct.objects.filter(discount_percentage__gt=0).update(discount_percentage=0)
+                discounted = MarketplaceProduct.objects.filter(discount_percentage__gt=0)
+                search_indexer.mark_queryset_dirty(discounted)
+                reset_count = discounted.update(discount_percentage=0)
                 self.stdout.write(self.style.SUCCESS(f"✓ Reset {reset_count} products to 0% discount"))
         elif reset and dry_run:
             reset_count = MarketplaceProduct.objects.filter(discount_percentage__gt=0).count()
@@ -94,6 +97,7 @@ class Command(BaseCommand):
 
                 # Apply discount
                 if not dry_run:
+                    search_indexer.mark_queryset_dirty(products_queryset)
                     updated_count = products_queryset.update(discount_percentage=Decimal(str(discount_percentage)))
                 else:
                     updated_count = products_queryset.count()
@@ -1,5 +1,4 @@
 from django.core.management.base import BaseCommand
-from django.db import transaction
 
 from producer.models import MarketplaceProduct
 from producer.tag_extractor import TagExtractor
@@ -13,6 +12,12 @@ class Command(BaseCommand):
         parser.add_argument("--batch-size", type=int, default=100, help="Number of products to process in each batch")
         parser.add_argument("--product-id", type=int, help="Extract tags for a single product ID")
         parser.add_argument("--force", action="store_true", help="Force re-extraction even if tags exist")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Extraction processes (default: one per CPU; 0 or 1 extracts in-process)",
+        )
 
     def handle(self, *args, **options):
         batch_size = options["batch_size"]
@@ -30,7 +35,6 @@ class Command(BaseCommand):
             else:
                 queryset = MarketplaceProduct.objects.filter(search_tags=[])
 
-        queryset = queryset.select_related("product", "product__category")
         total = queryset.count()
 
         if total == 0:
@@ -39,19 +43,9 @@ class Command(BaseCommand):
 
         self.stdout.write(f"📊 Processing {total} products...")
 
-        processed = 0
-        for batch_start in range(0, total, batch_size):
-            batch = queryset[batch_start : batch_start + batch_size]
-
-            with transaction.atomic():
-                for product in batch:
-                    tags = TagExtractor.extract_and_save(product, save=True)
-                    processed += 1
-
-                    if processed % 10 == 0:
-                        self.stdout.write(f" Processed {processed}/{total}")
-
-            self.stdout.write(f"Batch {batch_start//batch_size + 1} completed")
+        processed = TagExtractor.bulk_extract(
+            queryset, batch_size=batch_size, workers=options["workers"], log=self.stdout.write
+        )
 
         self.stdout.write(self.style.SUCCESS(f"\n Successfully extracted tags for {processed} products!"))
 
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
 
+from main.manager import resolve_shop_id
 from producer.models import Producer, Product
 
 
@@ -124,7 +125,8 @@ class Command(BaseCommand):
                         self.stdout.write(f"  ... and {update_count - 5} more products")
                 else:
                     # Actually update the products
-                    updated = products_to_update.update(user=user)
+                    # update() skips pre_save, so the denormalized shop id is set here
+                    updated = products_to_update.update(user=user, shop_id=resolve_shop_id(user.id))
                     updated_count += updated
                     self.stdout.write(
                         self.style.SUCCESS(
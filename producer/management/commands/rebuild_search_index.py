@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from producer.search_indexing import DIRTY_KEY, search_indexer
+
+
+class Command(BaseCommand):
+    help = "Rebuild the marketplace search index into a new index and swap the alias to it, without downtime"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Listings per bulk request")
+        parser.add_argument("--keep-old", action="store_true", help="Keep the previous index after the swap")
+        parser.add_argument("--flush", action="store_true", help="Only index the queued changes, do not rebuild")
+
+    def handle(self, *args, **options):
+        if options["flush"]:
+            self.stdout.write(f"{search_indexer.queue.size(DIRTY_KEY)} listings queued for indexing")
+            counts = search_indexer.flush()
+            self.stdout.write(
+                self.style.SUCCESS(f"Indexed {counts['indexed']} and removed {counts['removed']} listings")
+            )
+            return
+
+        new_name = search_indexer.rebuild(
+            batch_size=options["batch_size"], keep_old=options["keep_old"], log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt into {new_name}"))
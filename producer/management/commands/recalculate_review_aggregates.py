@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from producer.models import MarketplaceProduct
+
+
+class Command(BaseCommand):
+    help = "Recompute stored review counts, rating sums and star histograms for marketplace products"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product-id", type=int, action="append", dest="product_ids", help="Limit to these products")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows fetched and updated per batch")
+
+    def handle(self, *args, **options):
+        queryset = MarketplaceProduct.objects.all()
+        if options["product_ids"]:
+            queryset = queryset.filter(id__in=options["product_ids"])
+
+        self.stdout.write(f"Checking review aggregates for {queryset.count()} products...")
+        repaired = MarketplaceProduct.recalculate_review_aggregates(queryset, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired review aggregates for {repaired} products"))
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+BACKFILL_REVIEW_AGGREGATES_SQL = """
+UPDATE producer_marketplaceproduct mp
+SET review_count = r.review_count,
+    rating_sum = r.rating_sum,
+    rating_1_count = r.rating_1_count,
+    rating_2_count = r.rating_2_count,
+    rating_3_count = r.rating_3_count,
+    rating_4_count = r.rating_4_count,
+    rating_5_count = r.rating_5_count
+FROM (
+    SELECT product_id,
+           COUNT(*) AS review_count,
+           SUM(rating) AS rating_sum,
+           COUNT(*) FILTER (WHERE rating = 1) AS rating_1_count,
+           COUNT(*) FILTER (WHERE rating = 2) AS rating_2_count,
+           COUNT(*) FILTER (WHERE rating = 3) AS rating_3_count,
+           COUNT(*) FILTER (WHERE rating = 4) AS rating_4_count,
+           COUNT(*) FILTER (WHERE rating = 5) AS rating_5_count
+    FROM producer_marketplaceproductreview
+    GROUP BY product_id
+) AS r
+WHERE r.product_id = mp.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("producer", "0063_marketplaceproduct_is_delivery_free"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="marketplaceproduct",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Review Count"),
+        ),
+        migrations.AddField(
+            model_name="marketplaceproduct",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Rating Sum"),
+        ),
+        migrations.AddField(
+            model_name="marketplaceproduct",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="1-Star Reviews"),
+        ),
+        migrations.AddField(
+            model_name="marketplaceproduct",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="2-Star Reviews"),
+        ),
+        migrations.AddField(
+            model_name="marketplaceproduct",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="3-Star Reviews"),
+        ),
+        migrations.AddField(
+            model_name="marketplaceproduct",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="4-Star Reviews"),
+        ),
+        migrations.AddField(
+            model_name="marketplaceproduct",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="5-Star Reviews"),
+        ),
+        migrations.RunSQL(BACKFILL_REVIEW_AGGREGATES_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.26 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+BACKFILL_SHOP_IDS_SQL = """
+UPDATE producer_producer t SET shop_id = up.shop_id
+FROM user_userprofile up
+WHERE up.user_id = t.user_id AND up.shop_id IS NOT NULL;
+
+UPDATE producer_customer t SET shop_id = up.shop_id
+FROM user_userprofile up
+WHERE up.user_id = t.user_id AND up.shop_id IS NOT NULL;
+
+UPDATE producer_product t SET shop_id = up.shop_id
+FROM user_userprofile up
+WHERE up.user_id = t.user_id AND up.shop_id IS NOT NULL;
+
+UPDATE producer_order t SET shop_id = up.shop_id
+FROM user_userprofile up
+WHERE up.user_id = t.user_id AND up.shop_id IS NOT NULL;
+
+UPDATE producer_sale t SET shop_id = up.shop_id
+FROM user_userprofile up
+WHERE up.user_id = t.user_id AND up.shop_id IS NOT NULL;
+
+UPDATE producer_purchaseorder t SET shop_id = up.shop_id
+FROM user_userprofile up
+WHERE up.user_id = t.user_id AND up.shop_id IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("producer", "0064_marketplaceproduct_review_aggregates"),
+        ("user", "0025_businessuserproxy_generaluserproxy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="producer",
+            name="shop_id",
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True, verbose_name="Shop ID"),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="shop_id",
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True, verbose_name="Shop ID"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="shop_id",
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True, verbose_name="Shop ID"),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="shop_id",
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True, verbose_name="Shop ID"),
+        ),
+        migrations.AddField(
+            model_name="sale",
+            name="shop_id",
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True, verbose_name="Shop ID"),
+        ),
+        migrations.AddField(
+            model_name="purchaseorder",
+            name="shop_id",
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True, verbose_name="Shop ID"),
+        ),
+        migrations.RunSQL(BACKFILL_SHOP_IDS_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("producer", "0065_denormalized_shop_id"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="marketplaceproduct",
+            name="producer_ma_is_avai_c0ceee_idx",
+        ),
+        migrations.AddIndex(
+            model_name="marketplaceproduct",
+            index=models.Index(fields=["is_available", "-listed_date", "-id"], name="producer_ma_is_avai_73c927_idx"),
+        ),
+    ]
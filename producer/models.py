@@ -1,5 +1,4 @@
 import uuid
-from collections import Counter
 from datetime import date, timedelta
 from decimal import Decimal
 
@@ -10,10 +9,19 @@ from django.core.exceptions import PermissionDenied, ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import transaction
 from django.db.models import Count, Sum
-from django.db.models.functions import TruncDate
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+RATING_STARS = range(1, 6)
+
+
+def rating_count_field(star):
+    return f"rating_{star}_count"
+
+
+REVIEW_AGGREGATE_FIELDS = ["review_count", "rating_sum", *(rating_count_field(star) for star in RATING_STARS)]
+
 
 class Producer(models.Model):
     """
@@ -38,6 +46,7 @@ class Producer(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Update Time"))
     location = models.PointField(srid=4326, help_text="Local Unit Location", null=True, blank=True)
     user = models.ForeignKey(User, verbose_name=_("User"), on_delete=models.CASCADE)
+    shop_id = models.UUIDField(null=True, blank=True, editable=False, db_index=True, verbose_name=_("Shop ID"))
 
     service_radius_km = models.PositiveIntegerField(
         default=50,
@@ -83,6 +92,7 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Creation Time"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Update Time"))
     user = models.ForeignKey(User, verbose_name=_("User"), on_delete=models.CASCADE)
+    shop_id = models.UUIDField(null=True, blank=True, editable=False, db_index=True, verbose_name=_("Shop ID"))
 
     def __str__(self):
         return f"{self.name} ({self.customer_type})"
@@ -330,6 +340,7 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Update Time"))
     is_marketplace_created = models.BooleanField(default=False, verbose_name=_("Marketplace Created"))
     user = models.ForeignKey(User, verbose_name=_("User"), on_delete=models.CASCADE)
+    shop_id = models.UUIDField(null=True, blank=True, editable=False, db_index=True, verbose_name=_("Shop ID"))
     location = models.ForeignKey(
         "City", on_delete=models.CASCADE, verbose_name="Location", help_text="Location of the product", null=True, blank=True
     )
@@ -541,6 +552,7 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Creation Time"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Update Time"))
     user = models.ForeignKey(User, verbose_name=_("User"), on_delete=models.CASCADE)
+    shop_id = models.UUIDField(null=True, blank=True, editable=False, db_index=True, verbose_name=_("Shop ID"))
 
     def __str__(self):
         return f"Order {self.order_number} by {self.customer.name}"
@@ -614,6 +626,7 @@ class Sale(models.Model):
     )
     payment_due_date = models.DateTimeField(null=True, blank=True, verbose_name=_("Payment Due Date"))
     user = models.ForeignKey(User, verbose_name=_("User"), on_delete=models.CASCADE)
+    shop_id = models.UUIDField(null=True, blank=True, editable=False, db_index=True, verbose_name=_("Shop ID"))
 
     def __str__(self):
         return f"Sale of {self.order.product.name} (Order: {self.order.order_number})"
@@ -856,6 +869,14 @@ class MarketplaceProduct(models.Model):
     )
     view_count = models.PositiveIntegerField(default=0, verbose_name=_("View Count"))
     rank_score = models.FloatField(default=0, verbose_name=_("Rank Score"))
+    # Review aggregates, maintained by MarketplaceProductReview.save() and the review post_delete receiver
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Review Count"))
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Rating Sum"))
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("1-Star Reviews"))
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("2-Star Reviews"))
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("3-Star Reviews"))
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("4-Star Reviews"))
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("5-Star Reviews"))
     is_featured = models.BooleanField(default=False, verbose_name=_("Is Featured"))
     is_made_in_nepal = models.BooleanField(
         default=False, verbose_name=_("Made in Nepal"), help_text=_("Indicates if this product is made in Nepal")
@@ -1015,6 +1036,12 @@ class MarketplaceProduct(models.Model):
 
         if self.offer_start and self.offer_end and self.offer_start >= self.offer_end:
             raise ValidationError({"offer_end": "Offer end must be after offer start."})
+
+        # Review aggregates change concurrently through apply_review_change(); never write back stale copies
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in REVIEW_AGGREGATE_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     @property
@@ -1052,73 +1079,77 @@ class MarketplaceProduct(models.Model):
 
     def get_effective_price_for_user(self, user, quantity=1):
         """Get the effective price for a user based on their business type and quantity"""
-        if not user or not user.is_authenticated:
-            return self.price  # Regular customer price
-
-        try:
-            profile = getattr(user, "user_profile", None)
-            if not profile:
-                return self.price
-
-            # Check if B2B sales are enabled and user is verified business
-            if self.enable_b2b_sales and getattr(profile, "b2b_verified", False) and profile.business_type:
-
-                # Check B2B pricing tiers first
-                try:
-                    b2b_tier = (
-                        self.b2b_price_tiers.filter(
-                            customer_type=profile.business_type, min_quantity__lte=quantity, is_active=True
-                        )
-                        .order_by("-min_quantity")
-                        .first()
-                    )
-
-                    if b2b_tier:
-                        return Decimal(str(b2b_tier.price_per_unit))
-                except AttributeError:
-                    # b2b_price_tiers relation doesn't exist yet
-                    pass
-
-                # Fallback to general B2B price if no specific tier
-                if self.b2b_price and quantity >= (self.b2b_min_quantity or 1):
-                    return Decimal(str(self.b2b_price))
-        except AttributeError:
-            # Handle cases where user_profile doesn't have b2b fields yet
-            pass
+        from .pricing import PriceResolver
 
-        # Check regular bulk pricing
-        try:
-            bulk_tier = self.bulk_price_tiers.filter(min_quantity__lte=quantity).order_by("-min_quantity").first()
-
-            if bulk_tier:
-                if bulk_tier.price_per_unit:
-                    return Decimal(str(bulk_tier.price_per_unit))
-                elif bulk_tier.discount_percent:
-                    discount = self.listed_price * (bulk_tier.discount_percent / 100)
-                    return Decimal(str(self.listed_price - discount))
-        except AttributeError:
-            # Handle cases where bulk_price_tiers relation doesn't exist
-            pass
-
-        return self.price
+        return PriceResolver(user).price(self, quantity)
 
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if not reviews:
+        if not self.review_count:
             return 0
-        return round(sum(r.rating for r in reviews) / reviews.count(), 2)
+        return round(self.rating_sum / self.review_count, 2)
 
     @property
     def ratings_breakdown(self):
-        reviews = self.reviews.all()
-        breakdown = Counter(r.rating for r in reviews)
-        total = reviews.count()
-        return {str(star): round(100 * breakdown.get(star, 0) / total, 2) if total else 0 for star in range(1, 6)}
+        total = self.review_count
+        return {
+            str(star): round(100 * getattr(self, rating_count_field(star)) / total, 2) if total else 0
+            for star in RATING_STARS
+        }
 
     @property
     def total_reviews(self):
-        return self.reviews.count()
+        return self.review_count
+
+    @classmethod
+    def apply_review_change(cls, product_id, added=None, removed=None):
+        """
+        Adjust the stored review aggregates of one product in place.
+
+        ``added`` is the rating of a review that now counts towards the product,
+        ``removed`` the rating of one that no longer does; either may be None.
+        """
+        if added == removed:
+            return
+        changes = {}
+        if added is not None:
+            changes[rating_count_field(added)] = models.F(rating_count_field(added)) + 1
+        if removed is not None:
+            changes[rating_count_field(removed)] = models.F(rating_count_field(removed)) - 1
+        count_delta = (added is not None) - (removed is not None)
+        if count_delta:
+            changes["review_count"] = models.F("review_count") + count_delta
+        changes["rating_sum"] = models.F("rating_sum") + (added or 0) - (removed or 0)
+        cls.objects.filter(pk=product_id).update(**changes)
+
+    @classmethod
+    def recalculate_review_aggregates(cls, queryset=None, batch_size=1000):
+        """
+        Recompute review aggregates from the review table for ``queryset`` (all
+        products by default). Returns the number of products whose stored values changed.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        star_counts = {
+            rating_count_field(star): Count("reviews", filter=models.Q(reviews__rating=star)) for star in RATING_STARS
+        }
+        rows = queryset.order_by().annotate(
+            actual_review_count=Count("reviews"),
+            actual_rating_sum=Coalesce(Sum("reviews__rating"), 0),
+            **{f"actual_{name}": expression for name, expression in star_counts.items()},
+        )
+
+        stale = []
+        for product in rows.only("id", *REVIEW_AGGREGATE_FIELDS).iterator(chunk_size=batch_size):
+            changed = False
+            for name in REVIEW_AGGREGATE_FIELDS:
+                actual = getattr(product, f"actual_{name}")
+                if getattr(product, name) != actual:
+                    setattr(product, name, actual)
+                    changed = True
+            if changed:
+                stale.append(product)
+        cls.objects.bulk_update(stale, REVIEW_AGGREGATE_FIELDS, batch_size=batch_size)
+        return len(stale)
 
     @property
     def brand_name(self):
@@ -1142,7 +1173,8 @@ class MarketplaceProduct(models.Model):
         verbose_name = _("Marketplace Product")
         verbose_name_plural = _("Marketplace Products")
         indexes = [
-            models.Index(fields=["is_available", "-listed_date"]),
+            # Keyset pages of the catalog tail (producer.catalog)
+            models.Index(fields=["is_available", "-listed_date", "-id"]),
         ]
 
 
@@ -1276,6 +1308,27 @@ class MarketplaceProductReview(models.Model):
         if self.rating < 1 or self.rating > 5:
             raise ValidationError({"rating": "Rating must be between 1 and 5."})
 
+    def save(self, *args, **kwargs):
+        # Keep the product's review aggregates in step with this row; deletes are handled by a post_delete receiver
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding and self.pk:
+                previous = (
+                    MarketplaceProductReview.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values("product_id", "rating")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+
+            if previous is None:
+                MarketplaceProduct.apply_review_change(self.product_id, added=self.rating)
+            elif previous["product_id"] != self.product_id:
+                MarketplaceProduct.apply_review_change(previous["product_id"], removed=previous["rating"])
+                MarketplaceProduct.apply_review_change(self.product_id, added=self.rating)
+            else:
+                MarketplaceProduct.apply_review_change(self.product_id, added=self.rating, removed=previous["rating"])
+
     def __str__(self):
         return f"{self.product} - {self.user} ({self.rating})"
 
@@ -1358,6 +1411,7 @@ class PurchaseOrder(models.Model):
     approved = models.BooleanField(default=False)
     sent_to_vendor = models.BooleanField(default=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("User"))
+    shop_id = models.UUIDField(null=True, blank=True, editable=False, db_index=True, verbose_name=_("Shop ID"))
 
     def __str__(self):
         return f"PO #{self.id} – {self.product.sku} x{self.quantity}"
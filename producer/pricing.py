@@ -0,0 +1,195 @@
+"""
+Batch price resolution for marketplace products.
+
+A product's price for a user depends on the user's B2B status and on the
+quantity: an active ``B2BPriceTier`` for the user's business type wins, then
+the product's flat B2B price, then the best ``MarketplaceBulkPriceTier``,
+then the listed/discounted price. Resolving that per line item used to cost
+two queries per product per quantity.
+
+``PriceResolver`` loads the tiers of many products at once (two queries for
+all cache misses), keeps them as ``PriceTierTable`` objects sorted by minimum
+quantity so the applicable tier is a bisect away, and memoizes resolved
+prices. Tier tables are cached per product and dropped whenever a tier of
+that product is saved or deleted (see ``producer.signals``).
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import B2BPriceTier, MarketplaceBulkPriceTier
+
+TIER_CACHE_PREFIX = "producer:price_tiers"
+REQUEST_ATTRIBUTE = "_price_resolver"
+
+
+def tier_cache_key(product_id):
+    return f"{TIER_CACHE_PREFIX}:{product_id}"
+
+
+def invalidate_price_tiers(product_id):
+    cache.delete(tier_cache_key(product_id))
+
+
+@dataclass
+class PriceTierTable:
+    """
+    Tiers of one product, sorted by ``min_quantity``. ``bulk`` holds
+    ``(min_quantity, price_per_unit, discount_percent)``; ``b2b`` maps a
+    customer type to the field values of its active tiers.
+    """
+
+    bulk_quantities: list = field(default_factory=list)
+    bulk: list = field(default_factory=list)
+    b2b_quantities: dict = field(default_factory=dict)
+    b2b: dict = field(default_factory=dict)
+
+    def bulk_tier(self, quantity):
+        index = bisect_right(self.bulk_quantities, quantity)
+        return self.bulk[index - 1] if index else None
+
+    def b2b_tier(self, customer_type, quantity):
+        index = bisect_right(self.b2b_quantities.get(customer_type, ()), quantity)
+        return self.b2b[customer_type][index - 1] if index else None
+
+
+def load_price_tier_tables(product_ids):
+    """Build tier tables for ``product_ids`` with one query per tier model."""
+    tables = {product_id: PriceTierTable() for product_id in product_ids}
+    if not tables:
+        return tables
+
+    bulk_rows = (
+        MarketplaceBulkPriceTier.objects.filter(product_id__in=tables)
+        .order_by("product_id", "min_quantity")
+        .values_list("product_id", "min_quantity", "price_per_unit", "discount_percent")
+    )
+    for product_id, min_quantity, price_per_unit, discount_percent in bulk_rows:
+        table = tables[product_id]
+        table.bulk_quantities.append(min_quantity)
+        table.bulk.append((min_quantity, price_per_unit, discount_percent))
+
+    b2b_rows = (
+        B2BPriceTier.objects.filter(product_id__in=tables, is_active=True)
+        .order_by("product_id", "customer_type", "min_quantity")
+        .values()
+    )
+    for row in b2b_rows:
+        table = tables[row["product_id"]]
+        table.b2b_quantities.setdefault(row["customer_type"], []).append(row["min_quantity"])
+        table.b2b.setdefault(row["customer_type"], []).append(row)
+    return tables
+
+
+def get_price_tier_tables(product_ids):
+    """Tier tables for ``product_ids``, from the cache where possible."""
+    product_ids = set(product_ids)
+    keys = {tier_cache_key(product_id): product_id for product_id in product_ids}
+    tables = {keys[key]: table for key, table in cache.get_many(list(keys)).items()}
+
+    missing = product_ids - tables.keys()
+    if missing:
+        loaded = load_price_tier_tables(missing)
+        timeout = getattr(settings, "PRICE_TIER_CACHE_TIMEOUT", 3600)
+        cache.set_many({tier_cache_key(product_id): table for product_id, table in loaded.items()}, timeout)
+        tables.update(loaded)
+    return tables
+
+
+class PriceResolver:
+    """
+    Resolves effective unit prices for one user across many products and quantities.
+
+    Call ``prefetch`` with every product about to be priced to load their
+    tiers in bulk; products that were not prefetched are loaded on demand.
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self.profile = None
+        self.business_type = None
+        self.b2b_customer_type = None  # business type whose B2B prices apply (verified businesses only)
+        self._tables = {}
+        self._prices = {}
+
+        if user is not None and user.is_authenticated:
+            self.profile = getattr(user, "user_profile", None)
+            if self.profile:
+                self.business_type = getattr(self.profile, "business_type", None)
+                if self.profile.is_b2b_eligible() and self.business_type:
+                    self.b2b_customer_type = self.business_type
+
+    @classmethod
+    def for_request(cls, request):
+        """The resolver memoized on ``request`` (created on first use)."""
+        resolver = getattr(request, REQUEST_ATTRIBUTE, None)
+        if resolver is None:
+            resolver = cls(getattr(request, "user", None))
+            setattr(request, REQUEST_ATTRIBUTE, resolver)
+        return resolver
+
+    @classmethod
+    def from_context(cls, context):
+        """Resolver for a serializer context: the request's, or a fresh anonymous one."""
+        request = context.get("request")
+        if request is not None:
+            return cls.for_request(request)
+        return context.setdefault(REQUEST_ATTRIBUTE, cls())
+
+    def prefetch(self, products):
+        missing = {product.pk for product in products} - self._tables.keys()
+        if missing:
+            self._tables.update(get_price_tier_tables(missing))
+        return self
+
+    def tiers(self, product):
+        table = self._tables.get(product.pk)
+        if table is None:
+            table = self._tables[product.pk] = get_price_tier_tables([product.pk])[product.pk]
+        return table
+
+    def price(self, product, quantity=1):
+        key = (product.pk, quantity)
+        if key not in self._prices:
+            self._prices[key] = self._resolve(product, quantity)
+        return self._prices[key]
+
+    def prices(self, items):
+        """Unit prices for ``(product, quantity)`` pairs, in order."""
+        items = list(items)
+        self.prefetch(product for product, _ in items)
+        return [self.price(product, quantity) for product, quantity in items]
+
+    def b2b_tiers(self, product):
+        """Active ``B2BPriceTier`` instances for this user's business type, by minimum quantity (B2B-eligible users only)."""
+        if not self.b2b_customer_type:
+            return []
+        return [B2BPriceTier(**row) for row in self.tiers(product).b2b.get(self.b2b_customer_type, [])]
+
+    def _resolve(self, product, quantity):
+        if not self.profile:
+            return product.price
+
+        if product.enable_b2b_sales and self.b2b_customer_type:
+            b2b_tier = self.tiers(product).b2b_tier(self.b2b_customer_type, quantity)
+            if b2b_tier:
+                return Decimal(str(b2b_tier["price_per_unit"]))
+
+            # Fallback to general B2B price if no specific tier
+            if product.b2b_price and quantity >= (product.b2b_min_quantity or 1):
+                return Decimal(str(product.b2b_price))
+
+        bulk_tier = self.tiers(product).bulk_tier(quantity)
+        if bulk_tier:
+            _, price_per_unit, discount_percent = bulk_tier
+            if price_per_unit:
+                return Decimal(str(price_per_unit))
+            elif discount_percent:
+                discount = product.listed_price * (discount_percent / 100)
+                return Decimal(str(product.listed_price - discount))
+
+        return product.price
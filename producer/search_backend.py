@@ -0,0 +1,633 @@
+"""
+Embedded, in-process search engine registered as a haystack backend.
+
+An inverted index over the fields of the registered search indexes
+(``MarketplaceProductIndex``) scored with BM25, for when Elasticsearch is
+slow or down, and as a deterministic target for tests and benchmarks::
+
+    HAYSTACK_CONNECTIONS["embedded"] = {
+        "ENGINE": "producer.search_backend.EmbeddedSearchEngine",
+        "PATH": "/var/lib/app/search_index",
+    }
+
+The same ``SearchQuerySet`` calls work against it: content and ``contains``
+lookups are BM25-scored token matches, ``startswith`` matches the last token
+as a prefix, ``exact`` / ``in`` are term filters on the normalized value of
+a string field, and ``gt`` / ``gte`` / ``lt`` / ``lte`` / ``range`` compare
+stored values (prices). Results are ordered by score, then by document id,
+so equal inputs always give equal pages.
+
+The index lives in ``PATH`` as immutable segments: a postings file of
+``(document, term frequency)`` uint32 pairs per term, memory-mapped for
+reads, and a JSON file with the sorted term dictionary, field lengths and
+stored fields. ``update`` writes a new segment and marks the documents it
+replaces as deleted; ``remove`` only marks deletions. A ``segments.json``
+manifest, replaced atomically, lists the live segments and their deletions,
+and readers reload when it changes. Once there are more than
+``MAX_SEGMENTS`` segments they are merged into one. Writes from several
+processes are serialized with a file lock.
+
+Fill it with ``manage.py update_index --using embedded``, or let
+``producer.search_indexing`` mirror every flush into it.
+"""
+
+import bisect
+import fcntl
+import json
+import math
+import mmap
+import os
+import re
+import threading
+from array import array
+from contextlib import contextmanager
+
+from haystack import connections
+from haystack.backends import BaseEngine, BaseSearchBackend, BaseSearchQuery, log_query
+from haystack.constants import DJANGO_CT, DJANGO_ID, ID
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+
+MANIFEST = "segments.json"
+LOCK_FILE = "write.lock"
+MAX_SEGMENTS = 8
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TOKEN_RE = re.compile(r"[\w\u0900-\u097f]+")  # word characters, plus Devanagari vowel signs and viramas
+TEXT_FIELD_TYPES = ("string", "edge_ngram", "ngram")
+SCORING_FILTERS = ("content", "contains", "endswith", "fuzzy", "startswith")
+# Lookups haystack recognizes; any other suffix is part of a plain content lookup
+VALID_FILTERS = {"contains", "exact", "gt", "gte", "lt", "lte", "in", "startswith", "range", "endswith", "content", "fuzzy"}
+
+
+def tokenize(value):
+    return TOKEN_RE.findall(str(value).lower())
+
+
+def normalize(value):
+    return str(value).strip().lower()
+
+
+def text_term(field, token):
+    return f"{field}:{token}"
+
+
+def keyword_term(field, value):
+    return f"{field}={normalize(value)}"
+
+
+def split_expression(expression):
+    """``(field, filter_type)`` of a lookup such as ``name__startswith``, as haystack splits it."""
+    parts = expression.split("__")
+    if len(parts) == 1 or parts[-1] not in VALID_FILTERS:
+        return parts[0], "content"
+    return parts[0], parts[-1]
+
+
+def query_value(value):
+    # AutoQuery, Exact, Clean ... carry the user's input in query_string
+    return getattr(value, "query_string", value)
+
+
+class SegmentBuilder:
+    """Accumulates documents in memory and writes them as one segment."""
+
+    def __init__(self):
+        self.keys = []
+        self.stored = []
+        self.lengths = {}
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, text_fields, stored, keyword_fields=()):
+        """
+        Add a document. ``text_fields`` maps a field to its values, whose
+        tokens are indexed, plus the whole normalized value for the fields in
+        ``keyword_fields``; ``stored`` is returned with results.
+        """
+        ordinal = len(self.keys)
+        self.keys.append(key)
+        self.stored.append(stored)
+        for field, values in text_fields.items():
+            frequencies = {}
+            length = 0
+            for value in values:
+                tokens = tokenize(value)
+                length += len(tokens)
+                for token in tokens:
+                    term = text_term(field, token)
+                    frequencies[term] = frequencies.get(term, 0) + 1
+                if field in keyword_fields:
+                    frequencies[keyword_term(field, value)] = 1
+            for term, frequency in frequencies.items():
+                self.postings.setdefault(term, []).append((ordinal, frequency))
+            lengths = self.lengths.setdefault(field, [])
+            lengths.extend([0] * (ordinal - len(lengths)))
+            lengths.append(length)
+
+    def add_postings(self, term, postings):
+        self.postings.setdefault(term, []).extend(postings)
+
+    def write(self, directory, name):
+        terms = sorted(self.postings)
+        data = array("I")
+        offsets, counts = [], []
+        for term in terms:
+            postings = self.postings[term]
+            offsets.append(len(data))
+            counts.append(len(postings))
+            for ordinal, frequency in postings:
+                data.append(ordinal)
+                data.append(frequency)
+        lengths = {field: values + [0] * (len(self.keys) - len(values)) for field, values in self.lengths.items()}
+
+        with open(os.path.join(directory, f"{name}.post"), "wb") as f:
+            data.tofile(f)
+        meta = {
+            "keys": self.keys,
+            "stored": self.stored,
+            "lengths": lengths,
+            "terms": terms,
+            "offsets": offsets,
+            "counts": counts,
+        }
+        with open(os.path.join(directory, f"{name}.meta.json"), "w") as f:
+            json.dump(meta, f, separators=(",", ":"))
+
+
+class Segment:
+    """A written segment; postings are read from the memory-mapped postings file."""
+
+    def __init__(self, directory, name):
+        self.name = name
+        with open(os.path.join(directory, f"{name}.meta.json")) as f:
+            meta = json.load(f)
+        self.keys = meta["keys"]
+        self.stored = meta["stored"]
+        self.lengths = meta["lengths"]
+        self.terms = meta["terms"]
+        self.offsets = meta["offsets"]
+        self.counts = meta["counts"]
+        self.term_ids = {term: index for index, term in enumerate(self.terms)}
+
+        self._postings = memoryview(b"").cast("I")
+        with open(os.path.join(directory, f"{name}.post"), "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                # The mapping stays valid after the file is closed (and after a merge deletes it)
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._postings = memoryview(self._mmap).cast("I")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def postings(self, term):
+        """``(ordinal, frequency)`` pairs of ``term``."""
+        index = self.term_ids.get(term)
+        if index is None:
+            return []
+        start = self.offsets[index]
+        view = self._postings[start : start + 2 * self.counts[index]]
+        return zip(view[0::2], view[1::2])
+
+    def terms_with_prefix(self, prefix):
+        index = bisect.bisect_left(self.terms, prefix)
+        while index < len(self.terms) and self.terms[index].startswith(prefix):
+            yield self.terms[index]
+            index += 1
+
+
+class Snapshot:
+    """Segments and deletions of one manifest generation, with the collection statistics BM25 needs."""
+
+    def __init__(self, segments, deleted):
+        self.segments = segments
+        self.deleted = deleted
+        self.live = {}
+        lengths, counts = {}, {}
+        for number, segment in enumerate(segments):
+            gone = deleted.get(segment.name, set())
+            for ordinal, key in enumerate(segment.keys):
+                if ordinal not in gone:
+                    self.live[key] = (number, ordinal)
+            for field, values in segment.lengths.items():
+                lengths[field] = lengths.get(field, 0) + sum(v for o, v in enumerate(values) if o not in gone)
+                counts[field] = counts.get(field, 0) + len(segment) - len(gone)
+        self.size = len(self.live)
+        self.average_length = {field: lengths[field] / counts[field] for field in lengths if counts[field]}
+
+    def is_live(self, number, ordinal):
+        return ordinal not in self.deleted.get(self.segments[number].name, ())
+
+    def stored(self, handle):
+        number, ordinal = handle
+        return self.segments[number].stored[ordinal]
+
+    def key(self, handle):
+        number, ordinal = handle
+        return self.segments[number].keys[ordinal]
+
+    def all_documents(self):
+        return {handle: 0.0 for handle in self.live.values()}
+
+    def score_term(self, field, term, scores=None):
+        """Add the BM25 score of ``term`` in ``field`` to ``scores`` (handle -> score) for every live match."""
+        scores = {} if scores is None else scores
+        matches = [
+            (number, ordinal, tf)
+            for number, segment in enumerate(self.segments)
+            for ordinal, tf in segment.postings(term)
+            if self.is_live(number, ordinal)
+        ]
+        if not matches:
+            return scores
+        # Document frequency over live documents only, so replaced versions don't dilute the idf
+        idf = math.log(1 + (self.size - len(matches) + 0.5) / (len(matches) + 0.5))
+        average = self.average_length.get(field) or 1.0
+        for number, ordinal, tf in matches:
+            lengths = self.segments[number].lengths.get(field)
+            length = lengths[ordinal] if lengths else 0
+            score = idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average))
+            scores[(number, ordinal)] = scores.get((number, ordinal), 0.0) + score
+        return scores
+
+    def match_term(self, term):
+        """Live documents containing ``term``, unscored."""
+        return {
+            (number, ordinal): 0.0
+            for number, segment in enumerate(self.segments)
+            for ordinal, _ in segment.postings(term)
+            if self.is_live(number, ordinal)
+        }
+
+
+class EmbeddedIndex:
+    """The segments of one index directory; safe to share between threads."""
+
+    def __init__(self, path, max_segments=MAX_SEGMENTS):
+        self.path = path
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._snapshot = Snapshot([], {})
+        self._manifest = {"generation": 0, "segments": [], "deleted": {}}
+
+    # Reading
+
+    def snapshot(self):
+        """The current snapshot, reloaded if another writer changed the manifest."""
+        try:
+            stat = os.stat(os.path.join(self.path, MANIFEST))
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._stamp:
+            with self._lock:
+                self._load(stamp)
+        return self._snapshot
+
+    def _load(self, stamp):
+        if stamp == self._stamp:
+            return
+        manifest = {"generation": 0, "segments": [], "deleted": {}}
+        if stamp is not None:
+            with open(os.path.join(self.path, MANIFEST)) as f:
+                manifest = json.load(f)
+        loaded = {segment.name: segment for segment in self._snapshot.segments}
+        segments = [loaded.get(name) or Segment(self.path, name) for name in manifest["segments"]]
+        deleted = {name: set(ordinals) for name, ordinals in manifest["deleted"].items()}
+        self._manifest, self._snapshot, self._stamp = manifest, Snapshot(segments, deleted), stamp
+
+    # Writing
+
+    @contextmanager
+    def _writing(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(os.path.join(self.path, LOCK_FILE), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.snapshot()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def write(self, builder=None, removed=()):
+        """Add the documents of ``builder`` (replacing earlier versions) and delete the ``removed`` keys."""
+        with self._writing():
+            snapshot = self._snapshot
+            manifest = {
+                "generation": self._manifest["generation"] + 1,
+                "segments": list(self._manifest["segments"]),
+                "deleted": {name: set(ordinals) for name, ordinals in self._manifest["deleted"].items()},
+            }
+            replaced = list(removed) + (builder.keys if builder else [])
+            for key in replaced:
+                handle = snapshot.live.get(key)
+                if handle is not None:
+                    manifest["deleted"].setdefault(snapshot.segments[handle[0]].name, set()).add(handle[1])
+            if builder is not None and len(builder):
+                name = f"seg_{manifest['generation']:08d}"
+                builder.write(self.path, name)
+                manifest["segments"].append(name)
+            self._commit(manifest)
+            if len(self._manifest["segments"]) > self.max_segments:
+                self._merge()
+
+    def clear(self):
+        with self._writing():
+            self._commit({"generation": self._manifest["generation"] + 1, "segments": [], "deleted": {}})
+
+    def optimize(self):
+        """Merge every segment into one, dropping deleted documents."""
+        with self._writing():
+            self._merge()
+
+    def _merge(self):
+        snapshot = self._snapshot
+        builder = SegmentBuilder()
+        fields = {field for segment in snapshot.segments for field in segment.lengths}
+        builder.lengths = {field: [] for field in fields}
+        for number, segment in enumerate(snapshot.segments):
+            remap = {}
+            for ordinal, key in enumerate(segment.keys):
+                if snapshot.is_live(number, ordinal):
+                    remap[ordinal] = len(builder.keys)
+                    builder.keys.append(key)
+                    builder.stored.append(segment.stored[ordinal])
+            for field in fields:
+                values = segment.lengths.get(field)
+                builder.lengths[field].extend(values[ordinal] if values else 0 for ordinal in remap)
+            for term in segment.terms:
+                postings = [(remap[o], tf) for o, tf in segment.postings(term) if o in remap]
+                if postings:
+                    builder.add_postings(term, postings)
+
+        generation = self._manifest["generation"] + 1
+        manifest = {"generation": generation, "segments": [], "deleted": {}}
+        if len(builder):
+            name = f"seg_{generation:08d}"
+            builder.write(self.path, name)
+            manifest["segments"].append(name)
+        self._commit(manifest)
+
+    def _commit(self, manifest):
+        manifest["deleted"] = {
+            name: sorted(ordinals) for name, ordinals in manifest["deleted"].items() if name in manifest["segments"]
+        }
+        temporary = os.path.join(self.path, f"{MANIFEST}.tmp")
+        with open(temporary, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, os.path.join(self.path, MANIFEST))
+        self._stamp = None
+        self.snapshot()
+
+        # Segments dropped by this manifest; readers still holding them keep their mappings
+        live = set(manifest["segments"])
+        for filename in os.listdir(self.path):
+            if filename.startswith("seg_") and filename.split(".")[0] not in live:
+                os.remove(os.path.join(self.path, filename))
+
+    # Searching
+
+    def evaluate(self, node, snapshot, text_fields, content_field):
+        """``{handle: score}`` of the documents matching a haystack query tree ``node``."""
+        if isinstance(node, tuple):
+            field, filter_type = split_expression(node[0])
+            value = query_value(node[1])
+            matches = self._evaluate_lookup(field, filter_type, value, snapshot, text_fields, content_field)
+        elif not node.children:
+            matches = snapshot.all_documents()
+        else:
+            matches = None
+            for child in node.children:
+                child_matches = self.evaluate(child, snapshot, text_fields, content_field)
+                if matches is None:
+                    matches = child_matches
+                elif node.connector == "OR":
+                    for handle, score in child_matches.items():
+                        matches[handle] = matches.get(handle, 0.0) + score
+                else:
+                    matches = intersect(matches, child_matches)
+        if getattr(node, "negated", False):
+            return {handle: 0.0 for handle in snapshot.live.values() if handle not in matches}
+        return matches
+
+    def _evaluate_lookup(self, field, filter_type, value, snapshot, text_fields, content_field):
+        if field == "content":
+            field = content_field
+
+        if filter_type in SCORING_FILTERS and field in text_fields:
+            tokens = tokenize(value)
+            if not tokens:
+                return {}
+            matches = None
+            for position, token in enumerate(tokens):
+                if filter_type == "startswith" and position == len(tokens) - 1:
+                    token_matches = {}
+                    for term in self._prefix_terms(snapshot, text_term(field, token)):
+                        for handle, score in snapshot.score_term(field, term).items():
+                            token_matches[handle] = max(token_matches.get(handle, 0.0), score)
+                else:
+                    token_matches = snapshot.score_term(field, text_term(field, token))
+                if matches is None:
+                    matches = token_matches
+                else:
+                    matches = intersect(matches, token_matches)
+                if not matches:
+                    return {}
+            return matches
+
+        if filter_type in ("exact", "in") and field in text_fields:
+            values = value if filter_type == "in" else [value]
+            matches = {}
+            for item in values:
+                matches.update(snapshot.match_term(keyword_term(field, query_value(item))))
+            return matches
+
+        return {
+            handle: 0.0
+            for handle in snapshot.live.values()
+            if compare(snapshot.stored(handle).get(field), filter_type, value)
+        }
+
+    @staticmethod
+    def _prefix_terms(snapshot, prefix):
+        terms = set()
+        for segment in snapshot.segments:
+            terms.update(segment.terms_with_prefix(prefix))
+        return sorted(terms)
+
+
+def intersect(matches, other):
+    """Documents in both ``matches`` and ``other``, with their scores added."""
+    return {handle: score + other[handle] for handle, score in matches.items() if handle in other}
+
+
+def compare(stored, filter_type, value):
+    """Whether a stored value passes a non-text lookup."""
+    if stored is None:
+        return False
+    if isinstance(stored, list):
+        return any(compare(item, filter_type, value) for item in stored)
+    try:
+        if filter_type == "in":
+            return any(compare(stored, "exact", item) for item in value)
+        if filter_type == "range":
+            low, high = value
+            return coerce(low, stored) <= stored <= coerce(high, stored)
+        other = coerce(query_value(value), stored)
+    except (TypeError, ValueError):
+        return False
+    if filter_type == "gt":
+        return stored > other
+    if filter_type == "gte":
+        return stored >= other
+    if filter_type == "lt":
+        return stored < other
+    if filter_type == "lte":
+        return stored <= other
+    if isinstance(stored, str):
+        return normalize(stored) == normalize(other)
+    return stored == other
+
+
+def coerce(value, like):
+    if isinstance(like, bool):
+        return value if isinstance(value, bool) else str(value).lower() in ("true", "1", "yes")
+    if isinstance(like, (int, float)):
+        return float(value)
+    return str(value)
+
+
+def jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple, set)):
+        return [jsonable(item) for item in value]
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path, max_segments=MAX_SEGMENTS):
+    """The process-wide ``EmbeddedIndex`` of ``path``."""
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = EmbeddedIndex(path, max_segments=max_segments)
+        return _indexes[path]
+
+
+class EmbeddedSearchBackend(BaseSearchBackend):
+    def __init__(self, connection_alias, **connection_options):
+        super().__init__(connection_alias, **connection_options)
+        if not connection_options.get("PATH"):
+            raise ValueError(f"The '{connection_alias}' search connection needs a PATH for its index files")
+        self.index = get_index(connection_options["PATH"], connection_options.get("MAX_SEGMENTS", MAX_SEGMENTS))
+
+    def text_fields(self):
+        unified_index = connections[self.connection_alias].get_unified_index()
+        fields = unified_index.all_searchfields()
+        return {name for name, field in fields.items() if field.field_type in TEXT_FIELD_TYPES}
+
+    def update(self, index, iterable, commit=True):
+        text_fields = self.text_fields()
+        content_field = index.get_content_field()
+        # Whole-value terms for exact and in filters; the document text is only searched by token
+        keyword_fields = text_fields - {content_field}
+        builder = SegmentBuilder()
+        for obj in iterable:
+            prepared = index.full_prepare(obj)
+            texts, stored = {}, {}
+            for name, value in prepared.items():
+                if value is None or name == ID:
+                    continue
+                if name in text_fields:
+                    texts[name] = value if isinstance(value, (list, tuple)) else [value]
+                if name != content_field:
+                    stored[name] = jsonable(value)
+            builder.add(prepared[ID], texts, stored, keyword_fields)
+        if len(builder):
+            self.index.write(builder)
+
+    def remove(self, obj_or_string, commit=True):
+        self.index.write(removed=[get_identifier(obj_or_string)])
+
+    def clear(self, models=None, commit=True):
+        if not models:
+            self.index.clear()
+            return
+        cts = {get_model_ct(model) for model in models}
+        snapshot = self.index.snapshot()
+        removed = [key for key, handle in snapshot.live.items() if snapshot.stored(handle).get(DJANGO_CT) in cts]
+        self.index.write(removed=removed)
+
+    @log_query
+    def search(self, query_string, start_offset=0, end_offset=None, sort_by=None, models=None, result_class=None, **kwargs):
+        snapshot = self.index.snapshot()
+        unified_index = connections[self.connection_alias].get_unified_index()
+        content_field = unified_index.document_field
+        matches = self.index.evaluate(query_string, snapshot, self.text_fields(), content_field)
+
+        if models:
+            cts = {get_model_ct(model) for model in models}
+            matches = {handle: score for handle, score in matches.items() if snapshot.stored(handle).get(DJANGO_CT) in cts}
+
+        ordered = self._sort(matches, snapshot, sort_by)
+        page = ordered[start_offset:end_offset]
+        result_class = result_class or SearchResult
+        results = []
+        for handle in page:
+            stored = dict(snapshot.stored(handle))
+            app_label, model_name = stored.pop(DJANGO_CT).split(".")
+            pk = stored.pop(DJANGO_ID)
+            results.append(result_class(app_label, model_name, pk, matches[handle], **stored))
+        return {"results": results, "hits": len(ordered), "facets": {}, "spelling_suggestion": None}
+
+    @staticmethod
+    def _sort(matches, snapshot, sort_by):
+        ordered = sorted(matches, key=snapshot.key)
+        ordered.sort(key=lambda handle: -matches[handle])
+        for field in reversed(sort_by or []):
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            if name in ("_score", "score"):
+                ordered.sort(key=lambda handle: matches[handle], reverse=descending)
+            else:
+                # Documents without the field sort last either way
+                present = [handle for handle in ordered if snapshot.stored(handle).get(name) is not None]
+                missing = [handle for handle in ordered if snapshot.stored(handle).get(name) is None]
+                present.sort(key=lambda handle: snapshot.stored(handle)[name], reverse=descending)
+                ordered = present + missing
+        return ordered
+
+    def more_like_this(self, model_instance, additional_query_string=None, result_class=None, **kwargs):
+        # Not supported: no similar documents, like haystack's simple backend, rather than failing the page
+        return {"results": [], "hits": 0, "facets": {}, "spelling_suggestion": None}
+
+
+class EmbeddedSearchQuery(BaseSearchQuery):
+    def build_query(self):
+        # The backend evaluates the filter tree itself rather than a query string
+        return self.query_filter
+
+    def build_query_fragment(self, field, filter_type, value):
+        return f"{field}__{filter_type}={query_value(value)!r}"
+
+    def __str__(self):
+        return self.query_filter.as_query_string(self.build_query_fragment)
+
+
+class EmbeddedSearchEngine(BaseEngine):
+    backend = EmbeddedSearchBackend
+    query = EmbeddedSearchQuery
@@ -17,11 +17,19 @@ class MarketplaceProductIndex(indexes.SearchIndex, indexes.Indexable):
     brand = indexes.CharField(model_attr="product__brand__name", null=True)
     size = indexes.CharField(model_attr="size", null=True)
     color = indexes.CharField(model_attr="color", null=True)
+    sku = indexes.CharField(model_attr="product__sku", null=True)
+    listed_price = indexes.FloatField(model_attr="listed_price", null=True)
     search_tags = indexes.CharField(model_attr="search_tags", null=True)
 
     def get_model(self):
         return MarketplaceProduct
 
+    def index_queryset(self, using=None):
+        # Everything the fields and the text template read, so preparing a document runs no queries
+        return self.get_model().objects.select_related(
+            "product__category", "product__subcategory", "product__sub_subcategory", "product__brand"
+        )
+
     def prepare_search_tags(self, obj):
         if not obj.search_tags:
             return ""
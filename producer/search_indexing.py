@@ -0,0 +1,409 @@
+"""
+Queued, incremental indexing of ``MarketplaceProductIndex``.
+
+Writes never wait on Elasticsearch. ``QueuedSignalProcessor`` (the haystack
+signal processor) marks saved and deleted marketplace products dirty once
+their transaction commits. Saved products are marked too, and their listings
+are looked up at flush time. Bulk writers that bypass signals (``update()``)
+call ``mark_dirty`` / ``mark_queryset_dirty`` themselves. ``collect()``
+gathers the marks of a loop of saves into a single enqueue.
+
+The dirty set is a sorted set scored by the time an id was first marked, so
+any number of changes to one listing coalesce into one reindex, and the score
+gives the indexing lag reported as ``search_index_lag_seconds``.
+``SearchIndexer.flush`` runs as a Celery beat task every
+``SEARCH_INDEX_FLUSH_INTERVAL`` seconds. It pops ids in batches, loads them
+through ``index_queryset()`` (joined, so preparing a document runs no
+queries) and writes each batch with one bulk request. Documents whose listing
+is gone are deleted in bulk as well. A failed batch goes back on the queue.
+
+``rebuild`` loads a fresh physical index behind the index name, which becomes
+an alias, and swaps the alias atomically, so searches are served throughout.
+Listings flushed while a rebuild is loading are replayed after the swap.
+
+Without Redis (local development, tests) an in-process queue is used and
+flushed from the write path once ``flush_interval`` has elapsed.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+from haystack.signals import BaseSignalProcessor
+
+from market.metrics import COUNTER, GAUGE, HISTOGRAM, metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# The hash tag keeps both queues on the same cluster slot
+KEY_PREFIX = "search_index:{producer}"
+DIRTY_KEY = f"{KEY_PREFIX}:dirty"
+REPLAY_KEY = f"{KEY_PREFIX}:replay"
+# Set while a rebuild loads its new index; names that index
+REBUILD_KEY = "search_index:rebuilding"
+REBUILD_TIMEOUT = 6 * 3600
+
+# Queue members: "m:<id>" for a marketplace product, "p:<id>" for a product whose listings changed
+LISTING, PRODUCT = "m", "p"
+
+
+def _member(kind, pk):
+    return f"{kind}:{pk}"
+
+
+def _parse_member(member):
+    if isinstance(member, bytes):
+        member = member.decode()
+    kind, pk = member.split(":", 1)
+    return kind, int(pk)
+
+
+class LocalIndexQueue:
+    """In-process queue with the same semantics as the Redis one."""
+
+    is_local = True
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, entries):
+        with self._lock:
+            queue = self._entries.setdefault(key, {})
+            for member, timestamp in entries.items():
+                queue.setdefault(member, timestamp)
+
+    def pop(self, key, limit):
+        with self._lock:
+            queue = self._entries.get(key, {})
+            # Oldest first, ties by member, like ZPOPMIN
+            batch = sorted(queue.items(), key=lambda entry: (entry[1], entry[0]))[:limit]
+            for member, _ in batch:
+                del queue[member]
+            return batch
+
+    def size(self, key):
+        return len(self._entries.get(key, {}))
+
+    def oldest(self, key):
+        queue = self._entries.get(key, {})
+        return min(queue.values()) if queue else None
+
+
+class RedisIndexQueue:
+    is_local = False
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def add(self, key, entries):
+        # NX keeps the first mark's time, so the lag covers the oldest unindexed change
+        self._connection.zadd(key, entries, nx=True)
+
+    def pop(self, key, limit):
+        return self._connection.zpopmin(key, limit)
+
+    def size(self, key):
+        return self._connection.zcard(key)
+
+    def oldest(self, key):
+        entries = self._connection.zrange(key, 0, 0, withscores=True)
+        return entries[0][1] if entries else None
+
+
+class SearchIndexer:
+    """
+    Records dirty listings (``mark_dirty``, ``collect``), indexes them in
+    batches (``flush``) and rebuilds the index behind its alias (``rebuild``).
+    """
+
+    def __init__(self, queue=None, using="default"):
+        self._queue = queue
+        self.using = using
+        self.batch_size = getattr(settings, "SEARCH_INDEX_BATCH_SIZE", 500)
+        self.flush_interval = getattr(settings, "SEARCH_INDEX_FLUSH_INTERVAL", 15)
+        self.mirrors = [alias for alias in getattr(settings, "SEARCH_INDEX_MIRRORS", ()) if alias != using]
+        self._collecting = threading.local()
+        self._last_flush = time.monotonic()
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = self._default_queue()
+        return self._queue
+
+    def _default_queue(self):
+        try:
+            from django_redis import get_redis_connection
+
+            return RedisIndexQueue(get_redis_connection("default"))
+        except Exception:
+            # Non-Redis cache backend (e.g. LocMemCache) or django_redis missing
+            return LocalIndexQueue()
+
+    @property
+    def index(self):
+        from haystack import connections
+
+        from .models import MarketplaceProduct
+
+        return connections[self.using].get_unified_index().get_index(MarketplaceProduct)
+
+    def get_backend(self, index_name=None):
+        """A backend of its own that raises instead of logging failures, so failed batches are retried."""
+        from haystack import connections
+
+        backend = connections[self.using].get_backend()
+        backend.silently_fail = False
+        if index_name is not None:
+            backend.index_name = index_name
+        return backend
+
+    # Recording
+
+    def mark_dirty(self, listing_ids=(), product_ids=()):
+        """Queue marketplace products (and the listings of products) for reindexing once the transaction commits."""
+        members = {_member(LISTING, pk) for pk in listing_ids} | {_member(PRODUCT, pk) for pk in product_ids}
+        if not members:
+            return
+        pending = getattr(self._collecting, "members", None)
+        if pending is not None:
+            pending.update(members)
+            return
+        transaction.on_commit(lambda: self._enqueue(members))
+
+    def mark_queryset_dirty(self, queryset):
+        """Mark the marketplace products of ``queryset``; call it before ``update()``s that change what it matches."""
+        self.mark_dirty(listing_ids=list(queryset.values_list("pk", flat=True)))
+
+    @contextmanager
+    def collect(self):
+        """Gather the marks made inside the block into one enqueue at its end."""
+        if getattr(self._collecting, "members", None) is not None:
+            yield
+            return
+        self._collecting.members = set()
+        try:
+            yield
+        finally:
+            members, self._collecting.members = self._collecting.members, None
+            if members:
+                transaction.on_commit(lambda: self._enqueue(members))
+
+    def _enqueue(self, members):
+        now = time.time()
+        try:
+            self.queue.add(DIRTY_KEY, {member: now for member in members})
+        except Exception as e:
+            # The listings stay stale in search until they change again or the index is rebuilt
+            logger.warning(f"Search index queue unavailable, {len(members)} changes not queued: {e}")
+            metrics_registry.record("search_index_enqueue_failures", len(members), metric_type=COUNTER)
+            return
+        if self.queue.is_local and time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Search index flush failed: {e}")
+
+    # Indexing
+
+    def flush(self, max_batches=None):
+        """Index queued listings batch by batch; returns the number of documents indexed and removed."""
+        self._last_flush = time.monotonic()
+        counts = {"indexed": 0, "removed": 0, "batches": 0}
+        backend = self.get_backend()
+        while max_batches is None or counts["batches"] < max_batches:
+            entries = self.queue.pop(DIRTY_KEY, self.batch_size)
+            if not entries:
+                break
+            try:
+                indexed, removed = self.index_entries(entries, backend)
+            except Exception:
+                self.queue.add(DIRTY_KEY, dict(entries))
+                raise
+            if cache.get(REBUILD_KEY) is not None:
+                # The rebuild may have loaded these listings before they changed
+                self.queue.add(REPLAY_KEY, dict(entries))
+            counts["indexed"] += indexed
+            counts["removed"] += removed
+            counts["batches"] += 1
+            if len(entries) < self.batch_size:
+                break
+
+        metrics_registry.record("search_index_queue_depth", self.queue.size(DIRTY_KEY), metric_type=GAUGE)
+        oldest = self.queue.oldest(DIRTY_KEY)
+        metrics_registry.record(
+            "search_index_oldest_pending_seconds", time.time() - oldest if oldest else 0, metric_type=GAUGE
+        )
+        return counts
+
+    def index_entries(self, entries, backend=None):
+        """Index (or delete) the listings of popped queue ``entries``; returns ``(indexed, removed)``."""
+        from .models import MarketplaceProduct
+
+        started = time.perf_counter()
+        marked_at, product_marks = {}, {}
+        for member, timestamp in entries:
+            kind, pk = _parse_member(member)
+            marks = marked_at if kind == LISTING else product_marks
+            marks[pk] = min(marks.get(pk, timestamp), timestamp)
+        if product_marks:
+            listings = MarketplaceProduct.objects.filter(product_id__in=product_marks).values_list("id", "product_id")
+            for pk, product_id in listings:
+                marked_at[pk] = min(marked_at.get(pk, product_marks[product_id]), product_marks[product_id])
+
+        backend = backend or self.get_backend()
+        index = self.index
+        listings = list(index.index_queryset(using=self.using).filter(pk__in=marked_at))
+        missing = marked_at.keys() - {listing.pk for listing in listings}
+        # Mirrors first: a batch the primary fails is retried, and updating a mirror again is harmless
+        for alias in self.mirrors:
+            self.mirror(alias, listings, missing)
+        if listings:
+            backend.update(index, listings)
+        if missing:
+            self.remove(missing, backend)
+
+        now = time.time()
+        for timestamp in marked_at.values():
+            metrics_registry.record("search_index_lag_seconds", now - timestamp, metric_type=HISTOGRAM)
+        duration = time.perf_counter() - started
+        metrics_registry.record("search_index_batch_duration_seconds", duration, metric_type=HISTOGRAM)
+        metrics_registry.record("search_index_documents", len(listings), {"operation": "index"}, COUNTER)
+        metrics_registry.record("search_index_documents", len(missing), {"operation": "delete"}, COUNTER)
+        return len(listings), len(missing)
+
+    def mirror(self, alias, listings, missing):
+        """Apply a batch to the ``alias`` connection as well; failures are logged, not retried."""
+        from haystack import connections
+
+        from .models import MarketplaceProduct
+
+        try:
+            backend = connections[alias].get_backend()
+            if listings:
+                backend.update(connections[alias].get_unified_index().get_index(MarketplaceProduct), listings)
+            for pk in sorted(missing):
+                backend.remove(f"{MarketplaceProduct._meta.label_lower}.{pk}")
+        except Exception as e:
+            logger.warning(f"Search index mirror '{alias}' not updated: {e}")
+            metrics_registry.record("search_index_mirror_failures", 1, {"connection": alias}, COUNTER)
+
+    def remove(self, listing_ids, backend=None):
+        """Delete the documents of ``listing_ids`` with one bulk request."""
+        from elasticsearch.helpers import bulk
+
+        from .models import MarketplaceProduct
+
+        backend = backend or self.get_backend()
+        label = MarketplaceProduct._meta.label_lower
+        actions = [
+            {"_op_type": "delete", "_index": backend.index_name, "_id": f"{label}.{pk}"} for pk in sorted(listing_ids)
+        ]
+        # Listings that were never indexed come back as 404s, which are fine
+        bulk(backend.conn, actions, raise_on_error=False)
+
+    # Rebuilding
+
+    def rebuild(self, batch_size=None, keep_old=False, log=None):
+        """
+        Load every listing into a new physical index and point the index
+        alias at it in one atomic alias update. Returns the new index name.
+        """
+        from haystack import connections
+
+        log = log or logger.info
+        batch_size = batch_size or self.batch_size
+        backend = self.get_backend()
+        alias = backend.index_name
+        new_name = f"{alias}_{timezone.now():%Y%m%d%H%M%S}"
+
+        _, field_mapping = backend.build_schema(connections[self.using].get_unified_index().all_searchfields())
+        backend.conn.indices.create(index=new_name, body=backend.DEFAULT_SETTINGS)
+        backend.conn.indices.put_mapping(index=new_name, body={"properties": field_mapping})
+        target = self.get_backend(new_name)
+        target.setup_complete = True
+
+        cache.set(REBUILD_KEY, new_name, REBUILD_TIMEOUT)
+        try:
+            queryset = self.index.index_queryset(using=self.using).order_by("pk")
+            last_pk, total = 0, 0
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                target.update(self.index, batch)
+                last_pk = batch[-1].pk
+                total += len(batch)
+                log(f"Indexed {total} listings into {new_name}")
+            old_names = self.swap_alias(backend, new_name)
+        except Exception:
+            backend.conn.indices.delete(index=new_name, ignore=[404])
+            raise
+        finally:
+            cache.delete(REBUILD_KEY)
+
+        self.replay()
+        if old_names and not keep_old:
+            backend.conn.indices.delete(index=",".join(old_names), ignore=[404])
+        log(f"{alias} now points to {new_name} ({total} listings)")
+        return new_name
+
+    def swap_alias(self, backend, new_name):
+        """Point the alias at ``new_name`` atomically; returns the indexes it pointed to before."""
+        conn, alias = backend.conn, backend.index_name
+        actions = [{"add": {"index": new_name, "alias": alias}}]
+        old_names = []
+        if conn.indices.exists_alias(name=alias):
+            old_names = list(conn.indices.get_alias(name=alias))
+            actions += [{"remove": {"index": name, "alias": alias}} for name in old_names]
+        elif conn.indices.exists(index=alias):
+            # A concrete index still holds the name from before indexes were aliased; it goes in the same update
+            actions.insert(0, {"remove_index": {"index": alias}})
+        conn.indices.update_aliases(body={"actions": actions})
+        return old_names
+
+    def replay(self):
+        """Requeue listings flushed while a rebuild was loading, so the new index gets their latest state."""
+        while True:
+            entries = self.queue.pop(REPLAY_KEY, self.batch_size)
+            if not entries:
+                break
+            self.queue.add(DIRTY_KEY, dict(entries))
+
+
+search_indexer = SearchIndexer()
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """Haystack signal processor that queues changes for ``SearchIndexer.flush`` instead of indexing inline."""
+
+    def setup(self):
+        from .models import MarketplaceProduct, Product
+
+        for sender in (MarketplaceProduct, Product):
+            models.signals.post_save.connect(self.handle_save, sender=sender)
+            models.signals.post_delete.connect(self.handle_delete, sender=sender)
+
+    def teardown(self):
+        from .models import MarketplaceProduct, Product
+
+        for sender in (MarketplaceProduct, Product):
+            models.signals.post_save.disconnect(self.handle_save, sender=sender)
+            models.signals.post_delete.disconnect(self.handle_delete, sender=sender)
+
+    def handle_save(self, sender, instance, **kwargs):
+        if sender._meta.model_name == "product":
+            search_indexer.mark_dirty(product_ids=[instance.pk])
+        else:
+            search_indexer.mark_dirty(listing_ids=[instance.pk])
+
+    def handle_delete(self, sender, instance, **kwargs):
+        # Deleted products cascade to their listings, which are marked by their own post_delete
+        if sender._meta.model_name != "product":
+            search_indexer.mark_dirty(listing_ids=[instance.pk])
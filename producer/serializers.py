@@ -4,6 +4,7 @@ from re import M
 
 from django.contrib.auth.models import User
 from django.contrib.gis.geos import Point
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 import market
@@ -34,6 +35,7 @@ from .models import (
     Subcategory,
     SubSubcategory,
 )
+from .pricing import PriceResolver
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -45,6 +47,10 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
     def get_subcategories_count(self, obj):
+        # Callers serializing many categories can prefetch active subcategories into ``active_subcategories``
+        active_subcategories = getattr(obj, "active_subcategories", None)
+        if active_subcategories is not None:
+            return len(active_subcategories)
         return obj.subcategories.filter(is_active=True).count()
 
 
@@ -165,6 +171,9 @@ class SubcategoryLightSerializer(serializers.ModelSerializer):
         fields = ["id", "code", "name", "category", "category_name", "category_code", "sub_subcategories_count"]
 
     def get_sub_subcategories_count(self, obj):
+        active_sub_subcategories = getattr(obj, "active_sub_subcategories", None)
+        if active_sub_subcategories is not None:
+            return len(active_sub_subcategories)
         return obj.sub_subcategories.filter(is_active=True).count()
 
 
@@ -415,19 +424,22 @@ class ProductSerializer(serializers.ModelSerializer):
         """Get brand information from the brand_info property"""
         return obj.brand_info
 
+    def _first_marketplace_listing(self, obj):
+        # Callers serializing many products can prefetch listings (ordered by pk) into ``marketplace_listings``
+        listings = getattr(obj, "marketplace_listings", None)
+        if listings is not None:
+            return listings[0] if listings else None
+        return MarketplaceProduct.objects.filter(product=obj).first()
+
     def get_marketplace_id(self, obj):
         """Return the id of the related MarketplaceProduct if it exists, else None."""
-        marketplace_product = MarketplaceProduct.objects.filter(product=obj)
-        if marketplace_product.exists():
-            return marketplace_product.first().id
-        return None
+        marketplace_product = self._first_marketplace_listing(obj)
+        return marketplace_product.id if marketplace_product else None
 
     def get_marketplace_discounted_price(self, obj):
         """Return the discounted_price of the related MarketplaceProduct if it exists, else None."""
-        marketplace_product = MarketplaceProduct.objects.filter(product=obj)
-        if marketplace_product.exists():
-            return marketplace_product.first().discounted_price
-        return None
+        marketplace_product = self._first_marketplace_listing(obj)
+        return marketplace_product.discounted_price if marketplace_product else None
 
     def validate_price(self, value):
         """
@@ -739,6 +751,49 @@ class SellerInfoSerializer(serializers.ModelSerializer):
         fields = ["id", "username"]
 
 
+def marketplace_product_prefetches(prefix=""):
+    """
+    Prefetch lookups that let ``MarketplaceProductSerializer`` render any number
+    of products in a fixed number of queries. ``prefix`` is the path from the
+    objects being prefetched to the marketplace product, e.g. ``"product__"``.
+    """
+    return [
+        f"{prefix}product__user__user_profile",
+        f"{prefix}product__images",
+        f"{prefix}product__brand__category",
+        f"{prefix}product__brand__subcategory",
+        Prefetch(
+            f"{prefix}product__category__subcategories",
+            queryset=Subcategory.objects.filter(is_active=True),
+            to_attr="active_subcategories",
+        ),
+        f"{prefix}product__subcategory__category",
+        Prefetch(
+            f"{prefix}product__subcategory__sub_subcategories",
+            queryset=SubSubcategory.objects.filter(is_active=True),
+            to_attr="active_sub_subcategories",
+        ),
+        f"{prefix}product__sub_subcategory__subcategory__category",
+        Prefetch(
+            f"{prefix}product__marketplaceproduct_set",
+            queryset=MarketplaceProduct.objects.order_by("pk").only("id", "product_id", "discounted_price"),
+            to_attr="marketplace_listings",
+        ),
+        f"{prefix}bulk_price_tiers",
+        f"{prefix}variants",
+        Prefetch(f"{prefix}reviews", queryset=MarketplaceProductReview.objects.select_related("user")),
+    ]
+
+
+class MarketplaceProductListSerializer(serializers.ListSerializer):
+    """Loads the price tiers of every product on the page before the items are serialized."""
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, "all") else data)
+        PriceResolver.from_context(self.context).prefetch(products)
+        return super().to_representation(products)
+
+
 class MarketplaceProductSerializer(serializers.ModelSerializer):
     product_details = ProductSerializer(source="product", read_only=True)
     latitude = serializers.FloatField(source="product.user.user_profile.latitude", read_only=True)
@@ -779,6 +834,7 @@ class MarketplaceProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = MarketplaceProduct
+        list_serializer_class = MarketplaceProductListSerializer
         fields = [
             "id",
             "product",
@@ -835,23 +891,17 @@ class MarketplaceProductSerializer(serializers.ModelSerializer):
 
     def get_b2b_price_tiers(self, obj):
         """Get B2B price tiers for eligible users"""
-        user = self.context.get("request", {}).user if self.context.get("request") else None
-        if user and user.is_authenticated:
-            try:
-                profile = getattr(user, "user_profile", None)
-                if profile and getattr(profile, "is_b2b_eligible", False):
-                    tiers = obj.b2b_price_tiers.filter(customer_type=profile.business_type, is_active=True)
-                    return B2BPriceTierSerializer(tiers, many=True).data
-            except (AttributeError, TypeError):
-                pass
-        return []
+        try:
+            tiers = PriceResolver.from_context(self.context).b2b_tiers(obj)
+        except (AttributeError, TypeError):
+            return []
+        return B2BPriceTierSerializer(tiers, many=True).data
 
     def get_effective_price(self, obj):
         """Get effective price for the current user"""
-        user = self.context.get("request", {}).user if self.context.get("request") else None
         quantity = self.context.get("quantity", 1)
         try:
-            return float(obj.get_effective_price_for_user(user, quantity))
+            return float(PriceResolver.from_context(self.context).price(obj, quantity))
         except (AttributeError, TypeError):
             return float(obj.price)
 
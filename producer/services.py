@@ -10,6 +10,7 @@ from django.db import transaction
 from django.utils import timezone
 
 from .models import B2BPriceTier, MarketplaceProduct
+from .pricing import PriceResolver
 
 
 class B2BPricingService:
@@ -27,6 +28,7 @@ class B2BPricingService:
         Returns:
             Dict containing line items, totals, and B2B information
         """
+        unit_prices = PriceResolver(user).prices((item["product"], item["quantity"]) for item in items)
         total = Decimal("0")
         line_items = []
         is_b2b_order = False
@@ -38,12 +40,9 @@ class B2BPricingService:
         except AttributeError:
             is_b2b_eligible = False
 
-        for item in items:
+        for item, unit_price in zip(items, unit_prices):
             product = item["product"]
             quantity = item["quantity"]
-
-            # Calculate unit price using the product's pricing logic
-            unit_price = product.get_effective_price_for_user(user, quantity)
             line_total = unit_price * quantity
 
             # Check if this item uses B2B pricing
@@ -100,7 +99,9 @@ class B2BPricingService:
         return order_info
 
     @staticmethod
-    def get_b2b_pricing_for_product(product: MarketplaceProduct, user: User, quantity: int = 1) -> Dict[str, Any]:
+    def get_b2b_pricing_for_product(
+        product: MarketplaceProduct, user: User, quantity: int = 1, resolver: Optional[PriceResolver] = None
+    ) -> Dict[str, Any]:
         """
         Get detailed B2B pricing information for a specific product.
 
@@ -108,6 +109,7 @@ class B2BPricingService:
             product: The marketplace product
             user: The user requesting pricing
             quantity: Quantity for pricing calculation
+            resolver: Price resolver to reuse across calls for the same user
 
         Returns:
             Dict containing pricing breakdown and B2B information
@@ -119,8 +121,9 @@ class B2BPricingService:
             is_b2b_eligible = False
             profile = None
 
+        resolver = resolver or PriceResolver(user)
         regular_price = product.price
-        effective_price = product.get_effective_price_for_user(user, quantity)
+        effective_price = resolver.price(product, quantity)
 
         pricing_info = {
             "regular_price": regular_price,
@@ -138,9 +141,7 @@ class B2BPricingService:
         # Add B2B specific information
         if is_b2b_eligible and product.enable_b2b_sales:
             # Get applicable B2B tiers
-            b2b_tiers = product.b2b_price_tiers.filter(customer_type=profile.business_type, is_active=True).order_by(
-                "min_quantity"
-            )
+            b2b_tiers = resolver.b2b_tiers(product)
 
             tier_breakdown = []
             for tier in b2b_tiers:
@@ -257,9 +258,10 @@ class B2BPricingService:
             quantity_tiers.append(max_quantity)
         quantity_tiers = sorted([q for q in quantity_tiers if q <= max_quantity])
 
+        resolver = PriceResolver(user)
         breakdown = []
         for qty in quantity_tiers:
-            pricing = B2BPricingService.get_b2b_pricing_for_product(product, user, qty)
+            pricing = B2BPricingService.get_b2b_pricing_for_product(product, user, qty, resolver=resolver)
             breakdown.append(
                 {
                     "quantity": qty,
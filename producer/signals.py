@@ -1,11 +1,29 @@
 from django.apps import apps
 from django.conf import settings
-from django.db.models.signals import post_delete, post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from main.manager import resolve_shop_id
+from producer.pricing import invalidate_price_tiers
+from producer.taxonomy import invalidate_taxonomy, taxonomy_cache
+
 User = apps.get_model(settings.AUTH_USER_MODEL)
 CreatorProfile = apps.get_model("producer", "CreatorProfile")
+MarketplaceProduct = apps.get_model("producer", "MarketplaceProduct")
+MarketplaceProductReview = apps.get_model("producer", "MarketplaceProductReview")
+MarketplaceBulkPriceTier = apps.get_model("producer", "MarketplaceBulkPriceTier")
+B2BPriceTier = apps.get_model("producer", "B2BPriceTier")
+Category = apps.get_model("producer", "Category")
+Subcategory = apps.get_model("producer", "Subcategory")
+SubSubcategory = apps.get_model("producer", "SubSubcategory")
 ShoppableVideo = apps.get_model("market", "ShoppableVideo")
+UserProfile = apps.get_model("user", "UserProfile")
+
+# Models carrying a denormalized copy of their user's shop id, for tenant filters without the user -> profile join
+SHOP_SCOPED_MODELS = [
+    apps.get_model("producer", name) for name in ("Producer", "Customer", "Product", "Order", "Sale", "PurchaseOrder")
+]
 
 
 @receiver(post_save, sender=ShoppableVideo)
@@ -46,3 +64,56 @@ def backfill_shoppable_videos_creator_profile(sender, instance, created, **kwarg
             )
     except Exception:
         pass
+
+
+@receiver(post_delete, sender=MarketplaceProductReview)
+def remove_review_from_product_aggregates(sender, instance, **kwargs):
+    """Take a deleted review out of its product's rating aggregates (runs inside the delete transaction)."""
+    MarketplaceProduct.apply_review_change(instance.product_id, removed=instance.rating)
+
+
+@receiver(post_save, sender=MarketplaceBulkPriceTier)
+@receiver(post_delete, sender=MarketplaceBulkPriceTier)
+@receiver(post_save, sender=B2BPriceTier)
+@receiver(post_delete, sender=B2BPriceTier)
+def invalidate_product_price_tiers(sender, instance, **kwargs):
+    """Drop the cached tier table once the tier change is committed, so no reader re-caches the old tiers."""
+    product_id = instance.product_id
+    transaction.on_commit(lambda: invalidate_price_tiers(product_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+@receiver(post_save, sender=SubSubcategory)
+@receiver(post_delete, sender=SubSubcategory)
+def invalidate_cached_taxonomy(sender, instance, **kwargs):
+    """
+    Let the rest of this transaction read the changed tree right away, and bump the shared
+    version once the change is committed, so no worker reloads the old tree under the new stamp.
+    """
+    taxonomy_cache.invalidate_local()
+    transaction.on_commit(invalidate_taxonomy)
+
+
+def set_shop_id(sender, instance, **kwargs):
+    """
+    Copy the owner's shop id onto tenant rows as they are saved, every time,
+    so a row given to another user moves to that user's shop (the lookup is cached).
+    """
+    if instance.user_id:
+        instance.shop_id = resolve_shop_id(instance.user_id)
+
+
+for shop_scoped_model in SHOP_SCOPED_MODELS:
+    pre_save.connect(set_shop_id, sender=shop_scoped_model, dispatch_uid=f"set_shop_id_{shop_scoped_model.__name__}")
+
+
+@receiver(post_save, sender=UserProfile)
+def propagate_shop_id(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the denormalized shop id of the user's tenant rows in step with their profile."""
+    if update_fields is not None and "shop_id" not in update_fields:
+        return
+    for model in SHOP_SCOPED_MODELS:
+        model.objects.filter(user_id=instance.user_id).exclude(shop_id=instance.shop_id).update(shop_id=instance.shop_id)
@@ -1,4 +1,139 @@
+import itertools
+import logging
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from main.processes import POOL_UNAVAILABLE_ERRORS, pool_workers
+
+logger = logging.getLogger(__name__)
+
+# Below this many products a process pool costs more than it saves
+PARALLEL_MIN_PRODUCTS = 500
+
+
+def _trie_pattern(words):
+    """
+    A regex matching any of ``words``, shaped as a trie so the engine follows
+    one branch per character instead of trying every word in turn. Optional
+    tails are greedy, so at a given position the longest word wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = None
+
+    def render(node):
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return render(trie)
+
+
+class KeywordMatcher:
+    r"""
+    Finds which keywords of a fixed dictionary occur in a text in one regex
+    pass, with the semantics of ``keyword in text`` (or of
+    ``re.search(rf"\b{keyword}\b", text)`` with ``whole_words``).
+
+    The pattern is a lookahead, so it is tried at every position and reports
+    the longest keyword starting there. Every other keyword starting at that
+    position is contained in the longest one, so each keyword also carries the
+    precomputed set of dictionary keywords it contains.
+    """
+
+    def __init__(self, tags_by_keyword, whole_words=False):
+        self.tags_by_keyword = {keyword: frozenset(tags) for keyword, tags in tags_by_keyword.items() if keyword}
+        keywords = sorted(self.tags_by_keyword)
+        boundary = r"\b" if whole_words else ""
+        self.pattern = re.compile(f"(?=({boundary}{_trie_pattern(keywords)}{boundary}))") if keywords else None
+
+        def contains(keyword, other):
+            if whole_words:
+                return re.search(boundary + re.escape(other) + boundary, keyword) is not None
+            return other in keyword
+
+        self.contained = {
+            keyword: frozenset(other for other in keywords if len(other) <= len(keyword) and contains(keyword, other))
+            for keyword in keywords
+        }
+
+    def find(self, text):
+        """The keywords occurring in ``text``."""
+        found = set()
+        if self.pattern is not None:
+            for longest in set(self.pattern.findall(text)):
+                found |= self.contained[longest]
+        return found
+
+    def tags(self, text):
+        """The tags of the keywords occurring in ``text``."""
+        tags = set()
+        for keyword in self.find(text):
+            tags |= self.tags_by_keyword[keyword]
+        return tags
+
+
+@dataclass
+class TagSource:
+    """
+    What tag extraction reads from a marketplace product, as plain data, so
+    tags can be extracted in worker processes without database access.
+    """
+
+    name: str
+    description: str = ""
+    additional_information: str = ""
+    category_code: Optional[str] = None
+    category_name: Optional[str] = None
+    color: Optional[str] = None
+    color_display: str = ""
+    is_made_in_nepal: bool = False
+    is_delivery_free: bool = False
+    enable_b2b_sales: bool = False
+    is_featured: bool = False
+    made_for_you: bool = False
+    is_available: bool = True
+    discounted_price: Optional[float] = None
+    discount_percentage: Optional[float] = None
+    listed_price: float = 0
+    recent_purchases_count: int = 0
+    view_count: int = 0
+
+    @classmethod
+    def from_listing(cls, marketplace_product):
+        from .models import MarketplaceProduct
+
+        product = marketplace_product.product
+        category = product.category
+        color = marketplace_product.color
+        return cls(
+            name=product.name,
+            description=product.description or "",
+            additional_information=marketplace_product.additional_information or "",
+            category_code=category.code if category else None,
+            category_name=category.name if category else None,
+            color=color,
+            color_display=dict(MarketplaceProduct.ColorChoices.choices).get(color, "") if color else "",
+            is_made_in_nepal=marketplace_product.is_made_in_nepal,
+            is_delivery_free=marketplace_product.is_delivery_free,
+            enable_b2b_sales=marketplace_product.enable_b2b_sales,
+            is_featured=marketplace_product.is_featured,
+            made_for_you=marketplace_product.made_for_you,
+            is_available=marketplace_product.is_available,
+            discounted_price=marketplace_product.discounted_price,
+            discount_percentage=marketplace_product.discount_percentage,
+            listed_price=marketplace_product.listed_price,
+            recent_purchases_count=marketplace_product.recent_purchases_count,
+            view_count=marketplace_product.view_count,
+        )
 
 
 class TagExtractor:
@@ -389,18 +524,143 @@ class TagExtractor:
         ],
     }
 
+    FEATURE_KEYWORDS = {
+        "waterproof": ["waterproof", "water resistant", "splash proof", "rain proof"],
+        "durable": ["durable", "long lasting", "sturdy", "heavy duty", "tough"],
+        "portable": ["portable", "lightweight", "easy to carry", "compact", "travel friendly"],
+        "easy_to_use": ["easy to use", "user friendly", "simple operation", "plug and play"],
+        "safety": ["child lock", "safe", "protective", "overload protection", "auto shutoff"],
+        "energy_saving": ["energy saving", "power efficient", "eco friendly", "green", "low consumption"],
+        "smart_features": ["smart", "intelligent", "auto", "automatic", "programmable", "digital"],
+    }
+
+    # Features tagged only for products of these category codes
+    CATEGORY_FEATURES = {
+        "EG": ["inverter", "digital display", "remote control", "touch control", "voice control"],
+        "HL": ["easy clean", "stain resistant", "scratch resistant", "heat resistant", "foldable"],
+    }
+
+    RESOLUTIONS = {
+        "8k": "8k resolution",
+        "4k": "4k ultra hd",
+        "ultra hd": "ultra hd",
+        "full hd": "full hd 1080p",
+        "hd ready": "hd ready 720p",
+    }
+
+    SIZE_WORDS = {
+        "xs": ["xs", "extra small", "x-small"],
+        "s": ["s", "small"],
+        "m": ["m", "medium"],
+        "l": ["l", "large"],
+        "xl": ["xl", "extra large", "x-large"],
+        "xxl": ["xxl", "double extra large", "2xl"],
+        "xxxl": ["xxxl", "triple extra large", "3xl"],
+        "one_size": ["one size", "free size", "os", "one size fits all"],
+    }
+
+    COMMON_COLORS = [
+        "red",
+        "blue",
+        "green",
+        "black",
+        "white",
+        "gray",
+        "grey",
+        "brown",
+        "orange",
+        "purple",
+        "pink",
+        "navy",
+        "beige",
+        "gold",
+        "silver",
+        "yellow",
+        "maroon",
+        "cyan",
+        "magenta",
+        "violet",
+        "indigo",
+    ]
+
+    # Compiled matchers by name; built on first use from the dictionaries above
+    _matchers = {}
+
+    @classmethod
+    def _matcher(cls, name):
+        matcher = cls._matchers.get(name)
+        if matcher is None:
+            matcher = cls._matchers[name] = cls._build_matcher(name)
+        return matcher
+
+    @classmethod
+    def _build_matcher(cls, name):
+        tags_by_keyword = {}
+
+        def add(keyword, *tags):
+            tags_by_keyword.setdefault(keyword, set()).update(tags)
+
+        kind, _, category_code = name.partition(":")
+        if kind == "category":
+            category_data = cls.CATEGORY_TAGS.get(category_code, {})
+            for product_type, keywords in category_data.get("products", {}).items():
+                if isinstance(keywords, list):
+                    for keyword in keywords:
+                        add(keyword, keyword, product_type.replace("_", " "))
+            for attr_category, attributes in category_data.get("attributes", {}).items():
+                if isinstance(attributes, list):
+                    for attr in attributes:
+                        add(attr, attr, attr_category)
+        elif kind == "brands":
+            for brand_category, brand_list in cls.BRANDS.items():
+                for brand in brand_list:
+                    add(brand, brand, brand_category)
+            return KeywordMatcher(tags_by_keyword, whole_words=True)
+        elif kind == "features":
+            for feature_category, keywords in cls.FEATURE_KEYWORDS.items():
+                for keyword in keywords:
+                    add(keyword, keyword, feature_category.replace("_", " "))
+            for feature in cls.CATEGORY_FEATURES.get(category_code, []):
+                add(feature, feature)
+        elif kind == "resolutions":
+            for resolution, tag in cls.RESOLUTIONS.items():
+                add(resolution, resolution, tag)
+        elif kind == "sizes":
+            for size_code, size_variants in cls.SIZE_WORDS.items():
+                for variant in size_variants:
+                    add(variant, variant, size_code.upper())
+        elif kind == "colors":
+            for color in cls.COMMON_COLORS:
+                add(color, color)
+        else:
+            raise ValueError(f"Unknown tag matcher: {name}")
+        return KeywordMatcher(tags_by_keyword)
+
+    @classmethod
+    def compile(cls):
+        """Build every matcher now, e.g. before forking workers that should share them."""
+        for name in ("brands", "resolutions", "sizes", "colors", "features:"):
+            cls._matcher(name)
+        for category_code in cls.CATEGORY_TAGS:
+            cls._matcher(f"category:{category_code}")
+        for category_code in cls.CATEGORY_FEATURES:
+            cls._matcher(f"features:{category_code}")
+
     @classmethod
     def extract_tags(cls, marketplace_product):
-        """Main tag extraction method"""
+        """Main tag extraction method; takes a marketplace product or its ``TagSource``"""
         tags = set()
 
         # Get product info
-        product = marketplace_product.product
-        category_code = product.category.code if product.category else None
+        if isinstance(marketplace_product, TagSource):
+            source = marketplace_product
+        else:
+            source = TagSource.from_listing(marketplace_product)
+        category_code = source.category_code
 
-        product_name = product.name.lower()
-        product_description = (product.description or "").lower()
-        additional_info = (marketplace_product.additional_information or "").lower()
+        product_name = source.name.lower()
+        product_description = source.description.lower()
+        additional_info = source.additional_information.lower()
 
         combined_text = f"{product_name} {product_description} {additional_info}"
 
@@ -410,8 +670,8 @@ class TagExtractor:
             tags.update(category_tags)
 
             # Add category name as tag
-            if product.category:
-                tags.add(product.category.category_name.lower())
+            if source.category_name:
+                tags.add(source.category_name.lower())
 
         # 2. Extract brands
         brands = cls._extract_brands(combined_text)
@@ -426,17 +686,17 @@ class TagExtractor:
         tags.update(sizes)
 
         # 5. Extract colors
-        colors = cls._extract_colors(combined_text, marketplace_product)
+        colors = cls._extract_colors(combined_text, source)
         tags.update(colors)
 
         # 6. Add product field-based tags
-        cls._add_field_tags(marketplace_product, tags)
+        cls._add_field_tags(source, tags)
 
         # 7. Add price-related tags
-        cls._add_price_tags(marketplace_product, tags)
+        cls._add_price_tags(source, tags)
 
         # 8. Add popularity tags
-        cls._add_popularity_tags(marketplace_product, tags)
+        cls._add_popularity_tags(source, tags)
 
         # 9. Add feature tags from description
         features = cls._extract_features(combined_text, category_code)
@@ -454,41 +714,13 @@ class TagExtractor:
     @classmethod
     def _extract_category_tags(cls, category_code, text):
         """Extract tags specific to category"""
-        tags = set()
-        category_data = cls.CATEGORY_TAGS.get(category_code, {})
-
-        # Extract product type tags
-        for product_type, keywords in category_data.get("products", {}).items():
-            if isinstance(keywords, list):
-                for keyword in keywords:
-                    if keyword in text:
-                        tags.add(keyword)
-                        # Add the product type as tag (e.g., 'television', 'refrigerator')
-                        tags.add(product_type.replace("_", " "))
-
-        # Extract attribute tags
-        for attr_category, attributes in category_data.get("attributes", {}).items():
-            if isinstance(attributes, list):
-                for attr in attributes:
-                    if attr in text:
-                        tags.add(attr)
-                        tags.add(attr_category)
-
-        return tags
+        # Each keyword found adds itself and its product type (e.g. 'television') or attribute group
+        return cls._matcher(f"category:{category_code}").tags(text)
 
     @classmethod
     def _extract_brands(cls, text):
-        """Extract brand names from text"""
-        brands_found = set()
-
-        for brand_category, brand_list in cls.BRANDS.items():
-            for brand in brand_list:
-                # Check for brand as whole word
-                if re.search(r"\b" + re.escape(brand) + r"\b", text):
-                    brands_found.add(brand)
-                    brands_found.add(brand_category)
-
-        return brands_found
+        """Extract brand names (as whole words) and their brand categories from text"""
+        return cls._matcher("brands").tags(text)
 
     @classmethod
     def _extract_specifications(cls, text, category_code):
@@ -538,17 +770,7 @@ class TagExtractor:
                     tags.add("small room ac")
 
         # Resolution
-        resolutions = {
-            "8k": "8k resolution",
-            "4k": "4k ultra hd",
-            "ultra hd": "ultra hd",
-            "full hd": "full hd 1080p",
-            "hd ready": "hd ready 720p",
-        }
-        for res, tag in resolutions.items():
-            if res in text:
-                tags.add(tag)
-                tags.add(res)
+        tags.update(cls._matcher("resolutions").tags(text))
 
         # Storage and memory
         storage_matches = re.findall(r"(\d+(?:gb|tb|gB|tB|GB|TB))", text)
@@ -564,67 +786,21 @@ class TagExtractor:
     @classmethod
     def _extract_sizes(cls, text):
         """Extract size information"""
-        tags = set()
-
-        size_words = {
-            "xs": ["xs", "extra small", "x-small"],
-            "s": ["s", "small"],
-            "m": ["m", "medium"],
-            "l": ["l", "large"],
-            "xl": ["xl", "extra large", "x-large"],
-            "xxl": ["xxl", "double extra large", "2xl"],
-            "xxxl": ["xxxl", "triple extra large", "3xl"],
-            "one_size": ["one size", "free size", "os", "one size fits all"],
-        }
-
-        for size_code, size_variants in size_words.items():
-            for variant in size_variants:
-                if variant in text:
-                    tags.add(size_code.upper())
-                    tags.add(variant)
-
-        return tags
+        return cls._matcher("sizes").tags(text)
 
     @classmethod
-    def _extract_colors(cls, text, marketplace_product):
+    def _extract_colors(cls, text, source):
         """Extract color information"""
         tags = set()
 
         # Add color from model field if exists
-        if marketplace_product.color:
-            color_display = dict(MarketplaceProduct.ColorChoices.choices).get(marketplace_product.color, "")
-            if color_display:
-                tags.add(color_display.lower())
-            tags.add(marketplace_product.color.lower())
+        if source.color:
+            if source.color_display:
+                tags.add(source.color_display.lower())
+            tags.add(source.color.lower())
 
         # Extract colors from text
-        common_colors = [
-            "red",
-            "blue",
-            "green",
-            "black",
-            "white",
-            "gray",
-            "grey",
-            "brown",
-            "orange",
-            "purple",
-            "pink",
-            "navy",
-            "beige",
-            "gold",
-            "silver",
-            "yellow",
-            "maroon",
-            "cyan",
-            "magenta",
-            "violet",
-            "indigo",
-        ]
-
-        for color in common_colors:
-            if color in text:
-                tags.add(color)
+        tags.update(cls._matcher("colors").tags(text))
 
         return tags
 
@@ -721,39 +897,9 @@ class TagExtractor:
     @classmethod
     def _extract_features(cls, text, category_code):
         """Extract feature-related tags"""
-        features = set()
-
-        # Common feature keywords
-        feature_keywords = {
-            "waterproof": ["waterproof", "water resistant", "splash proof", "rain proof"],
-            "durable": ["durable", "long lasting", "sturdy", "heavy duty", "tough"],
-            "portable": ["portable", "lightweight", "easy to carry", "compact", "travel friendly"],
-            "easy_to_use": ["easy to use", "user friendly", "simple operation", "plug and play"],
-            "safety": ["child lock", "safe", "protective", "overload protection", "auto shutoff"],
-            "energy_saving": ["energy saving", "power efficient", "eco friendly", "green", "low consumption"],
-            "smart_features": ["smart", "intelligent", "auto", "automatic", "programmable", "digital"],
-        }
-
-        for feature_category, keywords in feature_keywords.items():
-            for keyword in keywords:
-                if keyword in text:
-                    features.add(keyword)
-                    features.add(feature_category.replace("_", " "))
-
-        # Category-specific features
-        if category_code == "EG":
-            eg_features = ["inverter", "digital display", "remote control", "touch control", "voice control"]
-            for feat in eg_features:
-                if feat in text:
-                    features.add(feat)
-
-        elif category_code == "HL":
-            hl_features = ["easy clean", "stain resistant", "scratch resistant", "heat resistant", "foldable"]
-            for feat in hl_features:
-                if feat in text:
-                    features.add(feat)
-
-        return features
+        # Common features plus the ones specific to the category
+        features_for = category_code if category_code in cls.CATEGORY_FEATURES else ""
+        return cls._matcher(f"features:{features_for}").tags(text)
 
     @classmethod
     def _extract_numeric_values(cls, text):
@@ -841,19 +987,18 @@ class TagExtractor:
 
         return cleaned
 
+    @staticmethod
+    def _combine_tags(tags, existing_tags):
+        """New tags merged with the existing ones, limited to 40"""
+        return list(set(tags) | set(existing_tags or []))[:40]
+
     @classmethod
     def extract_and_save(cls, marketplace_product, save=True):
         """Extract tags and save to database"""
         tags = cls.extract_tags(marketplace_product)
 
         # Preserve existing tags if any
-        existing_tags = set(marketplace_product.search_tags or [])
-
-        # Combine existing and new tags (prioritize new extraction)
-        combined_tags = list(set(tags) | existing_tags)
-
-        # Limit to 40 tags
-        marketplace_product.search_tags = combined_tags[:40]
+        marketplace_product.search_tags = cls._combine_tags(tags, marketplace_product.search_tags)
 
         if save:
             marketplace_product.save(update_fields=["search_tags"])
@@ -861,19 +1006,85 @@ class TagExtractor:
         return marketplace_product.search_tags
 
     @classmethod
-    def bulk_extract(cls, queryset=None, batch_size=100):
-        """Bulk extract tags for multiple products"""
+    def bulk_extract(cls, queryset=None, batch_size=100, workers=None, log=None):
+        """
+        Extract and save tags for the marketplace products of ``queryset`` (all
+        of them by default), ``batch_size`` at a time. Tags are extracted in a
+        pool of ``workers`` processes (one per CPU by default, 0 or 1 for
+        in-process) when there are at least ``PARALLEL_MIN_PRODUCTS`` products
+        and this process may fork, falling back to in-process extraction when
+        the pool cannot be started. Every batch is written back with one
+        ``bulk_update``. Progress and throughput in products per second go to
+        ``log`` (the module logger by default). Returns the number of products
+        updated.
+        """
+        from django.db import transaction
+
+        from market.tagged_cache import category_tag, tagged_cache
+
         from .models import MarketplaceProduct
+        from .search_indexing import search_indexer
 
         if queryset is None:
-            queryset = MarketplaceProduct.objects.select_related("product", "product__category").all()
+            queryset = MarketplaceProduct.objects.all()
+        queryset = queryset.select_related("product", "product__category")
+        log = log or logger.info
+        workers = pool_workers(workers)
+        total = queryset.count()
+
+        executor = None
+        if workers > 1 and total >= PARALLEL_MIN_PRODUCTS:
+            # Forked workers inherit the compiled matchers instead of each building them
+            cls.compile()
+            try:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            except POOL_UNAVAILABLE_ERRORS as e:
+                logger.warning(f"Tag extraction process pool unavailable, extracting serially: {e}")
 
         updated = 0
-        for product in queryset.iterator(chunk_size=batch_size):
-            cls.extract_and_save(product, save=True)
-            updated += 1
+        categories = set()
+        started = time.perf_counter()
+        listings = queryset.iterator(chunk_size=batch_size)
+        try:
+            # bulk_update sends no post_save, so the batches are queued for reindexing here
+            with search_indexer.collect():
+                while batch := list(itertools.islice(listings, batch_size)):
+                    sources = [TagSource.from_listing(listing) for listing in batch]
+                    extracted = None
+                    if executor is not None:
+                        try:
+                            chunksize = max(1, len(sources) // (workers * 4))
+                            extracted = list(executor.map(extract_source_tags, sources, chunksize=chunksize))
+                        except POOL_UNAVAILABLE_ERRORS as e:
+                            # Workers start on the first map, so a refused fork surfaces here
+                            logger.warning(f"Tag extraction process pool unavailable, extracting serially: {e}")
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            executor = None
+                    if extracted is None:
+                        extracted = [extract_source_tags(source) for source in sources]
+
+                    for listing, tags in zip(batch, extracted):
+                        listing.search_tags = cls._combine_tags(tags, listing.search_tags)
+                    MarketplaceProduct.objects.bulk_update(batch, ["search_tags"])
+                    search_indexer.mark_dirty(listing_ids=[listing.pk for listing in batch])
+                    categories.update(source.category_name for source in sources if source.category_name)
+
+                    updated += len(batch)
+                    elapsed = time.perf_counter() - started
+                    log(f"Processed {updated}/{total} products ({updated / elapsed:.1f} products/s)")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # One invalidation for the whole run instead of one per saved product
+        tags = ["trending", "producer", *(category_tag(name) for name in categories)]
+        transaction.on_commit(lambda: tagged_cache.invalidate(*tags))
+
+        elapsed = time.perf_counter() - started
+        log(f"Tagged {updated} products in {elapsed:.1f}s ({updated / elapsed if elapsed else 0:.1f} products/s)")
+        return updated
 
-            if updated % batch_size == 0:
-                print(f"✅ Processed {updated} products")
 
-        return updated
+def extract_source_tags(source):
+    """``TagExtractor.extract_tags`` of a ``TagSource``; the entry point of the process pool workers."""
+    return TagExtractor.extract_tags(source)
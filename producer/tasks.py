@@ -1,9 +1,8 @@
 import logging
 import math
-import statistics
-from collections import defaultdict
 from datetime import timedelta
 
+import numpy as np
 from celery import shared_task
 from django.db.models import Sum, functions
 from django.utils import timezone
@@ -30,87 +29,184 @@ def move_large_stock_to_stocklist():
 
 
 SERVICE_LEVEL_Z = 1.65  # ~95% service level
+DEMAND_WINDOW_DAYS = 90
+BURN_WINDOW_DAYS = 14
+EOQ_ORDER_COST = 50
+EOQ_HOLDING_COST = 2
+RECALC_CHUNK_SIZE = 5000
+
+INVENTORY_PARAMETER_FIELDS = (
+    "avg_daily_demand",
+    "stddev_daily_demand",
+    "safety_stock",
+    "reorder_point",
+    "reorder_quantity",
+    "projected_stockout_date_field",
+)
+
+
+def compute_inventory_parameters(units_sum, units_sq_sum, lead_time_days, stock, burn_total, today):
+    """
+    Vectorized demand statistics for a chunk of products.
+
+    ``units_sum`` and ``units_sq_sum`` are the sum and sum of squares of daily units sold over the
+    demand window. Days without sales count as zero demand, so mean and variance are taken over the
+    whole window rather than only over the days that had sales.
+    """
+    units_sum = np.asarray(units_sum, dtype=np.float64)
+    units_sq_sum = np.asarray(units_sq_sum, dtype=np.float64)
+    lead_time_days = np.asarray(lead_time_days, dtype=np.float64)
+    stock = np.asarray(stock, dtype=np.float64)
+    burn_total = np.asarray(burn_total, dtype=np.float64)
+
+    avg = units_sum / DEMAND_WINDOW_DAYS
+    variance = np.maximum(units_sq_sum / DEMAND_WINDOW_DAYS - avg**2, 0.0)
+
+    # Safety stock & reorder point
+    safety_stock = np.ceil(SERVICE_LEVEL_Z * np.sqrt(lead_time_days * variance))
+    reorder_point = np.ceil(avg * lead_time_days + safety_stock)
+
+    # EOQ
+    annual = avg * 365
+    reorder_quantity = np.ceil(np.sqrt((2 * annual * EOQ_ORDER_COST) / EOQ_HOLDING_COST))
+
+    # Projected stock-out
+    burn = burn_total / BURN_WINDOW_DAYS
+    days_left = np.floor(np.divide(np.maximum(stock, 0), burn, out=np.full_like(burn, -1.0), where=burn > 0))
+    stockout = [today + timedelta(days=int(d)) if d >= 0 else None for d in days_left]
+
+    return {
+        "avg_daily_demand": avg.tolist(),
+        "stddev_daily_demand": np.sqrt(variance).tolist(),
+        "safety_stock": safety_stock.astype(np.int64).tolist(),
+        "reorder_point": reorder_point.astype(np.int64).tolist(),
+        "reorder_quantity": reorder_quantity.astype(np.int64).tolist(),
+        "projected_stockout_date_field": stockout,
+    }
+
+
+def _value_changed(old, new):
+    if isinstance(new, float) and old is not None:
+        return not math.isclose(old, new, rel_tol=1e-9, abs_tol=1e-9)
+    return old != new
+
+
+def _recalc_inventory_chunk(rows, today, demand_cutoff, burn_cutoff):
+    """
+    Recalculate one chunk of ``Product.values()`` rows and bulk-update the rows that changed.
+    Returns the number of products written.
+    """
+    position = {row["id"]: idx for idx, row in enumerate(rows)}
+    size = len(rows)
+
+    daily_sales = list(
+        Sale.objects.filter(order__product_id__in=position, sale_date__date__gte=demand_cutoff)
+        .annotate(day=functions.TruncDate("sale_date"))
+        .values("order__product_id", "day")
+        .annotate(units_sold=Sum("quantity"))
+    )
+    idx = np.fromiter((position[r["order__product_id"]] for r in daily_sales), dtype=np.int64, count=len(daily_sales))
+    units = np.fromiter((r["units_sold"] or 0 for r in daily_sales), dtype=np.float64, count=len(daily_sales))
+    units_sum = np.bincount(idx, weights=units, minlength=size)
+    units_sq_sum = np.bincount(idx, weights=units**2, minlength=size)
+
+    burn_total = np.zeros(size)
+    burn_rows = (
+        Sale.objects.filter(order__product_id__in=position, sale_date__date__gte=burn_cutoff)
+        .values("order__product_id")
+        .annotate(total_sold=Sum("quantity"))
+    )
+    for r in burn_rows:
+        burn_total[position[r["order__product_id"]]] = r["total_sold"] or 0
+
+    computed = compute_inventory_parameters(
+        units_sum,
+        units_sq_sum,
+        [row["lead_time_days"] for row in rows],
+        [row["stock"] or 0 for row in rows],
+        burn_total,
+        today,
+    )
+
+    changed_fields = set()
+    to_update = []
+    for i, row in enumerate(rows):
+        new_values = {field: computed[field][i] for field in INVENTORY_PARAMETER_FIELDS}
+        changed = {field for field, value in new_values.items() if _value_changed(row[field], value)}
+        if changed:
+            changed_fields |= changed
+            to_update.append(Product(id=row["id"], **new_values))
+
+    if to_update:
+        Product.objects.bulk_update(
+            to_update,
+            [field for field in INVENTORY_PARAMETER_FIELDS if field in changed_fields],
+            batch_size=1000,
+        )
+    return len(to_update)
 
 
 @shared_task
-def recalc_inventory_parameters():
+def recalc_inventory_parameters(chunk_size=RECALC_CHUNK_SIZE):
     """
     Recalculate inventory parameters for all products.
     This task updates average daily demand, safety stock, reorder points, etc.
+
+    Products are streamed as ``values()`` rows in primary-key chunks; each chunk's sales are
+    aggregated in SQL, the parameters computed as NumPy arrays and only changed rows written back
+    with ``bulk_update``.
     """
     try:
         logger.info("Starting inventory parameters recalculation...")
 
         today = timezone.localdate()
-        cutoff_90 = today - timedelta(days=90)
-        cutoff_14 = today - timedelta(days=14)
-
-        # Bulk 90-day sales aggregated by product & day
-        sales_90 = (
-            Sale.objects.filter(sale_date__date__gte=cutoff_90)
-            .annotate(day=functions.TruncDate("sale_date"))
-            .values("order__product_id", "day")
-            .annotate(units_sold=Sum("quantity"))
-        )
-        sales_map = defaultdict(list)
-        for row in sales_90:
-            sales_map[row["order__product_id"]].append(row["units_sold"])
-
-        # Bulk 14-day burn aggregated by product
-        burn_14 = (
-            Sale.objects.filter(sale_date__date__gte=cutoff_14)
-            .values("order__product_id")
-            .annotate(total_sold=Sum("quantity"))
-        )
-        burn_map = {row["order__product_id"]: row["total_sold"] for row in burn_14}
+        demand_cutoff = today - timedelta(days=DEMAND_WINDOW_DAYS - 1)
+        burn_cutoff = today - timedelta(days=BURN_WINDOW_DAYS)
 
+        products_scanned = 0
         products_updated = 0
         products_with_errors = 0
-
-        for p in Product.objects.all():
+        last_id = 0
+
+        base_qs = Product.objects.order_by("id").values("id", "stock", "lead_time_days", *INVENTORY_PARAMETER_FIELDS)
+        while True:
+            rows = list(base_qs.filter(id__gt=last_id)[:chunk_size])
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            products_scanned += len(rows)
             try:
-                vals90 = sales_map.get(p.id, [])
-                p.avg_daily_demand = statistics.mean(vals90) if vals90 else 0
-                p.stddev_daily_demand = statistics.pstdev(vals90) if len(vals90) > 1 else 0
-
-                # Safety stock & reorder point
-                sigma_lt = math.sqrt(p.lead_time_days * p.stddev_daily_demand**2)
-                p.safety_stock = math.ceil(SERVICE_LEVEL_Z * sigma_lt)
-                p.reorder_point = math.ceil(p.avg_daily_demand * p.lead_time_days + p.safety_stock)
-
-                # EOQ
-                annual = p.avg_daily_demand * 365
-                p.reorder_quantity = math.ceil(math.sqrt((2 * annual * 50) / 2))
-
-                # Projected stock-out (persist to a DateField if you add one)
-                burn = (burn_map.get(p.id, 0) or 0) / 14
-                if burn > 0:
-                    p.projected_stockout_date_field = today + timedelta(days=p.stock / burn)
-                else:
-                    p.projected_stockout_date_field = None
-
-                p.save(
-                    update_fields=[
-                        "avg_daily_demand",
-                        "stddev_daily_demand",
-                        "safety_stock",
-                        "reorder_point",
-                        "reorder_quantity",
-                        "projected_stockout_date_field",
-                    ]
-                )
-                products_updated += 1
-
+                products_updated += _recalc_inventory_chunk(rows, today, demand_cutoff, burn_cutoff)
             except Exception as e:
-                logger.error(f"Error updating product {p.id}: {e}")
-                products_with_errors += 1
-                continue
+                logger.error(f"Error updating products {rows[0]['id']}..{last_id}: {e}")
+                products_with_errors += len(rows)
 
         logger.info(
-            f"Inventory parameters recalculation completed. Updated: {products_updated}, Errors: {products_with_errors}"
+            f"Inventory parameters recalculation completed. Scanned: {products_scanned}, "
+            f"Updated: {products_updated}, Errors: {products_with_errors}"
         )
         return f"Updated {products_updated} products successfully, {products_with_errors} errors"
 
     except Exception as e:
         logger.error(f"Critical error in recalc_inventory_parameters: {e}")
         raise
+
+
+SEARCH_INDEX_FLUSH_LOCK = "search_index:flush_lock"
+
+
+@shared_task
+def flush_search_index():
+    """Index the marketplace products queued by producer.search_indexing."""
+    from django.core.cache import cache
+
+    from .search_indexing import search_indexer
+
+    # One flusher at a time, so an older batch can never overwrite a newer one for the same listing
+    if not cache.add(SEARCH_INDEX_FLUSH_LOCK, 1, timeout=300):
+        return "Search index flush already running"
+    try:
+        counts = search_indexer.flush()
+    finally:
+        cache.delete(SEARCH_INDEX_FLUSH_LOCK)
+    return f"Indexed {counts['indexed']} and removed {counts['removed']} listings"
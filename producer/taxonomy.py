@@ -0,0 +1,262 @@
+"""
+In-process cache of the category taxonomy (Category, Subcategory, SubSubcategory).
+
+The three tables are loaded together, in three queries, into a ``Taxonomy``:
+nodes keyed by id and by lower-cased name per level, each with its parent
+and its children in model order. Every process keeps one loaded taxonomy
+together with the version stamp it was loaded at. The stamp lives in the
+shared cache and is bumped by the save/delete signals of the three models
+once the change is committed, so each worker notices on its next access
+(one cache ``GET``) and reloads lazily, instead of re-querying the tree on
+every filtered search or hierarchy request.
+
+Until then the transaction that made the change reads its own taxonomy: the
+signals also register a marker hook with ``on_commit``, and while one of the
+thread's markers is still pending it gets a private copy loaded inside the
+transaction. Django drops pending hooks on commit, on rollback and on the
+rollback of the savepoint that registered them, so uncommitted changes never
+reach the shared copy and a rolled-back change is simply forgotten.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework import serializers
+
+TAXONOMY_VERSION_KEY = "producer:taxonomy_version"
+# The stamp outlives any process; one that expires only causes a reload
+TAXONOMY_VERSION_TIMEOUT = 30 * 24 * 3600
+
+CATEGORY = "category"
+SUBCATEGORY = "subcategory"
+SUB_SUBCATEGORY = "sub_subcategory"
+LEVELS = (CATEGORY, SUBCATEGORY, SUB_SUBCATEGORY)
+
+NODE_FIELDS = ("id", "code", "name", "description", "is_active", "created_at", "updated_at")
+
+_datetime_field = serializers.DateTimeField()
+
+
+@dataclass(eq=False)
+class TaxonomyNode:
+    level: str
+    id: int
+    code: str
+    name: str
+    description: str = ""
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    parent: Optional["TaxonomyNode"] = field(default=None, repr=False)
+    children: List["TaxonomyNode"] = field(default_factory=list, repr=False)
+
+    @property
+    def active_children(self):
+        return [child for child in self.children if child.is_active]
+
+    def as_dict(self):
+        """The node's own fields, rendered like the model serializers render them."""
+        return {
+            "id": self.id,
+            "code": self.code,
+            "name": self.name,
+            "description": self.description,
+            "is_active": self.is_active,
+            "created_at": _datetime_field.to_representation(self.created_at) if self.created_at else None,
+            "updated_at": _datetime_field.to_representation(self.updated_at) if self.updated_at else None,
+        }
+
+
+class Taxonomy:
+    """One loaded snapshot of the taxonomy; treat it as read-only."""
+
+    def __init__(self, categories=(), subcategories=(), sub_subcategories=(), version=None):
+        self.version = version
+        self.by_id: Dict[str, Dict[int, TaxonomyNode]] = {level: {} for level in LEVELS}
+        self.by_name: Dict[str, Dict[str, TaxonomyNode]] = {level: {} for level in LEVELS}
+        for level, rows, parent_level, parent_key in (
+            (CATEGORY, categories, None, None),
+            (SUBCATEGORY, subcategories, CATEGORY, "category_id"),
+            (SUB_SUBCATEGORY, sub_subcategories, SUBCATEGORY, "subcategory_id"),
+        ):
+            for row in rows:
+                node = TaxonomyNode(level=level, **{name: row[name] for name in NODE_FIELDS})
+                if parent_level is not None:
+                    node.parent = self.by_id[parent_level].get(row[parent_key])
+                    if node.parent is not None:
+                        node.parent.children.append(node)
+                self.by_id[level][node.id] = node
+                # The first node in model order wins when names repeat
+                self.by_name[level].setdefault(node.name.strip().lower(), node)
+
+    @classmethod
+    def load(cls, version=None):
+        from .models import Category, Subcategory, SubSubcategory
+
+        return cls(
+            categories=Category.objects.order_by("name", "id").values(*NODE_FIELDS),
+            subcategories=Subcategory.objects.order_by("category__name", "name", "id").values(*NODE_FIELDS, "category_id"),
+            sub_subcategories=SubSubcategory.objects.order_by(
+                "subcategory__category__name", "subcategory__name", "name", "id"
+            ).values(*NODE_FIELDS, "subcategory_id"),
+            version=version,
+        )
+
+    @property
+    def categories(self):
+        return list(self.by_id[CATEGORY].values())
+
+    def get(self, level, pk):
+        try:
+            return self.by_id[level].get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def find(self, name, levels=LEVELS):
+        """The first node named ``name`` (case-insensitively), searching ``levels`` in order."""
+        key = str(name).strip().lower()
+        for level in levels:
+            node = self.by_name[level].get(key)
+            if node is not None:
+                return node
+        return None
+
+    def resolve_name(self, value, levels=LEVELS):
+        """
+        The name of the node whose id is ``value``, trying ``levels`` in order;
+        ``value`` itself when it is not an id or no node has it.
+        """
+        for level in levels:
+            node = self.get(level, value)
+            if node is not None:
+                return node.name
+        return value
+
+    def sub_subcategory_dict(self, node):
+        subcategory = node.parent
+        category = subcategory.parent if subcategory is not None else None
+        return {
+            **node.as_dict(),
+            "subcategory": subcategory.id if subcategory is not None else None,
+            "category_name": category.name if category is not None else None,
+            "category_code": category.code if category is not None else None,
+            "subcategory_name": subcategory.name if subcategory is not None else None,
+        }
+
+    def subcategory_dict(self, node):
+        """A subcategory as ``SubcategorySerializer`` renders it."""
+        category = node.parent
+        return {
+            **node.as_dict(),
+            "category": category.id if category is not None else None,
+            "category_name": category.name if category is not None else None,
+            "category_code": category.code if category is not None else None,
+            "sub_subcategories": [self.sub_subcategory_dict(child) for child in node.children],
+            "sub_subcategories_count": len(node.active_children),
+        }
+
+    def hierarchy(self):
+        """The active categories as ``CategoryHierarchySerializer`` renders them."""
+        return [
+            {
+                "id": category.id,
+                "code": category.code,
+                "name": category.name,
+                "description": category.description,
+                "is_active": category.is_active,
+                "subcategories": [self.subcategory_dict(subcategory) for subcategory in category.children],
+            }
+            for category in self.categories
+            if category.is_active
+        ]
+
+
+class TaxonomyCache:
+    def __init__(self):
+        self._taxonomy = None
+        self._lock = threading.Lock()
+        # Per thread: on_commit markers of uncommitted changes, and a private copy with how many were pending at load
+        self._local = threading.local()
+
+    def version(self):
+        """The shared version stamp, started from the current time in milliseconds when missing."""
+        stamp = cache.get(TAXONOMY_VERSION_KEY)
+        if stamp is None:
+            cache.add(TAXONOMY_VERSION_KEY, int(time.time() * 1000), TAXONOMY_VERSION_TIMEOUT)
+            stamp = cache.get(TAXONOMY_VERSION_KEY)
+        return stamp
+
+    def get(self):
+        """The taxonomy, reloaded first when the shared stamp has moved since it was loaded."""
+        taxonomy = self._uncommitted()
+        if taxonomy is not None:
+            return taxonomy
+        # Read the stamp before loading: a change committed during the load moves it again and forces a reload
+        stamp = self.version()
+        taxonomy = self._taxonomy
+        if taxonomy is not None and stamp is not None and taxonomy.version == stamp:
+            return taxonomy
+        with self._lock:
+            taxonomy = self._taxonomy
+            if taxonomy is None or stamp is None or taxonomy.version != stamp:
+                taxonomy = self._taxonomy = Taxonomy.load(version=stamp)
+        return taxonomy
+
+    def invalidate_local(self):
+        """
+        Serve the current thread a taxonomy read inside its transaction until
+        the change is committed or rolled back. Called as soon as a change is made.
+        """
+        local = self._local
+        local.taxonomy = None
+        if not connection.in_atomic_block:
+            # Autocommit: the change is already visible to everyone
+            local.markers = []
+            return
+
+        def marker():
+            pass
+
+        transaction.on_commit(marker)
+        local.markers = [*getattr(local, "markers", []), marker]
+
+    def _uncommitted(self):
+        local = self._local
+        markers = getattr(local, "markers", None)
+        if not markers:
+            return None
+        pending = {func for _savepoints, func, _robust in connection.run_on_commit}
+        markers = local.markers = [marker for marker in markers if marker in pending]
+        if not markers:
+            # Committed (and bumped by then) or rolled back: back to the shared copy
+            local.taxonomy = None
+            return None
+        if local.taxonomy is None or local.loaded_with != len(markers):
+            # A rolled-back savepoint took some of the changes with it
+            local.taxonomy = Taxonomy.load()
+            local.loaded_with = len(markers)
+        return local.taxonomy
+
+    def invalidate(self):
+        """Bump the shared stamp so every process reloads on its next access."""
+        try:
+            cache.incr(TAXONOMY_VERSION_KEY)
+        except ValueError:
+            cache.add(TAXONOMY_VERSION_KEY, int(time.time() * 1000), TAXONOMY_VERSION_TIMEOUT)
+        self._taxonomy = None
+
+
+taxonomy_cache = TaxonomyCache()
+
+
+def get_taxonomy():
+    return taxonomy_cache.get()
+
+
+def invalidate_taxonomy():
+    taxonomy_cache.invalidate()
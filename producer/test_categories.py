@@ -3,11 +3,15 @@
 import json
 
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.db import DatabaseError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from producer.models import Category, Subcategory, SubSubcategory
+from producer.serializers import CategoryHierarchySerializer, SubcategorySerializer
+from producer.taxonomy import CATEGORY, SUB_SUBCATEGORY, SUBCATEGORY, get_taxonomy, taxonomy_cache
 
 
 class CategoryAPITestCase(TestCase):
@@ -72,3 +76,85 @@ class CategoryAPITestCase(TestCase):
         hierarchy = product.get_category_hierarchy()
         expected = f"{self.category.name} > {self.subcategory.name} > {self.sub_subcategory.name}"
         self.assertEqual(hierarchy, expected)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TaxonomyCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username="taxonomy", password="testpass123"))
+        self.category = Category.objects.create(code="HL", name="Home & Living")
+        Category.objects.create(code="OLD", name="Retired", is_active=False)
+        self.subcategory = Subcategory.objects.create(code="HL_KD", name="Kitchen & Dining", category=self.category)
+        Subcategory.objects.create(code="HL_BD", name="Bedding", category=self.category, is_active=False)
+        self.sub_subcategory = SubSubcategory.objects.create(code="HL_KD_CW", name="Cookware", subcategory=self.subcategory)
+        SubSubcategory.objects.create(code="HL_KD_OLD", name="Retired Ware", subcategory=self.subcategory, is_active=False)
+
+    def test_lookups_by_id_and_name(self):
+        taxonomy = get_taxonomy()
+        node = taxonomy.get(SUB_SUBCATEGORY, self.sub_subcategory.id)
+        self.assertEqual(node.name, "Cookware")
+        self.assertIs(node.parent, taxonomy.get(SUBCATEGORY, str(self.subcategory.id)))
+        self.assertIs(node.parent.parent, taxonomy.get(CATEGORY, self.category.id))
+        self.assertIs(taxonomy.find("kitchen & dining "), node.parent)
+        self.assertEqual(taxonomy.resolve_name(str(self.sub_subcategory.id), levels=(SUB_SUBCATEGORY,)), "Cookware")
+        self.assertEqual(taxonomy.resolve_name("Cookware"), "Cookware")
+        self.assertIsNone(taxonomy.get(CATEGORY, "abc"))
+
+    def test_loaded_once_until_the_version_moves(self):
+        get_taxonomy()
+        with self.assertNumQueries(0):
+            get_taxonomy()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subcategory.name = "Kitchen"
+            self.subcategory.save()
+        self.assertEqual(get_taxonomy().get(SUBCATEGORY, self.subcategory.id).name, "Kitchen")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub_subcategory.delete()
+        self.assertIsNone(get_taxonomy().get(SUB_SUBCATEGORY, self.sub_subcategory.id))
+
+    def test_changes_are_visible_inside_their_transaction_only(self):
+        get_taxonomy()
+        self.subcategory.name = "Kitchen"
+        self.subcategory.save()
+        # Not committed yet: this transaction already reads the new name
+        self.assertEqual(get_taxonomy().get(SUBCATEGORY, self.subcategory.id).name, "Kitchen")
+
+        try:
+            with transaction.atomic():
+                Category.objects.create(code="TMP", name="Temporary")
+                self.assertIsNotNone(get_taxonomy().find("temporary"))
+                raise DatabaseError("roll back")
+        except DatabaseError:
+            pass
+        self.assertIsNone(get_taxonomy().find("temporary"))
+        self.assertEqual(get_taxonomy().get(SUBCATEGORY, self.subcategory.id).name, "Kitchen")
+
+    def test_uncommitted_changes_stay_out_of_the_shared_copy(self):
+        shared = taxonomy_cache._taxonomy
+        Category.objects.create(code="NEW", name="Brand New")
+        self.assertIsNotNone(get_taxonomy().find("brand new"))
+        self.assertIs(taxonomy_cache._taxonomy, shared)
+
+    def test_hierarchy_matches_serializer(self):
+        categories = Category.objects.filter(is_active=True).prefetch_related("subcategories__sub_subcategories")
+        expected = CategoryHierarchySerializer(categories, many=True).data
+
+        get_taxonomy()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/categories/hierarchy/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in captured.captured_queries if "category" in query["sql"]])
+        self.assertEqual(json.loads(json.dumps(response.data)), json.loads(json.dumps(expected)))
+
+    def test_subcategories_full_matches_serializer(self):
+        expected = SubcategorySerializer(self.category.subcategories.filter(is_active=True), many=True).data
+        response = self.client.get(f"/api/categories/{self.category.id}/subcategories_full/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(json.dumps(response.data)), json.loads(json.dumps(expected)))
+
+        retired = Category.objects.get(code="OLD")
+        response = self.client.get(f"/api/categories/{retired.id}/subcategories_full/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
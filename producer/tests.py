@@ -1,14 +1,45 @@
+import datetime
+import shutil
+import statistics
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.tree import Node
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from main.manager import resolve_shop_id
+from user.models import Role, UserProfile
+
 from .factories import (
     CustomerFactory,
+    MarketplaceProductFactory,
     OrderFactory,
     ProducerFactory,
     ProductFactory,
     SaleFactory,
+    UserFactory,
+)
+from .models import (
+    B2BPriceTier,
+    Category,
+    MarketplaceBulkPriceTier,
+    MarketplaceProduct,
+    MarketplaceProductReview,
+    Order,
+    Product,
 )
-from .models import Order
+from .pricing import PriceResolver
+from .search_backend import EmbeddedIndex, EmbeddedSearchBackend, SegmentBuilder
+from .search_indexing import DIRTY_KEY, REBUILD_KEY, LocalIndexQueue, SearchIndexer, search_indexer
+from .tag_extractor import KeywordMatcher, TagExtractor, TagSource
+from .tasks import DEMAND_WINDOW_DAYS, compute_inventory_parameters
 
 
 class ProducerAPITestCase(APITestCase):
@@ -162,3 +193,584 @@ class SaleAPITestCase(APITestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(len(response.data), 1)
+
+
+class InventoryParametersTestCase(SimpleTestCase):
+
+    def test_zero_sale_days_are_part_of_demand_stats(self):
+        """
+        Test that mean and standard deviation cover the whole window, not only days with sales.
+        """
+        daily = [3, 5, 0, 2] + [0] * (DEMAND_WINDOW_DAYS - 4)
+        result = compute_inventory_parameters(
+            [sum(daily)], [sum(d * d for d in daily)], [7], [20], [14], datetime.date(2026, 1, 1)
+        )
+        self.assertAlmostEqual(result["avg_daily_demand"][0], statistics.mean(daily))
+        self.assertAlmostEqual(result["stddev_daily_demand"][0], statistics.pstdev(daily))
+        self.assertEqual(result["safety_stock"][0], 3)
+        self.assertEqual(result["reorder_point"][0], 4)
+        self.assertEqual(result["projected_stockout_date_field"][0], datetime.date(2026, 1, 21))
+
+    def test_no_sales(self):
+        """
+        Test that products without sales get zeroed parameters and no stock-out date.
+        """
+        result = compute_inventory_parameters([0], [0], [7], [20], [0], datetime.date(2026, 1, 1))
+        self.assertEqual(result["reorder_point"], [0])
+        self.assertEqual(result["reorder_quantity"], [0])
+        self.assertEqual(result["projected_stockout_date_field"], [None])
+
+
+class MarketplaceProductReviewAggregatesTestCase(APITestCase):
+
+    def setUp(self):
+        self.marketplace_product = MarketplaceProductFactory()
+        self.users = UserFactory.create_batch(3)
+
+    def review(self, user, rating, marketplace_product=None):
+        return MarketplaceProductReview.objects.create(
+            product=marketplace_product or self.marketplace_product, user=user, rating=rating
+        )
+
+    def test_aggregates_follow_review_create_update_delete(self):
+        """
+        Test that stored counts, sums and the star histogram track review changes.
+        """
+        review = self.review(self.users[0], 5)
+        self.review(self.users[1], 2)
+        self.marketplace_product.refresh_from_db()
+        self.assertEqual(self.marketplace_product.total_reviews, 2)
+        self.assertEqual(self.marketplace_product.average_rating, 3.5)
+        self.assertEqual(
+            self.marketplace_product.ratings_breakdown, {"1": 0.0, "2": 50.0, "3": 0.0, "4": 0.0, "5": 50.0}
+        )
+
+        review.rating = 4
+        review.save()
+        self.marketplace_product.refresh_from_db()
+        self.assertEqual(self.marketplace_product.rating_sum, 6)
+        self.assertEqual(self.marketplace_product.rating_4_count, 1)
+        self.assertEqual(self.marketplace_product.rating_5_count, 0)
+
+        review.delete()
+        self.marketplace_product.refresh_from_db()
+        self.assertEqual(self.marketplace_product.total_reviews, 1)
+        self.assertEqual(self.marketplace_product.average_rating, 2)
+
+    def test_product_save_keeps_concurrent_review_aggregates(self):
+        """
+        Test that saving a stale product instance does not overwrite aggregates written since it was loaded.
+        """
+        stale = MarketplaceProduct.objects.get(pk=self.marketplace_product.pk)
+        self.review(self.users[0], 3)
+        stale.is_featured = True
+        stale.save()
+        self.marketplace_product.refresh_from_db()
+        self.assertTrue(self.marketplace_product.is_featured)
+        self.assertEqual(self.marketplace_product.review_count, 1)
+
+    def test_recalculate_repairs_drift(self):
+        """
+        Test that the bulk recalculation restores aggregates that drifted from the review table.
+        """
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 1)
+        MarketplaceProduct.objects.filter(pk=self.marketplace_product.pk).update(
+            review_count=0, rating_sum=0, rating_5_count=0
+        )
+        self.assertEqual(MarketplaceProduct.recalculate_review_aggregates(), 1)
+        self.marketplace_product.refresh_from_db()
+        self.assertEqual(self.marketplace_product.review_count, 2)
+        self.assertEqual(self.marketplace_product.rating_sum, 6)
+        self.assertEqual(self.marketplace_product.rating_5_count, 1)
+        self.assertEqual(MarketplaceProduct.recalculate_review_aggregates(), 0)
+
+    def test_ratings_read_without_queries(self):
+        """
+        Test that rating properties are served from the product row.
+        """
+        self.review(self.users[0], 4)
+        products = list(MarketplaceProduct.objects.all())
+        with self.assertNumQueries(0):
+            for product in products:
+                product.average_rating, product.ratings_breakdown, product.total_reviews
+
+    def test_list_query_count_does_not_depend_on_reviews(self):
+        """
+        Test that the marketplace list endpoint issues the same queries with and without reviews.
+        """
+        products = [self.marketplace_product] + MarketplaceProductFactory.create_batch(2)
+        self.client.force_authenticate(self.users[0])
+        url = "/api/v1/marketplace/"
+
+        with CaptureQueriesContext(connection) as without_reviews:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for product in products:
+            for rating, user in enumerate(self.users, 3):
+                self.review(user, rating, product)
+
+        with self.assertNumQueries(len(without_reviews)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class PriceResolverTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        buyer = UserFactory()
+        UserProfile.objects.create(user=buyer, business_type=UserProfile.BusinessType.RETAILER, b2b_verified=True)
+        self.buyer = User.objects.select_related("user_profile").get(pk=buyer.pk)
+        self.products = MarketplaceProductFactory.create_batch(3, listed_price=100, enable_b2b_sales=True)
+        for product in self.products:
+            MarketplaceBulkPriceTier.objects.create(product=product, min_quantity=10, price_per_unit=90)
+            MarketplaceBulkPriceTier.objects.create(product=product, min_quantity=20, discount_percent=20)
+            B2BPriceTier.objects.create(
+                product=product, customer_type="retailer", min_quantity=50, price_per_unit=Decimal("70")
+            )
+
+    def test_prices_resolve_from_tiers_in_two_queries(self):
+        """
+        Test that a whole basket is priced with one query per tier model and matches the per-product method.
+        """
+        items = [(product, quantity) for product in self.products for quantity in (1, 10, 20, 50)]
+        with self.assertNumQueries(2):
+            prices = PriceResolver(self.buyer).prices(items)
+        self.assertEqual(prices[:4], [Decimal("100"), Decimal("90"), Decimal("80"), Decimal("70")])
+        self.assertEqual(prices, [product.get_effective_price_for_user(self.buyer, qty) for product, qty in items])
+
+    def test_tier_tables_are_cached_until_tiers_change(self):
+        """
+        Test that cached tier tables serve later resolvers and are dropped when a tier is saved.
+        """
+        product = self.products[0]
+        PriceResolver(self.buyer).prefetch(self.products)
+        with self.assertNumQueries(0):
+            self.assertEqual(PriceResolver(self.buyer).price(product, 10), Decimal("90"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MarketplaceBulkPriceTier.objects.get(product=product, min_quantity=10).delete()
+        self.assertEqual(PriceResolver(self.buyer).price(product, 10), Decimal("100"))
+
+    def test_anonymous_users_get_the_listed_price(self):
+        """
+        Test that tiers only apply to users with a profile, as before.
+        """
+        with self.assertNumQueries(0):
+            self.assertEqual(PriceResolver().price(self.products[0], 50), Decimal("100"))
+
+    def test_unverified_business_users_get_no_b2b_tiers(self):
+        """
+        Test that B2B tiers are only shown to and applied for B2B-verified business users.
+        """
+        product = self.products[0]
+        self.assertEqual([tier.price_per_unit for tier in PriceResolver(self.buyer).b2b_tiers(product)], [Decimal("70")])
+
+        unverified = UserFactory()
+        UserProfile.objects.create(user=unverified, business_type=UserProfile.BusinessType.RETAILER, b2b_verified=False)
+        unverified = User.objects.select_related("user_profile").get(pk=unverified.pk)
+        resolver = PriceResolver(unverified)
+        self.assertEqual(resolver.b2b_tiers(product), [])
+        self.assertNotEqual(resolver.price(product, 50), Decimal("70"))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ShopScopingTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = UserFactory()
+        owner_role = Role.get_or_create_role(code="business_owner", name="Business Owner", level=3, description="")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = UserProfile.objects.create(user=self.owner, role=owner_role)
+
+    def test_tenant_rows_copy_the_owner_shop_id(self):
+        """
+        Test that tenant rows get the denormalized shop id of their user and follow profile changes.
+        """
+        product = ProductFactory(user=self.owner)
+        self.assertIsNotNone(self.profile.shop_id)
+        self.assertEqual(product.shop_id, self.profile.shop_id)
+        self.assertEqual(list(Product.objects.filter(shop_id=self.profile.shop_id)), [product])
+
+        self.profile.role = Role.get_or_create_role(code="general_user", name="General User", level=1, description="")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+        product.refresh_from_db()
+        self.assertIsNone(product.shop_id)
+
+    def test_reassigned_rows_move_to_the_new_owner_shop(self):
+        """
+        Test that giving a tenant row to another user moves it to that user's shop.
+        """
+        new_owner = UserFactory()
+        owner_role = Role.get_or_create_role(code="business_owner", name="Business Owner", level=3, description="")
+        with self.captureOnCommitCallbacks(execute=True):
+            new_profile = UserProfile.objects.create(user=new_owner, role=owner_role)
+        self.assertNotEqual(new_profile.shop_id, self.profile.shop_id)
+
+        product = ProductFactory(user=self.owner)
+        product.user = new_owner
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.shop_id, new_profile.shop_id)
+
+    def test_shop_id_resolution_is_cached_until_the_profile_changes(self):
+        """
+        Test that the middleware lookup hits the database once per user until the profile is saved.
+        """
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_shop_id(self.owner.id), self.profile.shop_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_shop_id(self.owner.id), self.profile.shop_id)
+
+        self.profile.role = Role.get_or_create_role(code="general_user", name="General User", level=1, description="")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+        self.assertIsNone(resolve_shop_id(self.owner.id))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}, CATALOG_POOL_SIZE=4
+)
+class MarketplaceCatalogTestCase(APITestCase):
+    url = "/api/v1/marketplace/"
+
+    def setUp(self):
+        cache.clear()
+        self.products = [MarketplaceProductFactory(listed_price=price) for price in range(10, 100, 10)]
+        # Ties on listed_date are broken by id
+        MarketplaceProduct.objects.filter(pk__in=[p.pk for p in self.products[:4]]).update(
+            listed_date=self.products[0].listed_date
+        )
+        self.client.force_authenticate(UserFactory())
+
+    def walk(self, url, key="next"):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([item["id"] for item in response.data["results"]])
+            url = response.data[key]
+        return pages
+
+    def test_cursor_pages_cover_the_catalog_once_in_order(self):
+        """
+        Test that cursor pages serve the interleaved pool, then the rest by (listed_date, id), without repeats.
+        """
+        pages = self.walk(f"{self.url}?limit=3")
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual([len(page) for page in pages], [3, 3, 3])
+        self.assertEqual(sorted(ids), sorted(p.pk for p in self.products))
+
+        prices = {p.pk: p.listed_price for p in self.products}
+        self.assertEqual(sorted(prices[pk] for pk in ids[:4]), [10, 20, 80, 90])
+        self.assertGreater(prices[ids[0]], prices[ids[1]])
+        tail = MarketplaceProduct.objects.filter(pk__in=ids[4:]).order_by("-listed_date", "-id")
+        self.assertEqual(ids[4:], [p.pk for p in tail])
+
+    def test_previous_links_retrace_the_same_pages(self):
+        """
+        Test that following previous links from the last page returns the pages of the session in reverse.
+        """
+        response = self.client.get(f"{self.url}?limit=2")
+        forward = [[item["id"] for item in response.data["results"]]] + self.walk(response.data["next"])
+        last_url = self.url + "?limit=2"
+        while True:
+            response = self.client.get(last_url)
+            if not response.data["next"]:
+                break
+            last_url = response.data["next"]
+
+        self.assertEqual(self.walk(last_url, key="previous"), forward[::-1])
+
+    def test_later_pages_are_bounded_by_page_size(self):
+        """
+        Test that pages after the first reuse the cached pool and issue the same queries however deep they are.
+        """
+        MarketplaceProductFactory.create_batch(20)
+        response = self.client.get(f"{self.url}?limit=2")
+        second_url = response.data["next"]
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(second_url)
+        while response.data["next"]:
+            deep_url = response.data["next"]
+            response = self.client.get(deep_url)
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(deep_url)
+        self.assertLessEqual(len(deep), len(second))
+        self.assertFalse(any("OFFSET" in query["sql"] for query in deep.captured_queries))
+
+    def test_tampered_cursor_is_rejected(self):
+        """
+        Test that an unsigned cursor or one issued for other filters is a 404.
+        """
+        self.assertEqual(self.client.get(f"{self.url}?cursor=abc").status_code, status.HTTP_404_NOT_FOUND)
+        next_url = self.client.get(f"{self.url}?limit=2").data["next"]
+        response = self.client.get(next_url + "&search=rice")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_offset_pages_are_still_served(self):
+        """
+        Test that offset pagination keeps working over the same ordering.
+        """
+        pages = self.walk(f"{self.url}?limit=4&offset=0")
+        self.assertEqual(sum(len(page) for page in pages), len(self.products))
+        self.assertEqual(self.client.get(f"{self.url}?limit=4&offset=4").data["count"], len(self.products))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}, SEARCH_INDEX_MIRRORS=[]
+)
+class SearchIndexerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.queue = LocalIndexQueue()
+        self.indexer = SearchIndexer(queue=self.queue)
+        self.indexer.flush_interval = 3600
+        # Outside a transaction on_commit callbacks run at once; patched so no database connection is needed
+        patcher = mock.patch("producer.search_indexing.transaction.on_commit", side_effect=lambda func: func())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_marks_coalesce_and_keep_the_first_time(self):
+        """
+        Test that repeated changes to a listing are queued once, with the time of the first change.
+        """
+        with mock.patch("producer.search_indexing.time.time", side_effect=[100.0, 200.0]):
+            self.indexer.mark_dirty(listing_ids=[1, 2])
+            self.indexer.mark_dirty(listing_ids=[2, 3], product_ids=[7])
+
+        self.assertEqual(self.queue.size(DIRTY_KEY), 4)
+        self.assertEqual(self.queue.pop(DIRTY_KEY, 10), [("m:1", 100.0), ("m:2", 100.0), ("m:3", 200.0), ("p:7", 200.0)])
+
+    def test_collect_enqueues_once_at_the_end(self):
+        """
+        Test that marks made in a collect block reach the queue together when it ends.
+        """
+        with mock.patch.object(self.queue, "add", wraps=self.queue.add) as add:
+            with self.indexer.collect():
+                for pk in range(5):
+                    self.indexer.mark_dirty(listing_ids=[pk])
+                add.assert_not_called()
+        add.assert_called_once()
+        self.assertEqual(self.queue.size(DIRTY_KEY), 5)
+
+    def test_failed_batch_goes_back_on_the_queue(self):
+        """
+        Test that a batch whose indexing fails is requeued with its original times.
+        """
+        self.queue.add(DIRTY_KEY, {"m:1": 100.0, "m:2": 150.0})
+        with mock.patch.object(self.indexer, "get_backend"):
+            with mock.patch.object(self.indexer, "index_entries", side_effect=ConnectionError("down")):
+                with self.assertRaises(ConnectionError):
+                    self.indexer.flush()
+        self.assertEqual(self.queue.pop(DIRTY_KEY, 10), [("m:1", 100.0), ("m:2", 150.0)])
+
+    def test_listings_flushed_during_a_rebuild_are_replayed(self):
+        """
+        Test that batches indexed while a rebuild loads are requeued by replay after the swap.
+        """
+        self.indexer.batch_size = 1
+        self.queue.add(DIRTY_KEY, {"m:1": 100.0, "m:2": 150.0})
+        cache.set(REBUILD_KEY, "new_index_1")
+        with mock.patch.object(self.indexer, "get_backend"):
+            with mock.patch.object(self.indexer, "index_entries", return_value=(1, 0)) as index_entries:
+                self.assertEqual(self.indexer.flush(), {"indexed": 2, "removed": 0, "batches": 2})
+        self.assertEqual(index_entries.call_count, 2)
+        self.assertEqual(self.queue.size(DIRTY_KEY), 0)
+
+        self.indexer.replay()
+        self.assertEqual(self.queue.pop(DIRTY_KEY, 10), [("m:1", 100.0), ("m:2", 150.0)])
+
+    def test_alias_swap_is_one_atomic_update(self):
+        """
+        Test that the alias moves to the new index in one update, replacing a concrete index of the same name.
+        """
+        backend = mock.Mock(index_name="new_index")
+        backend.conn.indices.exists_alias.return_value = False
+        backend.conn.indices.exists.return_value = True
+
+        self.assertEqual(self.indexer.swap_alias(backend, "new_index_2"), [])
+        backend.conn.indices.update_aliases.assert_called_once_with(
+            body={
+                "actions": [
+                    {"remove_index": {"index": "new_index"}},
+                    {"add": {"index": "new_index_2", "alias": "new_index"}},
+                ]
+            }
+        )
+
+        backend.conn.indices.exists_alias.return_value = True
+        backend.conn.indices.get_alias.return_value = {"new_index_2": {}}
+        self.assertEqual(self.indexer.swap_alias(backend, "new_index_3"), ["new_index_2"])
+        actions = backend.conn.indices.update_aliases.call_args.kwargs["body"]["actions"]
+        self.assertEqual(actions[1], {"remove": {"index": "new_index_2", "alias": "new_index"}})
+
+
+class EmbeddedSearchIndexTestCase(SimpleTestCase):
+    TEXT_FIELDS = {"text", "name", "category"}
+    LISTINGS = [
+        (1, "Basmati Rice 5kg", "Grocery", 900.0),
+        (2, "Rice cooker", "Kitchen", 3500.0),
+        (3, "Brown rice", "Grocery", 400.0),
+        (4, "Red lentils", "Grocery", 200.0),
+    ]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.index = EmbeddedIndex(self.path, max_segments=3)
+        self.write(*self.LISTINGS)
+
+    def write(self, *listings):
+        builder = SegmentBuilder()
+        for pk, name, category, price in listings:
+            builder.add(
+                f"producer.marketplaceproduct.{pk}",
+                {"text": [f"{name} {category}"], "name": [name], "category": [category]},
+                {"django_id": str(pk), "name": name, "category": category, "listed_price": price},
+                keyword_fields={"name", "category"},
+            )
+        self.index.write(builder)
+
+    def search(self, *children, connector="AND", index=None):
+        index = index or self.index
+        snapshot = index.snapshot()
+        matches = index.evaluate(Node(list(children), connector), snapshot, self.TEXT_FIELDS, "text")
+        ranked = sorted(matches, key=lambda handle: (-matches[handle], snapshot.key(handle)))
+        return [snapshot.stored(handle)["django_id"] for handle in ranked]
+
+    def test_bm25_ranks_shorter_documents_first(self):
+        self.assertEqual(self.search(("content", "rice")), ["2", "3", "1"])
+
+    def test_prefix_and_term_filters(self):
+        self.assertEqual(self.search(("name__startswith", "len")), ["4"])
+        self.assertEqual(self.search(("content", "rice"), ("category__exact", "grocery")), ["3", "1"])
+        self.assertEqual(self.search(("category__in", ["Kitchen"])), ["2"])
+
+    def test_price_range_and_negation(self):
+        self.assertEqual(sorted(self.search(("listed_price__gte", 500))), ["1", "2"])
+        self.assertEqual(self.search(("listed_price__range", (300, 1000)), ("content", "rice")), ["3", "1"])
+        self.assertEqual(self.search(("content", "rice"), Node([("category", "kitchen")], negated=True)), ["3", "1"])
+
+    def test_updates_deletes_and_merges(self):
+        for version in range(4):
+            self.write((2, f"Steel pot v{version}", "Kitchen", 3000.0))
+        self.index.write(removed=["producer.marketplaceproduct.4"])
+
+        snapshot = self.index.snapshot()
+        self.assertLessEqual(len(snapshot.segments), 3)
+        self.assertEqual(snapshot.size, 3)
+        self.assertEqual(self.search(("content", "rice")), ["3", "1"])
+        self.assertEqual(self.search(("content", "v3")), ["2"])
+        self.assertEqual(self.search(("content", "v2")), [])
+        self.assertEqual(self.search(("content", "lentils")), [])
+
+    def test_reopens_from_disk(self):
+        self.index.write(removed=["producer.marketplaceproduct.1"])
+        self.index.optimize()
+        reopened = EmbeddedIndex(self.path)
+        self.assertEqual(self.search(("content", "rice"), index=reopened), ["2", "3"])
+        self.assertEqual(len(reopened.snapshot().segments), 1)
+
+    def test_more_like_this_finds_nothing(self):
+        backend = EmbeddedSearchBackend("embedded", PATH=self.path)
+        self.assertEqual(backend.more_like_this(mock.Mock())["hits"], 0)
+
+
+class TagExtractorTestCase(SimpleTestCase):
+    def test_keyword_matcher_finds_overlapping_keywords(self):
+        matcher = KeywordMatcher({"tv": ["tv"], "led": ["led"], "led tv": ["led tv", "television"], "fridge": ["fridge"]})
+        self.assertEqual(matcher.find("new led tv, 32 inch"), {"tv", "led", "led tv"})
+        self.assertEqual(matcher.tags("smart led tv"), {"tv", "led", "led tv", "television"})
+        # Substring semantics, like ``keyword in text``
+        self.assertEqual(matcher.find("minifridges"), {"fridge"})
+        self.assertEqual(matcher.find("no match"), set())
+
+    def test_keyword_matcher_whole_words(self):
+        matcher = KeywordMatcher({"mi": ["mi"], "redmi": ["redmi"], "us polo": ["us polo"]}, whole_words=True)
+        self.assertEqual(matcher.find("redmi note by us polo"), {"redmi", "us polo"})
+        self.assertEqual(matcher.find("mi band, mini"), {"mi"})
+        self.assertEqual(matcher.find("campus polo"), set())
+
+    def test_extract_tags_from_source(self):
+        source = TagSource(
+            name="Samsung 55 inch Smart LED TV",
+            description="4K ultra hd with remote control",
+            category_code="EG",
+            category_name="Electronics & Gadgets",
+            is_made_in_nepal=True,
+        )
+        tags = set(TagExtractor.extract_tags(source))
+        self.assertLessEqual({"samsung", "electronics", "led tv", "television tv", "remote control", "large screen"}, tags)
+        self.assertLessEqual({"electronics gadgets", "made in nepal"}, tags)
+        self.assertNotIn("refrigerator fridge", tags)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TagBulkExtractTestCase(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(code="EG", name="Electronics & Gadgets")
+        self.listings = [
+            MarketplaceProductFactory(product=ProductFactory(name=name, category=category, description=""))
+            for name in ("Samsung smart tv", "Whirlpool double door fridge")
+        ]
+
+    def extract(self, workers):
+        MarketplaceProduct.objects.filter(pk__in=[listing.pk for listing in self.listings]).update(search_tags=[])
+        with mock.patch.object(search_indexer, "mark_dirty"):
+            TagExtractor.bulk_extract(
+                MarketplaceProduct.objects.filter(pk__in=[listing.pk for listing in self.listings]),
+                workers=workers,
+                log=lambda message: None,
+            )
+        return [MarketplaceProduct.objects.get(pk=listing.pk).search_tags for listing in self.listings]
+
+    def test_bulk_extract_writes_tags_in_bulk(self):
+        listings = self.listings
+        MarketplaceProduct.objects.filter(pk=listings[1].pk).update(search_tags=["kept"])
+
+        log = []
+        with mock.patch.object(search_indexer, "mark_dirty") as mark_dirty:
+            with self.assertNumQueries(3):
+                # The count, the listings with their products and categories, and one bulk update
+                updated = TagExtractor.bulk_extract(
+                    MarketplaceProduct.objects.filter(pk__in=[listing.pk for listing in listings]), workers=1, log=log.append
+                )
+
+        self.assertEqual(updated, 2)
+        tv, fridge = (MarketplaceProduct.objects.get(pk=listing.pk).search_tags for listing in listings)
+        self.assertLessEqual({"samsung", "smart tv", "electronics gadgets"}, set(tv))
+        self.assertLessEqual({"whirlpool", "double door", "kept"}, set(fridge))
+        self.assertEqual(sorted(mark_dirty.call_args.kwargs["listing_ids"]), sorted(listing.pk for listing in listings))
+        self.assertIn("products/s", log[-1])
+
+    @mock.patch("producer.tag_extractor.PARALLEL_MIN_PRODUCTS", 1)
+    def test_process_pool_matches_in_process(self):
+        self.assertEqual(self.extract(workers=2), self.extract(workers=1))
+
+    @mock.patch("producer.tag_extractor.PARALLEL_MIN_PRODUCTS", 1)
+    def test_unavailable_pool_falls_back_to_in_process(self):
+        in_process = self.extract(workers=1)
+        for failure in (
+            {"side_effect": OSError("semaphores unavailable")},
+            {"return_value.map.side_effect": AssertionError("daemonic processes are not allowed to have children")},
+        ):
+            with mock.patch("producer.tag_extractor.ProcessPoolExecutor", **failure):
+                with self.assertLogs("producer.tag_extractor", "WARNING"):
+                    self.assertEqual(self.extract(workers=2), in_process)
+
+    @mock.patch("producer.tag_extractor.PARALLEL_MIN_PRODUCTS", 1)
+    @mock.patch("producer.tag_extractor.ProcessPoolExecutor")
+    def test_zero_workers_or_a_daemonic_process_extracts_in_process(self, mock_executor):
+        self.extract(workers=0)
+        with mock.patch("multiprocessing.current_process") as current_process:
+            current_process.return_value.daemon = True
+            self.extract(workers=4)
+
+        mock_executor.assert_not_called()
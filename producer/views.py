@@ -3,26 +3,21 @@ import logging
 import random
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from itertools import zip_longest
 
 import requests
 from django.conf import settings
-from django.core.cache import cache
 from django.db import models, transaction
 from django.db.models import (
-    Case,
     Count,
     DecimalField,
     ExpressionWrapper,
     F,
     FloatField,
-    IntegerField,
     Prefetch,
     Q,
     Sum,
-    When,
 )
-from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.db.models.functions import TruncDate, TruncMonth
 from django.db.models.query import QuerySet
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
@@ -32,13 +27,16 @@ from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 from rest_framework import status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
 from market.models import MarketplaceProduct, ShoppableVideo, UserFollow
 from market.serializers import MarketplaceProductSerializer, ShoppableVideoSerializer
+from market.tagged_cache import request_cache_tags, tagged_cache
 from notification.models import Notification
 from user.models import UserProfile
 
@@ -46,6 +44,7 @@ from user.models import UserProfile
 SEARCH_CACHE_TTL = getattr(settings, "PRODUCER_SEARCH_CACHE_TTL", 30)
 LIST_CACHE_TTL = getattr(settings, "PRODUCER_LIST_CACHE_TTL", 15)
 
+from .catalog import Catalog, InvalidCatalogCursor, decode_cursor, filter_signature, new_seed
 from .filters import (
     BrandFilter,
     CustomerFilter,
@@ -64,6 +63,7 @@ from .models import (
     DirectSale,
     LedgerEntry,
     MarketplaceProduct,
+    MarketplaceProductReview,
     Order,
     Payment,
     Producer,
@@ -78,7 +78,6 @@ from .models import (
 from .serializers import (
     AuditLogSerializer,
     BrandSerializer,
-    CategoryHierarchySerializer,
     CategorySerializer,
     CitySerializer,
     CustomerOrdersSerializer,
@@ -110,6 +109,7 @@ from .serializers import (
     SubSubcategorySerializer,
 )
 from .supply_chain import SupplyChainService
+from .taxonomy import CATEGORY, SUB_SUBCATEGORY, SUBCATEGORY, get_taxonomy
 from .utils import export_queryset_to_excel
 
 logger = logging.getLogger(__name__)
@@ -702,7 +702,7 @@ class ProducerViewSet(viewsets.ModelViewSet):
 
         user_profile = getattr(user, "user_profile", None)
         if user_profile:
-            return Producer.objects.select_related("user").filter(user__user_profile__shop_id=user_profile.shop_id)
+            return Producer.objects.select_related("user").filter(shop_id=user_profile.shop_id)
         else:
             return Producer.objects.none()
 
@@ -730,7 +730,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
 
         user_profile = getattr(user, "user_profile", None)
         if user_profile:
-            return Customer.objects.select_related("user").filter(user__user_profile__shop_id=user_profile.shop_id)
+            return Customer.objects.select_related("user").filter(shop_id=user_profile.shop_id)
         else:
             return Customer.objects.none()
 
@@ -765,7 +765,7 @@ class ProductViewSet(viewsets.ModelViewSet):
                     "brand", "category", "subcategory", "sub_subcategory", "producer", "user", "location"
                 )
                 .prefetch_related("images")
-                .filter(user__user_profile__shop_id=user_profile.shop_id)
+                .filter(shop_id=user_profile.shop_id)
             )
         else:
             return Product.objects.none()
@@ -913,7 +913,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         if user_profile:
             return Order.objects.select_related(
                 "customer", "product", "product__brand", "product__category", "product__producer", "user"
-            ).filter(user__user_profile__shop_id=user_profile.shop_id)
+            ).filter(shop_id=user_profile.shop_id)
         else:
             return Order.objects.none()
 
@@ -1002,7 +1002,7 @@ class SaleViewSet(viewsets.ModelViewSet):
                 "order__product__producer",
                 "user",
                 "payment",
-            ).filter(user__user_profile__shop_id=user_profile.shop_id)
+            ).filter(shop_id=user_profile.shop_id)
         else:
             return Sale.objects.none()
 
@@ -1022,22 +1022,22 @@ class DashboardAPIView(APIView):
         shop_id = user_profile.shop_id
         current_year = timezone.now().year
 
-        total_products = Product.objects.filter(user__user_profile__shop_id=shop_id).distinct().count() or 0
-        total_orders = Order.objects.filter(user__user_profile__shop_id=shop_id).count()
-        total_sales = Sale.objects.filter(user__user_profile__shop_id=shop_id).count()
-        total_customers = Customer.objects.filter(user__user_profile__shop_id=shop_id).count()
+        total_products = Product.objects.filter(shop_id=shop_id).distinct().count() or 0
+        total_orders = Order.objects.filter(shop_id=shop_id).count()
+        total_sales = Sale.objects.filter(shop_id=shop_id).count()
+        total_customers = Customer.objects.filter(shop_id=shop_id).count()
         pending_orders = Order.objects.filter(
-            status__in=[Order.Status.PENDING, Order.Status.APPROVED], user__user_profile__shop_id=shop_id
+            status__in=[Order.Status.PENDING, Order.Status.APPROVED], shop_id=shop_id
         ).count()
         total_revenue = (
-            Sale.objects.filter(user__user_profile__shop_id=shop_id).aggregate(total_revenue=Sum("sale_price"))[
+            Sale.objects.filter(shop_id=shop_id).aggregate(total_revenue=Sum("sale_price"))[
                 "total_revenue"
             ]
             or 0
         )
 
         sales_trends = (
-            Sale.objects.filter(user__user_profile__shop_id=shop_id, sale_date__year=current_year)
+            Sale.objects.filter(shop_id=shop_id, sale_date__year=current_year)
             .annotate(month=TruncMonth("sale_date"))
             .values("month")
             .annotate(total_sales=Sum("sale_price"))
@@ -1100,7 +1100,7 @@ class TopSalesCustomersView(APIView):
         shop_id = user_profile.shop_id
 
         top_sales_customers = (
-            Sale.objects.filter(user__user_profile__shop_id=shop_id, sale_date__year=current_year)
+            Sale.objects.filter(shop_id=shop_id, sale_date__year=current_year)
             .annotate(total_sales_amount=ExpressionWrapper(F("sale_price") * F("quantity"), output_field=FloatField()))
             .values("order__customer__id", "order__customer__name")
             .annotate(total_sales=Sum("total_sales_amount"), name=F("order__customer__name"), id=F("order__customer__id"))
@@ -1126,7 +1126,7 @@ class TopOrdersCustomersView(APIView):
         shop_id = user_profile.shop_id
 
         top_orders_customers = (
-            Customer.objects.filter(user__user_profile__shop_id=shop_id, order__order_date__year=current_year)
+            Customer.objects.filter(shop_id=shop_id, order__order_date__year=current_year)
             .annotate(total_orders=Count("order"))
             .order_by("-total_orders")[:10]
         )
@@ -1188,63 +1188,54 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
         return (
             MarketplaceProduct.objects.filter(is_available=True)
             .select_related("product", "product__user", "product__category")
-            .prefetch_related("bulk_price_tiers", "variants")
+            .prefetch_related(
+                "bulk_price_tiers",
+                "variants",
+                Prefetch("reviews", queryset=MarketplaceProductReview.objects.select_related("user")),
+            )
         )
 
     def list(self, request, *args, **kwargs):
+        """
+        The catalog: a price-interleaved pool shuffled per session, then the
+        rest newest first, paged by cursor. Requests with ``offset`` get
+        offset pages over the same order with a fresh shuffle.
+        """
         qs = self.filter_queryset(self.get_queryset())
+        paginator = self.paginator
+        if paginator is None or paginator.offset_query_param in request.query_params:
+            catalog = Catalog(qs, new_seed())
+            page = self.paginate_queryset(catalog)
+            if page is None:
+                return Response(self.get_serializer(catalog[:], many=True).data)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
-        pool_size = 200
-        half = pool_size // 2
-
-        # Annotate with effective price: use discounted_price when set, otherwise listed_price
-        qs_priced = qs.annotate(effective_price=Coalesce("discounted_price", "listed_price"))
-
-        # Collect the cheapest half and the most expensive half as separate pools
-        low_ids = list(qs_priced.order_by("effective_price").values_list("id", flat=True)[:half])
-        high_ids = list(qs_priced.order_by("-effective_price").values_list("id", flat=True)[:half])
-
-        # Drop any overlap that arises when the total product count is less than pool_size
-        low_set = set(low_ids)
-        high_ids = [pk for pk in high_ids if pk not in low_set]
-
-        # Shuffle each price group independently so every refresh produces a new order
-        random.shuffle(low_ids)
-        random.shuffle(high_ids)
-
-        # Interleave: high-price, low-price, high-price, low-price …
-        interleaved_ids = []
-        for h, l in zip_longest(high_ids, low_ids):
-            if h is not None:
-                interleaved_ids.append(h)
-            if l is not None:
-                interleaved_ids.append(l)
-
-        if interleaved_ids:
-            all_pool_set = set(interleaved_ids)
-            preserved_order = Case(
-                *[When(id=pk, then=pos) for pos, pk in enumerate(interleaved_ids)],
-                output_field=IntegerField(),
-            )
-            pool_items = list(qs.filter(id__in=all_pool_set).order_by(preserved_order))
-            remaining_items = list(qs.exclude(id__in=all_pool_set).order_by("-listed_date"))
-            combined = pool_items + remaining_items
-
-            page = self.paginate_queryset(combined)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return Response(self.get_paginated_response(serializer.data).data)
-
-            serializer = self.get_serializer(combined, many=True)
-            return Response(serializer.data)
-        else:
-            page = self.paginate_queryset(qs)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return Response(self.get_paginated_response(serializer.data).data)
+        signature = filter_signature(request.query_params)
+        cursor = request.query_params.get("cursor")
+        try:
+            seed, offset, anchor = decode_cursor(cursor, signature) if cursor else (new_seed(), 0, None)
+        except InvalidCatalogCursor as e:
+            raise NotFound(str(e))
+
+        catalog = Catalog(qs, seed, signature)
+        page_size = paginator.get_limit(request)
+        page = catalog.page(offset, page_size, anchor)
+        serializer = self.get_serializer(page.items, many=True)
+        return Response(
+            {
+                "count": catalog.count(),
+                "next": self._catalog_cursor_url(request, catalog.encode(page.next), page_size),
+                "previous": self._catalog_cursor_url(request, catalog.encode(page.previous), page_size),
+                "results": serializer.data,
+            }
+        )
 
-            serializer = self.get_serializer(qs, many=True)
-            return Response(serializer.data)
+    def _catalog_cursor_url(self, request, cursor, page_size):
+        if cursor is None:
+            return None
+        url = replace_query_param(request.build_absolute_uri(), "cursor", cursor)
+        return replace_query_param(url, self.paginator.limit_query_param, page_size)
 
     @action(detail=False, methods=["get"], url_path="made-for-you", permission_classes=[AllowAny])
     def made_for_you(self, request):
@@ -1265,7 +1256,8 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
             "producer:made_for_you:"
             + hashlib.sha256((request.get_full_path() + ":" + user_part).encode("utf-8")).hexdigest()
         )
-        cached = cache.get(cache_key)
+        cache_tags = request_cache_tags(request, "producer")
+        cached, generations = tagged_cache.lookup(cache_key, cache_tags)
         if cached is not None:
             return Response(cached)
 
@@ -1282,7 +1274,7 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
         response = paginator.get_paginated_response(serializer.data)
 
         try:
-            cache.set(cache_key, response.data, LIST_CACHE_TTL)
+            tagged_cache.set(cache_key, response.data, LIST_CACHE_TTL, cache_tags, generations=generations)
         except Exception:
             pass
 
@@ -1321,11 +1313,13 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
         cache_key = (
             "producer:search:" + hashlib.sha256((request.get_full_path() + ":" + user_part).encode("utf-8")).hexdigest()
         )
-        cached = cache.get(cache_key)
+        cache_tags = request_cache_tags(request, "producer")
+        cached, generations = tagged_cache.lookup(cache_key, cache_tags)
         if cached is not None:
             return Response(cached)
 
-        sqs = SearchQuerySet().models(MarketplaceProduct)
+        using = getattr(settings, "MARKETPLACE_SEARCH_CONNECTION", "default")
+        sqs = SearchQuerySet(using=using).models(MarketplaceProduct)
 
         try:
             combined = (
@@ -1347,36 +1341,11 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
             except Exception:
                 sqs = sqs.filter(content=phrase)
 
-        def _id_to_name(val):
-            try:
-                int_val = int(val)
-            except Exception:
-                return val
-            from producer.models import Category, Subcategory, SubSubcategory
-
-            # Try category, then subcategory, then sub_subcategory
-            try:
-                c = Category.objects.filter(id=int_val).first()
-                if c:
-                    return c.name
-            except Exception:
-                pass
-            try:
-                s = Subcategory.objects.filter(id=int_val).first()
-                if s:
-                    return s.name
-            except Exception:
-                pass
-            try:
-                ss = SubSubcategory.objects.filter(id=int_val).first()
-                if ss:
-                    return ss.name
-            except Exception:
-                pass
-            return val
+        taxonomy = get_taxonomy()
 
         if category:
-            name_val = _id_to_name(category)
+            # An id is tried as a category, then a subcategory, then a sub-subcategory
+            name_val = taxonomy.resolve_name(category)
             try:
                 sqs = sqs.filter(SQ(category=name_val) | SQ(subcategory=name_val) | SQ(sub_subcategory=name_val))
             except Exception:
@@ -1396,22 +1365,15 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
                     int_val = None
 
                 if int_val:
-                    from producer.models import Category, Subcategory, SubSubcategory
-
-                    try:
-                        if field_name == "subcategory":
-                            sub = Subcategory.objects.get(id=int_val)
-                            return sqs_obj.filter(subcategory=sub.name)
-                        if field_name == "sub_subcategory":
-                            ssub = SubSubcategory.objects.get(id=int_val)
-                            return sqs_obj.filter(sub_subcategory=ssub.name)
-                    except Exception:
+                    node = taxonomy.get(field_name, int_val)
+                    if node is None:
                         return sqs_obj
+                    return sqs_obj.filter(**{field_name: node.name})
 
                 return sqs_obj.filter(**{field_name: value})
 
-            sqs = _apply_field_filter(sqs, "subcategory", sub_category)
-            sqs = _apply_field_filter(sqs, "sub_subcategory", sub_subcategory)
+            sqs = _apply_field_filter(sqs, SUBCATEGORY, sub_category)
+            sqs = _apply_field_filter(sqs, SUB_SUBCATEGORY, sub_subcategory)
 
         # Apply additional filters
         if brand:
@@ -1440,7 +1402,17 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
         paginator.page_size = int(request.query_params.get("page_size", 100))
 
         # This returns a list of SearchResult objects for the current page
-        page_results = paginator.paginate_queryset(sqs, request, view=self)
+        try:
+            page_results = paginator.paginate_queryset(sqs, request, view=self)
+        except NotFound:
+            raise
+        except Exception as e:
+            # Degraded mode: answer from the fallback index while the primary search cluster is unavailable
+            fallback = getattr(settings, "MARKETPLACE_SEARCH_FALLBACK_CONNECTION", None)
+            if not fallback or fallback == using:
+                raise
+            logger.warning(f"Search on '{using}' failed, falling back to '{fallback}': {e}")
+            page_results = paginator.paginate_queryset(sqs.using(fallback), request, view=self)
 
         # Resolve objects only for the current page
         results = [r.object for r in page_results if getattr(r, "object", None) is not None]
@@ -1450,7 +1422,7 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
 
         # Cache the response payload for a short TTL
         try:
-            cache.set(cache_key, response.data, SEARCH_CACHE_TTL)
+            tagged_cache.set(cache_key, response.data, SEARCH_CACHE_TTL, cache_tags, generations=generations)
         except Exception:
             pass
 
@@ -1601,13 +1573,15 @@ class MarketplaceProductViewSet(viewsets.ModelViewSet):
         if not items_data:
             return Response({"error": "No items provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        items = []
-        for item_data in items_data:
-            try:
-                product = MarketplaceProduct.objects.get(id=item_data["product_id"])
-                items.append({"product": product, "quantity": item_data["quantity"]})
-            except (MarketplaceProduct.DoesNotExist, KeyError):
-                return Response({"error": f"Invalid product or quantity data"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            product_ids = [int(item_data["product_id"]) for item_data in items_data]
+            products = MarketplaceProduct.objects.select_related("product").in_bulk(product_ids)
+            items = [
+                {"product": products[product_id], "quantity": item_data["quantity"]}
+                for product_id, item_data in zip(product_ids, items_data)
+            ]
+        except (KeyError, TypeError, ValueError):
+            return Response({"error": f"Invalid product or quantity data"}, status=status.HTTP_400_BAD_REQUEST)
 
         from .services import B2BPricingService
 
@@ -1820,7 +1794,7 @@ class StatsAPIView(APIView):
 
         # Filter data based on the shop_id of the user's profile
         shop_id = user_profile.shop_id
-        sales_query = Sale.objects.filter(user__user_profile__shop_id=shop_id)
+        sales_query = Sale.objects.filter(shop_id=shop_id)
 
         if filter_params["location"]:
             sales_query = sales_query.filter(order__customer__city=filter_params["location"])
@@ -1913,7 +1887,7 @@ def export_producers_to_excel(request):
 
     user_profile = getattr(user, "user_profile", None)
     if user_profile:
-        queryset = Producer.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
+        queryset = Producer.objects.filter(shop_id=user_profile.shop_id)
     wb = export_queryset_to_excel(queryset, field_names)
 
     response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
@@ -1943,7 +1917,7 @@ def export_customers_to_excel(request):
 
     user_profile = getattr(user, "user_profile", None)
     if user_profile:
-        queryset = Customer.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
+        queryset = Customer.objects.filter(shop_id=user_profile.shop_id)
     wb = export_queryset_to_excel(queryset, field_names)
 
     response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
@@ -1988,7 +1962,7 @@ def export_products_to_excel(request):
 
     user_profile = getattr(user, "user_profile", None)
     if user_profile:
-        queryset = Product.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
+        queryset = Product.objects.filter(shop_id=user_profile.shop_id)
     wb = export_queryset_to_excel(queryset, field_names, headers)
 
     response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
@@ -2037,7 +2011,7 @@ def export_orders_to_excel(request):
     if not user_profile:
         return Response({"error": "User profile not found"}, status=status.HTTP_400_BAD_REQUEST)
 
-    queryset = Order.objects.filter(user__user_profile__shop_id=user_profile.shop_id).select_related("customer", "product")
+    queryset = Order.objects.filter(shop_id=user_profile.shop_id).select_related("customer", "product")
     if start_date:
         try:
             start_date = timezone.datetime.strptime(start_date, "%Y-%m-%d").date()
@@ -2118,7 +2092,7 @@ def export_sales_to_excel(request):
         return Response({"error": "User profile not found"}, status=status.HTTP_400_BAD_REQUEST)
 
     # Base queryset with shop filtering
-    queryset = Sale.objects.filter(user__user_profile__shop_id=user_profile.shop_id).select_related("order__product")
+    queryset = Sale.objects.filter(shop_id=user_profile.shop_id).select_related("order__product")
 
     # Apply date filters
     if start_date:
@@ -2369,7 +2343,7 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
 
         user_profile = getattr(user, "user_profile", None)
         if user_profile:
-            return PurchaseOrder.objects.filter(user__user_profile__shop_id=user_profile.shop_id)
+            return PurchaseOrder.objects.filter(shop_id=user_profile.shop_id)
         else:
             return PurchaseOrder.objects.none()
 
@@ -2534,9 +2508,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def hierarchy(self, request):
         """Get complete category hierarchy with subcategories and sub-subcategories"""
-        categories = Category.objects.filter(is_active=True).prefetch_related("subcategories__sub_subcategories")
-        serializer = CategoryHierarchySerializer(categories, many=True)
-        return Response(serializer.data)
+        return Response(get_taxonomy().hierarchy())
 
     @action(detail=True, methods=["get"])
     def subcategories(self, request, pk=None):
@@ -2549,10 +2521,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"])
     def subcategories_full(self, request, pk=None):
         """Get subcategories with full sub-subcategory details"""
-        category = self.get_object()
-        subcategories = category.subcategories.filter(is_active=True)
-        serializer = SubcategorySerializer(subcategories, many=True)
-        return Response(serializer.data)
+        taxonomy = get_taxonomy()
+        category = taxonomy.get(CATEGORY, pk)
+        if category is None or not category.is_active:
+            raise NotFound()
+        return Response([taxonomy.subcategory_dict(subcategory) for subcategory in category.active_children])
 
 
 class BrandViewSet(viewsets.ModelViewSet):
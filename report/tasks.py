@@ -92,7 +92,7 @@ def generate_single_user_digest(self, user_id, target_date_str=None):
             return f"Digest already exists for {owner.username} week {start_date}"
 
         sales_in_period = Sale.objects.filter(
-            user__user_profile__shop_id=shop_id, sale_date__date__range=[start_date, end_date]
+            shop_id=shop_id, sale_date__date__range=[start_date, end_date]
         )
         stats = sales_in_period.aggregate(total_rev=Sum("sale_price"), count=Count("id"))
         total_rev = stats["total_rev"] or Decimal("0.00")
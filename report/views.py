@@ -65,7 +65,7 @@ class ERPHealthDashboardView(APIView):
         if not shop_id:
             return Response({"error": "Shop ID not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        out_of_stock_products = Product.objects.filter(user__user_profile__shop_id=shop_id, stock=0, avg_daily_demand__gt=0)
+        out_of_stock_products = Product.objects.filter(shop_id=shop_id, stock=0, avg_daily_demand__gt=0)
 
         lost_sales_revenue = 0
         for p in out_of_stock_products:
@@ -107,7 +107,7 @@ class LostSalesView(APIView):
         if not shop_id:
             return Response({"error": "Shop ID not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        out_of_stock = Product.objects.filter(user__user_profile__shop_id=shop_id, stock=0, avg_daily_demand__gt=0)
+        out_of_stock = Product.objects.filter(shop_id=shop_id, stock=0, avg_daily_demand__gt=0)
 
         results = []
         total_lost_revenue = 0
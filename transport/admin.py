@@ -58,7 +58,7 @@ class DeliveryRatingInline(admin.TabularInline):
 class RouteDeliveryInline(admin.TabularInline):
     model = RouteDelivery
     extra = 0
-    fields = ["delivery", "order"]
+    fields = ["delivery", "pickup_order", "order"]
     ordering = ["order"]
 
 
@@ -2,6 +2,7 @@ from celery import shared_task
 
 from .tasks import (
     cleanup_expired_deliveries,
+    flush_transporter_locations,
     run_periodic_tasks,
     send_delivery_reminders,
     update_delivery_estimates,
@@ -23,6 +24,11 @@ def periodic_estimate_updates():
     return update_delivery_estimates()
 
 
+@shared_task
+def periodic_location_flush():
+    return flush_transporter_locations()
+
+
 @shared_task
 def run_all_periodic_tasks():
     return run_periodic_tasks()
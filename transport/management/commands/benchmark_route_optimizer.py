@@ -0,0 +1,79 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from transport.services.route_optimizer import RouteJob, RouteProblem, naive_route_distance, solve_routes
+
+
+class Command(BaseCommand):
+    help = "Benchmark route optimizer quality and speed on a synthetic fleet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transporters", type=int, default=200, help="Number of transporters in the fleet")
+        parser.add_argument("--deliveries", type=int, default=8, help="Open deliveries per transporter")
+        parser.add_argument("--radius-km", type=float, default=15.0, help="Radius of the service area in km")
+        parser.add_argument("--on-board-ratio", type=float, default=0.25, help="Share of deliveries already picked up")
+        parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic fleet")
+
+    def handle(self, *args, **options):
+        problems = self.build_fleet(options)
+        stops = sum(2 if job.pickup else 1 for problem in problems for job in problem.jobs)
+        self.stdout.write(f"Fleet: {len(problems)} transporters, {stops} stops")
+
+        naive_km = sum(naive_route_distance(problem) for problem in problems)
+
+        started = time.perf_counter()
+        constructed = solve_routes(problems, max_workers=1, local_search=False)
+        construction_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        serial = solve_routes(problems, max_workers=1)
+        serial_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        parallel = solve_routes(problems, max_workers=options["workers"])
+        parallel_time = time.perf_counter() - started
+
+        nearest_km = sum(solution.distance_km for solution in constructed)
+        optimized_km = sum(solution.distance_km for solution in serial)
+        if abs(optimized_km - sum(solution.distance_km for solution in parallel)) > 1e-6:
+            self.stdout.write(self.style.WARNING("Parallel and serial solutions differ"))
+
+        self.stdout.write(f"{'Strategy':<28}{'Distance (km)':>16}{'vs naive':>12}{'Time (s)':>12}")
+        rows = [
+            ("Naive (priority order)", naive_km, None),
+            ("Nearest neighbour", nearest_km, construction_time),
+            ("+ 2-opt/Or-opt (serial)", optimized_km, serial_time),
+            ("+ 2-opt/Or-opt (parallel)", optimized_km, parallel_time),
+        ]
+        for label, distance, elapsed in rows:
+            saving = f"{(1 - distance / naive_km) * 100:.1f}%" if naive_km else "-"
+            timing = f"{elapsed:.3f}" if elapsed is not None else "-"
+            self.stdout.write(f"{label:<28}{distance:>16.1f}{saving:>12}{timing:>12}")
+
+        if parallel_time:
+            self.stdout.write(self.style.SUCCESS(f"Parallel speed-up: {serial_time / parallel_time:.2f}x"))
+
+    def build_fleet(self, options):
+        rng = random.Random(options["seed"])
+        # Roughly 111 km per degree; good enough for a synthetic service area
+        spread = options["radius_km"] / 111.0
+        center_lat, center_lng = 27.7172, 85.3240
+
+        def point():
+            return (center_lat + rng.uniform(-spread, spread), center_lng + rng.uniform(-spread, spread))
+
+        problems = []
+        for transporter in range(options["transporters"]):
+            jobs = [
+                RouteJob(
+                    delivery_id=transporter * options["deliveries"] + index,
+                    drop=point(),
+                    pickup=None if rng.random() < options["on_board_ratio"] else point(),
+                )
+                for index in range(options["deliveries"])
+            ]
+            problems.append(RouteProblem(key=transporter, jobs=jobs, start=point()))
+        return problems
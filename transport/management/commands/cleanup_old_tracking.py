@@ -3,7 +3,7 @@ from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from transport.models import DeliveryTracking
+from transport.models import DeliveryTracking, LocationBreadcrumb
 
 
 class Command(BaseCommand):
@@ -11,6 +11,9 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--days", type=int, default=90, help="Delete tracking records older than this many days")
+        parser.add_argument(
+            "--breadcrumb-days", type=int, default=7, help="Delete location breadcrumbs older than this many days"
+        )
 
     def handle(self, *args, **options):
         days = options["days"]
@@ -22,3 +25,8 @@ class Command(BaseCommand):
         old_tracking.delete()
 
         self.stdout.write(self.style.SUCCESS(f"Successfully deleted {count} old tracking records"))
+
+        breadcrumb_cutoff = timezone.now() - timedelta(days=options["breadcrumb_days"])
+        deleted, _ = LocationBreadcrumb.objects.filter(recorded_at__lt=breadcrumb_cutoff).delete()
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully deleted {deleted} old location breadcrumbs"))
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.26 on 2026-10-18 09:30
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transport", "0008_remove_delivery_transport_delivery_source_constraint_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="delivery",
+            name="pickup_point",
+            field=django.contrib.gis.db.models.fields.PointField(
+                blank=True,
+                editable=False,
+                geography=True,
+                help_text="Derived from pickup latitude/longitude for spatial queries",
+                null=True,
+                spatial_index=False,
+                srid=4326,
+            ),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE transport_delivery
+                SET pickup_point = ST_SetSRID(ST_MakePoint(pickup_longitude, pickup_latitude), 4326)::geography
+                WHERE pickup_latitude IS NOT NULL AND pickup_longitude IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="delivery",
+            index=django.contrib.postgres.indexes.GistIndex(
+                condition=models.Q(("status", "available")),
+                fields=["pickup_point"],
+                name="delivery_open_pickup_gist",
+            ),
+        ),
+    ]
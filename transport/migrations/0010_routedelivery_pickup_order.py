@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transport", "0009_delivery_pickup_point"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="routedelivery",
+            name="pickup_order",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Stop position of the pickup; empty when the parcel is already on board",
+                null=True,
+                verbose_name="Pickup Order",
+            ),
+        ),
+    ]
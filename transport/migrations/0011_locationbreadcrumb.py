@@ -0,0 +1,40 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transport", "0010_routedelivery_pickup_order"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LocationBreadcrumb",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("latitude", models.DecimalField(decimal_places=6, max_digits=9)),
+                ("longitude", models.DecimalField(decimal_places=6, max_digits=9)),
+                ("recorded_at", models.DateTimeField()),
+                (
+                    "transporter",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="breadcrumbs",
+                        to="transport.transporter",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Location Breadcrumb",
+                "verbose_name_plural": "Location Breadcrumbs",
+                "ordering": ["-recorded_at"],
+                "indexes": [
+                    models.Index(fields=["transporter", "recorded_at"], name="transport_l_transpo_67a58c_idx"),
+                    models.Index(fields=["recorded_at"], name="transport_l_recorde_03c91d_idx"),
+                ],
+            },
+        ),
+    ]
@@ -2,6 +2,9 @@ import uuid
 from decimal import Decimal
 
 from django.contrib.auth.models import User
+from django.contrib.gis.db import models as gis_models
+from django.contrib.gis.geos import Point
+from django.contrib.postgres.indexes import GistIndex
 from django.core.validators import (
     FileExtensionValidator,
     MaxValueValidator,
@@ -217,6 +220,15 @@ class Delivery(models.Model):
     pickup_address = models.TextField(verbose_name=_("Pickup Address"))
     pickup_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     pickup_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    pickup_point = gis_models.PointField(
+        geography=True,
+        srid=4326,
+        null=True,
+        blank=True,
+        spatial_index=False,
+        editable=False,
+        help_text=_("Derived from pickup latitude/longitude for spatial queries"),
+    )
     pickup_contact_name = models.CharField(max_length=255, verbose_name=_("Pickup Contact Name"))
     pickup_contact_phone = PhoneNumberField(verbose_name=_("Pickup Contact Phone"))
     pickup_instructions = models.TextField(blank=True, verbose_name=_("Pickup Instructions"))
@@ -313,8 +325,17 @@ class Delivery(models.Model):
         self.clean()
         if not self.tracking_number:
             self.tracking_number = self.generate_tracking_number()
+        self.pickup_point = self.build_pickup_point()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"pickup_latitude", "pickup_longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "pickup_point"}
         super().save(*args, **kwargs)
 
+    def build_pickup_point(self):
+        if self.pickup_latitude is None or self.pickup_longitude is None:
+            return None
+        return Point(float(self.pickup_longitude), float(self.pickup_latitude), srid=4326)
+
     class Meta:
         verbose_name = _("Delivery")
         verbose_name_plural = _("Deliveries")
@@ -328,6 +349,12 @@ class Delivery(models.Model):
             models.Index(fields=["delivery_latitude", "delivery_longitude"]),
             models.Index(fields=["tracking_number"]),
             models.Index(fields=["created_at"]),
+            # Spatial index over open deliveries only; drivers search among available ones
+            GistIndex(
+                fields=["pickup_point"],
+                name="delivery_open_pickup_gist",
+                condition=models.Q(status="available"),
+            ),
         ]
         constraints = [
             models.CheckConstraint(
@@ -476,6 +503,29 @@ class DeliveryTracking(models.Model):
         return f"{self.delivery.tracking_number} - {self.get_status_display()} at {self.timestamp}"
 
 
+class LocationBreadcrumb(models.Model):
+    """
+    Sampled GPS trail of a transporter, written in batches by the location tracker
+    """
+
+    transporter = models.ForeignKey(Transporter, on_delete=models.CASCADE, related_name="breadcrumbs")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = _("Location Breadcrumb")
+        verbose_name_plural = _("Location Breadcrumbs")
+        ordering = ["-recorded_at"]
+        indexes = [
+            models.Index(fields=["transporter", "recorded_at"]),
+            models.Index(fields=["recorded_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.transporter_id} at {self.recorded_at}"
+
+
 class DeliveryRating(models.Model):
     """
     Rating system for deliveries
@@ -565,6 +615,12 @@ class RouteDelivery(models.Model):
     route = models.ForeignKey(DeliveryRoute, on_delete=models.CASCADE)
     delivery = models.ForeignKey(Delivery, on_delete=models.CASCADE)
     order = models.PositiveIntegerField(verbose_name=_("Delivery Order"))
+    pickup_order = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("Pickup Order"),
+        help_text=_("Stop position of the pickup; empty when the parcel is already on board"),
+    )
 
     class Meta:
         unique_together = ["route", "delivery"]
@@ -493,7 +493,7 @@ class RouteDeliverySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = RouteDelivery
-        fields = ["id", "delivery", "order"]
+        fields = ["id", "delivery", "pickup_order", "order"]
 
 
 class DeliveryRouteSerializer(serializers.ModelSerializer):
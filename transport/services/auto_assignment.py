@@ -13,6 +13,7 @@ from transport.models import (
     TransportStatus,
     VehicleType,
 )
+from transport.services.location_tracking import location_tracker
 from transport.utils import calculate_delivery_distance, calculate_distance
 
 
@@ -70,6 +71,8 @@ class DeliveryAutoAssignmentService:
 
         current_date = timezone.now().date()
         transporters = transporters.exclude(Q(insurance_expiry__lte=current_date) | Q(license_expiry__lte=current_date))
+        # Score against live positions rather than the periodically flushed columns
+        transporters = location_tracker.apply_live_positions(transporters)
 
         if delivery.pickup_latitude and delivery.pickup_longitude:
             eligible_transporters = []
@@ -1,9 +1,6 @@
 from math import atan2, cos, radians, sin, sqrt
 
-from django.db.models import Case, F, FloatField, Q, Value, When
-from django.db.models.functions import ATan2, Cos, Power, Radians, Sin, Sqrt
-
-from transport.models import Delivery, TransportStatus
+from transport.services.nearby_deliveries import NearbyDeliveryService
 
 
 class DeliverySuggestionService:
@@ -24,40 +21,21 @@ class DeliverySuggestionService:
         r = 6371  # Radius of Earth in kilometers
         return r * c
 
-    def get_suggested_deliveries(self, latitude, longitude, max_distance_km=20, vehicle_type=None, limit=10):
+    def get_suggested_deliveries(self, latitude, longitude, max_distance_km=20, vehicle_type=None, limit=10, max_weight=None):
         """
-        Get suggested deliveries for a transporter based on their location
+        Get suggested deliveries for a transporter based on their location.
+
+        Deliveries carry no vehicle requirement, so ``vehicle_type`` does not
+        narrow the results; pass ``max_weight`` to respect vehicle capacity.
         """
-        # First filter by status and other basic criteria
         queryset = (
-            Delivery.objects.filter(status=TransportStatus.AVAILABLE)
+            NearbyDeliveryService()
+            .get_nearby_deliveries(latitude, longitude, radius_km=max_distance_km, max_weight=max_weight)
             .select_related("marketplace_sale", "marketplace_sale__seller")
             .prefetch_related("items")
         )
 
-        # If vehicle type is specified, filter by compatible vehicle types
-        if vehicle_type:
-            queryset = queryset.filter(Q(required_vehicle_type=vehicle_type) | Q(required_vehicle_type__isnull=True))
-
-        # Annotate with distance calculation
-        queryset = queryset.annotate(
-            distance_km=Case(
-                When(
-                    pickup_latitude__isnull=False,
-                    pickup_longitude__isnull=False,
-                    then=Sqrt(
-                        Power(Radians(F("pickup_latitude") - latitude) * 111.32, 2)
-                        + Power(
-                            (Radians(F("pickup_longitude") - longitude) * 111.32 * Cos(Radians(F("pickup_latitude")))), 2
-                        )
-                    ),
-                ),
-                default=Value(float("inf")),
-                output_field=FloatField(),
-            )
-        )
-
-        # Filter by max distance and order by distance and priority
-        queryset = queryset.filter(distance_km__lte=max_distance_km).order_by("distance_km", "-priority")
+        # Closest first, then priority
+        queryset = queryset.order_by("distance", "-priority", "id")
 
         return queryset[:limit]
@@ -0,0 +1,431 @@
+"""
+Live location ingestion for transporters.
+
+Location pings never touch Postgres directly. The latest position of every
+transporter is kept in a geo set (``GEOADD``) together with its timestamp,
+and the transporter is marked dirty; a periodic flush writes the dirty
+positions back to ``Transporter.current_latitude/longitude`` with one
+``bulk_update``.
+
+Breadcrumb trails are sampled at ingest with a dead band: a ping is kept only
+when the transporter moved at least ``min_distance_m`` from the last kept
+point or ``max_interval`` seconds have passed. Kept points are queued and
+persisted as ``LocationBreadcrumb`` rows in batches.
+
+With Redis the whole ingest step is one Lua call. Without Redis (local
+development, tests) an in-process store with the same semantics is used and
+flushed from the request path once ``flush_interval`` has elapsed.
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from transport.models import LocationBreadcrumb, Transporter
+from transport.utils import calculate_distances
+
+logger = logging.getLogger(__name__)
+
+# The hash tag keeps every key on the same cluster slot for the Lua script.
+KEY_PREFIX = "transport:{loc}"
+POSITIONS_KEY = f"{KEY_PREFIX}:positions"
+SEEN_KEY = f"{KEY_PREFIX}:seen"
+DIRTY_KEY = f"{KEY_PREFIX}:dirty"
+ANCHORS_KEY = f"{KEY_PREFIX}:anchors"
+BREADCRUMBS_KEY = f"{KEY_PREFIX}:breadcrumbs"
+
+EARTH_RADIUS_M = 6371000
+
+INGEST_SCRIPT = """
+-- KEYS: positions (geo), seen (hash), dirty (set), anchors (hash), breadcrumbs (list)
+-- ARGV: id, longitude, latitude, timestamp, min_distance_m, max_interval_s
+local id = ARGV[1]
+local lng, lat, ts = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+redis.call('GEOADD', KEYS[1], lng, lat, id)
+redis.call('HSET', KEYS[2], id, ARGV[4])
+redis.call('SADD', KEYS[3], id)
+
+local anchor = redis.call('HGET', KEYS[4], id)
+if anchor then
+    local alat, alng, ats = string.match(anchor, '([^,]+),([^,]+),([^,]+)')
+    alat, alng, ats = tonumber(alat), tonumber(alng), tonumber(ats)
+    local rlat1, rlat2 = math.rad(alat), math.rad(lat)
+    local a = math.sin((rlat2 - rlat1) / 2) ^ 2
+        + math.cos(rlat1) * math.cos(rlat2) * math.sin(math.rad(lng - alng) / 2) ^ 2
+    local moved = 2 * 6371000 * math.asin(math.sqrt(a))
+    if moved < tonumber(ARGV[5]) and ts - ats < tonumber(ARGV[6]) then
+        return 0
+    end
+end
+local point = ARGV[3] .. ',' .. ARGV[2] .. ',' .. ARGV[4]
+redis.call('HSET', KEYS[4], id, point)
+redis.call('RPUSH', KEYS[5], id .. ',' .. point)
+return 1
+"""
+
+
+def _moved_m(lat1, lng1, lat2, lng2):
+    rlat1, rlat2 = math.radians(lat1), math.radians(lat2)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin((rlat2 - rlat1) / 2) ** 2 + math.cos(rlat1) * math.cos(rlat2) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _parse_breadcrumb(entry):
+    if isinstance(entry, bytes):
+        entry = entry.decode()
+    transporter_id, latitude, longitude, timestamp = entry.split(",")
+    return int(transporter_id), float(latitude), float(longitude), float(timestamp)
+
+
+class LocalLocationStore:
+    """In-process store with the same semantics as the Redis backend."""
+
+    is_local = True
+
+    def __init__(self):
+        self._positions = {}
+        self._dirty = set()
+        self._anchors = {}
+        self._breadcrumbs = []
+        self._lock = threading.Lock()
+
+    def record(self, transporter_id, latitude, longitude, timestamp, min_distance_m, max_interval):
+        with self._lock:
+            self._positions[transporter_id] = (latitude, longitude, timestamp)
+            self._dirty.add(transporter_id)
+            anchor = self._anchors.get(transporter_id)
+            if anchor is not None:
+                alat, alng, ats = anchor
+                if _moved_m(alat, alng, latitude, longitude) < min_distance_m and timestamp - ats < max_interval:
+                    return False
+            self._anchors[transporter_id] = (latitude, longitude, timestamp)
+            self._breadcrumbs.append((transporter_id, latitude, longitude, timestamp))
+            return True
+
+    def pop_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return {
+                transporter_id: self._positions[transporter_id]
+                for transporter_id in dirty
+                if transporter_id in self._positions
+            }
+
+    def pop_breadcrumbs(self, limit):
+        with self._lock:
+            batch, self._breadcrumbs = self._breadcrumbs[:limit], self._breadcrumbs[limit:]
+            return batch
+
+    def requeue_dirty(self, transporter_ids):
+        with self._lock:
+            self._dirty.update(transporter_ids)
+
+    def requeue_breadcrumbs(self, batch):
+        with self._lock:
+            self._breadcrumbs[:0] = batch
+
+    def positions(self, transporter_ids):
+        with self._lock:
+            return {
+                transporter_id: self._positions[transporter_id]
+                for transporter_id in transporter_ids
+                if transporter_id in self._positions
+            }
+
+    def nearby(self, latitude, longitude, radius_km, count=None):
+        with self._lock:
+            items = list(self._positions.items())
+        if not items:
+            return []
+        ids = [transporter_id for transporter_id, _ in items]
+        lats, lngs, _ = zip(*(position for _, position in items))
+        distances = calculate_distances(latitude, longitude, lats, lngs)
+        found = sorted(
+            (float(distance), transporter_id) for transporter_id, distance in zip(ids, distances) if distance <= radius_km
+        )
+        return [(transporter_id, distance) for distance, transporter_id in found[:count]]
+
+    def size(self):
+        return len(self._positions)
+
+    def seen_at(self, transporter_ids):
+        return {transporter_id: position[2] for transporter_id, position in self.positions(transporter_ids).items()}
+
+    def prune(self, cutoff):
+        with self._lock:
+            stale = [transporter_id for transporter_id, (_, _, ts) in self._positions.items() if ts < cutoff]
+            for transporter_id in stale:
+                self._positions.pop(transporter_id, None)
+                self._anchors.pop(transporter_id, None)
+            return len(stale)
+
+
+class RedisLocationStore:
+    is_local = False
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._script = connection.register_script(INGEST_SCRIPT)
+
+    def record(self, transporter_id, latitude, longitude, timestamp, min_distance_m, max_interval):
+        keys = [POSITIONS_KEY, SEEN_KEY, DIRTY_KEY, ANCHORS_KEY, BREADCRUMBS_KEY]
+        args = [transporter_id, longitude, latitude, timestamp, min_distance_m, max_interval]
+        return bool(self._script(keys=keys, args=args))
+
+    def pop_dirty(self):
+        pipe = self._connection.pipeline(transaction=True)
+        pipe.smembers(DIRTY_KEY)
+        pipe.delete(DIRTY_KEY)
+        members, _ = pipe.execute()
+        return self.positions([int(member) for member in members])
+
+    def pop_breadcrumbs(self, limit):
+        pipe = self._connection.pipeline(transaction=True)
+        pipe.lrange(BREADCRUMBS_KEY, 0, limit - 1)
+        pipe.ltrim(BREADCRUMBS_KEY, limit, -1)
+        entries, _ = pipe.execute()
+        return [_parse_breadcrumb(entry) for entry in entries]
+
+    def requeue_dirty(self, transporter_ids):
+        transporter_ids = list(transporter_ids)
+        if transporter_ids:
+            self._connection.sadd(DIRTY_KEY, *transporter_ids)
+
+    def requeue_breadcrumbs(self, batch):
+        # LPUSH prepends one at a time, so push in reverse to restore the original order at the head
+        entries = [
+            f"{transporter_id},{latitude!r},{longitude!r},{timestamp!r}"
+            for transporter_id, latitude, longitude, timestamp in batch
+        ]
+        if entries:
+            self._connection.lpush(BREADCRUMBS_KEY, *reversed(entries))
+
+    def positions(self, transporter_ids):
+        transporter_ids = list(transporter_ids)
+        if not transporter_ids:
+            return {}
+        pipe = self._connection.pipeline(transaction=False)
+        pipe.geopos(POSITIONS_KEY, *transporter_ids)
+        pipe.hmget(SEEN_KEY, transporter_ids)
+        coordinates, seen = pipe.execute()
+        return {
+            transporter_id: (float(point[1]), float(point[0]), float(timestamp))
+            for transporter_id, point, timestamp in zip(transporter_ids, coordinates, seen)
+            if point is not None and timestamp is not None
+        }
+
+    def nearby(self, latitude, longitude, radius_km, count=None):
+        results = self._connection.geosearch(
+            POSITIONS_KEY,
+            longitude=longitude,
+            latitude=latitude,
+            radius=radius_km,
+            unit="km",
+            withdist=True,
+            sort="ASC",
+            count=count,
+        )
+        return [(int(member), float(distance)) for member, distance in results]
+
+    def size(self):
+        return self._connection.zcard(POSITIONS_KEY)
+
+    def seen_at(self, transporter_ids):
+        transporter_ids = list(transporter_ids)
+        if not transporter_ids:
+            return {}
+        seen = self._connection.hmget(SEEN_KEY, transporter_ids)
+        return {
+            transporter_id: float(timestamp)
+            for transporter_id, timestamp in zip(transporter_ids, seen)
+            if timestamp is not None
+        }
+
+    def prune(self, cutoff):
+        stale = [member for member, timestamp in self._connection.hscan_iter(SEEN_KEY) if float(timestamp) < cutoff]
+        if stale:
+            pipe = self._connection.pipeline(transaction=True)
+            pipe.zrem(POSITIONS_KEY, *stale)
+            pipe.hdel(SEEN_KEY, *stale)
+            pipe.hdel(ANCHORS_KEY, *stale)
+            pipe.execute()
+        return len(stale)
+
+
+class LocationTracker:
+    """
+    Entry point for location pings and live position reads.
+
+    ``record`` ingests a ping, ``flush`` persists dirty positions and queued
+    breadcrumbs, and ``nearby`` / ``get_positions`` / ``apply_live_positions``
+    serve readers from the live geo set.
+    """
+
+    def __init__(self, store=None):
+        self._store = store
+        self.min_distance_m = getattr(settings, "TRANSPORT_BREADCRUMB_MIN_DISTANCE_M", 50)
+        self.max_interval = getattr(settings, "TRANSPORT_BREADCRUMB_MAX_INTERVAL", 60)
+        self.stale_after = getattr(settings, "TRANSPORT_LOCATION_STALE_AFTER", 1800)
+        self.flush_interval = getattr(settings, "TRANSPORT_LOCATION_FLUSH_INTERVAL", 60)
+        self.batch_size = getattr(settings, "TRANSPORT_LOCATION_FLUSH_BATCH_SIZE", 5000)
+        self._last_flush = time.monotonic()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = self._default_store()
+        return self._store
+
+    def _default_store(self):
+        try:
+            from django_redis import get_redis_connection
+
+            return RedisLocationStore(get_redis_connection("location_cache"))
+        except Exception:
+            # Non-Redis cache backend (e.g. LocMemCache) or django_redis missing
+            return LocalLocationStore()
+
+    def record(self, transporter, latitude, longitude, now=None):
+        """
+        Ingest one ping and reflect it on ``transporter`` in memory (not saved).
+        Falls back to a direct database write if the store is unavailable.
+        """
+        timestamp = now if now is not None else time.time()
+        try:
+            self.store.record(
+                transporter.pk, float(latitude), float(longitude), timestamp, self.min_distance_m, self.max_interval
+            )
+        except Exception as e:
+            logger.warning(f"Location store unavailable, writing location directly: {e}")
+            transporter.update_location(latitude, longitude)
+            return transporter.last_location_update
+
+        transporter.current_latitude = latitude
+        transporter.current_longitude = longitude
+        transporter.last_location_update = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+        if self.store.is_local and time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                self.flush()
+            except Exception as e:
+                # Nothing is lost: the flush puts back what it could not write
+                logger.warning(f"Location flush failed, retrying on the next flush: {e}")
+        return transporter.last_location_update
+
+    def flush(self):
+        """
+        Persist dirty positions with ``bulk_update`` and queued breadcrumbs with
+        ``bulk_create``. Whatever a failed write popped from the store is put
+        back before the error propagates, so the next flush retries it.
+        """
+        self._last_flush = time.monotonic()
+        counts = {"positions": 0, "breadcrumbs": 0, "pruned": 0}
+
+        positions = self.store.pop_dirty()
+        if positions:
+            try:
+                self._write_positions(positions)
+            except Exception:
+                # The positions themselves stay in the live store; marking them dirty again is enough
+                self.store.requeue_dirty(positions)
+                raise
+            counts["positions"] = len(positions)
+
+        while True:
+            batch = self.store.pop_breadcrumbs(self.batch_size)
+            if not batch:
+                break
+            try:
+                self._write_breadcrumbs(batch)
+            except Exception:
+                self.store.requeue_breadcrumbs(batch)
+                raise
+            counts["breadcrumbs"] += len(batch)
+            if len(batch) < self.batch_size:
+                break
+
+        counts["pruned"] = self.store.prune(time.time() - self.stale_after)
+        return counts
+
+    def _write_positions(self, positions):
+        Transporter.objects.bulk_update(
+            [
+                Transporter(
+                    id=transporter_id,
+                    current_latitude=Decimal(f"{latitude:.6f}"),
+                    current_longitude=Decimal(f"{longitude:.6f}"),
+                    last_location_update=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+                )
+                for transporter_id, (latitude, longitude, timestamp) in positions.items()
+            ],
+            ["current_latitude", "current_longitude", "last_location_update"],
+            batch_size=1000,
+        )
+
+    def _write_breadcrumbs(self, batch):
+        with transaction.atomic():
+            LocationBreadcrumb.objects.bulk_create(
+                [
+                    LocationBreadcrumb(
+                        transporter_id=transporter_id,
+                        latitude=Decimal(f"{latitude:.6f}"),
+                        longitude=Decimal(f"{longitude:.6f}"),
+                        recorded_at=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+                    )
+                    for transporter_id, latitude, longitude, timestamp in batch
+                ],
+                batch_size=1000,
+            )
+
+    def nearby(self, latitude, longitude, radius_km, count=None):
+        """
+        ``[(transporter_id, distance_km), ...]`` ordered by distance, only
+        transporters seen within ``stale_after`` seconds. Returns None when the
+        live store is empty (cold start) or cannot be queried, so callers can
+        fall back to the database.
+        """
+        try:
+            results = self.store.nearby(float(latitude), float(longitude), float(radius_km), count)
+            if not results and not self.store.size():
+                return None
+            seen = self.store.seen_at([transporter_id for transporter_id, _ in results])
+        except Exception as e:
+            logger.warning(f"Live location search failed: {e}")
+            return None
+        cutoff = time.time() - self.stale_after
+        return [
+            (transporter_id, distance) for transporter_id, distance in results if seen.get(transporter_id, 0) >= cutoff
+        ]
+
+    def get_positions(self, transporter_ids):
+        """``{transporter_id: (latitude, longitude, timestamp)}`` for fresh live positions."""
+        try:
+            positions = self.store.positions(transporter_ids)
+        except Exception as e:
+            logger.warning(f"Live location lookup failed: {e}")
+            return {}
+        cutoff = time.time() - self.stale_after
+        return {transporter_id: position for transporter_id, position in positions.items() if position[2] >= cutoff}
+
+    def apply_live_positions(self, transporters):
+        """Overwrite the (possibly lagging) database coordinates with live ones, in memory."""
+        transporters = list(transporters)
+        positions = self.get_positions([transporter.pk for transporter in transporters])
+        for transporter in transporters:
+            position = positions.get(transporter.pk)
+            if position is not None:
+                latitude, longitude, timestamp = position
+                transporter.current_latitude = Decimal(f"{latitude:.6f}")
+                transporter.current_longitude = Decimal(f"{longitude:.6f}")
+                transporter.last_location_update = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+        return transporters
+
+
+location_tracker = LocationTracker()
@@ -0,0 +1,38 @@
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.db.models import ExpressionWrapper, FloatField, Value
+from django.db.models.functions import Cast
+
+from transport.models import Delivery, TransportStatus
+
+
+class NearbyDeliveryService:
+    """
+    Spatial search for open deliveries around a location.
+
+    Uses ``ST_DWithin`` on the geography ``pickup_point`` column, served by the
+    partial GiST index over available deliveries, and annotates the exact
+    great-circle ``distance`` (km) in SQL so results can be ordered and
+    paginated in the database.
+    """
+
+    MAX_RADIUS_KM = 100
+
+    def get_nearby_deliveries(self, latitude, longitude, radius_km=10, max_weight=None):
+        radius_km = min(max(float(radius_km), 0), self.MAX_RADIUS_KM)
+        origin = Point(float(longitude), float(latitude), srid=4326)
+
+        queryset = Delivery.objects.filter(
+            status=TransportStatus.AVAILABLE,
+            pickup_point__dwithin=(origin, D(km=radius_km)),
+        )
+
+        if max_weight is not None:
+            queryset = queryset.filter(package_weight__lte=max_weight)
+
+        return queryset.annotate(
+            distance=ExpressionWrapper(
+                Cast(Distance("pickup_point", origin), FloatField()) / Value(1000.0), output_field=FloatField()
+            )
+        ).order_by("distance", "id")
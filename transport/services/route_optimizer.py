@@ -0,0 +1,237 @@
+"""
+Multi-stop route optimization for transporters.
+
+Each transporter's open deliveries become a pickup-and-delivery problem: every
+delivery still to be collected contributes a pickup stop and a drop stop (the
+pickup must come first), deliveries already on board contribute only a drop.
+A haversine distance matrix is built with NumPy, an initial sequence is
+constructed greedily (nearest feasible stop) and then improved with 2-opt
+segment reversals and Or-opt segment moves that keep every pickup ahead of its
+drop. Routes are open paths starting at the transporter's position.
+
+Transporters are independent, so ``solve_routes`` spreads them over a process
+pool once there are enough of them to amortize the worker start-up.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Optional
+
+import numpy as np
+
+from main.processes import POOL_UNAVAILABLE_ERRORS, pool_workers
+from transport.utils import calculate_distances
+
+logger = logging.getLogger(__name__)
+
+PICKUP = "pickup"
+DROP = "drop"
+
+PARALLEL_MIN_PROBLEMS = 8
+MAX_IMPROVEMENT_PASSES = 50
+OR_OPT_SEGMENT_LENGTHS = (1, 2, 3)
+EPSILON = 1e-9
+
+
+@dataclass(frozen=True)
+class RouteJob:
+    """One delivery to sequence; ``pickup`` is None when the parcel is already on board."""
+
+    delivery_id: int
+    drop: tuple
+    pickup: Optional[tuple] = None
+
+
+@dataclass
+class RouteProblem:
+    key: int
+    jobs: list
+    start: Optional[tuple] = None
+
+
+@dataclass
+class RouteSolution:
+    key: int
+    stops: list = field(default_factory=list)  # [(delivery_id, PICKUP | DROP), ...]
+    distance_km: float = 0.0
+    initial_distance_km: float = 0.0
+
+    @property
+    def orders(self):
+        """``{delivery_id: (pickup position or None, drop position)}`` with 1-based positions."""
+        positions = {}
+        for position, (delivery_id, kind) in enumerate(self.stops, 1):
+            positions.setdefault(delivery_id, {})[kind] = position
+        return {delivery_id: (stop.get(PICKUP), stop[DROP]) for delivery_id, stop in positions.items()}
+
+
+class _StopGraph:
+    """
+    Stops of one problem. Node 0 is the start; nodes 1..n are stops. Without a
+    start position node 0 is a virtual depot at zero distance from every stop.
+    """
+
+    def __init__(self, problem):
+        self.stops = []
+        self.pickup_of = [-1]  # drop node -> its pickup node
+        points = [problem.start or (0.0, 0.0)]
+
+        for job in problem.jobs:
+            pickup_node = -1
+            if job.pickup is not None:
+                self.stops.append((job.delivery_id, PICKUP))
+                self.pickup_of.append(-1)
+                points.append(job.pickup)
+                pickup_node = len(self.stops)
+            self.stops.append((job.delivery_id, DROP))
+            self.pickup_of.append(pickup_node)
+            points.append(job.drop)
+
+        lats, lngs = np.array(points, dtype=np.float64).T
+        self.matrix = calculate_distances(lats[:, None], lngs[:, None], lats[None, :], lngs[None, :])
+        if problem.start is None:
+            self.matrix[0, :] = 0.0
+            self.matrix[:, 0] = 0.0
+        self.dist = self.matrix.tolist()
+        self.size = len(self.stops)
+
+    def cost(self, sequence):
+        dist = self.dist
+        total, previous = 0.0, 0
+        for node in sequence:
+            total += dist[previous][node]
+            previous = node
+        return total
+
+    def is_feasible(self, sequence):
+        position = [0] * (self.size + 1)
+        for index, node in enumerate(sequence):
+            position[node] = index
+        return all(position[pickup] < position[node] for node in sequence if (pickup := self.pickup_of[node]) > 0)
+
+    def in_order(self):
+        return list(range(1, self.size + 1))
+
+    def nearest_neighbour(self):
+        dist = self.dist
+        dropped_after = {pickup: node for node, pickup in enumerate(self.pickup_of) if pickup > 0}
+        available = {node for node in range(1, self.size + 1) if self.pickup_of[node] <= 0}
+        sequence, current = [], 0
+        while available:
+            current = min(available, key=lambda node: (dist[current][node], node))
+            available.remove(current)
+            sequence.append(current)
+            if current in dropped_after:
+                available.add(dropped_after[current])
+        return sequence
+
+
+def _prev_cost(dist, sequence, index, node):
+    return dist[sequence[index - 1] if index else 0][node]
+
+
+def _next_cost(dist, sequence, index, node):
+    return dist[node][sequence[index + 1]] if index + 1 < len(sequence) else 0.0
+
+
+def _two_opt(graph, sequence):
+    """Apply the first improving feasible segment reversal; return True if one was found."""
+    dist = graph.dist
+    n = len(sequence)
+    for i in range(n - 1):
+        for j in range(i + 1, n):
+            delta = (
+                _prev_cost(dist, sequence, i, sequence[j])
+                + _next_cost(dist, sequence, j, sequence[i])
+                - _prev_cost(dist, sequence, i, sequence[i])
+                - _next_cost(dist, sequence, j, sequence[j])
+            )
+            if delta < -EPSILON:
+                # Reversing puts a drop ahead of its pickup when both lie in the segment
+                segment = set(sequence[i : j + 1])
+                if any(graph.pickup_of[node] in segment for node in segment):
+                    continue
+                sequence[i : j + 1] = sequence[i : j + 1][::-1]
+                return True
+    return False
+
+
+def _or_opt(graph, sequence):
+    """Apply the first improving feasible segment relocation; return True if one was found."""
+    dist = graph.dist
+    n = len(sequence)
+    for length in OR_OPT_SEGMENT_LENGTHS:
+        for i in range(n - length + 1):
+            j = i + length - 1
+            first, last = sequence[i], sequence[j]
+            before = sequence[i - 1] if i else 0
+            after = sequence[j + 1] if j + 1 < n else None
+            removal_gain = dist[before][first] + (dist[last][after] - dist[before][after] if after is not None else 0.0)
+
+            rest = sequence[:i] + sequence[j + 1 :]
+            segment = sequence[i : j + 1]
+            for k in range(len(rest) + 1):
+                if k == i:
+                    continue
+                left = rest[k - 1] if k else 0
+                right = rest[k] if k < len(rest) else None
+                insertion_cost = dist[left][first] + (dist[last][right] - dist[left][right] if right is not None else 0.0)
+                if insertion_cost - removal_gain < -EPSILON:
+                    candidate = rest[:k] + segment + rest[k:]
+                    if graph.is_feasible(candidate):
+                        sequence[:] = candidate
+                        return True
+    return False
+
+
+def improve(graph, sequence, max_passes=MAX_IMPROVEMENT_PASSES):
+    """Run 2-opt and Or-opt moves until neither improves the route (or ``max_passes`` is hit)."""
+    for _ in range(max_passes):
+        if not (_two_opt(graph, sequence) or _or_opt(graph, sequence)):
+            break
+    return sequence
+
+
+def solve_route(problem, local_search=True):
+    """Sequence the stops of one ``RouteProblem``."""
+    graph = _StopGraph(problem)
+    sequence = graph.nearest_neighbour()
+    initial_distance = graph.cost(sequence)
+    if local_search and len(sequence) > 2:
+        improve(graph, sequence)
+
+    return RouteSolution(
+        key=problem.key,
+        stops=[graph.stops[node - 1] for node in sequence],
+        distance_km=graph.cost(sequence),
+        initial_distance_km=initial_distance,
+    )
+
+
+def naive_route_distance(problem):
+    """Distance of visiting the jobs in the given order (pickup then drop), for comparisons."""
+    graph = _StopGraph(problem)
+    return graph.cost(graph.in_order())
+
+
+def solve_routes(problems, max_workers=None, local_search=True):
+    """
+    Solve independent problems, in a process pool of ``max_workers`` (one per
+    CPU by default) when there are at least ``PARALLEL_MIN_PROBLEMS`` of them
+    and this process may fork. Results are returned in input order.
+    """
+    problems = list(problems)
+    solve = partial(solve_route, local_search=local_search)
+    max_workers = pool_workers(max_workers)
+
+    if max_workers > 1 and len(problems) >= PARALLEL_MIN_PROBLEMS:
+        chunksize = max(1, len(problems) // (max_workers * 4))
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(solve, problems, chunksize=chunksize))
+        except POOL_UNAVAILABLE_ERRORS as e:
+            logger.warning(f"Route optimizer process pool unavailable, solving serially: {e}")
+
+    return [solve(problem) for problem in problems]
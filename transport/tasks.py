@@ -2,20 +2,25 @@ import logging
 from datetime import timedelta
 from decimal import Decimal
 
+import numpy as np
 from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Avg, Count, F, Q
+from django.db.models import Avg, F, Q
 from django.utils import timezone
 
 from .models import (
     Delivery,
     DeliveryPriority,
+    DeliveryRoute,
     DeliveryTracking,
+    RouteDelivery,
     Transporter,
     TransporterStatus,
     TransportStatus,
 )
-from .utils import calculate_distance, send_delivery_notification
+from .services.location_tracking import location_tracker
+from .services.route_optimizer import RouteJob, RouteProblem, solve_routes
+from .utils import calculate_distances, send_delivery_notification
 
 logger = logging.getLogger(__name__)
 
@@ -178,75 +183,96 @@ def cleanup_expired_deliveries():
         return cleanup_counts
 
 
+ETA_REFRESH_CHUNK_SIZE = 5000
+ETA_SHIFT_THRESHOLD = timedelta(minutes=5)  # smaller ETA changes are not written back
+DELAY_EVENT_SHIFT_THRESHOLD = timedelta(minutes=15)  # ETA shift that warrants a delay tracking event
+
+BASE_SPEEDS = {
+    "bike": 35,
+    "bicycle": 15,
+    "car": 40,
+    "van": 35,
+    "truck": 30,
+    "other": 30,
+}
+
+PRIORITY_BUFFERS = {
+    DeliveryPriority.URGENT: 1.1,
+    DeliveryPriority.SAME_DAY: 1.2,
+}
+
+
+def compute_eta_hours(distances, vehicle_types, priorities, current_time):
+    """
+    Vectorized ETA in hours: distance over the time-of-day adjusted vehicle speed,
+    padded by a priority buffer (plus 0.2 for trips over 50 km).
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    speeds = np.array([BASE_SPEEDS.get(v, 30) for v in vehicle_types], dtype=np.float64)
+    speeds *= speed_multiplier_for(current_time)
+
+    buffers = np.array([PRIORITY_BUFFERS.get(p, 1.3) for p in priorities], dtype=np.float64)
+    buffers += np.where(distances > 50, 0.2, 0.0)
+
+    return distances / speeds * buffers
+
+
 def update_delivery_estimates():
     """
     Update estimated delivery times for in-transit deliveries.
     Enhanced with dynamic speed calculation and route optimization.
+
+    Deliveries are pulled as value rows in chunks and ETAs computed as arrays.
+    Only estimates that moved by at least ``ETA_SHIFT_THRESHOLD`` are written
+    back (``bulk_update``), and delay events are bulk-created only for overdue
+    deliveries whose ETA shifted by ``DELAY_EVENT_SHIFT_THRESHOLD``.
     """
     updated_counts = {"estimates_updated": 0, "routes_optimized": 0, "stale_locations": 0}
 
     try:
+        now = timezone.now()
+        stale_cutoff = now - timedelta(minutes=30)
+
         in_transit_deliveries = Delivery.objects.filter(
             status__in=[TransportStatus.PICKED_UP, TransportStatus.IN_TRANSIT],
             transporter__current_latitude__isnull=False,
             transporter__current_longitude__isnull=False,
             delivery_latitude__isnull=False,
             delivery_longitude__isnull=False,
-        ).select_related("transporter")
-
-        for delivery in in_transit_deliveries:
+        )
+
+        updated_counts["stale_locations"] = in_transit_deliveries.filter(
+            transporter__last_location_update__lt=stale_cutoff
+        ).count()
+
+        rows = (
+            in_transit_deliveries.exclude(transporter__last_location_update__lt=stale_cutoff)
+            .order_by("id")
+            .values_list(
+                "id",
+                "status",
+                "priority",
+                "requested_delivery_date",
+                "estimated_delivery_time",
+                "distance_km",
+                "delivery_latitude",
+                "delivery_longitude",
+                "transporter__current_latitude",
+                "transporter__current_longitude",
+                "transporter__vehicle_type",
+            )
+        )
+
+        last_id = 0
+        while True:
+            chunk = list(rows.filter(id__gt=last_id)[:ETA_REFRESH_CHUNK_SIZE])
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
             try:
-                transporter = delivery.transporter
-
-                if transporter.last_location_update and transporter.last_location_update < timezone.now() - timedelta(
-                    minutes=30
-                ):
-                    updated_counts["stale_locations"] += 1
-                    continue
-
-                distance = calculate_distance(
-                    float(transporter.current_latitude),
-                    float(transporter.current_longitude),
-                    float(delivery.delivery_latitude),
-                    float(delivery.delivery_longitude),
-                )
-
-                speed = calculate_dynamic_speed(transporter.vehicle_type, timezone.now())
-
-                base_time_hours = distance / speed
-
-                if delivery.priority == DeliveryPriority.URGENT:
-                    buffer_multiplier = 1.1
-                elif delivery.priority == DeliveryPriority.SAME_DAY:
-                    buffer_multiplier = 1.2
-                else:
-                    buffer_multiplier = 1.3
-
-                if distance > 50:
-                    buffer_multiplier += 0.2
-
-                estimated_hours = base_time_hours * buffer_multiplier
-                estimated_time = timezone.now() + timedelta(hours=estimated_hours)
-
-                delivery.estimated_delivery_time = estimated_time
-                delivery.distance_km = Decimal(str(round(distance, 2)))
-                delivery.save(update_fields=["estimated_delivery_time", "distance_km"])
-
-                updated_counts["estimates_updated"] += 1
-
-                if delivery.requested_delivery_date < timezone.now():
-                    delay_hours = (timezone.now() - delivery.requested_delivery_date).total_seconds() / 3600
-                    if delay_hours > 2:
-                        DeliveryTracking.objects.create(
-                            delivery=delivery,
-                            status=delivery.status,
-                            latitude=transporter.current_latitude,
-                            longitude=transporter.current_longitude,
-                            notes=f"Delivery delayed by {delay_hours:.1f} hours. New ETA: {estimated_time.strftime('%H:%M')}",
-                        )
-
+                updated_counts["estimates_updated"] += _refresh_eta_chunk(chunk, now)
             except Exception as e:
-                logger.error(f"Failed to update estimate for delivery {delivery.tracking_number}: {e}")
+                logger.error(f"Failed to update estimates for deliveries up to id {last_id}: {e}")
 
         updated_counts["routes_optimized"] = optimize_transporter_routes()
 
@@ -258,62 +284,181 @@ def update_delivery_estimates():
         return updated_counts
 
 
-def calculate_dynamic_speed(vehicle_type: str, current_time) -> float:
-    """Calculate dynamic speed based on vehicle type and time of day."""
-    base_speeds = {
-        "bike": 35,
-        "bicycle": 15,
-        "car": 40,
-        "van": 35,
-        "truck": 30,
-        "other": 30,
-    }
+def _refresh_eta_chunk(chunk, now):
+    columns = list(zip(*chunk))
+    (ids, statuses, priorities, requested, current_eta, current_distance, dlat, dlng, tlat, tlng, vehicles) = columns
+
+    distances = calculate_distances(tlat, tlng, dlat, dlng)
+    eta_seconds = np.rint(compute_eta_hours(distances, vehicles, priorities, now) * 3600)
+
+    to_update = []
+    delay_events = []
+    for i, delivery_id in enumerate(ids):
+        estimated_time = now + timedelta(seconds=float(eta_seconds[i]))
+        distance_km = Decimal(str(round(float(distances[i]), 2)))
+        previous = current_eta[i]
+        shift = abs(estimated_time - previous) if previous else None
+
+        if shift is not None and shift < ETA_SHIFT_THRESHOLD and current_distance[i] == distance_km:
+            continue
+
+        to_update.append(Delivery(id=delivery_id, estimated_delivery_time=estimated_time, distance_km=distance_km))
+
+        if requested[i] < now and (shift is None or shift >= DELAY_EVENT_SHIFT_THRESHOLD):
+            delay_hours = (now - requested[i]).total_seconds() / 3600
+            if delay_hours > 2:
+                delay_events.append(
+                    DeliveryTracking(
+                        delivery_id=delivery_id,
+                        status=statuses[i],
+                        latitude=tlat[i],
+                        longitude=tlng[i],
+                        notes=f"Delivery delayed by {delay_hours:.1f} hours. New ETA: {estimated_time.strftime('%H:%M')}",
+                    )
+                )
+
+    with transaction.atomic():
+        if to_update:
+            Delivery.objects.bulk_update(to_update, ["estimated_delivery_time", "distance_km"], batch_size=1000)
+        if delay_events:
+            DeliveryTracking.objects.bulk_create(delay_events, batch_size=1000)
+
+    return len(to_update)
 
-    base_speed = base_speeds.get(vehicle_type, 30)
 
+def speed_multiplier_for(current_time) -> float:
+    """Traffic multiplier for the time of day."""
     hour = current_time.hour
     if 7 <= hour <= 9 or 17 <= hour <= 19:
-        speed_multiplier = 0.6
+        return 0.6
     elif 22 <= hour or hour <= 6:
-        speed_multiplier = 1.2
-    else:
-        speed_multiplier = 1.0
+        return 1.2
+    return 1.0
+
+
+def calculate_dynamic_speed(vehicle_type: str, current_time) -> float:
+    """Calculate dynamic speed based on vehicle type and time of day."""
+    return BASE_SPEEDS.get(vehicle_type, 30) * speed_multiplier_for(current_time)
+
 
-    return base_speed * speed_multiplier
+ROUTE_STATUSES = [TransportStatus.ASSIGNED, TransportStatus.PICKED_UP, TransportStatus.IN_TRANSIT]
 
 
 def optimize_transporter_routes():
-    """Optimize routes for transporters with multiple assigned deliveries."""
-    optimized_count = 0
+    """
+    Sequence the open deliveries of every transporter with more than one of them.
 
+    Problems are built from value rows, solved in parallel by the route
+    optimizer and stored as each transporter's pending ``DeliveryRoute``
+    (not yet started) with one ``RouteDelivery`` per delivery. Routes whose
+    stop order did not change are left untouched.
+    """
     try:
-        transporters_with_multiple = Transporter.objects.annotate(
-            delivery_count=Count(
-                "assigned_deliveries",
-                filter=Q(assigned_deliveries__status__in=[TransportStatus.ASSIGNED, TransportStatus.PICKED_UP]),
+        now = timezone.now()
+        rows = (
+            Delivery.objects.filter(
+                status__in=ROUTE_STATUSES,
+                transporter__isnull=False,
+                delivery_latitude__isnull=False,
+                delivery_longitude__isnull=False,
             )
-        ).filter(delivery_count__gt=1)
-
-        for transporter in transporters_with_multiple:
-            deliveries = transporter.assigned_deliveries.filter(
-                status__in=[TransportStatus.ASSIGNED, TransportStatus.PICKED_UP]
-            ).order_by("priority", "requested_pickup_date")
-
-            if deliveries.count() > 1:
-                optimized_count += 1
-                DeliveryTracking.objects.create(
-                    delivery=deliveries.first(),
-                    status=deliveries.first().status,
-                    notes=f"Route optimized for {deliveries.count()} deliveries",
+            .order_by("transporter_id", "priority", "requested_pickup_date", "id")
+            .values_list(
+                "id",
+                "transporter_id",
+                "status",
+                "pickup_latitude",
+                "pickup_longitude",
+                "delivery_latitude",
+                "delivery_longitude",
+                "transporter__current_latitude",
+                "transporter__current_longitude",
+                "transporter__vehicle_type",
+            )
+        )
+
+        problems = {}
+        vehicle_types = {}
+        for delivery_id, transporter_id, status, plat, plng, dlat, dlng, tlat, tlng, vehicle_type in rows:
+            on_board = status != TransportStatus.ASSIGNED
+            if not on_board and (plat is None or plng is None):
+                continue
+            if transporter_id not in problems:
+                start = (float(tlat), float(tlng)) if tlat is not None and tlng is not None else None
+                problems[transporter_id] = RouteProblem(key=transporter_id, jobs=[], start=start)
+                vehicle_types[transporter_id] = vehicle_type
+            problems[transporter_id].jobs.append(
+                RouteJob(
+                    delivery_id=delivery_id,
+                    drop=(float(dlat), float(dlng)),
+                    pickup=None if on_board else (float(plat), float(plng)),
                 )
+            )
+
+        solutions = solve_routes(problem for problem in problems.values() if len(problem.jobs) > 1)
+        if not solutions:
+            return 0
 
-        return optimized_count
+        return _save_optimized_routes(solutions, vehicle_types, now)
 
     except Exception as e:
         logger.error(f"Error in optimize_transporter_routes: {e}")
         return 0
 
 
+def _save_optimized_routes(solutions, vehicle_types, now):
+    routes = {}
+    for route in DeliveryRoute.objects.filter(
+        transporter_id__in=[solution.key for solution in solutions], started_at__isnull=True, completed_at__isnull=True
+    ).order_by("created_at"):
+        routes[route.transporter_id] = route  # latest pending route per transporter wins
+
+    stored_orders = {}
+    for route_id, delivery_id, pickup_order, order in RouteDelivery.objects.filter(
+        route__in=routes.values()
+    ).values_list("route_id", "delivery_id", "pickup_order", "order"):
+        stored_orders.setdefault(route_id, {})[delivery_id] = (pickup_order, order)
+
+    new_routes, changed_routes, route_orders = [], [], []
+    for solution in solutions:
+        orders = solution.orders
+        hours = solution.distance_km / calculate_dynamic_speed(vehicle_types[solution.key], now)
+        estimated_distance = Decimal(str(round(solution.distance_km, 2)))
+        estimated_duration = timedelta(seconds=round(hours * 3600))
+
+        route = routes.get(solution.key)
+        if route is None:
+            route = DeliveryRoute(
+                transporter_id=solution.key,
+                name=f"Optimized route {now:%Y-%m-%d %H:%M}",
+                estimated_distance=estimated_distance,
+                estimated_duration=estimated_duration,
+            )
+            new_routes.append(route)
+        elif stored_orders.get(route.id) == orders:
+            continue
+        else:
+            route.estimated_distance = estimated_distance
+            route.estimated_duration = estimated_duration
+            changed_routes.append(route)
+        route_orders.append((route, orders))
+
+    with transaction.atomic():
+        DeliveryRoute.objects.bulk_create(new_routes)
+        DeliveryRoute.objects.bulk_update(changed_routes, ["estimated_distance", "estimated_duration"])
+        RouteDelivery.objects.filter(route__in=changed_routes).delete()
+        RouteDelivery.objects.bulk_create(
+            [
+                RouteDelivery(route=route, delivery_id=delivery_id, pickup_order=pickup_order, order=order)
+                for route, orders in route_orders
+                for delivery_id, (pickup_order, order) in orders.items()
+            ],
+            batch_size=1000,
+        )
+
+    return len(route_orders)
+
+
 def update_transporter_performance_metrics():
     """
     Update performance metrics for all active transporters.
@@ -362,6 +507,19 @@ def update_transporter_performance_metrics():
         return 0
 
 
+def flush_transporter_locations():
+    """
+    Persist live transporter positions and sampled breadcrumbs from the location tracker.
+    """
+    try:
+        counts = location_tracker.flush()
+        logger.info(f"Transporter locations flushed: {counts}")
+        return counts
+    except Exception as e:
+        logger.error(f"Error in flush_transporter_locations: {e}")
+        return {"positions": 0, "breadcrumbs": 0, "pruned": 0}
+
+
 def check_transporter_availability():
     """
     Check and update transporter availability based on location updates and document expiry.
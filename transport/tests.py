@@ -0,0 +1,315 @@
+import random
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from external_delivery.models import ExternalBusiness, ExternalBusinessStatus, ExternalDelivery
+from transport.models import (
+    Delivery,
+    DeliveryPriority,
+    DeliveryTracking,
+    LocationBreadcrumb,
+    Transporter,
+    TransportStatus,
+    VehicleType,
+)
+from transport.services.location_tracking import LocalLocationStore, LocationTracker
+from transport.services.nearby_deliveries import NearbyDeliveryService
+from transport.services.route_optimizer import (
+    DROP,
+    PARALLEL_MIN_PROBLEMS,
+    PICKUP,
+    RouteJob,
+    RouteProblem,
+    naive_route_distance,
+    solve_route,
+    solve_routes,
+)
+from transport.tasks import (
+    DELAY_EVENT_SHIFT_THRESHOLD,
+    _refresh_eta_chunk,
+    calculate_dynamic_speed,
+    compute_eta_hours,
+)
+from transport.utils import calculate_distance
+
+ORIGIN = (27.7172, 85.3240)
+
+
+def build_problems(count, deliveries=6, seed=7):
+    rng = random.Random(seed)
+
+    def point():
+        return (27.7 + rng.uniform(-0.1, 0.1), 85.3 + rng.uniform(-0.1, 0.1))
+
+    return [
+        RouteProblem(
+            key=key,
+            jobs=[
+                RouteJob(delivery_id=key * 100 + index, drop=point(), pickup=None if index % 3 == 0 else point())
+                for index in range(deliveries)
+            ],
+            start=point(),
+        )
+        for key in range(count)
+    ]
+
+
+class RouteOptimizerTest(SimpleTestCase):
+    def test_every_stop_is_visited_once_with_pickups_first(self):
+        problem = build_problems(1)[0]
+        solution = solve_route(problem)
+
+        expected = {(job.delivery_id, DROP) for job in problem.jobs}
+        expected |= {(job.delivery_id, PICKUP) for job in problem.jobs if job.pickup is not None}
+        self.assertEqual(len(solution.stops), len(expected))
+        self.assertEqual(set(solution.stops), expected)
+        for job in problem.jobs:
+            pickup, drop = solution.orders[job.delivery_id]
+            if job.pickup is None:
+                self.assertIsNone(pickup)
+            else:
+                self.assertLess(pickup, drop)
+
+    def test_local_search_never_worsens_the_constructed_route(self):
+        for problem in build_problems(5, deliveries=8):
+            solution = solve_route(problem)
+            self.assertLessEqual(solution.distance_km, solution.initial_distance_km + 1e-9)
+            self.assertLessEqual(solution.distance_km, naive_route_distance(problem) + 1e-9)
+
+    def test_on_board_parcels_are_only_dropped(self):
+        problem = RouteProblem(key=1, jobs=[RouteJob(delivery_id=1, drop=(27.70, 85.30))], start=(27.71, 85.31))
+        self.assertEqual(solve_route(problem).stops, [(1, DROP)])
+
+    def test_results_keep_input_order(self):
+        problems = build_problems(3)
+        self.assertEqual([solution.key for solution in solve_routes(reversed(problems), max_workers=1)], [2, 1, 0])
+
+
+class SolveRoutesFallbackTest(SimpleTestCase):
+    def setUp(self):
+        self.problems = build_problems(PARALLEL_MIN_PROBLEMS)
+        self.serial = solve_routes(self.problems, max_workers=1)
+
+    def assertSameSolutions(self, solutions):
+        self.assertEqual([solution.stops for solution in solutions], [solution.stops for solution in self.serial])
+
+    @patch("transport.services.route_optimizer.ProcessPoolExecutor")
+    def test_daemonic_process_solves_serially_without_starting_a_pool(self, mock_executor):
+        with patch("multiprocessing.current_process") as current_process:
+            current_process.return_value.daemon = True
+            solutions = solve_routes(self.problems, max_workers=4)
+
+        mock_executor.assert_not_called()
+        self.assertSameSolutions(solutions)
+
+    @patch("transport.services.route_optimizer.ProcessPoolExecutor")
+    def test_pool_errors_fall_back_to_serial(self, mock_executor):
+        for error in (AssertionError("daemonic processes are not allowed to have children"), OSError("fork")):
+            mock_executor.side_effect = error
+            with self.assertLogs("transport.services.route_optimizer", "WARNING"):
+                solutions = solve_routes(self.problems, max_workers=4)
+            self.assertSameSolutions(solutions)
+
+    def test_zero_workers_solves_in_process(self):
+        with patch("transport.services.route_optimizer.ProcessPoolExecutor") as mock_executor:
+            solutions = solve_routes(self.problems, max_workers=0)
+
+        mock_executor.assert_not_called()
+        self.assertSameSolutions(solutions)
+
+    def test_process_pool_matches_serial(self):
+        self.assertSameSolutions(solve_routes(self.problems, max_workers=2))
+
+
+class LocationTrackerFlushTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="tracked", password="testpass123")
+        self.transporter = Transporter.objects.create(
+            user=user,
+            license_number="LIC-TRACK-1",
+            vehicle_type=VehicleType.BIKE,
+            vehicle_number="BA 1 PA 1234",
+            vehicle_capacity=Decimal("50.00"),
+        )
+        self.store = LocalLocationStore()
+        self.tracker = LocationTracker(store=self.store)
+        self.tracker.min_distance_m = 0
+        self.tracker.flush_interval = 3600
+        self.now = time.time()
+
+    def ping(self, latitude, longitude, now):
+        self.tracker.record(self.transporter, latitude, longitude, now=now)
+
+    def test_flush_writes_latest_position_and_breadcrumbs(self):
+        self.ping(27.7, 85.3, now=self.now)
+        self.ping(27.71, 85.31, now=self.now + 10)
+
+        self.assertEqual(self.tracker.flush()["breadcrumbs"], 2)
+
+        self.transporter.refresh_from_db()
+        self.assertEqual(self.transporter.current_latitude, Decimal("27.710000"))
+        self.assertEqual(LocationBreadcrumb.objects.filter(transporter=self.transporter).count(), 2)
+        self.assertEqual(self.tracker.flush(), {"positions": 0, "breadcrumbs": 0, "pruned": 0})
+
+    def test_failed_position_write_is_retried_by_the_next_flush(self):
+        self.ping(27.7, 85.3, now=self.now)
+
+        with patch.object(Transporter.objects, "bulk_update", side_effect=DatabaseError("down")):
+            with self.assertRaises(DatabaseError):
+                self.tracker.flush()
+
+        self.assertEqual(self.tracker.flush()["positions"], 1)
+        self.transporter.refresh_from_db()
+        self.assertEqual(self.transporter.current_latitude, Decimal("27.700000"))
+
+    def test_failed_breadcrumb_write_keeps_the_batch_in_order(self):
+        for offset in range(3):
+            self.ping(27.7 + offset / 100, 85.3, now=self.now + offset)
+        self.tracker.batch_size = 2
+
+        with patch.object(LocationBreadcrumb.objects, "bulk_create", side_effect=DatabaseError("down")):
+            with self.assertRaises(DatabaseError):
+                self.tracker.flush()
+
+        queued = [timestamp for _id, _latitude, _longitude, timestamp in self.store.pop_breadcrumbs(10)]
+        self.assertEqual(queued, [self.now, self.now + 1, self.now + 2])
+
+
+class NearbyDeliveryServiceTest(TestCase):
+    def setUp(self):
+        self.business = ExternalBusiness.objects.create(
+            business_name="Nearby Test Business",
+            business_email="nearby@test.com",
+            contact_person="Nearby User",
+            contact_phone="+1234567890",
+            business_address="123 Nearby St",
+            status=ExternalBusinessStatus.APPROVED,
+        )
+        self.service = NearbyDeliveryService()
+
+    def create_delivery(self, reference, latitude, longitude, weight="5.00", status=TransportStatus.AVAILABLE):
+        with patch("external_delivery.tasks.process_external_delivery.delay"):
+            external = ExternalDelivery.objects.create(
+                external_business=self.business,
+                external_delivery_id=reference,
+                pickup_name="Sender",
+                pickup_address="Pickup St",
+                pickup_city="Kathmandu",
+                pickup_phone="+9771234567",
+                delivery_name="Receiver",
+                delivery_address="Drop St",
+                delivery_city="Lalitpur",
+                delivery_phone="+9777654321",
+                package_description="Parcel",
+                package_weight=Decimal(weight),
+                delivery_fee=Decimal("100.00"),
+            )
+        now = timezone.now()
+        return Delivery.objects.create(
+            external_delivery=external,
+            pickup_address="Pickup St",
+            pickup_latitude=Decimal(f"{latitude:.6f}"),
+            pickup_longitude=Decimal(f"{longitude:.6f}"),
+            pickup_contact_name="Sender",
+            pickup_contact_phone="+9779800000000",
+            delivery_address="Drop St",
+            delivery_contact_name="Receiver",
+            delivery_contact_phone="+9779800000001",
+            package_weight=Decimal(weight),
+            requested_pickup_date=now,
+            requested_delivery_date=now + timezone.timedelta(days=1),
+            delivery_fee=Decimal("100.00"),
+            status=status,
+        )
+
+    def test_returns_open_deliveries_within_radius_nearest_first(self):
+        far_in_radius = self.create_delivery("N-2", ORIGIN[0] + 0.05, ORIGIN[1])
+        near = self.create_delivery("N-1", ORIGIN[0] + 0.01, ORIGIN[1])
+        self.create_delivery("N-3", ORIGIN[0] + 0.5, ORIGIN[1])  # ~55 km away
+        self.create_delivery("N-4", ORIGIN[0], ORIGIN[1] + 0.001, status=TransportStatus.ASSIGNED)
+
+        results = list(self.service.get_nearby_deliveries(*ORIGIN, radius_km=10))
+
+        self.assertEqual([delivery.pk for delivery in results], [near.pk, far_in_radius.pk])
+        for delivery in results:
+            expected = calculate_distance(*ORIGIN, float(delivery.pickup_latitude), float(delivery.pickup_longitude))
+            self.assertAlmostEqual(delivery.distance, expected, delta=0.05)
+
+    def test_max_weight_and_moved_pickup(self):
+        light = self.create_delivery("W-1", ORIGIN[0] + 0.01, ORIGIN[1], weight="2.00")
+        self.create_delivery("W-2", ORIGIN[0] + 0.01, ORIGIN[1], weight="50.00")
+
+        results = self.service.get_nearby_deliveries(*ORIGIN, radius_km=5, max_weight=10)
+        self.assertEqual([delivery.pk for delivery in results], [light.pk])
+
+        # pickup_point follows the coordinates even on a partial save
+        light.pickup_latitude = Decimal(f"{ORIGIN[0] + 0.3:.6f}")
+        light.save(update_fields=["pickup_latitude"])
+        self.assertFalse(self.service.get_nearby_deliveries(*ORIGIN, radius_km=5, max_weight=10).exists())
+
+
+class EtaRefreshTest(TestCase):
+    def test_vectorized_eta_matches_the_per_delivery_formula(self):
+        now = timezone.now().replace(hour=8)  # rush hour multiplier
+        cases = [
+            ((27.70, 85.30, 27.75, 85.35), "bike", DeliveryPriority.URGENT),
+            ((27.70, 85.30, 28.20, 85.90), "truck", DeliveryPriority.SAME_DAY),
+            ((27.70, 85.30, 27.71, 85.31), "unknown", DeliveryPriority.NORMAL),
+        ]
+        distances = [calculate_distance(*points) for points, _vehicle, _priority in cases]
+
+        hours = compute_eta_hours(
+            distances, [vehicle for _points, vehicle, _priority in cases], [priority for *_rest, priority in cases], now
+        )
+
+        for (_points, vehicle, priority), distance, eta in zip(cases, distances, hours):
+            buffer = {DeliveryPriority.URGENT: 1.1, DeliveryPriority.SAME_DAY: 1.2}.get(priority, 1.3)
+            buffer += 0.2 if distance > 50 else 0.0
+            self.assertAlmostEqual(eta, distance / calculate_dynamic_speed(vehicle, now) * buffer, places=6)
+
+    def row(self, delivery_id, current_eta, current_distance, requested, now):
+        # (id, status, priority, requested, eta, distance_km, dlat, dlng, tlat, tlng, vehicle)
+        return (
+            delivery_id,
+            TransportStatus.IN_TRANSIT,
+            DeliveryPriority.NORMAL,
+            requested,
+            current_eta,
+            current_distance,
+            Decimal("27.750000"),
+            Decimal("85.350000"),
+            Decimal("27.700000"),
+            Decimal("85.300000"),
+            "car",
+        )
+
+    @patch.object(DeliveryTracking.objects, "bulk_create")
+    @patch.object(Delivery.objects, "bulk_update")
+    def test_only_moved_estimates_are_written_and_only_big_shifts_log_delays(self, bulk_update, bulk_create):
+        now = timezone.now().replace(hour=12)
+        distance = calculate_distance(27.70, 85.30, 27.75, 85.35)
+        eta = now + timezone.timedelta(hours=distance / calculate_dynamic_speed("car", now) * 1.3)
+        rounded = Decimal(str(round(distance, 2)))
+        overdue = now - timezone.timedelta(hours=3)
+        tomorrow = now + timezone.timedelta(days=1)
+
+        chunk = [
+            self.row(1, eta, rounded, tomorrow, now),  # unchanged: skipped
+            self.row(2, None, None, tomorrow, now),  # first estimate
+            self.row(3, eta + DELAY_EVENT_SHIFT_THRESHOLD * 2, rounded, overdue, now),  # overdue, big shift
+            self.row(4, eta + timezone.timedelta(minutes=10), rounded, overdue, now),  # overdue, small shift
+        ]
+
+        self.assertEqual(_refresh_eta_chunk(chunk, now), 3)
+
+        written = bulk_update.call_args[0][0]
+        self.assertEqual([delivery.id for delivery in written], [2, 3, 4])
+        self.assertEqual(written[0].distance_km, rounded)
+        events = bulk_create.call_args[0][0]
+        self.assertEqual([event.delivery_id for event in events], [3])
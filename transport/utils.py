@@ -2,6 +2,7 @@ import math
 from datetime import timedelta
 from typing import Any, Dict, Optional
 
+import numpy as np
 from django.conf import settings
 from django.core.mail import send_mail
 from django.db.models import Avg, Count, Sum
@@ -31,6 +32,19 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return R * c
 
 
+def calculate_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Vectorized Haversine distance in kilometers for arrays of coordinate pairs.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+
+    return 6371 * 2 * np.arcsin(np.sqrt(a))
+
+
 def calculate_delivery_distance(delivery: Delivery) -> Optional[float]:
     """
     Calculate distance for a delivery from pickup to delivery location.
@@ -192,19 +206,32 @@ def find_nearby_transporters(latitude, longitude, radius=10, vehicle_capacity=No
         vehicle_capacity: Minimum vehicle capacity required
 
     Returns:
-        QuerySet of nearby available transporters
+        List of nearby available transporters sorted by distance and rating
+
+    Live positions from the location tracker's geo set are used when available;
+    otherwise distances are computed from the stored coordinates.
     """
     from .models import Transporter
+    from .services.location_tracking import location_tracker
 
     # Start with available and verified transporters
-    transporters = Transporter.objects.filter(
-        is_available=True, is_verified=True, current_latitude__isnull=False, current_longitude__isnull=False
-    )
+    transporters = Transporter.objects.filter(is_available=True, is_verified=True)
 
     # Filter by vehicle capacity if specified
     if vehicle_capacity:
         transporters = transporters.filter(vehicle_capacity__gte=vehicle_capacity)
 
+    live = location_tracker.nearby(latitude, longitude, radius)
+    if live is not None:
+        distances = dict(live)
+        nearby_transporters = location_tracker.apply_live_positions(transporters.filter(id__in=distances))
+        for transporter in nearby_transporters:
+            transporter.distance = distances[transporter.id]
+        nearby_transporters.sort(key=lambda x: (x.distance, -float(x.rating)))
+        return nearby_transporters
+
+    transporters = transporters.filter(current_latitude__isnull=False, current_longitude__isnull=False)
+
     # Calculate distance for each transporter and filter by radius
     nearby_transporters = []
     for transporter in transporters:
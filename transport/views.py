@@ -1,4 +1,3 @@
-import math
 from datetime import datetime, timedelta
 
 from django.db.models import Q, Sum
@@ -50,6 +49,8 @@ from .serializers import (
     TransporterStatusUpdateSerializer,
 )
 from .services.delivery_suggestions import DeliverySuggestionService
+from .services.location_tracking import location_tracker
+from .services.nearby_deliveries import NearbyDeliveryService
 
 
 class IsTransporterOrReadOnly(permissions.BasePermission):
@@ -395,7 +396,7 @@ class UpdateDeliveryStatusView(APIView):
                         )
 
                 if latitude and longitude:
-                    transporter.update_location(latitude, longitude)
+                    location_tracker.record(transporter, latitude, longitude)
 
                 return Response(DeliverySerializer(delivery).data)
 
@@ -493,14 +494,14 @@ class UpdateLocationView(APIView):
             latitude = serializer.validated_data["latitude"]
             longitude = serializer.validated_data["longitude"]
 
-            transporter.update_location(latitude, longitude)
+            last_update = location_tracker.record(transporter, latitude, longitude)
 
             return Response(
                 {
                     "detail": "Location updated successfully",
                     "latitude": latitude,
                     "longitude": longitude,
-                    "last_update": transporter.last_location_update,
+                    "last_update": last_update,
                 }
             )
 
@@ -641,48 +642,25 @@ class NearbyDeliveriesView(generics.ListAPIView):
         except Transporter.DoesNotExist:
             return Delivery.objects.none()
 
+        location_tracker.apply_live_positions([transporter])
         if not transporter.current_latitude or not transporter.current_longitude:
             return Delivery.objects.none()
 
-        radius = float(self.request.query_params.get("radius", 10))
-
-        queryset = Delivery.objects.filter(
-            status=TransportStatus.AVAILABLE,
-            package_weight__lte=transporter.vehicle_capacity,
-            pickup_latitude__isnull=False,
-            pickup_longitude__isnull=False,
-        )
-        nearby_deliveries = []
-        for delivery in queryset:
-            distance = self.calculate_distance(
-                float(transporter.current_latitude),
-                float(transporter.current_longitude),
-                float(delivery.pickup_latitude),
-                float(delivery.pickup_longitude),
+        try:
+            radius = float(self.request.query_params.get("radius", 10))
+        except (TypeError, ValueError):
+            radius = 10
+
+        return (
+            NearbyDeliveryService()
+            .get_nearby_deliveries(
+                transporter.current_latitude,
+                transporter.current_longitude,
+                radius_km=radius,
+                max_weight=transporter.vehicle_capacity,
             )
-
-            if distance >= radius:
-                delivery.distance = distance
-                nearby_deliveries.append(delivery)
-        print(nearby_deliveries)
-        nearby_deliveries.sort(key=lambda x: x.distance)
-        return nearby_deliveries
-
-    def calculate_distance(self, lat1, lon1, lat2, lon2):
-        """Calculate distance between two points using Haversine formula"""
-        R = 6371
-
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-
-        a = math.sin(dlat / 2) * math.sin(dlat / 2) + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(
-            dlon / 2
-        ) * math.sin(dlon / 2)
-
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        distance = R * c
-
-        return distance
+            .select_related("marketplace_sale__product__product__user")
+        )
 
 
 class DeliverySearchView(generics.ListAPIView):
@@ -1678,6 +1656,7 @@ class DeliverySuggestionView(APIView):
             max_distance_km=data["max_distance_km"],
             vehicle_type=vehicle_type,
             limit=data["limit"],
+            max_weight=getattr(transporter, "vehicle_capacity", None),
         )
 
         serializer = DeliveryListSerializer(deliveries, many=True, context={"request": request})
@@ -2,9 +2,11 @@ import uuid
 
 from django.contrib.auth.models import User
 from django.db import IntegrityError, transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from main.manager import invalidate_shop_id
+
 from .models import Role, UserProfile
 
 
@@ -42,3 +44,11 @@ def create_user_profile(sender, instance, created, **kwargs):
 # @receiver(post_save, sender=User)
 # def save_user_profile(sender, instance, **kwargs):
 #     instance.userprofile.save()
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_shop_id(sender, instance, **kwargs):
+    """Drop the cached shop id used by ShopIDMiddleware once the profile change is committed."""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_shop_id(user_id))